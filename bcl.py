@@ -3,6 +3,12 @@ import argparse
 import os
 import glob
 
+# Usa o cache de detecção do pacote quando ele estiver instalado.
+try:
+    from battery_limiter.probe import ProbeCache
+except ImportError:
+    ProbeCache = None
+
 # Caminhos base para o ambiente real e o simulado.
 REAL_BASE_PATH = '/sys/class/power_supply/'
 MOCK_BASE_PATH = os.path.join(os.path.dirname(__file__), 'mock_sys/class/power_supply/')
@@ -14,6 +20,13 @@ def find_control_file(base_path: str) -> str | None:
     """
     Encontra o primeiro arquivo de controle de carga de bateria disponível no sistema.
     """
+    if ProbeCache is not None and base_path == REAL_BASE_PATH:
+        # Este script grava o percentual direto, então só serve o backend genérico.
+        for entry in ProbeCache().batteries(base_path).values():
+            if entry['backend'] == 'sysfs':
+                return entry['control_file']
+        # Sem resultado no cache, procura diretamente como antes.
+
     battery_dirs = glob.glob(os.path.join(base_path, 'BAT*'))
     if not battery_dirs:
         return None
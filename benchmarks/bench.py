@@ -0,0 +1,969 @@
+"""Micro-benchmarks for battery control paths.
+
+Run with ``python benchmarks/bench.py [NAME ...]`` from a checkout; the
+package under ``src`` is measured, installed or not. Results can be
+saved as a JSON baseline with ``--save`` and checked against one with
+``--compare``, which fails when a metric got worse by more than the
+tolerance.
+"""
+
+import argparse
+import copy
+import io
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from array import array
+from typing import Callable, Dict, List, Tuple
+
+# The checkout's package, also for the interpreters started by the benchmarks
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+sys.path.insert(0, SRC)
+
+from battery_limiter import backends, history
+from battery_limiter.analytics import analyze, numpy
+from battery_limiter.cli import SnapshotWriter
+from battery_limiter.config import Config, ConfigFollower, ConfigWatcher
+from battery_limiter.core import BatteryController, BatteryFleet, BatterySnapshot, LimitCoalescer
+from battery_limiter.estimate import ChargeEstimator
+from battery_limiter.history import HistoryStore
+from battery_limiter.metrics import fleet_metrics, format_prometheus
+from battery_limiter.mocksys import (VENDOR_CONTROL_FILES, create_power_supply_tree,
+                                     create_sysfs_tree)
+from battery_limiter.probe import ProbeCache
+from battery_limiter.sampler import STATUS_CODES, STATUS_NAMES
+from battery_limiter.stress import stress, stress_pairs
+from battery_limiter.sysfs import read_sysfs
+
+
+# Limits checked by ``main``, which exits with status 1 when one is exceeded
+BUDGETS = {
+    # Modules the boot/resume/hotplug apply path may import besides its own
+    'apply.extra_modules': 0,
+    # Milliseconds from process start to the sysfs write above a bare interpreter
+    'apply.overhead_ms': 20.0,
+    # Longest GUI event-loop stall while every sysfs access takes 200 ms
+    'gui.max_latency_ms': 50.0,
+    # Tray icon renders during an hour of 5-second samples
+    'repaints.icon_renders_per_hour': 12.0,
+    # The CLI must not pull in Qt or asyncio
+    'cold_start.cli_qt_modules': 0,
+    'cold_start.cli_asyncio_modules': 0,
+    'cold_start.cli_import_ms': 100.0,
+    'cold_start.gui_first_paint_ms': 400.0,
+    # Latency histograms on the cached limit read, the hottest sysfs path
+    'metrics.read_overhead_us': 1.5,
+    # Time-left estimate on every sample, replayed from a year of history
+    'estimate.replay_us': 5.0,
+    # Profile decision for 16 batteries on a power source or timer change
+    'config.decision_us': 20.0,
+    # Writes lost to transient firmware errors (5% EBUSY/EIO) despite retries
+    'stress.failed_writes': 0,
+    # Threshold pairs rejected, overwritten mid-transaction or left torn by
+    # concurrent writer processes
+    'pairs.failed_transactions': 0,
+    'pairs.mismatched_transactions': 0,
+    'pairs.torn_pairs': 0,
+    # ``battery-limiter watch | head`` must end without a traceback
+    'watch.broken_pipe_stderr_bytes': 0,
+}
+
+# Metrics where larger is better; smaller is better for all others
+HIGHER_IS_BETTER = ('ops_per_second', 'syscalls_saved_per_tick', 'writes_avoided', 'coverage')
+
+# Changes smaller than this, by metric unit, are timer noise on a busy machine
+NOISE_FLOOR = {'_us': 1.0, '_ms': 2.0}
+
+BASELINE_VERSION = 1
+
+
+def measure(func: Callable[[], object], iterations: int, repeat: int = 5) -> float:
+    """Return the best per-call time of ``func`` in microseconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        best = min(best, time.perf_counter() - start)
+    return best / iterations * 1e6
+
+
+def bench_snapshot(iterations: int = 5000) -> Dict[str, float]:
+    """Compare a ``uevent`` snapshot with the per-attribute read path."""
+    with tempfile.TemporaryDirectory() as tmp:
+        controller = BatteryController(base_path=create_power_supply_tree(tmp))
+        
+        directory = controller.attributes.directory
+        
+        def legacy():
+            # Per-attribute exists/open path used before snapshots
+            for name in (os.path.basename(controller.get_control_file_path()),
+                         'model_name', 'manufacturer'):
+                path = os.path.join(directory, name)
+                if os.path.exists(path):
+                    with open(path, 'r') as f:
+                        f.read().strip()
+        
+        return {
+            'multi_open_us': measure(legacy, iterations),
+            'snapshot_us': measure(controller.get_snapshot, iterations),
+        }
+
+
+def bench_startup(iterations: int = 500) -> Dict[str, float]:
+    """Fleet construction with a discovery scan versus a warm probe cache."""
+    with tempfile.TemporaryDirectory() as tmp:
+        base_path = create_power_supply_tree(os.path.join(tmp, 'sys'), batteries=2,
+                                             adapters=1, peripherals=8)
+        cache_path = os.path.join(tmp, 'probe.json')
+        ProbeCache(cache_path).batteries(base_path)
+        
+        def scan():
+            # Include the plugin scan a newly started process pays
+            backends._plugin_specs = None
+            BatteryFleet(base_path=base_path).close()
+        
+        def cached():
+            # A fresh cache object per run, as in a newly started process
+            BatteryFleet(base_path=base_path, probe_cache=ProbeCache(cache_path)).close()
+        
+        return {
+            'scan_us': measure(scan, iterations),
+            'cached_us': measure(cached, iterations),
+        }
+
+
+def bench_attributes(iterations: int = 5000) -> Dict[str, float]:
+    """Compare fresh opens with the tiered attribute cache in a monitoring loop."""
+    with tempfile.TemporaryDirectory() as tmp:
+        controller = BatteryController(base_path=create_power_supply_tree(tmp))
+        directory = controller.attributes.directory
+        
+        def uncached():
+            read_sysfs(controller.get_control_file_path())
+            read_sysfs(os.path.join(directory, 'model_name'))
+            read_sysfs(os.path.join(directory, 'manufacturer'))
+        
+        def cached():
+            controller.get_current_limit()
+            controller.get_battery_info()
+        
+        results = {
+            'uncached_us': measure(uncached, iterations),
+            'cached_us': measure(cached, iterations),
+        }
+        results['syscalls_saved_per_tick'] = (
+            controller.attributes.stats()['syscalls_saved'] / (iterations * 5)
+        )
+        controller.close()
+        return results
+
+
+def bench_fleet(batteries: int = 16, peripherals: int = 16,
+                iterations: int = 200) -> Dict[str, float]:
+    """Controller construction, discovery, snapshot reads and writes on a varied fleet.
+    
+    The generated batteries mix energy and charge units, states and models,
+    next to mains, USB-C and peripheral supplies that discovery must skip.
+    Discovery is also timed on each vendor platform driver layout.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        base_path = create_sysfs_tree(os.path.join(tmp, 'sys'), batteries=batteries,
+                                      usb_adapters=2, peripherals=peripherals, seed=0)
+        probe_cache = ProbeCache(persistent=False)
+        fleet = BatteryFleet(base_path=base_path, probe_cache=probe_cache)
+        
+        def construct():
+            # Probe result already known, as for every controller after the first
+            BatteryController(battery='BAT0', base_path=base_path,
+                              probe_cache=probe_cache).close()
+        
+        def discover(path):
+            BatteryFleet(base_path=path, probe_cache=ProbeCache(persistent=False)).close()
+        
+        limits = itertools.cycle((60, 80))
+        results = {
+            'controller_us': measure(construct, iterations),
+            f'discover_{batteries}_batteries_us': measure(lambda: discover(base_path),
+                                                          iterations // 10),
+            f'snapshots_{batteries}_batteries_us': measure(fleet.get_snapshots, iterations),
+            # Each write is read back to confirm it
+            f'write_{batteries}_batteries_us': measure(lambda: fleet.set_limits(next(limits)),
+                                                       iterations // 10),
+        }
+        fleet.close()
+        
+        for backend in sorted(VENDOR_CONTROL_FILES):
+            path = create_sysfs_tree(os.path.join(tmp, backend), backend, peripherals=2, seed=0)
+            results[f'discover_{backend}_us'] = measure(lambda: discover(path), iterations // 10)
+    return results
+
+
+def bench_writes(requests: int = 200) -> Dict[str, float]:
+    """Hardware writes left after a burst of quick-set requests."""
+    with tempfile.TemporaryDirectory() as tmp:
+        fleet = BatteryFleet(base_path=create_power_supply_tree(tmp, limit=80))
+        coalescer = LimitCoalescer(fleet, delay=0.05)
+        # Alternate between two presets, ending on the current limit
+        futures = [coalescer.request(80 if i % 2 else 60) for i in range(requests)]
+        futures[-1].result()
+        stats = fleet.write_stats()
+        fleet.close()
+        return {
+            'requests': float(requests),
+            'hardware_writes': float(stats['hardware_writes']),
+            'writes_avoided': float(requests - stats['hardware_writes']),
+        }
+
+
+def _environment() -> Dict[str, str]:
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [SRC, env.get('PYTHONPATH')]))
+    return env
+
+
+def _python(args: List[str]) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable] + args, env=_environment(), check=True,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+
+def _import_time(module: str) -> float:
+    """Cumulative import time of ``module`` in microseconds."""
+    result = _python(['-X', 'importtime', '-c', f"import {module}"])
+    for line in result.stderr.splitlines():
+        fields = [field.strip() for field in line.split('|')]
+        if len(fields) == 3 and fields[2] == module:
+            return float(fields[1])
+    return float('nan')
+
+
+def bench_apply(runs: int = 20) -> Dict[str, float]:
+    """Boot/resume apply path: process start to sysfs write, and import cost."""
+    with tempfile.TemporaryDirectory() as tmp:
+        base_path = create_sysfs_tree(os.path.join(tmp, 'sys'))
+        config = os.path.join(tmp, 'bcl.conf')
+        
+        interpreter = apply = float('inf')
+        for i in range(runs):
+            start = time.perf_counter()
+            _python(['-c', 'pass'])
+            interpreter = min(interpreter, time.perf_counter() - start)
+            
+            # Alternate the limit so every run writes
+            with open(config, 'w') as f:
+                f.write('70' if i % 2 else '80')
+            start = time.perf_counter()
+            _python(['-m', 'battery_limiter.apply', '--config', config, '--base-path', base_path])
+            apply = min(apply, time.perf_counter() - start)
+        
+        extra = _python(['-c', "import sys; before = set(sys.modules); "
+                               "import battery_limiter.apply; "
+                               "print(len(set(sys.modules) - before) - 2)"])
+        return {
+            'interpreter_ms': interpreter * 1e3,
+            'apply_ms': apply * 1e3,
+            'overhead_ms': (apply - interpreter) * 1e3,
+            'import_us': _import_time('battery_limiter.apply'),
+            'core_import_us': _import_time('battery_limiter.core'),
+            'extra_modules': float(extra.stdout),
+        }
+
+
+FIRST_PAINT_SCRIPT = """
+import time
+start = time.perf_counter()
+from PyQt6.QtCore import QTimer
+from PyQt6.QtWidgets import QApplication
+from battery_limiter.gui import BatteryLimiterGUI
+
+class Window(BatteryLimiterGUI):
+    painted = None
+    
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self.painted is None:
+            self.painted = time.perf_counter()
+            QTimer.singleShot(0, app.quit)
+
+app = QApplication([])
+window = Window(use_mock=True)
+window.show()
+app.exec()
+print((window.painted - start) * 1e3)
+"""
+
+
+def _wall_time(args: List[str]) -> float:
+    """Milliseconds to run the interpreter with ``args`` to completion."""
+    start = time.perf_counter()
+    _python(args)
+    return (time.perf_counter() - start) * 1e3
+
+
+def _count_modules(module: str, prefix: str) -> int:
+    result = _python(['-c', f"import sys, {module}; "
+                            f"print(sum(1 for m in sys.modules if m.split('.')[0] == {prefix!r}))"])
+    return int(result.stdout)
+
+
+def bench_cold_start(runs: int = 5) -> Dict[str, float]:
+    """Import cost of the CLI and GUI entry points and GUI time to first paint."""
+    result = {
+        'cli_import_ms': min(_import_time('battery_limiter.cli') for _ in range(runs)) / 1e3,
+        'cli_qt_modules': float(_count_modules('battery_limiter.cli', 'PyQt6')),
+        'cli_asyncio_modules': float(_count_modules('battery_limiter.cli', 'asyncio')),
+        'cli_get_ms': min(_wall_time(['-m', 'battery_limiter.cli', 'get', '--mock'])
+                          for _ in range(runs)),
+    }
+    try:
+        import PyQt6  # noqa: F401
+    except ImportError:
+        print("cold_start: GUI skipped, PyQt6 is not installed", file=sys.stderr)
+        return result
+    
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    result['gui_import_ms'] = min(_import_time('battery_limiter.gui') for _ in range(runs)) / 1e3
+    result['gui_first_paint_ms'] = min(float(_python(['-c', FIRST_PAINT_SCRIPT]).stdout)
+                                       for _ in range(runs))
+    return result
+
+
+def bench_history(records: int = 200000) -> Dict[str, float]:
+    """Append rate and time-range query cost of the history store."""
+    with tempfile.TemporaryDirectory() as tmp:
+        history = HistoryStore(tmp, segment_records=65536, sync_every=4096)
+        start = time.perf_counter()
+        for i in range(records):
+            history.append(float(i), capacity=80, energy=40000000, power=10000000,
+                           voltage=12000000, limit=80, status='Charging')
+        append_us = (time.perf_counter() - start) / records * 1e6
+        
+        day = records // 10
+        query_us = measure(lambda: history.query(records / 2, records / 2 + day), 20)
+        history.close()
+        return {'append_us': append_us, 'query_10pct_us': query_us}
+
+
+def synthetic_history(samples: int) -> Dict[str, array]:
+    """Generate a daily charge/discharge pattern sampled every 60 seconds."""
+    timestamp = array('d', bytes(8 * samples))
+    capacity = array('h', bytes(2 * samples))
+    power = array('i', bytes(4 * samples))
+    status = array('B', bytes(samples))
+    soc = 60
+    for i in range(samples):
+        timestamp[i] = i * 60.0
+        charging = (i // 480) % 3 == 0
+        soc = min(soc + 1, 80) if charging else max(soc - 1, 20) if i % 4 == 0 else soc
+        capacity[i] = soc
+        status[i] = 1 if charging and soc < 80 else 2
+        power[i] = 25000000 + (i % 7) * 3000000
+    return {'timestamp': timestamp, 'capacity': capacity, 'power': power, 'status': status}
+
+
+def bench_analytics(samples: int = 2000000) -> Dict[str, float]:
+    """Health report cost on a long synthetic history."""
+    columns = synthetic_history(samples)
+    results = {'python_s': measure(lambda: analyze(columns, use_numpy=False), 1, repeat=1)}
+    if numpy is not None:
+        arrays = {name: numpy.frombuffer(column, dtype=column.typecode)
+                  for name, column in columns.items()}
+        results['numpy_s'] = measure(lambda: analyze(arrays, use_numpy=True), 1, repeat=3)
+    return {name: value / 1e6 for name, value in results.items()}
+
+
+def synthetic_trace(samples: int, interval: float = 30.0, energy_full: int = 50000000,
+                    limit: int = 80, seed: int = 0) -> Dict[str, array]:
+    """Generate history columns of a battery discharged under a changing load and recharged.
+    
+    Discharging draws 5-20 W, drawn anew every 10 minutes, down to 10%;
+    charging runs at about 30 W up to ``limit``. Power readings and energy
+    steps carry a few percent of noise.
+    """
+    rng = random.Random(seed)
+    timestamp = array('d', bytes(8 * samples))
+    energy = array('i', bytes(4 * samples))
+    power = array('i', bytes(4 * samples))
+    status = array('B', bytes(samples))
+    level = energy_full * limit / 100
+    charging = False
+    load = 10e6
+    for i in range(samples):
+        if charging and level >= energy_full * limit / 100:
+            charging = False
+        elif not charging and level <= energy_full * 0.1:
+            charging = True
+        if i % int(600 / interval) == 0:
+            load = rng.uniform(5e6, 20e6)
+        draw = 30e6 if charging else load
+        level += (1 if charging else -1) * draw * rng.gauss(1.0, 0.03) * interval / 3600
+        timestamp[i] = i * interval
+        energy[i] = int(level)
+        power[i] = int(draw * rng.gauss(1.0, 0.03))
+        status[i] = 1 if charging else 2
+    return {'timestamp': timestamp, 'energy': energy, 'power': power, 'status': status}
+
+
+def bench_estimate(samples: int = 1000000, snapshots: int = 20000) -> Dict[str, float]:
+    """Time-left estimator cost on replayed traces, and its accuracy while charging.
+    
+    ``replay_us`` is the per-sample cost of fitting a year of 30-second
+    history; ``update_us`` that of fitting and estimating on each snapshot.
+    ``charge_error_pct`` is the median error of the time to the limit and
+    ``charge_coverage`` the share of those times within the bounds.
+    """
+    trace = synthetic_trace(samples)
+    estimator = ChargeEstimator()
+    start = time.perf_counter()
+    estimator.fit_history('BAT0', trace)
+    replay_us = (time.perf_counter() - start) / samples * 1e6
+    
+    trace = synthetic_trace(snapshots, seed=1)
+    target = 50000000 * 80 / 100
+    states = [BatterySnapshot('BAT0', status=STATUS_NAMES[trace['status'][i]],
+                              energy_now=trace['energy'][i], energy_full=50000000,
+                              power_now=trace['power'][i], limit=80)
+              for i in range(snapshots)]
+    estimator = ChargeEstimator()
+    start = time.perf_counter()
+    estimates = [estimator.update(state, trace['timestamp'][i]) for i, state in enumerate(states)]
+    update_us = (time.perf_counter() - start) / snapshots * 1e6
+    
+    # Actual time to the limit, scanning back from each time it was reached
+    timestamp, energy = trace['timestamp'], trace['energy']
+    errors = []
+    covered = 0
+    reached = None
+    for i in range(snapshots - 1, 0, -1):
+        if trace['status'][i] != STATUS_CODES['Charging']:
+            reached = None
+            continue
+        if energy[i] >= target:
+            # Interpolated between samples, which are further apart than the bounds
+            step = (energy[i] - target) / (energy[i] - energy[i - 1])
+            reached = timestamp[i] - step * (timestamp[i] - timestamp[i - 1])
+            continue
+        if reached is None:
+            continue
+        actual = reached - timestamp[i]
+        estimate = estimates[i]
+        if estimate is None or estimate.method != 'trend' or actual < 600:
+            continue
+        errors.append(abs(estimate.seconds - actual) / actual * 100)
+        if estimate.low <= actual <= (estimate.high or float('inf')):
+            covered += 1
+    errors.sort()
+    return {
+        'replay_us': replay_us,
+        'update_us': update_us,
+        'charge_error_pct': errors[len(errors) // 2] if errors else float('nan'),
+        'charge_coverage': covered / len(errors) if errors else 0.0,
+    }
+
+
+def sample_config(batteries: int = 16, rules: int = 20) -> str:
+    """Configuration with per-battery limits, four profiles and many rules."""
+    lines = ["limit 80", "start 75"]
+    lines += [f"battery BAT{i} limit {90 - i}" for i in range(0, batteries, 2)]
+    for name, limit in (('desk', 60), ('travel', 100), ('storage', 50)):
+        lines += [f"[profile {name}]", f"limit {limit}"]
+        lines += [f"battery BAT{i} limit {limit - i} start {limit - i - 5}"
+                  for i in range(1, batteries, 4)]
+    lines += ["[rules]", "on battery use travel"]
+    days = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+    profiles = ('desk', 'storage', 'default')
+    lines += [f"{days[i % 7]} {i % 24:02d}:00-{(i * 7 + 3) % 24:02d}:30 use {profiles[i % 3]}"
+              for i in range(rules)]
+    return '\n'.join(lines) + '\n'
+
+
+def bench_config(batteries: int = 16, iterations: int = 2000) -> Dict[str, float]:
+    """Cost of following a structured configuration.
+    
+    ``decision_us`` is one evaluation of the thresholds of every battery,
+    as on each power source change or profile timer; ``compile_ms`` the
+    parse and compile of the file, paid only when it changes; ``reload_ms``
+    the time from rewriting the file to the new table being in place.
+    """
+    text = sample_config(batteries)
+    names = [f"BAT{i}" for i in range(batteries)]
+    table = Config.parse(text).compile()
+    follower = ConfigFollower(names, lambda start, end, group: None, table, True,
+                              use_timerfd=False)
+    follower.update()
+    decision_us = measure(follower.update, iterations)
+    compile_ms = measure(lambda: Config.parse(text).compile(), 50) / 1000
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bcl.conf')
+        with open(path, 'w') as f:
+            f.write(text)
+        watcher = ConfigWatcher(path)
+        try:
+            best = float('inf')
+            for i in range(20):
+                with open(path, 'w') as f:
+                    f.write(text.replace("limit 80", f"limit {85 + i % 2}", 1))
+                start = time.perf_counter()
+                while not watcher.handle():
+                    time.sleep(0.0001)
+                best = min(best, time.perf_counter() - start)
+        finally:
+            watcher.close()
+    return {
+        'decision_us': decision_us,
+        'compile_ms': compile_ms,
+        'reload_ms': best * 1000,
+    }
+
+
+def _slowed(func: Callable, delay: float) -> Callable:
+    def slow(*args, **kwargs):
+        time.sleep(delay)
+        return func(*args, **kwargs)
+    return slow
+
+
+def bench_gui(delay: float = 0.2, duration: float = 3.0) -> Dict[str, float]:
+    """GUI event-loop latency with a slow backend under refresh and apply requests."""
+    try:
+        from PyQt6.QtCore import QTimer
+        from PyQt6.QtWidgets import QApplication
+    except ImportError:
+        print("gui: skipped, PyQt6 is not installed", file=sys.stderr)
+        return {}
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from battery_limiter.gui import BatteryLimiterGUI
+    
+    saved_state_home = os.environ.get('XDG_STATE_HOME')
+    saved_history_path = history.SYSTEM_HISTORY_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        # Keep the GUI's sampler away from the real history
+        os.environ['XDG_STATE_HOME'] = tmp
+        history.SYSTEM_HISTORY_PATH = os.path.join(tmp, 'system')
+        try:
+            fleet = BatteryFleet(use_mock=True,
+                                 base_path=create_power_supply_tree(os.path.join(tmp, 'sys')))
+            for controller in fleet.select():
+                for method in ('get_snapshot', 'get_current_limit', 'set_charge_limit'):
+                    setattr(controller, method, _slowed(getattr(controller, method), delay))
+            
+            app = QApplication.instance() or QApplication([])
+            window = BatteryLimiterGUI(fleet)
+            window.finish_setup()
+            
+            interval = 10
+            latencies = []
+            last = [time.perf_counter()]
+            
+            def tick():
+                now = time.perf_counter()
+                latencies.append(now - last[0] - interval / 1000)
+                last[0] = now
+            
+            requests = [0]
+            
+            def poke():
+                requests[0] += 1
+                window.update_display()
+                window.apply_limit_direct(60 if requests[0] % 2 else 80)
+            
+            ticker = QTimer()
+            ticker.setInterval(interval)
+            ticker.timeout.connect(tick)
+            poker = QTimer()
+            poker.setInterval(100)
+            poker.timeout.connect(poke)
+            
+            def finish():
+                # Before quitting: the window waits for pending writes then
+                ticker.stop()
+                poker.stop()
+                app.quit()
+            
+            ticker.start()
+            poker.start()
+            QTimer.singleShot(int(duration * 1000), finish)
+            app.exec()
+            
+            window.read_pool.waitForDone()
+            window.write_pool.waitForDone()
+            if window.sampler is not None:
+                window.sampler.stop()
+            if window.watcher is not None:
+                window.watcher.close()
+            fleet.close()
+        finally:
+            history.SYSTEM_HISTORY_PATH = saved_history_path
+            if saved_state_home is None:
+                del os.environ['XDG_STATE_HOME']
+            else:
+                os.environ['XDG_STATE_HOME'] = saved_state_home
+    
+    latencies.sort()
+    return {
+        'requests': float(requests[0]),
+        'p99_latency_ms': latencies[int(len(latencies) * 0.99)] * 1e3,
+        'max_latency_ms': latencies[-1] * 1e3,
+    }
+
+
+def bench_repaints(interval: float = 5.0) -> Dict[str, float]:
+    """Repaints per hour of the GUI fed a simulated hour of battery samples.
+    
+    The battery charges from 40% to its 80% limit, holds, then runs on
+    battery; the window is shown on the offscreen platform and paint
+    events are counted after each sample.
+    """
+    try:
+        from PyQt6.QtCore import QEvent, QObject
+        from PyQt6.QtWidgets import QApplication
+    except ImportError:
+        print("repaints: skipped, PyQt6 is not installed", file=sys.stderr)
+        return {}
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from battery_limiter.gui import BatteryLimiterGUI
+    
+    class PaintCounter(QObject):
+        paints = 0
+        
+        def eventFilter(self, obj, event):
+            if event.type() == QEvent.Type.Paint:
+                self.paints += 1
+            return False
+    
+    saved_state_home = os.environ.get('XDG_STATE_HOME')
+    saved_history_path = history.SYSTEM_HISTORY_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['XDG_STATE_HOME'] = tmp
+        history.SYSTEM_HISTORY_PATH = os.path.join(tmp, 'system')
+        try:
+            fleet = BatteryFleet(use_mock=True,
+                                 base_path=create_power_supply_tree(os.path.join(tmp, 'sys')))
+            name = fleet.names()[0]
+            app = QApplication.instance() or QApplication([])
+            window = BatteryLimiterGUI(fleet)
+            window.finish_setup()
+            window.show()
+            window.read_pool.waitForDone()
+            app.processEvents()
+            
+            counter = PaintCounter()
+            app.installEventFilter(counter)
+            renders = window.icons.renders
+            icon_updates = window.icon_updates
+            samples = int(3600 / interval)
+            capacity = 40.0
+            for i in range(samples):
+                if i < samples * 3 // 4:
+                    status = 'Charging' if capacity < 80 else 'Not charging'
+                    capacity = min(80.0, capacity + 40 * interval / 3600)
+                else:
+                    status = 'Discharging'
+                    capacity -= 10 * interval / 3600
+                properties = {
+                    'STATUS': status, 'CAPACITY': str(int(capacity)),
+                    'MODEL_NAME': '5B10W13930', 'MANUFACTURER': 'SMP',
+                }
+                window.show_snapshots({name: BatterySnapshot.from_properties(name, properties, 80)})
+                app.processEvents()
+            app.removeEventFilter(counter)
+            
+            window.read_pool.waitForDone()
+            window.write_pool.waitForDone()
+            if window.sampler is not None:
+                window.sampler.stop()
+            if window.watcher is not None:
+                window.watcher.close()
+            window.close()
+            fleet.close()
+        finally:
+            history.SYSTEM_HISTORY_PATH = saved_history_path
+            if saved_state_home is None:
+                del os.environ['XDG_STATE_HOME']
+            else:
+                os.environ['XDG_STATE_HOME'] = saved_state_home
+    
+    return {
+        'samples_per_hour': float(samples),
+        'paints_per_hour': float(counter.paints),
+        'icon_renders_per_hour': float(window.icons.renders - renders),
+        'icon_updates_per_hour': float(window.icon_updates - icon_updates),
+    }
+
+
+def bench_gui_update(batteries: int = 16, iterations: int = 500) -> Dict[str, float]:
+    """Cost of showing a fleet snapshot in the window, including the repaint.
+    
+    ``changed`` alternates between two states that differ in limit and
+    charge, so labels, icons and the tooltip are updated; ``unchanged``
+    shows the same state again, as most watcher and timer refreshes do.
+    """
+    try:
+        from PyQt6.QtWidgets import QApplication
+    except ImportError:
+        print("gui_update: skipped, PyQt6 is not installed", file=sys.stderr)
+        return {}
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from battery_limiter.gui import BatteryLimiterGUI
+    
+    saved_state_home = os.environ.get('XDG_STATE_HOME')
+    saved_history_path = history.SYSTEM_HISTORY_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['XDG_STATE_HOME'] = tmp
+        history.SYSTEM_HISTORY_PATH = os.path.join(tmp, 'system')
+        try:
+            fleet = BatteryFleet(use_mock=True, base_path=create_power_supply_tree(
+                os.path.join(tmp, 'sys'), batteries=batteries, seed=0))
+            app = QApplication.instance() or QApplication([])
+            window = BatteryLimiterGUI(fleet)
+            window.finish_setup()
+            window.show()
+            window.read_pool.waitForDone()
+            app.processEvents()
+            
+            states = [fleet.get_snapshots(), {}]
+            for name, snapshot in states[0].items():
+                other = states[1][name] = copy.copy(snapshot)
+                other.limit = 60
+                other.capacity = min(100, (snapshot.capacity or 0) + 25)
+            turns = itertools.cycle(states)
+            
+            def show(snapshots):
+                window.show_snapshots(snapshots)
+                app.processEvents()
+            
+            results = {
+                'changed_us': measure(lambda: show(next(turns)), iterations),
+                'unchanged_us': measure(lambda: show(states[0]), iterations),
+            }
+            
+            if window.sampler is not None:
+                window.sampler.stop()
+            if window.watcher is not None:
+                window.watcher.close()
+            window.close()
+            fleet.close()
+        finally:
+            history.SYSTEM_HISTORY_PATH = saved_history_path
+            if saved_state_home is None:
+                del os.environ['XDG_STATE_HOME']
+            else:
+                os.environ['XDG_STATE_HOME'] = saved_state_home
+    return results
+
+
+def bench_watch(batteries: int = 64, iterations: int = 200) -> Dict[str, float]:
+    """NDJSON stream cost for a large fleet, and behaviour on a closed pipe."""
+    with tempfile.TemporaryDirectory() as tmp:
+        fleet = BatteryFleet(use_mock=True,
+                             base_path=create_power_supply_tree(os.path.join(tmp, 'sys'),
+                                                                batteries=batteries))
+        names = fleet.names()
+        snapshots = list(fleet.get_snapshots().values())
+        writer = SnapshotWriter(as_json=True)
+        saved_stdout = sys.stdout
+        sys.stdout = io.StringIO()
+        try:
+            record_us = measure(lambda: writer.write(snapshots), iterations) / batteries
+            tick_us = measure(lambda: writer.write(fleet.get_snapshots(names).values()),
+                              iterations)
+        finally:
+            sys.stdout = saved_stdout
+        fleet.close()
+    
+    # Read one line, then close the pipe under a fast interval stream
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'battery_limiter.cli', 'watch', '--mock', '--json',
+         '--interval', '0.001'],
+        env=_environment(), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    process.stdout.readline()
+    process.stdout.close()
+    stderr = process.stderr.read()
+    process.wait()
+    return {
+        'record_us': record_us,
+        f'tick_{batteries}_batteries_us': tick_us,
+        'broken_pipe_stderr_bytes': float(len(stderr)),
+    }
+
+
+def bench_metrics(iterations: int = 10000) -> Dict[str, float]:
+    """Cost of the operation histograms on the limit read path, and of exporting."""
+    with tempfile.TemporaryDirectory() as tmp:
+        fleet = BatteryFleet(use_mock=True,
+                             base_path=create_power_supply_tree(os.path.join(tmp, 'sys'),
+                                                                batteries=8))
+        controller = fleet.select()[0]
+        backend, attributes = controller.backend, controller.attributes
+        
+        def bare():
+            return backend.decode(backend.read(attributes))
+        
+        # Interleaved so both minimums come from the same machine state
+        bare_us = timed_us = float('inf')
+        for _ in range(10):
+            bare_us = min(bare_us, measure(bare, iterations, repeat=1))
+            timed_us = min(timed_us, measure(controller.get_current_limit, iterations, repeat=1))
+        snapshots = fleet.get_snapshots()
+        export_us = measure(lambda: format_prometheus(fleet_metrics(fleet, snapshots)), 200)
+        fleet.close()
+    return {
+        'read_us': bare_us,
+        'timed_read_us': timed_us,
+        'read_overhead_us': timed_us - bare_us,
+        'export_8_batteries_us': export_us,
+    }
+
+
+def bench_stress() -> Dict[str, float]:
+    """Concurrent reads and writes on simulated firmware with 5% transient faults."""
+    result = stress(operations=2000, threads=16, fault_rate=0.05)
+    keys = ('ops_per_second', 'write_p99_ms', 'failed_writes', 'write_retries')
+    return {key: result[key] for key in keys}
+
+
+def bench_pairs() -> Dict[str, float]:
+    """Start/end threshold transactions from 8 processes while 2 others read."""
+    result = stress_pairs(processes=8, transactions=300, readers=2)
+    keys = ('transactions_per_second', 'transaction_p99_ms', 'read_p99_ms',
+            'failed_transactions', 'mismatched_transactions', 'torn_pairs')
+    return {key: result[key] for key in keys}
+
+
+BENCHMARKS = {
+    'snapshot': bench_snapshot,
+    'startup': bench_startup,
+    'fleet': bench_fleet,
+    'attributes': bench_attributes,
+    'writes': bench_writes,
+    'history': bench_history,
+    'analytics': bench_analytics,
+    'estimate': bench_estimate,
+    'config': bench_config,
+    'apply': bench_apply,
+    'cold_start': bench_cold_start,
+    'gui': bench_gui,
+    'repaints': bench_repaints,
+    'gui_update': bench_gui_update,
+    'watch': bench_watch,
+    'metrics': bench_metrics,
+    'stress': bench_stress,
+    'pairs': bench_pairs,
+}
+
+
+def load_baseline(path: str) -> Dict[str, float]:
+    """Read results saved by :func:`save_baseline`.
+    
+    Raises:
+        OSError: If the file cannot be read
+        ValueError: If it is not a baseline
+    """
+    with open(path) as f:
+        data = json.load(f)
+    if not isinstance(data, dict) or data.get('version') != BASELINE_VERSION:
+        raise ValueError(f"{path} is not a benchmark baseline")
+    return {key: float(value) for key, value in data['results'].items()}
+
+
+def save_baseline(path: str, results: Dict[str, float]) -> None:
+    """Write results, with the interpreter and machine they came from, as JSON."""
+    data = {
+        'version': BASELINE_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results,
+    }
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def compare(key: str, value: float, baseline: float, tolerance: float) -> Tuple[float, bool]:
+    """Change of a metric against its baseline.
+    
+    Args:
+        key: Metric name, whose suffix gives its unit and direction
+        value: Current result
+        baseline: Baseline result
+        tolerance: Allowed worsening as a fraction of the baseline
+    
+    Returns:
+        The relative change, and whether it is a regression: worse than the
+        tolerance plus the noise floor of the unit
+    """
+    if math.isnan(value) or math.isnan(baseline):
+        return float('nan'), False
+    change = value - baseline
+    if baseline:
+        relative = change / abs(baseline)
+    else:
+        relative = math.copysign(math.inf, change) if change else 0.0
+    worse = -change if key.endswith(HIGHER_IS_BETTER) else change
+    floor = next((noise for unit, noise in NOISE_FLOOR.items() if key.endswith(unit)), 0.0)
+    return relative, worse > tolerance * abs(baseline) + floor
+
+
+def main():
+    """Run the selected benchmarks and print the results."""
+    parser = argparse.ArgumentParser(description="Battery charge limiter benchmarks")
+    parser.add_argument('names', nargs='*',
+                        help=f"Benchmarks to run: {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument('--save', metavar='PATH', help="Save the results as a JSON baseline")
+    parser.add_argument('--compare', metavar='PATH',
+                        help="Compare with a saved baseline and fail on regressions")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="Allowed worsening against the baseline, as a fraction "
+                             "(default: 0.25)")
+    parser.add_argument('--repeat', type=int, default=1,
+                        help="Run each benchmark this many times and keep the best "
+                             "result of each metric (default: 1)")
+    args = parser.parse_args()
+    
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(sorted(unknown))}")
+    baseline = {}
+    if args.compare:
+        try:
+            baseline = load_baseline(args.compare)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            parser.error(f"cannot read baseline: {e}")
+    
+    failed = False
+    results = {}
+    for name in args.names or BENCHMARKS:
+        runs = [BENCHMARKS[name]() for _ in range(max(1, args.repeat))]
+        for metric in runs[0]:
+            key = f"{name}.{metric}"
+            best = max if key.endswith(HIGHER_IS_BETTER) else min
+            value = results[key] = best(run[metric] for run in runs)
+            notes = []
+            budget = BUDGETS.get(key)
+            if budget is not None and value > budget:
+                failed = True
+                notes.append(f"over budget of {budget:.2f}")
+            if key in baseline:
+                relative, regressed = compare(key, value, baseline[key], args.tolerance)
+                notes.append(f"baseline {baseline[key]:.2f}, {relative * 100:+.1f}%")
+                if regressed:
+                    failed = True
+                    notes.append("regressed")
+            print(f"{key}: {value:.2f}" + (f" ({', '.join(notes)})" if notes else ""))
+    if args.save:
+        save_baseline(args.save, results)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
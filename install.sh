@@ -108,9 +108,9 @@ install_python_package() {
     if command -v pipx &> /dev/null; then
         print_status "Using pipx for installation..."
         if [ -f "pyproject.toml" ] && [ -d "src/battery_limiter" ]; then
-            pipx install -e .
+            pipx install -e '.[gui]'
         else
-            pipx install battery-charge-limiter
+            pipx install 'battery-charge-limiter[gui]'
         fi
         print_success "Python package installed via pipx"
         return
@@ -119,7 +119,7 @@ install_python_package() {
     # Check if we're in the source directory
     if [ -f "pyproject.toml" ] && [ -d "src/battery_limiter" ]; then
         print_status "Installing from source directory..."
-        if ! pip install --user -e . 2>/tmp/pip_error.log; then
+        if ! pip install --user -e '.[gui]' 2>/tmp/pip_error.log; then
             if grep -q "externally-managed-environment" /tmp/pip_error.log; then
                 PEP668_ERROR=true
             else
@@ -129,7 +129,7 @@ install_python_package() {
         fi
     else
         print_status "Installing from PyPI..."
-        if ! pip install --user battery-charge-limiter 2>/tmp/pip_error.log; then
+        if ! pip install --user 'battery-charge-limiter[gui]' 2>/tmp/pip_error.log; then
             if grep -q "externally-managed-environment" /tmp/pip_error.log; then
                 PEP668_ERROR=true
             else
@@ -147,16 +147,12 @@ install_python_package() {
         VENV_DIR="$HOME/.local/share/battery-limiter-venv"
         python3 -m venv "$VENV_DIR"
         
-        # Install PyQt6 in virtual environment first
-        print_status "Installing PyQt6 in virtual environment..."
-        "$VENV_DIR/bin/pip" install PyQt6
-        
         if [ -f "pyproject.toml" ] && [ -d "src/battery_limiter" ]; then
             print_status "Installing from source in virtual environment..."
-            "$VENV_DIR/bin/pip" install -e .
+            "$VENV_DIR/bin/pip" install -e '.[gui]'
         else
             print_status "Installing from PyPI in virtual environment..."
-            "$VENV_DIR/bin/pip" install battery-charge-limiter
+            "$VENV_DIR/bin/pip" install 'battery-charge-limiter[gui]'
         fi
         
         # Create wrapper scripts in ~/.local/bin
@@ -258,6 +254,100 @@ setup_systemd_service() {
     fi
 }
 
+# Programs run as root must not be writable by the user, or anything running
+# as the user could edit them to gain root. The system services therefore
+# get their own copy of the package in a root-owned virtual environment,
+# never the one under ~/.local or an editable checkout.
+SYSTEM_VENV="/opt/battery-limiter"
+SYSTEM_BIN="/usr/local/bin"
+
+install_system_package() {
+    if [ "$SYSTEM_PACKAGE_INSTALLED" = true ]; then
+        return
+    fi
+    print_status "Installing the package for the system services in $SYSTEM_VENV..."
+    sudo python3 -m venv "$SYSTEM_VENV"
+    if [ -f "pyproject.toml" ] && [ -d "src/battery_limiter" ]; then
+        sudo "$SYSTEM_VENV/bin/pip" install --quiet --upgrade .
+    else
+        sudo "$SYSTEM_VENV/bin/pip" install --quiet --upgrade battery-charge-limiter
+    fi
+    SYSTEM_PACKAGE_INSTALLED=true
+}
+
+# Write a root-owned wrapper running a module of the system package.
+# -I keeps PYTHONPATH, the user site directory and the working directory
+# out of the import path.
+install_system_command() {
+    install_system_package
+    printf '#!/bin/sh\nexec %s/bin/python -I -m %s "$@"\n' "$SYSTEM_VENV" "$2" | \
+        sudo tee "$SYSTEM_BIN/$1" > /dev/null
+    sudo chown root:root "$SYSTEM_BIN/$1"
+    sudo chmod 755 "$SYSTEM_BIN/$1"
+}
+
+# Refuse to hand a program to a root service unless only root can change it
+check_root_owned() {
+    case "$1" in
+        "$HOME"/*)
+            print_error "Refusing to run $1 as root: it is under $HOME"
+            return 1
+            ;;
+    esac
+    if [ "$(stat -c %u "$1")" != "0" ] || [ -n "$(find "$1" -perm /022)" ]; then
+        print_error "Refusing to run $1 as root: it is not owned and writable by root only"
+        return 1
+    fi
+}
+
+# Setup the privileged daemon so the GUI and CLI work without sudo
+setup_daemon_service() {
+    print_status "Setting up battery limiter daemon..."
+
+    if [ ! -f "battery-limiter-daemon.service" ]; then
+        print_status "Daemon service file not found, skipping"
+        return
+    fi
+
+    install_system_command battery-limiter-daemon battery_limiter.daemon
+    DAEMON_BIN="$SYSTEM_BIN/battery-limiter-daemon"
+    check_root_owned "$DAEMON_BIN" || exit 1
+
+    sed "s|ExecStart=.*|ExecStart=$DAEMON_BIN|" battery-limiter-daemon.service | \
+        sudo tee /etc/systemd/system/battery-limiter-daemon.service > /dev/null
+    sudo systemctl daemon-reload
+    sudo systemctl enable --now battery-limiter-daemon.service
+    print_success "Daemon service enabled"
+}
+
+# Re-apply the limit at boot, after resume and when a battery is attached
+setup_apply_hooks() {
+    print_status "Setting up boot, resume and hotplug hooks..."
+
+    install_system_command battery-limiter-apply battery_limiter.apply
+    APPLY_BIN="$SYSTEM_BIN/battery-limiter-apply"
+    check_root_owned "$APPLY_BIN" || exit 1
+
+    if [ ! -f "/etc/bcl.conf" ] && [ -f "bcl.conf" ]; then
+        sudo cp bcl.conf /etc/bcl.conf
+    fi
+
+    sed "s|/usr/local/bin/battery-limiter-apply|$APPLY_BIN|" 99-battery-limiter.rules | \
+        sudo tee /etc/udev/rules.d/99-battery-limiter.rules > /dev/null
+    sudo udevadm control --reload-rules 2>/dev/null || true
+
+    sudo mkdir -p /usr/lib/systemd/system-sleep
+    sed "s|/usr/local/bin/battery-limiter-apply|$APPLY_BIN|" battery-limiter-sleep | \
+        sudo tee /usr/lib/systemd/system-sleep/battery-limiter > /dev/null
+    sudo chmod +x /usr/lib/systemd/system-sleep/battery-limiter
+
+    sed "s|ExecStart=.*|ExecStart=$APPLY_BIN|" bcl.service | \
+        sudo tee /etc/systemd/system/battery-limiter-apply.service > /dev/null
+    sudo systemctl daemon-reload
+    sudo systemctl enable battery-limiter-apply.service
+    print_success "Limit will be re-applied at boot, after resume and on battery hotplug"
+}
+
 # Show completion message
 show_completion() {
     echo ""
@@ -292,6 +382,8 @@ main() {
     install_python_package
     create_desktop_entry
     setup_systemd_service
+    setup_daemon_service
+    setup_apply_hooks
     show_completion
 }
 
@@ -0,0 +1,197 @@
+"""Battery health analytics over recorded history.
+
+All statistics are computed in whole-array operations with NumPy when it
+is installed, and in a single pass over the columns otherwise.
+"""
+
+import bisect
+from typing import Dict, Optional, Sequence
+
+from .core import BatterySnapshot
+from .sampler import MISSING, STATUS_CODES
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - optional dependency
+    numpy = None
+
+
+SOC_THRESHOLDS = (80, 90)
+# Charging power histogram bin edges in watts
+POWER_BINS = (0, 5, 10, 20, 30, 45, 65, 100)
+
+_CHARGING = STATUS_CODES['Charging']
+
+
+def capacity_fade(snapshot: Optional[BatterySnapshot]) -> Optional[float]:
+    """Fraction of design capacity lost (0.0 = as new).
+    
+    Uses energy values when the driver reports them, charge values otherwise.
+    """
+    if snapshot is None:
+        return None
+    for full, design in ((snapshot.energy_full, snapshot.energy_full_design),
+                         (snapshot.charge_full, snapshot.charge_full_design)):
+        if full and design:
+            return 1.0 - full / design
+    return None
+
+
+def _empty_report(thresholds: Sequence[int], bins: Sequence[float]) -> Dict[str, object]:
+    return {
+        'samples': 0,
+        'span_hours': 0.0,
+        'equivalent_full_cycles': 0.0,
+        'mean_soc': None,
+        'hours_above': {threshold: 0.0 for threshold in thresholds},
+        'fraction_above': {threshold: 0.0 for threshold in thresholds},
+        'charge_power_bins': list(bins),
+        'charge_power_histogram': [0] * (len(bins) - 1),
+        'median_charge_power': None,
+    }
+
+
+def _analyze_numpy(timestamp, capacity, power, status, thresholds, bins, max_gap):
+    timestamp = numpy.asarray(timestamp, dtype=numpy.float64)
+    capacity = numpy.asarray(capacity, dtype=numpy.float64)
+    power = numpy.asarray(power, dtype=numpy.int64)
+    status = numpy.asarray(status)
+    
+    valid = capacity >= 0
+    t = timestamp[valid]
+    soc = capacity[valid]
+    report = _empty_report(thresholds, bins)
+    report['samples'] = int(t.size)
+    
+    if t.size >= 2:
+        dt = numpy.diff(t)
+        if max_gap is not None:
+            dt = numpy.minimum(dt, max_gap)
+        span = float(dt.sum())
+        held = soc[:-1]
+        report['span_hours'] = span / 3600
+        report['equivalent_full_cycles'] = float(numpy.abs(numpy.diff(soc)).sum()) / 200
+        if span > 0:
+            report['mean_soc'] = float((held * dt).sum() / span)
+        for threshold in thresholds:
+            seconds = float(dt[held >= threshold].sum())
+            report['hours_above'][threshold] = seconds / 3600
+            report['fraction_above'][threshold] = seconds / span if span > 0 else 0.0
+    elif t.size == 1:
+        report['mean_soc'] = float(soc[0])
+    
+    charging = (status == _CHARGING) & (power != MISSING) & (power > 0)
+    watts = power[charging] / 1e6
+    if watts.size:
+        histogram, _edges = numpy.histogram(numpy.minimum(watts, bins[-1]), bins=bins)
+        report['charge_power_histogram'] = [int(n) for n in histogram]
+        report['median_charge_power'] = float(numpy.median(watts))
+    return report
+
+
+def _analyze_python(timestamp, capacity, power, status, thresholds, bins, max_gap):
+    report = _empty_report(thresholds, bins)
+    seconds_above = [0.0] * len(thresholds)
+    histogram = [0] * (len(bins) - 1)
+    last_bin = len(bins) - 2
+    watts = []
+    samples = 0
+    span = 0.0
+    weighted = 0.0
+    throughput = 0.0
+    prev_t = prev_soc = None
+    
+    for t, soc, p, code in zip(timestamp, capacity, power, status):
+        if code == _CHARGING and p != MISSING and p > 0:
+            w = p / 1e6
+            watts.append(w)
+            histogram[min(bisect.bisect_right(bins, w) - 1, last_bin)] += 1
+        if soc < 0:
+            continue
+        samples += 1
+        if prev_t is not None:
+            dt = t - prev_t
+            if max_gap is not None and dt > max_gap:
+                dt = max_gap
+            span += dt
+            weighted += prev_soc * dt
+            throughput += abs(soc - prev_soc)
+            for i, threshold in enumerate(thresholds):
+                if prev_soc >= threshold:
+                    seconds_above[i] += dt
+        prev_t, prev_soc = t, soc
+    
+    report['samples'] = samples
+    report['span_hours'] = span / 3600
+    report['equivalent_full_cycles'] = throughput / 200
+    if span > 0:
+        report['mean_soc'] = weighted / span
+    elif samples == 1:
+        report['mean_soc'] = float(prev_soc)
+    for i, threshold in enumerate(thresholds):
+        report['hours_above'][threshold] = seconds_above[i] / 3600
+        report['fraction_above'][threshold] = seconds_above[i] / span if span > 0 else 0.0
+    report['charge_power_histogram'] = histogram
+    if watts:
+        watts.sort()
+        middle = len(watts) // 2
+        report['median_charge_power'] = (
+            watts[middle] if len(watts) % 2 else (watts[middle - 1] + watts[middle]) / 2
+        )
+    return report
+
+
+def analyze(columns: Dict[str, Sequence], snapshot: Optional[BatterySnapshot] = None,
+            thresholds: Sequence[int] = SOC_THRESHOLDS,
+            bins: Sequence[float] = POWER_BINS, max_gap: Optional[float] = None,
+            use_numpy: Optional[bool] = None) -> Dict[str, object]:
+    """Compute battery health statistics from history columns.
+    
+    Args:
+        columns: Output of :meth:`HistoryStore.query` (``timestamp``,
+            ``capacity``, ``power`` and ``status``)
+        snapshot: Current battery state, used for capacity fade
+        thresholds: State-of-charge levels to report time spent above
+        bins: Charging power histogram edges in watts; the last bin also
+            counts everything above it
+        max_gap: Longest interval in seconds credited between two samples
+        use_numpy: Force or disable the NumPy path (default: if installed)
+    
+    Returns:
+        Report with ``samples``, ``span_hours``, ``equivalent_full_cycles``,
+        ``mean_soc``, ``hours_above``, ``fraction_above``,
+        ``charge_power_histogram``, ``median_charge_power``,
+        ``capacity_fade`` and ``cycle_count``
+    """
+    if use_numpy is None:
+        use_numpy = numpy is not None
+    analyzer = _analyze_numpy if use_numpy else _analyze_python
+    report = analyzer(columns['timestamp'], columns['capacity'], columns['power'],
+                      columns['status'], tuple(thresholds), tuple(bins), max_gap)
+    report['capacity_fade'] = capacity_fade(snapshot)
+    report['cycle_count'] = snapshot.cycle_count if snapshot is not None else None
+    return report
+
+
+def format_report(report: Dict[str, object]) -> str:
+    """Render a report as human-readable text."""
+    lines = []
+    fade = report['capacity_fade']
+    if fade is not None:
+        lines.append(f"Capacity health: {(1 - fade) * 100:.1f}% of design ({fade * 100:.1f}% fade)")
+    if report['cycle_count']:
+        lines.append(f"Cycle count (reported): {report['cycle_count']}")
+    lines.append(f"Samples: {report['samples']} over {report['span_hours']:.1f} h")
+    lines.append(f"Equivalent full cycles: {report['equivalent_full_cycles']:.2f}")
+    if report['mean_soc'] is not None:
+        lines.append(f"Average charge level: {report['mean_soc']:.0f}%")
+    for threshold, hours in report['hours_above'].items():
+        fraction = report['fraction_above'][threshold]
+        lines.append(f"Time at or above {threshold}%: {hours:.1f} h ({fraction * 100:.0f}%)")
+    if report['median_charge_power'] is not None:
+        lines.append(f"Median charging power: {report['median_charge_power']:.1f} W")
+        bins = report['charge_power_bins']
+        for i, count in enumerate(report['charge_power_histogram']):
+            label = f"{bins[i]}-{bins[i + 1]} W" if i < len(bins) - 2 else f"{bins[i]}+ W"
+            lines.append(f"  {label:>9}: {count}")
+    return "\n".join(lines)
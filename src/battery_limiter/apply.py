@@ -0,0 +1,290 @@
+"""Re-apply the configured charge limit at boot, resume and hotplug.
+
+This runs from systemd at boot, from the systemd sleep hook after resume
+and from udev when a battery appears or changes, i.e. exactly when the
+firmware may have reset the threshold and the battery is charging past
+it. The common case (a single limit and the generic threshold files)
+therefore only imports ``os`` and ``sys`` and costs a handful of
+syscalls; anything else falls back to the full controller with its
+vendor backends. A structured configuration (see
+:mod:`battery_limiter.config`) is compiled and applied for the current
+time and power source.
+
+Usage: see :data:`USAGE`.
+"""
+
+import os
+import sys
+
+
+USAGE = "usage: battery-limiter-apply [--config PATH] [--base-path PATH] [BATTERY ...]"
+
+CONFIG_PATH = '/etc/bcl.conf'
+REAL_BASE_PATH = '/sys/class/power_supply/'
+
+# Same names and order as battery_limiter.backends.sysfs.CONTROL_FILES and
+# START_FILES, repeated here to keep that package off the fast path
+CONTROL_FILES = ('charge_control_end_threshold', 'charge_stop_threshold')
+START_FILES = ('charge_control_start_threshold', 'charge_start_threshold')
+
+
+def _battery_names(base_path: str) -> list:
+    return sorted(name for name in os.listdir(base_path) if name.startswith('BAT'))
+
+
+def read_config(path: str = CONFIG_PATH, base_path: str = REAL_BASE_PATH, names=None):
+    """Read the thresholds the configuration asks for now.
+    
+    Args:
+        path: Configuration file, a single limit or structured
+        base_path: Path to the ``power_supply`` class directory, for the
+            batteries and the power source
+        names: Batteries to apply to (default: all)
+    
+    Returns:
+        ``[((start, limit), names), ...]``: the batteries to give each pair
+        of thresholds; ``start`` is ``None`` to leave it alone and
+        ``names`` is ``None`` for all batteries
+    
+    Raises:
+        OSError: If the file cannot be read
+        ValueError: If it is malformed (a
+            :class:`~battery_limiter.config.ConfigError` for structured files)
+    """
+    with open(path, 'r') as f:
+        text = f.read().strip()
+    if text.isdigit():
+        limit = int(text)
+        if not 1 <= limit <= 100:
+            raise ValueError(f"charge limit must be between 1 and 100, got {limit}")
+        return [((None, limit), names)]
+    
+    from datetime import datetime
+    from .config import Config, on_ac
+    
+    table = Config.parse(text).compile()
+    if names is None:
+        try:
+            names = _battery_names(base_path)
+        except OSError:
+            return []
+    groups = {}
+    for name, thresholds in table.limits(names, datetime.now(), on_ac(base_path)).items():
+        if thresholds[1] is not None:
+            groups.setdefault(thresholds, []).append(name)
+    return list(groups.items())
+
+
+def write_config(limit: int, path: str = CONFIG_PATH) -> None:
+    """Store ``limit`` as the limit re-applied at boot, resume and hotplug.
+    
+    A structured configuration keeps its profiles and rules; only the
+    limit of its default profile is replaced.
+    
+    Raises:
+        OSError: If the file cannot be written
+    """
+    try:
+        with open(path, 'r') as f:
+            text = f.read()
+    except FileNotFoundError:
+        text = ''
+    if text.strip() and not text.strip().isdigit():
+        from .config import update_limit
+        text = update_limit(text, limit)
+    else:
+        text = f"{limit}\n"
+    import tempfile
+    
+    # A private name per writer: the daemon and the CLI may save at once
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix='.bcl-')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except OSError:
+        os.unlink(tmp)
+        raise
+
+
+def _read(path: str) -> str:
+    fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+    try:
+        return os.read(fd, 64).decode().strip()
+    finally:
+        os.close(fd)
+
+
+def _write(path: str, value: str) -> None:
+    # Truncating is a no-op on sysfs and keeps plain files (mock trees) exact
+    fd = os.open(path, os.O_WRONLY | os.O_TRUNC | os.O_CLOEXEC)
+    try:
+        os.write(fd, value.encode())
+    finally:
+        os.close(fd)
+
+
+def _write_locked(path: str, start_path: str, limit: int) -> bool:
+    """Write ``limit`` holding the writers' lock, like ``set_thresholds`` does.
+    
+    A start threshold that is not below ``limit`` is cleared first, since
+    drivers reject an end threshold below it.
+    
+    Returns:
+        Whether the file was written, i.e. no other writer got there first
+    """
+    import fcntl
+    
+    fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        if _read(path) == str(limit):
+            return False
+        try:
+            if int(_read(start_path)) >= limit:
+                _write(start_path, '0')
+        except (FileNotFoundError, ValueError):
+            pass
+        _write(path, str(limit))
+        return True
+    finally:
+        os.close(fd)
+
+
+def apply_generic(limit: int, base_path: str = REAL_BASE_PATH, names=None):
+    """Write ``limit`` to the generic threshold file of each battery.
+    
+    Batteries already at ``limit`` are not written; only writes take the
+    lock serializing writers across processes.
+    
+    Args:
+        limit: Charge limit percentage
+        base_path: Path to the ``power_supply`` class directory
+        names: Batteries to apply to (default: all)
+    
+    Returns:
+        ``{battery: written}`` for the batteries handled, or ``None`` when
+        none of them exposes a generic threshold file
+    
+    Raises:
+        OSError: If a threshold file cannot be read or written
+        ValueError: If the firmware did not keep the written value
+    """
+    if names is None:
+        try:
+            names = _battery_names(base_path)
+        except OSError:
+            return None
+    results = {}
+    for name in names:
+        for control_file, start_file in zip(CONTROL_FILES, START_FILES):
+            path = os.path.join(base_path, name, control_file)
+            try:
+                current = _read(path)
+            except FileNotFoundError:
+                continue
+            written = current != str(limit) and _write_locked(
+                path, os.path.join(base_path, name, start_file), limit)
+            if written:
+                actual = _read(path)
+                if actual != str(limit):
+                    raise ValueError(f"{name}: firmware kept {actual}% instead of {limit}%")
+            results[name] = written
+            break
+    return results or None
+
+
+def apply_backends(limit: int, base_path: str = REAL_BASE_PATH, names=None, start=None,
+                   skip=()):
+    """Apply ``limit`` through the full controller and its vendor backends.
+    
+    Args:
+        start: Start threshold to set along with ``limit``, if any
+        skip: Batteries already handled, e.g. by :func:`apply_generic`
+    
+    Returns:
+        ``{battery: written}`` like :func:`apply_generic`
+    """
+    from .core import BatteryFleet
+    
+    fleet = BatteryFleet(base_path=base_path)
+    try:
+        results = {}
+        for controller in fleet.select(names):
+            if controller.name in skip:
+                continue
+            if start is None:
+                results[controller.name] = controller.set_charge_limit(limit)
+            else:
+                results[controller.name] = controller.set_thresholds(start, limit)
+        return results
+    finally:
+        fleet.close()
+
+
+def main(argv=None) -> int:
+    """Apply the configured limit; returns the process exit status."""
+    if argv is None:
+        argv = sys.argv[1:]
+    config = CONFIG_PATH
+    base_path = REAL_BASE_PATH
+    names = []
+    args = iter(argv)
+    for arg in args:
+        if arg == '--config':
+            config = next(args, config)
+        elif arg == '--base-path':
+            base_path = next(args, base_path)
+        elif arg in ('-h', '--help'):
+            print(USAGE)
+            return 0
+        else:
+            names.append(arg)
+    
+    try:
+        groups = read_config(config, base_path, names or None)
+    except FileNotFoundError:
+        # Nothing configured: leave the firmware default alone
+        return 0
+    except (OSError, ValueError) as e:
+        print(f"battery-limiter-apply: {config}: {e}", file=sys.stderr)
+        return 1
+    
+    # Errors go to the journal; udev and sleep hooks ignore the status
+    status = 0
+    for (start, limit), group in groups:
+        try:
+            results = {} if start is not None else apply_generic(limit, base_path, group) or {}
+        except (OSError, ValueError) as e:
+            print(f"battery-limiter-apply: {e}", file=sys.stderr)
+            status = 1
+            continue
+        # Batteries without a generic threshold file need a vendor backend
+        if group is not None:
+            missing = [name for name in group if name not in results]
+        else:
+            try:
+                missing = [name for name in _battery_names(base_path) if name not in results]
+            except OSError:
+                missing = []
+        if missing or not results:
+            from .core import BatteryControlError
+            try:
+                results.update(apply_backends(limit, base_path,
+                                              missing if group is not None else None,
+                                              start, skip=results))
+            except BatteryControlError as e:
+                print(f"battery-limiter-apply: {e}", file=sys.stderr)
+                status = 1
+        
+        thresholds = f"charge limit {limit}%"
+        if start is not None:
+            thresholds = f"charge thresholds {start}-{limit}%"
+        for name, written in sorted(results.items()):
+            print(f"{name}: {thresholds}" + ("" if written else " (unchanged)"))
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
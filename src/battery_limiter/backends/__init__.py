@@ -0,0 +1,265 @@
+"""Charge limit backends.
+
+A backend knows one kind of control interface: the generic
+``power_supply`` threshold files, or a vendor platform driver exposing its
+own attribute under ``/sys/devices/platform``. Backends are described by a
+:class:`BackendSpec` holding a few cheap existence checks; the module
+implementing a backend is imported only when one of its checks matches, so
+supporting many vendors costs nothing on machines that have none of them.
+
+Third-party backends register a :class:`BackendSpec` under the
+``battery_limiter.backends`` entry point group::
+
+    [project.entry-points."battery_limiter.backends"]
+    acme = "acme_battery.spec:SPEC"
+
+Entry points are only scanned when probing, never on a probe cache hit.
+"""
+
+import glob
+import importlib
+import os
+from typing import Dict, List, Optional, Sequence, Tuple, Type
+
+from ..sysfs import find_batteries
+
+
+ENTRY_POINT_GROUP = 'battery_limiter.backends'
+
+
+class Backend:
+    """Charge limit control through one control file.
+    
+    Subclasses implement :meth:`discover` and, when the file does not hold a
+    plain percentage, :meth:`decode` and :meth:`encode`. Interfaces with a
+    start threshold (below which charging resumes) also implement
+    :meth:`find_start_file`, and those storing both thresholds in one file
+    set :attr:`paired` and implement :meth:`encode_pair`.
+    """
+    
+    # Human-readable interface name used in messages
+    label = 'sysfs'
+    # Limits the interface can represent, or None for any of 1-100
+    limits: Optional[Tuple[int, ...]] = None
+    # Whether one write to the control file sets both thresholds
+    paired = False
+    
+    def __init__(self, control_file: str):
+        """Initialize the backend.
+        
+        Args:
+            control_file: Absolute path of the control file
+        """
+        self.control_file = control_file
+        self.start_file = self.find_start_file()
+    
+    def find_start_file(self) -> Optional[str]:
+        """Path of the start threshold file, or ``None`` if there is none."""
+        return None
+    
+    @classmethod
+    def discover(cls, sysfs_root: str, base_path: str) -> Dict[str, str]:
+        """Find the batteries this backend controls.
+        
+        Args:
+            sysfs_root: Root of the sysfs tree (``/sys`` on real hardware)
+            base_path: Path to the ``power_supply`` class directory
+        
+        Returns:
+            Control file path by battery name
+        """
+        raise NotImplementedError
+    
+    def read(self, attributes) -> str:
+        """Read the raw control file contents.
+        
+        Args:
+            attributes: :class:`~battery_limiter.sysfs.AttributeCache` of
+                the battery, which keeps the file open between reads
+        
+        Raises:
+            OSError: If the firmware fails the read
+        """
+        return attributes.read_dynamic(self.control_file)
+    
+    def write(self, raw: str) -> None:
+        """Write an encoded value to the control file.
+        
+        Raises:
+            OSError: If the firmware fails the write
+        """
+        with open(self.control_file, 'w') as f:
+            f.write(raw)
+    
+    def decode(self, raw: str) -> int:
+        """Convert the control file contents to a percentage.
+        
+        Raises:
+            ValueError: If the contents cannot be interpreted
+        """
+        return int(raw)
+    
+    def encode(self, limit: int) -> str:
+        """Convert a percentage to the value written to the control file.
+        
+        Raises:
+            BatteryControlError: If the interface cannot represent ``limit``
+        """
+        if self.limits is not None and limit not in self.limits:
+            from ..core import BatteryControlError
+            supported = ", ".join(f"{value}%" for value in self.limits)
+            raise BatteryControlError(f"{self.label} only supports limits of {supported}")
+        return str(limit)
+    
+    def read_start(self, attributes) -> str:
+        """Read the raw start threshold file contents, like :meth:`read`."""
+        return attributes.read_dynamic(self.start_file)
+    
+    def write_start(self, raw: str) -> None:
+        """Write an encoded value to the start threshold file."""
+        with open(self.start_file, 'w') as f:
+            f.write(raw)
+    
+    def decode_start(self, raw: str) -> int:
+        """Convert the start threshold file contents to a percentage."""
+        return int(raw)
+    
+    def encode_start(self, start: int) -> str:
+        """Convert a percentage to the value written to the start threshold file."""
+        return str(start)
+    
+    def encode_pair(self, start: int, end: int) -> str:
+        """Value setting both thresholds with one write, for :attr:`paired` interfaces."""
+        raise NotImplementedError
+
+
+def first_battery(base_path: str) -> Optional[str]:
+    """Battery a platform-wide control file applies to."""
+    names = find_batteries(base_path)
+    return names[0] if names else None
+
+
+class BackendSpec:
+    """Lazily loaded reference to a backend class."""
+    
+    __slots__ = ('name', 'target', 'paths', '_backend')
+    
+    def __init__(self, name: str, target: str, paths: Sequence[str] = ()):
+        """Initialize the spec.
+        
+        Args:
+            name: Unique backend name, stored in the probe cache
+            target: ``module:Class`` implementing :class:`Backend`
+            paths: Glob patterns relative to the sysfs root; the backend is
+                only loaded when one of them exists (always when empty)
+        """
+        self.name = name
+        self.target = target
+        self.paths = tuple(paths)
+        self._backend: Optional[Type[Backend]] = None
+    
+    def matches(self, sysfs_root: str) -> bool:
+        """Cheap pre-check run before importing the backend."""
+        if not self.paths:
+            return True
+        for pattern in self.paths:
+            path = os.path.join(sysfs_root, pattern)
+            if any(c in pattern for c in '*?['):
+                if glob.glob(path):
+                    return True
+            elif os.path.exists(path):
+                return True
+        return False
+    
+    def load(self) -> Type[Backend]:
+        """Import and return the backend class."""
+        if self._backend is None:
+            module, _, attribute = self.target.partition(':')
+            self._backend = getattr(importlib.import_module(module), attribute)
+        return self._backend
+    
+    def __repr__(self) -> str:
+        return f"BackendSpec({self.name!r}, {self.target!r})"
+
+
+# Built-in backends in order of preference; the generic interface wins
+# whenever a battery exposes it
+BUILTIN_BACKENDS = (
+    BackendSpec('sysfs', 'battery_limiter.backends.sysfs:SysfsBackend'),
+    BackendSpec('huawei', 'battery_limiter.backends.huawei:HuaweiBackend',
+                ('devices/platform/huawei-wmi/charge_control_thresholds',)),
+    BackendSpec('lg', 'battery_limiter.backends.lg:LGBackend',
+                ('devices/platform/lg-laptop/battery_care_limit',)),
+    BackendSpec('samsung', 'battery_limiter.backends.samsung:SamsungBackend',
+                ('devices/platform/samsung/battery_life_extender',)),
+    BackendSpec('smapi', 'battery_limiter.backends.smapi:SmapiBackend',
+                ('devices/platform/smapi/BAT*/stop_charge_thresh',)),
+    BackendSpec('sony', 'battery_limiter.backends.sony:SonyBackend',
+                ('devices/platform/sony-laptop/battery_care_limiter',)),
+)
+
+
+# Installed plugin specs, scanned once per process
+_plugin_specs: Optional[List[BackendSpec]] = None
+
+
+def _entry_point_specs() -> List[BackendSpec]:
+    global _plugin_specs
+    if _plugin_specs is None:
+        _plugin_specs = _scan_entry_points()
+    return _plugin_specs
+
+
+def _scan_entry_points() -> List[BackendSpec]:
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:  # pragma: no cover - Python < 3.8
+        return []
+    found = entry_points()
+    if hasattr(found, 'select'):
+        candidates = found.select(group=ENTRY_POINT_GROUP)
+    else:
+        candidates = found.get(ENTRY_POINT_GROUP, [])
+    specs = []
+    for entry_point in candidates:
+        try:
+            spec = entry_point.load()
+        except (ImportError, AttributeError):
+            # A broken plugin must not hide the built-in backends
+            continue
+        if isinstance(spec, BackendSpec):
+            specs.append(spec)
+    return specs
+
+
+def backend_specs() -> List[BackendSpec]:
+    """Every known backend: built-ins first, then installed plugins."""
+    specs = list(BUILTIN_BACKENDS)
+    names = {spec.name for spec in specs}
+    for spec in _entry_point_specs():
+        if spec.name not in names:
+            names.add(spec.name)
+            specs.append(spec)
+    return specs
+
+
+def load_backend(name: str) -> Optional[Type[Backend]]:
+    """Return the backend class registered as ``name``.
+    
+    Built-in names are resolved without scanning entry points.
+    """
+    for spec in BUILTIN_BACKENDS:
+        if spec.name == name:
+            return spec.load()
+    for spec in _entry_point_specs():
+        if spec.name == name:
+            try:
+                return spec.load()
+            except (ImportError, AttributeError):
+                return None
+    return None
+
+
+def sysfs_root(base_path: str) -> str:
+    """Sysfs root of a ``<root>/class/power_supply`` directory."""
+    return os.path.normpath(os.path.join(base_path, os.pardir, os.pardir))
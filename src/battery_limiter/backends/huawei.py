@@ -0,0 +1,47 @@
+"""Huawei MateBook ``huawei-wmi`` charge thresholds."""
+
+import os
+from typing import Dict, Optional
+
+from . import Backend, first_battery
+from ..core import BatteryControlError
+
+
+class HuaweiBackend(Backend):
+    """``charge_control_thresholds`` holding ``"<start> <end>"``."""
+    
+    label = 'huawei-wmi'
+    paired = True
+    
+    @classmethod
+    def discover(cls, sysfs_root: str, base_path: str) -> Dict[str, str]:
+        path = os.path.join(sysfs_root, 'devices/platform/huawei-wmi/charge_control_thresholds')
+        name = first_battery(base_path)
+        return {name: path} if name and os.path.exists(path) else {}
+    
+    def find_start_file(self) -> Optional[str]:
+        return self.control_file
+    
+    def decode(self, raw: str) -> int:
+        return int(raw.split()[-1])
+    
+    def decode_start(self, raw: str) -> int:
+        return int(raw.split()[0])
+    
+    def encode_pair(self, start: int, end: int) -> str:
+        if end < 2:
+            raise BatteryControlError(f"{self.label} needs a limit of at least 2%")
+        return f"{start} {end}"
+    
+    def encode(self, limit: int) -> str:
+        if limit < 2:
+            raise BatteryControlError(f"{self.label} needs a limit of at least 2%")
+        # Keep the start threshold unless it would not be below the new end
+        try:
+            with open(self.control_file, 'r') as f:
+                start = int(f.read().split()[0])
+        except (OSError, ValueError, IndexError):
+            start = 0
+        if start >= limit:
+            start = 0
+        return f"{start} {limit}"
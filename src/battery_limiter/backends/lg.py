@@ -0,0 +1,19 @@
+"""LG Gram ``lg-laptop`` battery care limit."""
+
+import os
+from typing import Dict
+
+from . import Backend, first_battery
+
+
+class LGBackend(Backend):
+    """``battery_care_limit``, which only accepts 80 or 100."""
+    
+    label = 'lg-laptop'
+    limits = (80, 100)
+    
+    @classmethod
+    def discover(cls, sysfs_root: str, base_path: str) -> Dict[str, str]:
+        path = os.path.join(sysfs_root, 'devices/platform/lg-laptop/battery_care_limit')
+        name = first_battery(base_path)
+        return {name: path} if name and os.path.exists(path) else {}
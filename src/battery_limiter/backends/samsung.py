@@ -0,0 +1,26 @@
+"""Samsung ``samsung-laptop`` battery life extender."""
+
+import os
+from typing import Dict
+
+from . import Backend, first_battery
+
+
+class SamsungBackend(Backend):
+    """``battery_life_extender``: 1 stops charging at 80%, 0 charges fully."""
+    
+    label = 'samsung-laptop'
+    limits = (80, 100)
+    
+    @classmethod
+    def discover(cls, sysfs_root: str, base_path: str) -> Dict[str, str]:
+        path = os.path.join(sysfs_root, 'devices/platform/samsung/battery_life_extender')
+        name = first_battery(base_path)
+        return {name: path} if name and os.path.exists(path) else {}
+    
+    def decode(self, raw: str) -> int:
+        return 80 if int(raw) else 100
+    
+    def encode(self, limit: int) -> str:
+        super().encode(limit)
+        return '1' if limit == 80 else '0'
@@ -0,0 +1,242 @@
+"""Simulated embedded controller for exercising the control path.
+
+Real firmware is slow and unreliable in ways ``mock_sys`` cannot show:
+embedded controller writes take tens of milliseconds, transactions fail
+with ``EBUSY`` or ``EIO`` and succeed when retried, some machines silently
+round the threshold to the few values they support, and some forget it
+after a while. :class:`SimulatedFirmware` models all of this in memory
+and :class:`SimulatedBackend` plugs it into a controller::
+
+    firmware = SimulatedFirmware(write_latency=Latency.lognormal(0.03, 0.2),
+                                 write_faults=FaultSchedule(rate=0.1),
+                                 supported=(60, 80, 100))
+    attach(controller, firmware)
+
+The backend is never probed; it is only attached explicitly.
+"""
+
+import errno
+import math
+import os
+import random
+import threading
+import time
+from typing import Callable, Iterable, Optional, Sequence
+
+from . import Backend
+
+
+class Latency:
+    """Distribution of operation durations, in seconds."""
+    
+    def __init__(self, sample: Callable[[random.Random], float], seed: Optional[int] = None):
+        """Initialize the distribution.
+        
+        Args:
+            sample: Draws one duration from the given generator
+            seed: Seed of the generator
+        """
+        self._sample = sample
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+    
+    def __call__(self) -> float:
+        with self._lock:
+            return max(0.0, self._sample(self._rng))
+    
+    @classmethod
+    def constant(cls, seconds: float) -> 'Latency':
+        return cls(lambda rng: seconds)
+    
+    @classmethod
+    def uniform(cls, low: float, high: float, seed: Optional[int] = None) -> 'Latency':
+        return cls(lambda rng: rng.uniform(low, high), seed)
+    
+    @classmethod
+    def lognormal(cls, median: float, p99: float, seed: Optional[int] = None) -> 'Latency':
+        """Long-tailed durations with the given median and 99th percentile."""
+        sigma = math.log(p99 / median) / 2.326 if p99 > median else 0.0
+        return cls(lambda rng: median * math.exp(sigma * rng.gauss(0.0, 1.0)), seed)
+
+
+NO_LATENCY = Latency.constant(0.0)
+
+
+class FaultSchedule:
+    """Decides which operations fail, and with which error.
+    
+    An explicit ``sequence`` is played first (``None`` entries succeed),
+    then each operation fails with probability ``rate``.
+    """
+    
+    def __init__(self, rate: float = 0.0, errnos: Sequence[int] = (errno.EBUSY, errno.EIO),
+                 sequence: Iterable[Optional[int]] = (), seed: Optional[int] = None):
+        """Initialize the schedule.
+        
+        Args:
+            rate: Probability that an operation fails once the sequence is over
+            errnos: Errors picked at random for those failures
+            sequence: Outcome of the first operations: an error number or
+                ``None`` for success
+            seed: Seed of the generator
+        """
+        self.rate = rate
+        self.errnos = tuple(errnos)
+        self._sequence = list(sequence)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+    
+    def next(self) -> Optional[int]:
+        """Error number for the next operation, or ``None`` if it succeeds."""
+        with self._lock:
+            if self._sequence:
+                return self._sequence.pop(0)
+            if self.rate and self._rng.random() < self.rate:
+                return self._rng.choice(self.errnos)
+            return None
+
+
+NO_FAULTS = FaultSchedule()
+
+
+class SimulatedFirmware:
+    """In-memory embedded controller holding one charge threshold.
+    
+    Operations are serialized like embedded controller transactions: a
+    slow write holds up reads issued meanwhile.
+    """
+    
+    def __init__(self, limit: int = 80, read_latency: Latency = NO_LATENCY,
+                 write_latency: Latency = NO_LATENCY, read_faults: FaultSchedule = NO_FAULTS,
+                 write_faults: FaultSchedule = NO_FAULTS,
+                 supported: Optional[Sequence[int]] = None,
+                 reset_after: Optional[float] = None, reset_limit: int = 100,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        """Initialize the firmware.
+        
+        Args:
+            limit: Threshold at start
+            read_latency: Duration of each read
+            write_latency: Duration of each write
+            read_faults: Reads that fail
+            write_faults: Writes that fail; a failed write changes nothing
+            supported: Thresholds the firmware can store; others are
+                silently rounded to the nearest one (upwards on ties)
+            reset_after: Seconds after a write when the firmware forgets
+                the threshold, or ``None`` to keep it
+            reset_limit: Threshold after such a reset
+            clock: Time source for ``reset_after``
+            sleep: Called to spend the operation latency
+        """
+        self.limit = limit
+        self.read_latency = read_latency
+        self.write_latency = write_latency
+        self.read_faults = read_faults
+        self.write_faults = write_faults
+        self.supported = tuple(sorted(supported)) if supported else None
+        self.reset_after = reset_after
+        self.reset_limit = reset_limit
+        self.clock = clock
+        self.sleep = sleep
+        self.written_at = clock()
+        self.reads = 0
+        self.writes = 0
+        self.faults = 0
+        self.clamped = 0
+        self.resets = 0
+        self._lock = threading.Lock()
+    
+    def _transaction(self, latency: Latency, faults: FaultSchedule) -> None:
+        delay = latency()
+        if delay:
+            self.sleep(delay)
+        error = faults.next()
+        if error is not None:
+            self.faults += 1
+            raise OSError(error, os.strerror(error))
+    
+    def _expire(self) -> None:
+        if (self.reset_after is not None and self.limit != self.reset_limit
+                and self.clock() - self.written_at >= self.reset_after):
+            self.limit = self.reset_limit
+            self.resets += 1
+    
+    def read(self) -> str:
+        """Read the threshold as the control file would show it.
+        
+        Raises:
+            OSError: When the fault schedule says so
+        """
+        with self._lock:
+            self.reads += 1
+            self._transaction(self.read_latency, self.read_faults)
+            self._expire()
+            return f"{self.limit}\n"
+    
+    def write(self, raw: str) -> None:
+        """Store a threshold written to the control file.
+        
+        Raises:
+            OSError: When the fault schedule says so, or ``EINVAL`` for a
+                value out of range, as the kernel does
+        """
+        with self._lock:
+            self.writes += 1
+            self._transaction(self.write_latency, self.write_faults)
+            try:
+                limit = int(raw)
+            except ValueError:
+                raise OSError(errno.EINVAL, os.strerror(errno.EINVAL))
+            if not 1 <= limit <= 100:
+                raise OSError(errno.EINVAL, os.strerror(errno.EINVAL))
+            if self.supported is not None:
+                nearest = min(self.supported, key=lambda value: (abs(value - limit), -value))
+                if nearest != limit:
+                    self.clamped += 1
+                limit = nearest
+            self.limit = limit
+            self.written_at = self.clock()
+
+
+class SimulatedBackend(Backend):
+    """Backend reading and writing a :class:`SimulatedFirmware` instead of sysfs."""
+    
+    label = 'simulated'
+    
+    def __init__(self, control_file: str, firmware: Optional[SimulatedFirmware] = None):
+        """Initialize the backend.
+        
+        Args:
+            control_file: Control file path the controller reports
+            firmware: Firmware to talk to (default: a fast, reliable one)
+        """
+        super().__init__(control_file)
+        self.firmware = firmware if firmware is not None else SimulatedFirmware()
+    
+    @classmethod
+    def discover(cls, sysfs_root: str, base_path: str):
+        # Attached explicitly, never found by probing
+        return {}
+    
+    def read(self, attributes) -> str:
+        return self.firmware.read()
+    
+    def write(self, raw: str) -> None:
+        self.firmware.write(raw)
+
+
+def attach(controller, firmware: Optional[SimulatedFirmware] = None) -> SimulatedFirmware:
+    """Route a controller's threshold reads and writes to simulated firmware.
+    
+    Args:
+        controller: :class:`~battery_limiter.core.BatteryController` with a
+            control file (e.g. in a tree from :mod:`battery_limiter.mocksys`)
+        firmware: Firmware to use (default: a fast, reliable one)
+    
+    Returns:
+        The firmware, for inspecting its counters
+    """
+    backend = SimulatedBackend(controller.control_file, firmware)
+    controller.backend = backend
+    return backend.firmware
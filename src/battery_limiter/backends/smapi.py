@@ -0,0 +1,29 @@
+"""Older ThinkPads driven by the out-of-tree ``tp_smapi`` module."""
+
+import os
+from typing import Dict, Optional
+
+from . import Backend
+from ..sysfs import find_batteries
+
+
+class SmapiBackend(Backend):
+    """``/sys/devices/platform/smapi/BATn/stop_charge_thresh`` (0 = 100%)."""
+    
+    label = 'tp_smapi'
+    
+    @classmethod
+    def discover(cls, sysfs_root: str, base_path: str) -> Dict[str, str]:
+        batteries = {}
+        for name in find_batteries(base_path):
+            path = os.path.join(sysfs_root, 'devices/platform/smapi', name, 'stop_charge_thresh')
+            if os.path.exists(path):
+                batteries[name] = path
+        return batteries
+    
+    def decode(self, raw: str) -> int:
+        return int(raw) or 100
+    
+    def find_start_file(self) -> Optional[str]:
+        path = os.path.join(os.path.dirname(self.control_file), 'start_charge_thresh')
+        return path if os.path.exists(path) else None
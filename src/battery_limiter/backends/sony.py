@@ -0,0 +1,26 @@
+"""Sony VAIO ``sony-laptop`` battery care limiter."""
+
+import os
+from typing import Dict
+
+from . import Backend, first_battery
+
+
+class SonyBackend(Backend):
+    """``battery_care_limiter``: 50, 80 or 100 (written as 0, meaning off)."""
+    
+    label = 'sony-laptop'
+    limits = (50, 80, 100)
+    
+    @classmethod
+    def discover(cls, sysfs_root: str, base_path: str) -> Dict[str, str]:
+        path = os.path.join(sysfs_root, 'devices/platform/sony-laptop/battery_care_limiter')
+        name = first_battery(base_path)
+        return {name: path} if name and os.path.exists(path) else {}
+    
+    def decode(self, raw: str) -> int:
+        return int(raw) or 100
+    
+    def encode(self, limit: int) -> str:
+        super().encode(limit)
+        return '0' if limit == 100 else str(limit)
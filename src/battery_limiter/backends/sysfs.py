@@ -0,0 +1,37 @@
+"""Generic ``power_supply`` charge threshold files."""
+
+import os
+from typing import Dict, Optional
+
+from . import Backend
+from ..sysfs import find_batteries
+
+
+# Control file names in order of preference
+CONTROL_FILES = ('charge_control_end_threshold', 'charge_stop_threshold')
+
+# Start threshold file next to each control file
+START_FILES = {
+    'charge_control_end_threshold': 'charge_control_start_threshold',
+    'charge_stop_threshold': 'charge_start_threshold',
+}
+
+
+class SysfsBackend(Backend):
+    """Threshold file in the battery directory, as exposed by most drivers."""
+    
+    @classmethod
+    def discover(cls, sysfs_root: str, base_path: str) -> Dict[str, str]:
+        batteries = {}
+        for name in find_batteries(base_path):
+            for control_file in CONTROL_FILES:
+                path = os.path.join(base_path, name, control_file)
+                if os.path.exists(path):
+                    batteries[name] = path
+                    break
+        return batteries
+    
+    def find_start_file(self) -> Optional[str]:
+        directory, name = os.path.split(self.control_file)
+        path = os.path.join(directory, START_FILES.get(name, 'charge_control_start_threshold'))
+        return path if os.path.exists(path) else None
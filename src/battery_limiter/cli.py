@@ -1,19 +1,57 @@
-"""Command-line interface for battery charge limiter."""
+"""Command-line interface for battery charge limiter.
+
+``get``, ``set`` and ``info`` take ``--json`` for machine-readable output,
+and ``watch --json`` streams one JSON object per line (NDJSON). ``info``
+and ``watch`` include the estimated time to the limit or to empty.
+``config check`` validates the configuration file and shows what it
+selects now. Output is block buffered and flushed once per batch of
+records; a reader closing the pipe (``battery-limiter info | head``)
+ends the command quietly.
+"""
 
 import argparse
+import json
+import os
+import select
+import signal
 import sys
-from .core import BatteryController, BatteryControlError
+import time
+from typing import Dict, List, Optional
+# Only what ``get`` and ``set`` need; every other subcommand imports its
+# own modules, keeping the common commands quick to start
+from .core import BatteryController, BatteryFleet, BatteryControlError
 
 
-def main():
+def main(argv=None):
     """Main entry point for the CLI application."""
+    try:
+        result = run(argv)
+        # Flush here so a closed pipe is caught below, not at exit
+        sys.stdout.flush()
+        return result
+    except BrokenPipeError:
+        # The reader went away; Python would complain again flushing stdout
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        sys.exit(128 + signal.SIGPIPE)
+
+
+def run(argv=None):
+    """Dispatch a subcommand or run the legacy ``battery-limiter LIMIT`` form."""
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv and argv[0] in COMMANDS:
+        return COMMANDS[argv[0]](argv[1:])
+    
     parser = argparse.ArgumentParser(
         description="Set battery charge limit for your laptop",
-        epilog="Example: battery-limiter 80"
+        epilog="Example: battery-limiter 80. "
+               "Other commands: " + ", ".join(sorted(COMMANDS))
     )
     parser.add_argument(
         'limit',
         type=int,
+        nargs='?',
         help="Charge limit percentage (1-100)"
     )
     parser.add_argument(
@@ -26,48 +64,774 @@ def main():
         action='store_true',
         help="Show battery information"
     )
+    parser.add_argument(
+        '--battery',
+        action='append',
+        metavar='NAME',
+        help="Only target the named battery (e.g. BAT1); may be repeated. "
+             "Defaults to all batteries"
+    )
+    parser.add_argument(
+        '--history',
+        type=float,
+        metavar='HOURS',
+        help="Show recorded battery history for the last HOURS hours"
+    )
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help="Keep running and print battery changes as they happen"
+    )
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     
-    # Initialize controller
-    controller = BatteryController(use_mock=args.mock)
+    if args.limit is None and not (args.info or args.watch or args.history):
+        parser.error("a charge limit is required unless --info, --history or --watch is given")
     
-    # Check if supported
-    if not controller.is_supported():
-        print("❌ Battery charge limiting is not supported on this system.")
-        print("Your laptop may not expose this functionality via sysfs.")
-        sys.exit(1)
+    fleet, controllers = open_fleet(args.mock, args.battery)
     
     # Show info if requested
     if args.info:
-        model, manufacturer = controller.get_battery_info()
+        print_info(controllers)
+    
+    if args.history:
+        show_history(args.history, controllers)
+    
+    if args.limit is None:
+        if args.watch:
+            watch(fleet, args.battery)
+        return
+    
+    # Set the limit
+    try:
+        print_set_result(fleet, controllers, args.limit,
+                         set_limit(fleet, controllers, args.limit, args.battery, args.mock))
+    except BatteryControlError as e:
+        report_error(e)
+        sys.exit(1)
+    except Exception as e:
+        print(f"❌ Unexpected error: {e}")
+        sys.exit(1)
+    
+    if args.watch:
+        watch(fleet, args.battery)
+
+
+def open_fleet(use_mock: bool, names=None, file=None):
+    """Discover batteries and select the requested ones, exiting on failure.
+    
+    Args:
+        use_mock: Use the mock environment
+        names: Battery names to select; all batteries if ``None``
+        file: Where to report failures (default: stdout)
+    
+    Returns:
+        Tuple of the fleet and the selected controllers
+    """
+    # Initialize controllers for every battery
+    fleet = BatteryFleet(use_mock=use_mock)
+    
+    # Check if supported
+    if not fleet.is_supported():
+        print("❌ Battery charge limiting is not supported on this system.", file=file)
+        print("Your laptop may not expose this functionality via sysfs.", file=file)
+        sys.exit(1)
+    
+    try:
+        controllers = fleet.select(names)
+    except BatteryControlError as e:
+        print(f"❌ Error: {e}", file=file)
+        print(f"   Available batteries: {', '.join(fleet.names())}", file=file)
+        sys.exit(1)
+    return fleet, controllers
+
+
+def report_error(error: BatteryControlError, file=None):
+    """Print a control error, with a hint when privileges are missing."""
+    print(f"❌ Error: {error}", file=file)
+    if "permission" in str(error).lower() or "operation not permitted" in str(error).lower():
+        print("💡 Try running with sudo privileges", file=file)
+
+
+def set_limit(fleet: BatteryFleet, controllers, limit: int, names=None,
+              use_mock: bool = False, start: Optional[int] = None) -> bool:
+    """Apply ``limit`` and ``start`` unless every selected battery already has them.
+    
+    Returns:
+        Whether anything was written
+    
+    Raises:
+        BatteryControlError: If the limit could not be applied
+    """
+    from .client import apply_limits
+    
+    current = fleet.get_limits(names)
+    if (all(value == limit for value in current.values())
+            and (start is None or all(c.get_start_threshold() == start for c in controllers))):
+        return False
+    apply_limits(fleet, limit, names, start=start)
+    if not use_mock:
+        record_history(controllers)
+    return True
+
+
+def print_set_result(fleet: BatteryFleet, controllers, limit: int, changed: bool,
+                     start: Optional[int] = None):
+    """Report the outcome of :func:`set_limit` for people."""
+    thresholds = f"{limit}%" if start is None else f"{limit}% (charging from {start}%)"
+    if changed:
+        print(f"✅ Battery charge limit set to {thresholds}")
+    else:
+        print(f"✅ Battery charge limit already {thresholds}, nothing to write")
+    for controller in controllers:
+        print(f"   Using: {controller.get_control_file_path()}")
+
+
+def print_info(controllers):
+    """Print model, control file, limit and charge of each battery."""
+    from .estimate import format_estimate
+    
+    for controller in controllers:
+        snapshot = controller.get_snapshot()
         control_file = controller.get_control_file_path()
-        current_limit = controller.get_current_limit()
         
-        print("🔋 Battery Information:")
-        print(f"   Manufacturer: {manufacturer or 'Unknown'}")
-        print(f"   Model: {model or 'Unknown'}")
+        print(f"🔋 Battery Information ({controller.name}):")
+        print(f"   Manufacturer: {snapshot.manufacturer or 'Unknown'}")
+        print(f"   Model: {snapshot.model_name or 'Unknown'}")
         print(f"   Control File: {control_file or 'Unknown'}")
-        print(f"   Current Limit: {current_limit or 'Unknown'}%")
+        print(f"   Current Limit: {snapshot.limit or 'Unknown'}%")
+        if snapshot.start_threshold is not None:
+            print(f"   Start Threshold: {snapshot.start_threshold}%")
+        if snapshot.capacity is not None:
+            print(f"   Charge: {snapshot.capacity}% ({snapshot.status or 'Unknown'})")
+        estimate = estimate_time_left(controller.name, snapshot)
+        if estimate is not None:
+            print(f"   Time Left: {format_estimate(estimate)}")
+        if snapshot.cycle_count:
+            print(f"   Cycle Count: {snapshot.cycle_count}")
         print()
+
+
+def estimate_time_left(name: str, snapshot, hours: float = 1.0):
+    """Estimate the time left from recent history and the current snapshot.
+    
+    Without recorded history the estimate is based on the current power.
+    
+    Returns:
+        An :class:`~battery_limiter.estimate.Estimate` or ``None``
+    """
+    from .estimate import ChargeEstimator
+    from .history import HistoryStore, default_history_path
+    
+    estimator = ChargeEstimator()
+    now = time.time()
+    path = default_history_path(name)
+    # Only read history that exists; a plain ``info`` must not create it
+    if os.path.isdir(path):
+        try:
+            history = HistoryStore(path)
+            estimator.fit_history(name, history.query(since=now - hours * 3600))
+            history.close()
+        except OSError:
+            pass
+    return estimator.update(snapshot, now)
+
+
+def write_json(value) -> None:
+    """Write one compact JSON document as a line of stdout."""
+    sys.stdout.write(json.dumps(value, separators=(',', ':')) + '\n')
+
+
+def add_common_arguments(parser: argparse.ArgumentParser, json_help: str) -> None:
+    """Add the ``--battery``, ``--mock`` and ``--json`` options."""
+    parser.add_argument(
+        '--battery',
+        action='append',
+        metavar='NAME',
+        help="Only target the named battery; may be repeated. Defaults to all batteries"
+    )
+    parser.add_argument(
+        '--mock',
+        action='store_true',
+        help="Use mock environment for testing"
+    )
+    parser.add_argument(
+        '--json',
+        action='store_true',
+        help=json_help
+    )
+
+
+def open_history(name: str):
+    """Open the history store of one battery, exiting on failure."""
+    from .history import HistoryStore, default_history_path
     
-    # Set the limit
     try:
-        controller.set_charge_limit(args.limit)
-        print(f"✅ Battery charge limit set to {args.limit}%")
+        return HistoryStore(default_history_path(name))
+    except OSError as e:
+        print(f"❌ Cannot open battery history: {e}")
+        sys.exit(1)
+
+
+def record_history(controllers):
+    """Add the current state of each battery to its history store."""
+    from .history import HistoryStore, default_history_path
+    
+    for controller in controllers:
+        try:
+            snapshot = controller.get_snapshot()
+            if snapshot is not None:
+                history = HistoryStore(default_history_path(controller.name))
+                history.append_snapshot(snapshot)
+                history.close()
+        except OSError:
+            pass
+
+
+def show_history(hours: float, controllers):
+    """Print recorded samples from the last ``hours`` hours."""
+    for controller in controllers:
+        history = open_history(controller.name)
+        columns = history.query(since=time.time() - hours * 3600)
         
-        if controller.get_control_file_path():
-            print(f"   Using: {controller.get_control_file_path()}")
+        print(f"🔋 Battery History ({controller.name}):")
+        if not len(columns['timestamp']):
+            print("   No battery history recorded yet.")
+        for i in range(len(columns['timestamp'])):
+            stamp = time.strftime('%Y-%m-%d %H:%M', time.localtime(columns['timestamp'][i]))
+            capacity = columns['capacity'][i]
+            limit = columns['limit'][i]
+            power = columns['power'][i]
+            line = f"   {stamp}  {capacity if capacity >= 0 else '?':>3}%"
+            line += f"  limit {limit if limit >= 0 else '?'}%"
+            if power >= 0:
+                line += f"  {power / 1e6:.1f} W"
+            print(line)
+        print()
+        history.close()
+
+
+def report(argv):
+    """``battery-limiter report``: battery health over recorded history."""
+    parser = argparse.ArgumentParser(
+        prog="battery-limiter report",
+        description="Show battery health statistics from recorded history"
+    )
+    parser.add_argument(
+        '--days',
+        type=float,
+        default=30,
+        help="Days of history to analyze (default: 30)"
+    )
+    parser.add_argument(
+        '--battery',
+        action='append',
+        metavar='NAME',
+        help="Only report on the named battery; may be repeated"
+    )
+    parser.add_argument(
+        '--mock',
+        action='store_true',
+        help="Use mock environment for testing"
+    )
+    args = parser.parse_args(argv)
+    
+    from .analytics import analyze, format_report
+    
+    _fleet, controllers = open_fleet(args.mock, args.battery)
+    for controller in controllers:
+        history = open_history(controller.name)
+        columns = history.query(since=time.time() - args.days * 86400)
+        result = analyze(columns, controller.get_snapshot())
+        history.close()
         
+        print(f"🔋 Battery Health Report ({controller.name}, last {args.days:g} days):")
+        for line in format_report(result).splitlines():
+            print(f"   {line}")
+        print()
+
+
+def schedule(argv):
+    """``battery-limiter schedule``: show or edit the time-of-day schedule."""
+    from .client import DEFAULT_SOCKET_PATH, read_schedule, write_schedule
+    from .schedule import SCHEDULE_PATH, Override, Rule, Schedule, ScheduleError
+    
+    parser = argparse.ArgumentParser(
+        prog="battery-limiter schedule",
+        description="Show or edit the charge limit schedule followed by the daemon",
+        epilog="Examples: schedule add mon-fri 22:00 60; "
+               "schedule override 2026-10-20T06:00 2026-10-20T09:00 100; schedule remove 2"
+    )
+    parser.add_argument(
+        'action',
+        nargs='?',
+        default='show',
+        choices=['show', 'add', 'override', 'remove', 'clear'],
+        help="What to do (default: show)"
+    )
+    parser.add_argument(
+        'entry',
+        nargs='*',
+        help="Rule (DAYS HH:MM LIMIT), override (START [END] LIMIT) or entry number"
+    )
+    parser.add_argument(
+        '--file',
+        default=SCHEDULE_PATH,
+        help=f"Schedule file used when the daemon is not running (default: {SCHEDULE_PATH})"
+    )
+    parser.add_argument(
+        '--socket',
+        default=DEFAULT_SOCKET_PATH,
+        help=f"Daemon socket (default: {DEFAULT_SOCKET_PATH})"
+    )
+    args = parser.parse_args(argv)
+    
+    try:
+        state = read_schedule(args.socket, args.file)
+        if args.action != 'show':
+            current = Schedule.parse(state['text'])
+            text = ' '.join(args.entry)
+            if args.action == 'add':
+                current.rules.append(Rule.parse(text))
+            elif args.action == 'override':
+                current.overrides.append(Override.parse(text))
+            elif args.action == 'remove':
+                entries = current.rules + current.overrides
+                if not text.isdigit() or not 1 <= int(text) <= len(entries):
+                    parser.error(f"remove takes an entry number from 1 to {len(entries)}")
+                entry = entries[int(text) - 1]
+                if isinstance(entry, Rule):
+                    current.rules.remove(entry)
+                else:
+                    current.overrides.remove(entry)
+            else:
+                current = Schedule()
+            state = write_schedule(current.format(), args.socket, args.file)
+    except ScheduleError as e:
+        print(f"❌ Invalid schedule entry: {e}")
+        sys.exit(1)
     except BatteryControlError as e:
         print(f"❌ Error: {e}")
-        if "permission" in str(e).lower() or "operation not permitted" in str(e).lower():
+        if "permission" in str(e).lower():
             print("💡 Try running with sudo privileges")
         sys.exit(1)
-    except Exception as e:
-        print(f"❌ Unexpected error: {e}")
+    
+    current = Schedule.parse(state['text'])
+    entries = [str(rule) for rule in current.rules]
+    entries.extend(f"override {override}" for override in current.overrides)
+    if not entries:
+        print("📅 No charge limit schedule")
+        return
+    print("📅 Charge limit schedule:")
+    for number, entry in enumerate(entries, 1):
+        print(f"   {number}. {entry}")
+    if state['limit'] is not None:
+        print(f"   Scheduled limit now: {state['limit']}%")
+    if state['next']:
+        print(f"   Next change: {state['next'].replace('T', ' ')}")
+    if state.get('suspended'):
+        print("💡 Rules in the configuration file take precedence; the schedule is suspended")
+    if not state['active']:
+        print("💡 The daemon is not running; the schedule is followed once it starts")
+
+
+def format_thresholds(thresholds) -> str:
+    """Describe a ``(start, end)`` pair, e.g. ``75-80%``."""
+    start, end = thresholds
+    if end is None:
+        return "firmware default"
+    return f"{start}-{end}%" if start is not None else f"{end}%"
+
+
+def config_command(argv):
+    """``battery-limiter config``: check the configuration file."""
+    from datetime import datetime
+    from .apply import CONFIG_PATH
+    from .config import Config, ConfigError, on_ac
+    
+    parser = argparse.ArgumentParser(
+        prog="battery-limiter config",
+        description="Check the charge limit configuration and show what it selects now"
+    )
+    parser.add_argument(
+        'action',
+        choices=['check'],
+        help="What to do"
+    )
+    parser.add_argument(
+        'path',
+        nargs='?',
+        default=CONFIG_PATH,
+        help=f"Configuration file (default: {CONFIG_PATH})"
+    )
+    parser.add_argument(
+        '--mock',
+        action='store_true',
+        help="Take the power source from the mock environment"
+    )
+    args = parser.parse_args(argv)
+    
+    try:
+        with open(args.path, 'r') as f:
+            config = Config.parse(f.read())
+        table = config.compile()
+    except OSError as e:
+        print(f"❌ Cannot read {args.path}: {e.strerror or e}")
+        sys.exit(1)
+    except ConfigError as e:
+        print(f"❌ Invalid configuration {args.path}: {e}")
         sys.exit(1)
+    
+    if config.legacy:
+        print(f"✅ {args.path}: charge limit {config.default.limit}% for every battery")
+        return
+    print(f"✅ {args.path}: {len(table.profiles)} profiles, {len(config.rules)} rules")
+    print("Profiles:")
+    for name, thresholds in zip(table.profiles, table.thresholds):
+        default = thresholds[None]
+        batteries = [f"{battery} {format_thresholds(value)}"
+                     for battery, value in thresholds.items()
+                     if battery is not None and value != default]
+        suffix = f" ({', '.join(batteries)})" if batteries else ""
+        fallback = " [when no rule matches]" if name == config.fallback else ""
+        print(f"   {name}: {format_thresholds(default)}{suffix}{fallback}")
+    if config.rules:
+        print("Rules (first match wins):")
+        for number, rule in enumerate(config.rules, 1):
+            print(f"   {number}. {rule}")
+    
+    base_path = BatteryController.MOCK_BASE_PATH if args.mock else BatteryController.REAL_BASE_PATH
+    ac = on_ac(base_path)
+    now = datetime.now()
+    power = {True: "on AC", False: "on battery", None: "power source unknown"}[ac]
+    print(f"Now ({power}): profile {table.profile_at(now, ac)}")
+    next_time = table.next_change(now, ac)
+    if next_time is not None:
+        print(f"   Next change: {next_time.isoformat(sep=' ', timespec='minutes')}")
+
+
+def get_command(argv):
+    """``battery-limiter get``: current charge limit of each battery."""
+    parser = argparse.ArgumentParser(
+        prog="battery-limiter get",
+        description="Show the current charge limit of each battery"
+    )
+    add_common_arguments(parser, "Print a JSON object of battery name to limit")
+    args = parser.parse_args(argv)
+    
+    fleet, _controllers = open_fleet(args.mock, args.battery,
+                                     sys.stderr if args.json else None)
+    limits = fleet.get_limits(args.battery)
+    if args.json:
+        write_json(limits)
+        return
+    for controller in fleet.select(args.battery):
+        limit = limits[controller.name]
+        start = controller.get_start_threshold()
+        print(f"🔋 {controller.name}: {'Unknown' if limit is None else f'{limit}%'}"
+              + ("" if start is None else f" (charging from {start}%)"))
+
+
+def set_command(argv):
+    """``battery-limiter set``: change the charge limit."""
+    parser = argparse.ArgumentParser(
+        prog="battery-limiter set",
+        description="Set the charge limit of the selected batteries"
+    )
+    parser.add_argument(
+        'limit',
+        type=int,
+        help="Charge limit percentage (1-100)"
+    )
+    parser.add_argument(
+        '--start',
+        type=int,
+        metavar='PERCENT',
+        help="Also set the start threshold below which charging resumes "
+             "(0 to LIMIT-1; needs charge_control_start_threshold)"
+    )
+    add_common_arguments(parser, "Print the outcome as a JSON object")
+    args = parser.parse_args(argv)
+    
+    errors = sys.stderr if args.json else None
+    fleet, controllers = open_fleet(args.mock, args.battery, errors)
+    try:
+        changed = set_limit(fleet, controllers, args.limit, args.battery, args.mock, args.start)
+    except BatteryControlError as e:
+        report_error(e, errors)
+        sys.exit(1)
+    if args.json:
+        write_json({'limit': args.limit, 'start': args.start, 'changed': changed,
+                    'batteries': fleet.get_limits(args.battery)})
+    else:
+        print_set_result(fleet, controllers, args.limit, changed, args.start)
+
+
+def info_command(argv):
+    """``battery-limiter info``: battery details."""
+    parser = argparse.ArgumentParser(
+        prog="battery-limiter info",
+        description="Show model, control file, limit and charge of each battery"
+    )
+    add_common_arguments(parser, "Print a JSON object of battery name to details")
+    args = parser.parse_args(argv)
+    
+    _fleet, controllers = open_fleet(args.mock, args.battery,
+                                     sys.stderr if args.json else None)
+    if not args.json:
+        print_info(controllers)
+        return
+    details = {}
+    for controller in controllers:
+        snapshot = controller.get_snapshot()
+        estimate = estimate_time_left(controller.name, snapshot)
+        details[controller.name] = dict(snapshot.as_dict(),
+                                        control_file=controller.get_control_file_path(),
+                                        estimate=estimate.as_dict() if estimate else None)
+    write_json(details)
+
+
+def watch_command(argv):
+    """``battery-limiter watch``: stream battery snapshots."""
+    parser = argparse.ArgumentParser(
+        prog="battery-limiter watch",
+        description="Print battery snapshots as they change, or at a fixed interval"
+    )
+    add_common_arguments(parser, "Stream one JSON object per snapshot (NDJSON)")
+    parser.add_argument(
+        '--interval',
+        type=float,
+        metavar='SECONDS',
+        help="Print every battery every SECONDS instead of on changes"
+    )
+    parser.add_argument(
+        '--count',
+        type=int,
+        metavar='N',
+        help="Exit after N snapshots"
+    )
+    args = parser.parse_args(argv)
+    if args.interval is not None and args.interval <= 0:
+        parser.error("--interval must be positive")
+    
+    fleet, _controllers = open_fleet(args.mock, args.battery,
+                                     sys.stderr if args.json else None)
+    watch(fleet, args.battery, args.json, args.interval, args.count)
+
+
+def stats_command(argv):
+    """``battery-limiter stats``: latency of control file operations."""
+    from .client import DEFAULT_SOCKET_PATH, read_metrics
+    from .metrics import fleet_metrics, format_prometheus, write_textfile
+    
+    parser = argparse.ArgumentParser(
+        prog="battery-limiter stats",
+        description="Show how often and how slowly the firmware control files are "
+                    "read and written, from the daemon when it is running"
+    )
+    add_common_arguments(parser, "Print the raw histograms and state as JSON")
+    parser.add_argument(
+        '--prometheus',
+        action='store_true',
+        help="Print in the Prometheus text format"
+    )
+    parser.add_argument(
+        '--textfile',
+        metavar='PATH',
+        help="Write the Prometheus text format to PATH atomically, for "
+             "node_exporter's textfile collector, instead of printing"
+    )
+    parser.add_argument(
+        '--socket',
+        default=DEFAULT_SOCKET_PATH,
+        help=f"Daemon socket (default: {DEFAULT_SOCKET_PATH})"
+    )
+    args = parser.parse_args(argv)
+    
+    errors = sys.stderr if args.json or args.prometheus or args.textfile else None
+    batteries = None
+    if not args.mock:
+        try:
+            batteries = read_metrics(args.socket)
+        except BatteryControlError as e:
+            report_error(e, errors)
+            sys.exit(1)
+    from_daemon = batteries is not None
+    if batteries is None:
+        # Only this process's own reads, but the state gauges are current
+        fleet, _controllers = open_fleet(args.mock, args.battery, errors)
+        batteries = fleet_metrics(fleet)
+    if args.battery:
+        unknown = set(args.battery) - set(batteries)
+        if unknown:
+            print(f"❌ Error: Battery {', '.join(sorted(unknown))} not found or not supported",
+                  file=errors)
+            sys.exit(1)
+        batteries = {name: batteries[name] for name in args.battery}
+    
+    if args.textfile:
+        try:
+            write_textfile(format_prometheus(batteries), args.textfile)
+        except OSError as e:
+            print(f"❌ Cannot write {args.textfile}: {e}", file=errors)
+            sys.exit(1)
+    elif args.prometheus:
+        sys.stdout.write(format_prometheus(batteries))
+    elif args.json:
+        write_json(batteries)
+    else:
+        print_stats(batteries, from_daemon)
+
+
+def print_stats(batteries, from_daemon: bool):
+    """Print operation counts and latency percentiles for people."""
+    from .metrics import OperationMetrics
+    
+    for name, data in batteries.items():
+        print(f"🔋 Control File Operations ({name}):")
+        metrics = OperationMetrics.from_dict(data['operations'])
+        for operation, histogram in metrics.latency.items():
+            count = histogram.count
+            if not count:
+                continue
+            line = (f"   {operation:<9} {count:>7} ops, mean {histogram.total_ns / count / 1e6:.3f} ms, "
+                    f"p50 ≤ {histogram.quantile(0.5) * 1e3:g} ms, "
+                    f"p99 ≤ {histogram.quantile(0.99) * 1e3:g} ms")
+            if metrics.errors[operation]:
+                line += f", {metrics.errors[operation]} failed"
+            print(line)
+        print(f"   Writes: {data['hardware_writes']} sent to the firmware, "
+              f"{data['writes_avoided']} avoided, {data.get('write_retries', 0)} retried")
+        print()
+    if not from_daemon:
+        print("💡 The daemon is not running: these are only this command's own operations")
+
+
+class SnapshotWriter:
+    """Format snapshots as text or NDJSON and write them in batches.
+    
+    Every snapshot written also feeds a :class:`~battery_limiter.estimate.ChargeEstimator`,
+    whose estimate of the time left goes with it.
+    """
+    
+    def __init__(self, as_json: bool = False, count: Optional[int] = None):
+        """Initialize the writer.
+        
+        Args:
+            as_json: Write NDJSON instead of text
+            count: Snapshots to write before :attr:`done` is set
+        """
+        from .estimate import ChargeEstimator
+        
+        self.as_json = as_json
+        self.remaining = count
+        self.estimator = ChargeEstimator()
+    
+    @property
+    def done(self) -> bool:
+        return self.remaining is not None and self.remaining <= 0
+    
+    def format(self, timestamp: float, snapshot) -> str:
+        estimate = self.estimator.update(snapshot, timestamp)
+        if self.as_json:
+            record = {'time': round(timestamp, 3)}
+            record.update(snapshot.as_dict())
+            record['estimate'] = estimate.as_dict() if estimate else None
+            return json.dumps(record, separators=(',', ':')) + '\n'
+        details = ", ".join(f"{key}={value}" for key, value in snapshot.as_dict().items()
+                            if value is not None and key != 'name')
+        if estimate is not None:
+            from .estimate import format_estimate
+            details += f"; {format_estimate(estimate)}"
+        return f"🔋 {snapshot.name}: {details}\n"
+    
+    def write(self, snapshots) -> None:
+        """Write a batch of snapshots with one write and one flush."""
+        snapshots = list(snapshots)
+        if self.remaining is not None:
+            snapshots = snapshots[:max(self.remaining, 0)]
+            self.remaining -= len(snapshots)
+        if not snapshots:
+            return
+        timestamp = time.time()
+        sys.stdout.write(''.join(self.format(timestamp, snapshot) for snapshot in snapshots))
+        sys.stdout.flush()
+
+
+def watch(fleet: BatteryFleet, names=None, as_json: bool = False,
+          interval: Optional[float] = None, count: Optional[int] = None):
+    """Print battery snapshots until interrupted.
+    
+    Without ``interval``, the current state is printed and then only
+    changes, as reported by the :class:`~battery_limiter.watch.BatteryWatcher`;
+    changes picked up together are written together. With ``interval``,
+    every selected battery is printed once per interval, on a fixed
+    schedule that skips ticks rather than catching up after a stall.
+    """
+    selected = [controller.name for controller in fleet.select(names)]
+    writer = SnapshotWriter(as_json, count)
+    try:
+        if interval is not None:
+            deadline = time.monotonic()
+            while True:
+                writer.write(fleet.get_snapshots(selected).values())
+                if writer.done:
+                    return
+                deadline += interval
+                now = time.monotonic()
+                if deadline < now:
+                    deadline = now + interval - (now - deadline) % interval
+                time.sleep(deadline - now)
+        else:
+            watch_changes(fleet, selected, writer)
+    except KeyboardInterrupt:
+        pass
+
+
+def watch_changes(fleet: BatteryFleet, selected: List[str], writer: SnapshotWriter):
+    """Write changed snapshots of the ``selected`` batteries as they happen."""
+    from .watch import BatteryWatcher
+    
+    changed: Dict[str, object] = {}
+    wanted = set(selected)
+    
+    def on_change(name, snapshot):
+        if name in wanted:
+            changed[name] = snapshot
+    
+    watcher = BatteryWatcher(fleet, on_change)
+    try:
+        writer.write(watcher.state[name] for name in selected)
+        poller = select.poll()
+        for fd in watcher.filenos():
+            poller.register(fd, select.POLLIN)
+        while not writer.done:
+            timeout = watcher.timeout()
+            ready = poller.poll(None if timeout is None else timeout * 1000)
+            if not ready:
+                watcher.poll()
+            for fd, _events in ready:
+                watcher.handle(fd)
+            if changed:
+                # Latest state per battery, in selection order
+                writer.write(changed[name] for name in selected if name in changed)
+                changed.clear()
+    finally:
+        watcher.close()
+
+
+# Subcommands dispatched before the legacy ``battery-limiter LIMIT`` form
+COMMANDS = {
+    'config': config_command,
+    'get': get_command,
+    'info': info_command,
+    'report': report,
+    'schedule': schedule,
+    'set': set_command,
+    'stats': stats_command,
+    'watch': watch_command,
+}
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
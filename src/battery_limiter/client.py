@@ -0,0 +1,261 @@
+"""Client side of the battery limiter daemon.
+
+Kept apart from :mod:`battery_limiter.daemon` so the CLI and GUI can talk
+to the daemon, or fall back to sysfs, without importing ``asyncio``.
+"""
+
+import json
+import os
+import socket
+import sys
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from .apply import write_config
+from .core import BatteryControlError, BatteryController, BatteryFleet
+from .schedule import SCHEDULE_PATH, Schedule, ScheduleError, load_schedule, save_schedule
+
+
+DEFAULT_SOCKET_PATH = '/run/battery-limiter.sock'
+
+
+class DaemonError(Exception):
+    """Exception raised for daemon protocol and connection errors."""
+    pass
+
+
+class DaemonClient:
+    """Blocking client for :class:`BatteryDaemon`."""
+    
+    def __init__(self, socket_path: str = DEFAULT_SOCKET_PATH, timeout: Optional[float] = 10.0):
+        """Connect to the daemon.
+        
+        Raises:
+            DaemonError: If the daemon is not running
+        """
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM | socket.SOCK_CLOEXEC)
+        try:
+            # Blocking connect waits for room in a busy daemon's backlog
+            self.sock.connect(socket_path)
+        except OSError as e:
+            self.sock.close()
+            raise DaemonError(f"Cannot connect to daemon at {socket_path}: {e}")
+        self.sock.settimeout(timeout)
+        self._file = self.sock.makefile('rb')
+        self._next_id = 0
+        self._events: List[Dict] = []
+    
+    @staticmethod
+    def available(socket_path: str = DEFAULT_SOCKET_PATH) -> bool:
+        """Whether a daemon socket exists at ``socket_path``."""
+        return os.path.exists(socket_path)
+    
+    def _receive(self) -> Dict:
+        line = self._file.readline()
+        if not line:
+            raise DaemonError("Connection closed by daemon")
+        return json.loads(line)
+    
+    def call(self, method: str, **params):
+        """Send one request and wait for its response.
+        
+        Raises:
+            BatteryControlError: If the daemon reports an error
+            DaemonError: If the connection fails
+        """
+        self._next_id += 1
+        request = {'id': self._next_id, 'method': method, 'params': params}
+        try:
+            self.sock.sendall(json.dumps(request).encode() + b'\n')
+            while True:
+                message = self._receive()
+                if 'event' in message:
+                    self._events.append(message)
+                    continue
+                if message.get('id') == self._next_id:
+                    break
+        except OSError as e:
+            raise DaemonError(f"Daemon request failed: {e}")
+        
+        if 'error' in message:
+            raise BatteryControlError(message['error'])
+        return message.get('result')
+    
+    def batteries(self) -> List[str]:
+        return self.call('batteries')
+    
+    def get_limits(self, names: Optional[List[str]] = None) -> Dict[str, Optional[int]]:
+        return self.call('get', batteries=names)
+    
+    def get_snapshots(self, names: Optional[List[str]] = None) -> Dict[str, Dict]:
+        return self.call('snapshot', batteries=names)
+    
+    def set_limits(self, limit: int, names: Optional[List[str]] = None) -> List[str]:
+        return self.call('set', limit=limit, batteries=names)
+    
+    def set_thresholds(self, start: Optional[int], end: int,
+                       names: Optional[List[str]] = None) -> List[str]:
+        return self.call('set', limit=end, start=start, batteries=names)
+    
+    def stats(self) -> Dict[str, object]:
+        return self.call('stats')
+    
+    def get_schedule(self) -> Dict:
+        return self.call('schedule')
+    
+    def set_schedule(self, text: str) -> Dict:
+        return self.call('set_schedule', text=text)
+    
+    def subscribe(self) -> Dict[str, Dict]:
+        """Start receiving change events; returns the current snapshots."""
+        return self.call('subscribe')
+    
+    def events(self) -> Iterator[Dict]:
+        """Yield change events after :meth:`subscribe`, blocking as needed."""
+        while True:
+            while self._events:
+                yield self._events.pop(0)
+            try:
+                message = self._receive()
+            except socket.timeout:
+                continue
+            if 'event' in message:
+                yield message
+    
+    def close(self) -> None:
+        self._file.close()
+        self.sock.close()
+
+
+def save_limit(fleet: BatteryFleet, limit: int, names: Optional[Iterable[str]] = None) -> None:
+    """Remember a limit applied to every battery for the boot and resume hooks.
+    
+    Only root changes on real hardware are saved, and not limits applied to
+    a subset of the batteries. A structured configuration only gets the
+    limit of its default profile replaced, see :func:`write_config`.
+    """
+    if (names is not None or os.geteuid() != 0
+            or fleet.base_path != BatteryController.REAL_BASE_PATH):
+        return
+    try:
+        write_config(limit)
+    except OSError as e:
+        print(f"Warning: could not save charge limit: {e}", file=sys.stderr)
+
+
+def apply_limits(fleet: BatteryFleet, limit: int, names: Optional[List[str]] = None,
+                 socket_path: str = DEFAULT_SOCKET_PATH, start: Optional[int] = None) -> List[str]:
+    """Set charge limits, through the daemon when running unprivileged.
+    
+    Root processes, mock environments and machines without a running
+    daemon write to sysfs directly. A ``start`` threshold is applied
+    together with the limit, see :meth:`BatteryFleet.set_thresholds`.
+    
+    Raises:
+        BatteryControlError: If the limit could not be applied
+    """
+    if os.geteuid() != 0 and not fleet.use_mock and DaemonClient.available(socket_path):
+        try:
+            client = DaemonClient(socket_path)
+        except DaemonError:
+            pass
+        else:
+            try:
+                return client.set_thresholds(start, limit, names)
+            except DaemonError as e:
+                raise BatteryControlError(str(e))
+            finally:
+                client.close()
+    result = fleet.set_thresholds(start, limit, names)
+    save_limit(fleet, limit, names)
+    return result
+
+
+def read_metrics(socket_path: str = DEFAULT_SOCKET_PATH) -> Optional[Dict[str, Dict]]:
+    """Operation metrics and state of every battery, from the running daemon.
+    
+    Returns:
+        :func:`battery_limiter.metrics.fleet_metrics` data of the daemon,
+        or ``None`` when no daemon is running
+    
+    Raises:
+        BatteryControlError: If the daemon fails the request
+    """
+    if not DaemonClient.available(socket_path):
+        return None
+    try:
+        client = DaemonClient(socket_path)
+    except DaemonError:
+        return None
+    try:
+        return client.stats().get('batteries')
+    except DaemonError as e:
+        raise BatteryControlError(str(e))
+    finally:
+        client.close()
+
+
+def read_schedule(socket_path: str = DEFAULT_SOCKET_PATH,
+                  schedule_path: str = SCHEDULE_PATH) -> Dict:
+    """Current schedule, from the daemon when it is running.
+    
+    Returns:
+        ``text``, the scheduled ``limit`` now and the ``next`` transition,
+        plus ``active``: whether a daemon is following the schedule
+    
+    Raises:
+        BatteryControlError: If the schedule cannot be read
+    """
+    if DaemonClient.available(socket_path):
+        try:
+            client = DaemonClient(socket_path)
+        except DaemonError:
+            pass
+        else:
+            try:
+                return dict(client.get_schedule(), active=True)
+            except DaemonError as e:
+                raise BatteryControlError(str(e))
+            finally:
+                client.close()
+    try:
+        schedule = load_schedule(schedule_path)
+    except (OSError, ScheduleError) as e:
+        raise BatteryControlError(f"Cannot read schedule: {e}")
+    now = datetime.now()
+    next_time = schedule.next_transition(now)
+    return {
+        'text': schedule.format(),
+        'limit': schedule.limit_at(now),
+        'next': next_time.isoformat(timespec='minutes') if next_time else None,
+        'active': False,
+    }
+
+
+def write_schedule(text: str, socket_path: str = DEFAULT_SOCKET_PATH,
+                   schedule_path: str = SCHEDULE_PATH) -> Dict:
+    """Replace the schedule, through the daemon when it is running.
+    
+    Returns:
+        The new state, as :func:`read_schedule`
+    
+    Raises:
+        BatteryControlError: If the schedule is invalid or cannot be saved
+    """
+    if DaemonClient.available(socket_path):
+        try:
+            client = DaemonClient(socket_path)
+        except DaemonError:
+            pass
+        else:
+            try:
+                return dict(client.set_schedule(text), active=True)
+            except DaemonError as e:
+                raise BatteryControlError(str(e))
+            finally:
+                client.close()
+    try:
+        save_schedule(Schedule.parse(text), schedule_path)
+    except (OSError, ScheduleError) as e:
+        raise BatteryControlError(f"Cannot save schedule: {e}")
+    return read_schedule(socket_path, schedule_path)
@@ -0,0 +1,690 @@
+"""Declarative charge limit configuration: profiles, per-battery limits and rules.
+
+``/etc/bcl.conf`` used to hold a single number, the limit of every
+battery. Such a file still means exactly that. A structured file looks
+like this::
+
+    # Used when no rule selects a profile
+    limit 80
+    start 75
+    battery BAT1 limit 90
+    
+    [profile desk]
+    limit 60
+    battery BAT1 limit 70 start 65
+    
+    [profile travel]
+    limit 100
+    
+    [profile storage]
+    limit 50
+    start 40
+    
+    [rules]
+    # The first matching rule selects the profile
+    mon-fri 09:00-18:00 on ac use desk
+    on battery use travel
+    daily 22:00-06:00 use storage
+
+Settings before the first section form the ``default`` profile, which
+applies when no rule matches (``profile NAME`` at the top selects another
+one instead). Other profiles inherit what they leave out from it, except
+that a start threshold only carries over along with its limit. A rule
+has an optional weekly window (``DAYS HH:MM-HH:MM``, past midnight when
+the end is earlier), an optional power source (``on ac`` or ``on
+battery``) and the profile it selects.
+
+:meth:`Config.compile` resolves the thresholds of every profile and
+battery up front and lays the rules out as one array of profile numbers
+per power source, indexed by minute of the week. A decision is then an
+array lookup: nothing is parsed or evaluated when the power source or
+the time changes. :class:`ConfigWatcher` follows the file with inotify
+and recompiles only when it is written or replaced; an edit that does
+not parse keeps the previous table in force. The daemon gives rules
+precedence over the schedule of :mod:`battery_limiter.schedule`.
+"""
+
+import os
+import time
+from array import array
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .apply import CONFIG_PATH
+from .schedule import RealtimeTimer, ScheduleError, format_days, parse_days, parse_limit
+
+
+DEFAULT_PROFILE = 'default'
+
+MINUTES_PER_WEEK = 7 * 24 * 60
+
+# Power sources a decision can be made for; ``None`` when it is unknown
+POWER_SOURCES = (True, False, None)
+
+# (start threshold, end threshold); either may be left to the firmware
+Thresholds = Tuple[Optional[int], Optional[int]]
+
+
+class ConfigError(ValueError):
+    """Exception raised for malformed or inconsistent configuration."""
+    pass
+
+
+def _parse_start(text: str) -> int:
+    try:
+        start = int(text.rstrip('%'))
+    except ValueError:
+        raise ConfigError(f"Invalid start threshold: {text}")
+    if not 0 <= start <= 99:
+        raise ConfigError(f"Start threshold must be between 0 and 99, got {start}")
+    return start
+
+
+def _parse_clock(text: str) -> int:
+    try:
+        hour, minute = (int(part) for part in text.split(':'))
+    except ValueError:
+        raise ConfigError(f"Invalid time: {text}")
+    if not (0 <= hour < 24 and 0 <= minute < 60) and (hour, minute) != (24, 0):
+        raise ConfigError(f"Invalid time: {text}")
+    return hour * 60 + minute
+
+
+def _format_clock(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+class Profile:
+    """Thresholds for every battery and for individual ones."""
+    
+    __slots__ = ('name', 'limit', 'start', 'batteries')
+    
+    def __init__(self, name: str, limit: Optional[int] = None, start: Optional[int] = None):
+        self.name = name
+        self.limit = limit
+        self.start = start
+        # Battery name to its own limit and start, ``None`` where not set
+        self.batteries: Dict[str, List[Optional[int]]] = {}
+    
+    def set(self, fields: List[str]) -> None:
+        """Apply one ``limit N``, ``start N`` or ``battery NAME ...`` line.
+        
+        Raises:
+            ConfigError: If the line is malformed
+        """
+        if fields[0] == 'battery':
+            if len(fields) < 4 or len(fields) % 2:
+                raise ConfigError("Expected 'battery NAME limit N [start N]'")
+            values = self.batteries.setdefault(fields[1], [None, None])
+            pairs = fields[2:]
+        else:
+            if len(fields) != 2:
+                raise ConfigError(f"Expected '{fields[0]} VALUE'")
+            values = None
+            pairs = fields
+        for key, value in zip(pairs[::2], pairs[1::2]):
+            if key == 'limit':
+                try:
+                    limit = parse_limit(value)
+                except ScheduleError as e:
+                    raise ConfigError(str(e))
+                if values is None:
+                    self.limit = limit
+                else:
+                    values[0] = limit
+            elif key == 'start':
+                if values is None:
+                    self.start = _parse_start(value)
+                else:
+                    values[1] = _parse_start(value)
+            else:
+                raise ConfigError(f"Unknown setting: {key}")
+    
+    def thresholds(self, battery: Optional[str], base: Optional['Profile'] = None) -> Thresholds:
+        """Start and end threshold of ``battery`` (``None`` for any other).
+        
+        Unset values come from the battery's entry in ``base``, then from
+        ``base`` itself. A start threshold is only taken along with its
+        limit or from a more specific setting, never on its own from a
+        fallback, where it may not fit the limit in force.
+        """
+        layers = [self.batteries.get(battery), [self.limit, self.start]]
+        if base is not None and base is not self:
+            layers += [base.batteries.get(battery), [base.limit, base.start]]
+        limit = start = None
+        for layer in layers:
+            if layer is None:
+                continue
+            if start is None:
+                start = layer[1]
+            if layer[0] is not None:
+                limit = layer[0]
+                break
+        return start, limit
+
+
+class ConfigRule:
+    """Select a profile during a weekly window and/or on one power source."""
+    
+    __slots__ = ('days', 'begin', 'end', 'ac', 'profile', 'line')
+    
+    def __init__(self, profile: str, days: Iterable[int] = range(7), begin: int = 0,
+                 end: int = 24 * 60, ac: Optional[bool] = None, line: int = 0):
+        """Initialize the rule.
+        
+        Args:
+            profile: Profile selected while the rule matches
+            days: Weekdays (0 = Monday) on which the window starts
+            begin: Start of the window in minutes after midnight
+            end: End of the window; at or before ``begin`` it ends the next day
+            ac: ``True`` to match on AC only, ``False`` on battery only,
+                ``None`` for both
+            line: Line of the rule in the file, for error messages
+        """
+        self.days = tuple(sorted(set(days)))
+        self.begin = begin
+        self.end = end
+        self.ac = ac
+        self.profile = profile
+        self.line = line
+    
+    @classmethod
+    def parse(cls, text: str, line: int = 0) -> 'ConfigRule':
+        """Parse ``[DAYS HH:MM-HH:MM] [on ac|battery] use PROFILE``.
+        
+        Raises:
+            ConfigError: If the rule is malformed
+        """
+        fields = text.split()
+        if len(fields) < 2 or fields[-2] != 'use':
+            raise ConfigError(f"Expected '[DAYS HH:MM-HH:MM] [on ac|battery] use PROFILE', "
+                              f"got: {text}")
+        profile = fields[-1]
+        fields = fields[:-2]
+        ac = None
+        if len(fields) >= 2 and fields[-2] == 'on':
+            if fields[-1] not in ('ac', 'battery'):
+                raise ConfigError(f"Expected 'on ac' or 'on battery', got: on {fields[-1]}")
+            ac = fields[-1] == 'ac'
+            fields = fields[:-2]
+        if not fields:
+            return cls(profile, ac=ac, line=line)
+        if len(fields) != 2:
+            raise ConfigError(f"Expected 'DAYS HH:MM-HH:MM', got: {' '.join(fields)}")
+        try:
+            days = parse_days(fields[0])
+        except ScheduleError as e:
+            raise ConfigError(str(e))
+        first, sep, last = fields[1].partition('-')
+        if not sep:
+            raise ConfigError(f"Expected a window like 22:00-06:00, got: {fields[1]}")
+        begin, end = _parse_clock(first), _parse_clock(last)
+        if begin == end:
+            raise ConfigError(f"Empty window: {fields[1]}")
+        return cls(profile, days, begin, end, ac, line)
+    
+    def __str__(self) -> str:
+        parts = []
+        if (self.begin, self.end) != (0, 24 * 60) or len(self.days) != 7:
+            parts.append(f"{format_days(self.days)} "
+                         f"{_format_clock(self.begin)}-{_format_clock(self.end)}")
+        if self.ac is not None:
+            parts.append('on ac' if self.ac else 'on battery')
+        parts.append(f"use {self.profile}")
+        return ' '.join(parts)
+    
+    def windows(self) -> Iterable[Tuple[int, int]]:
+        """Minute-of-week ranges covered, split where they wrap past Sunday."""
+        length = (self.end - self.begin) % (24 * 60) or 24 * 60
+        for day in self.days:
+            first = day * 24 * 60 + self.begin
+            last = first + length
+            if last <= MINUTES_PER_WEEK:
+                yield first, last
+            else:
+                yield first, MINUTES_PER_WEEK
+                yield 0, last - MINUTES_PER_WEEK
+
+
+class Config:
+    """Parsed configuration file."""
+    
+    def __init__(self):
+        self.profiles: Dict[str, Profile] = {DEFAULT_PROFILE: Profile(DEFAULT_PROFILE)}
+        self.rules: List[ConfigRule] = []
+        self.fallback = DEFAULT_PROFILE
+        # Line of the ``profile NAME`` setting, for error messages
+        self.fallback_line = 0
+        # Whether the file is the old single number
+        self.legacy = False
+    
+    @property
+    def default(self) -> Profile:
+        return self.profiles[DEFAULT_PROFILE]
+    
+    @classmethod
+    def parse(cls, text: str) -> 'Config':
+        """Parse a configuration file, structured or a single limit.
+        
+        Blank lines and ``#`` comments are ignored.
+        
+        Raises:
+            ConfigError: If a line is malformed
+        """
+        config = cls()
+        stripped = text.strip()
+        if stripped.isdigit():
+            config.legacy = True
+            config.default.set(['limit', stripped])
+            return config
+        
+        section: Optional[Profile] = config.default
+        for number, line in enumerate(text.splitlines(), 1):
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            try:
+                if line.startswith('['):
+                    section = config._section(line)
+                    continue
+                fields = line.split()
+                if section is None:
+                    config.rules.append(ConfigRule.parse(line, number))
+                elif section is config.default and fields[0] == 'profile':
+                    if len(fields) != 2:
+                        raise ConfigError("Expected 'profile NAME'")
+                    config.fallback, config.fallback_line = fields[1], number
+                elif fields[0] in ('limit', 'start', 'battery'):
+                    section.set(fields)
+                else:
+                    raise ConfigError(f"Unknown setting: {fields[0]}")
+            except ConfigError as e:
+                raise ConfigError(f"line {number}: {e}")
+        return config
+    
+    def _section(self, line: str) -> Optional[Profile]:
+        """Open the ``[rules]`` (``None``) or a ``[profile NAME]`` section."""
+        if not line.endswith(']'):
+            raise ConfigError(f"Malformed section: {line}")
+        fields = line[1:-1].split()
+        if fields == ['rules']:
+            return None
+        if len(fields) != 2 or fields[0] != 'profile':
+            raise ConfigError(f"Expected [profile NAME] or [rules], got: {line}")
+        if fields[1] == DEFAULT_PROFILE:
+            raise ConfigError("The default profile is set before the first section")
+        if fields[1] in self.profiles:
+            raise ConfigError(f"Profile defined twice: {fields[1]}")
+        profile = self.profiles[fields[1]] = Profile(fields[1])
+        return profile
+    
+    def batteries(self) -> List[str]:
+        """Batteries with settings of their own in any profile."""
+        names = set()
+        for profile in self.profiles.values():
+            names.update(profile.batteries)
+        return sorted(names)
+    
+    def compile(self) -> 'RuleTable':
+        """Check the configuration and build its decision table.
+        
+        Raises:
+            ConfigError: If a rule selects an undefined profile or a start
+                threshold is not below the limit it goes with
+        """
+        names = list(self.profiles)
+        if self.fallback not in self.profiles:
+            raise ConfigError(f"line {self.fallback_line}: Unknown profile: {self.fallback}")
+        for rule in self.rules:
+            if rule.profile not in self.profiles:
+                raise ConfigError(f"line {rule.line}: Unknown profile: {rule.profile}")
+        if len(names) > 255:
+            raise ConfigError("Too many profiles")
+        
+        thresholds = []
+        for name in names:
+            profile = self.profiles[name]
+            resolved = {battery: profile.thresholds(battery, self.default)
+                        for battery in [None] + self.batteries()}
+            for battery, (start, limit) in resolved.items():
+                if start is not None and limit is not None and start >= limit:
+                    where = f" for {battery}" if battery is not None else ""
+                    raise ConfigError(f"Profile {name}{where}: start threshold {start}% "
+                                      f"is not below the limit {limit}%")
+            thresholds.append(resolved)
+        
+        # Later rules are laid down first, so earlier ones win
+        fallback = names.index(self.fallback)
+        tables = {}
+        for ac in POWER_SOURCES:
+            table = array('B', [fallback]) * MINUTES_PER_WEEK
+            for rule in reversed(self.rules):
+                if rule.ac is not None and rule.ac != ac:
+                    continue
+                index = names.index(rule.profile)
+                for first, last in rule.windows():
+                    table[first:last] = array('B', [index]) * (last - first)
+            tables[ac] = table
+        return RuleTable(names, thresholds, tables, len(self.rules))
+
+
+def _minute_of_week(moment: datetime) -> int:
+    return moment.weekday() * 24 * 60 + moment.hour * 60 + moment.minute
+
+
+class RuleTable:
+    """Compiled configuration: which profile and thresholds apply when."""
+    
+    def __init__(self, profiles: List[str], thresholds: List[Dict[Optional[str], Thresholds]],
+                 tables: Dict[Optional[bool], array], rules: int = 0):
+        """Initialize the table; see :meth:`Config.compile`.
+        
+        Args:
+            profiles: Profile names, by profile number
+            thresholds: Per profile number, thresholds by battery name and
+                under ``None`` for batteries without settings of their own
+            tables: Per power source, the profile number by minute of the week
+            rules: Number of rules the tables were laid out from
+        """
+        self.profiles = profiles
+        self.thresholds = thresholds
+        self.tables = tables
+        self.rules = rules
+        # Minutes of the week at which another profile takes over
+        self.changes = {
+            ac: [minute for minute, (profile, previous)
+                 in enumerate(zip(table, table[-1:] + table[:-1])) if profile != previous]
+            for ac, table in tables.items()
+        }
+    
+    @property
+    def dynamic(self) -> bool:
+        """Whether the profile in force changes with the time of the week."""
+        return any(self.changes.values())
+    
+    def profile_at(self, moment: datetime, ac: Optional[bool] = None) -> str:
+        """Name of the profile in force at ``moment`` on the given power source."""
+        return self.profiles[self.tables[ac][_minute_of_week(moment)]]
+    
+    def limits(self, names: Iterable[str], moment: datetime,
+               ac: Optional[bool] = None) -> Dict[str, Thresholds]:
+        """Start and end thresholds of each battery at ``moment``."""
+        resolved = self.thresholds[self.tables[ac][_minute_of_week(moment)]]
+        default = resolved[None]
+        return {name: resolved.get(name, default) for name in names}
+    
+    def next_change(self, moment: datetime, ac: Optional[bool] = None) -> Optional[datetime]:
+        """Start of the first minute after ``moment`` with another profile.
+        
+        Returns:
+            The time, or ``None`` if the profile never changes on this
+            power source
+        """
+        changes = self.changes[ac]
+        if not changes:
+            return None
+        current = _minute_of_week(moment)
+        i = bisect_right(changes, current)
+        change = changes[i] if i < len(changes) else changes[0] + MINUTES_PER_WEEK
+        return moment.replace(second=0, microsecond=0) + timedelta(minutes=change - current)
+
+
+def load_config(path: str = CONFIG_PATH) -> Optional[RuleTable]:
+    """Read and compile a configuration file; a missing file gives ``None``.
+    
+    Raises:
+        OSError: If the file cannot be read
+        ConfigError: If it is malformed
+    """
+    try:
+        with open(path, 'r') as f:
+            text = f.read()
+    except FileNotFoundError:
+        return None
+    return Config.parse(text).compile()
+
+
+def update_limit(text: str, limit: int) -> str:
+    """Set the default profile's limit in a structured configuration file.
+    
+    The top-level ``limit`` line is replaced, or one is added at the top,
+    and a top-level start threshold that is not below the new limit is
+    removed; comments and everything else are kept.
+    """
+    lines = text.splitlines()
+    result = []
+    replaced = False
+    for i, line in enumerate(lines):
+        code = line.split('#', 1)[0]
+        fields = code.split()
+        if code.strip().startswith('['):
+            result += lines[i:]
+            break
+        if fields[:1] == ['limit'] and not replaced:
+            comment = line[len(code):]
+            line = f"limit {limit}" + (f"  {comment}" if comment else "")
+            replaced = True
+        elif fields[:1] == ['start'] and len(fields) == 2 and fields[1].rstrip('%').isdigit():
+            if int(fields[1].rstrip('%')) >= limit:
+                continue
+        result.append(line)
+    if not replaced:
+        result.insert(0, f"limit {limit}")
+    return '\n'.join(result) + '\n'
+
+
+def on_ac(base_path: str) -> Optional[bool]:
+    """Whether the machine runs on external power.
+    
+    Adapters (``Mains`` and ``USB`` supplies) are asked first; without
+    any, a battery that is not discharging counts as plugged in.
+    
+    Returns:
+        ``None`` when there is neither an adapter nor a battery status
+    """
+    try:
+        names = sorted(os.listdir(base_path))
+    except OSError:
+        return None
+    adapters = []
+    statuses = []
+    for name in names:
+        directory = os.path.join(base_path, name)
+        try:
+            with open(os.path.join(directory, 'type'), 'r') as f:
+                kind = f.read().strip()
+            if kind in ('Mains', 'USB'):
+                with open(os.path.join(directory, 'online'), 'r') as f:
+                    adapters.append(f.read().strip() == '1')
+            elif kind == 'Battery':
+                with open(os.path.join(directory, 'status'), 'r') as f:
+                    statuses.append(f.read().strip())
+        except OSError:
+            continue
+    if adapters:
+        return any(adapters)
+    if statuses:
+        return any(status != 'Discharging' for status in statuses)
+    return None
+
+
+class ConfigFollower:
+    """Apply the thresholds a :class:`RuleTable` selects as time and power change.
+    
+    Like :class:`~battery_limiter.schedule.Scheduler`, a battery's
+    thresholds are only written when they differ from the ones applied
+    before, so a limit changed by hand stays in place until the
+    configuration next selects another one for that battery (or until
+    resume or a battery swap re-applies the configuration).
+    """
+    
+    def __init__(self, names: Iterable[str],
+                 apply: Callable[[Optional[int], int, List[str]], object],
+                 table: Optional[RuleTable] = None, ac: Optional[bool] = None,
+                 clock: Callable[[], float] = time.time, use_timerfd: bool = True):
+        """Initialize the follower.
+        
+        Args:
+            names: Batteries to apply to
+            apply: Called with a start threshold (or ``None``), an end
+                threshold and the batteries to give them
+            table: Compiled configuration, ``None`` for none
+            ac: Whether the machine runs on external power, ``None`` if unknown
+            clock: Wall-clock time source (seconds since the epoch)
+            use_timerfd: Sleep on a timerfd; otherwise the caller drives
+                :meth:`update` using :meth:`timeout`
+        """
+        self.names = list(names)
+        self.apply = apply
+        self.table = table
+        self.ac = ac
+        self.clock = clock
+        self.current: Dict[str, Thresholds] = {}
+        self.next_time: Optional[datetime] = None
+        self.timer = None
+        if use_timerfd:
+            try:
+                self.timer = RealtimeTimer()
+            except (OSError, AttributeError):
+                self.timer = None
+    
+    def set_table(self, table: Optional[RuleTable]) -> None:
+        """Follow a reloaded configuration."""
+        self.table = table
+        self.update()
+    
+    def set_power(self, ac: Optional[bool]) -> None:
+        """Report the power source; a change re-evaluates the configuration."""
+        if ac != self.ac:
+            self.ac = ac
+            self.update()
+    
+    def update(self) -> Optional[datetime]:
+        """Apply the thresholds in force now and arm the timer for the next change.
+        
+        Returns:
+            Time of the next change of profile, or ``None`` if there is none
+        """
+        now = datetime.fromtimestamp(self.clock())
+        wanted = {}
+        self.next_time = None
+        if self.table is not None:
+            wanted = self.table.limits(self.names, now, self.ac)
+            self.next_time = self.table.next_change(now, self.ac)
+        groups: Dict[Thresholds, List[str]] = {}
+        for name, thresholds in wanted.items():
+            if thresholds[1] is not None and self.current.get(name) != thresholds:
+                groups.setdefault(thresholds, []).append(name)
+        self.current = wanted
+        for (start, end), names in groups.items():
+            self.apply(start, end, names)
+        if self.timer is not None:
+            self.timer.arm(self.next_time.timestamp() if self.next_time else None)
+        return self.next_time
+    
+    def timeout(self) -> Optional[float]:
+        """Seconds until the next change (for callers without a timerfd)."""
+        if self.next_time is None:
+            return None
+        return max(0.0, self.next_time.timestamp() - self.clock())
+    
+    def fileno(self) -> Optional[int]:
+        return self.timer.fileno() if self.timer is not None else None
+    
+    def handle(self) -> None:
+        """Process a timer expiry or clock change."""
+        if self.timer is not None:
+            self.timer.read()
+        self.update()
+    
+    def close(self) -> None:
+        if self.timer is not None:
+            self.timer.close()
+            self.timer = None
+
+
+class ConfigWatcher:
+    """Keep a compiled :class:`RuleTable` in step with the configuration file.
+    
+    The directory is watched rather than the file, so editors and
+    :func:`os.replace` that put a new file in place are noticed as well as
+    writes to the old one. Register :meth:`fileno` for reading and call
+    :meth:`handle` when it becomes readable.
+    """
+    
+    def __init__(self, path: str = CONFIG_PATH,
+                 on_change: Optional[Callable[[Optional[RuleTable]], None]] = None,
+                 use_inotify: bool = True):
+        """Load the configuration and start watching it.
+        
+        Args:
+            path: Configuration file
+            on_change: Called with the new table after each successful reload
+            use_inotify: Watch the file; if ``False`` or unavailable, only
+                explicit :meth:`reload` calls pick up changes
+        """
+        self.path = path
+        self.on_change = on_change
+        self.table: Optional[RuleTable] = None
+        self.error: Optional[Exception] = None
+        self.reloads = 0
+        self.inotify = None
+        if use_inotify:
+            self._open_inotify()
+        self.reload(notify=False)
+    
+    def _open_inotify(self) -> None:
+        from .watch import IN_CLOSE_WRITE, IN_DELETE, IN_MOVED_TO, InotifySource
+        
+        try:
+            inotify = InotifySource()
+        except (OSError, AttributeError):
+            return
+        try:
+            inotify.add(os.path.dirname(self.path) or '.', self.path,
+                        IN_CLOSE_WRITE | IN_MOVED_TO | IN_DELETE,
+                        filename=os.path.basename(self.path))
+        except OSError:
+            inotify.close()
+            return
+        self.inotify = inotify
+    
+    def fileno(self) -> Optional[int]:
+        return self.inotify.fileno() if self.inotify is not None else None
+    
+    def reload(self, notify: bool = True) -> bool:
+        """Read and compile the file again.
+        
+        A file that fails to load is recorded in :attr:`error` and the
+        previous table stays in force.
+        
+        Returns:
+            Whether the table was replaced
+        """
+        try:
+            table = load_config(self.path)
+        except (OSError, ConfigError) as e:
+            self.error = e
+            return False
+        self.error = None
+        self.table = table
+        self.reloads += 1
+        if notify and self.on_change is not None:
+            self.on_change(table)
+        return True
+    
+    def handle(self) -> bool:
+        """Drain pending file events and reload if the file changed.
+        
+        Returns:
+            Whether the table was replaced
+        """
+        if self.inotify is None or not self.inotify.read():
+            return False
+        return self.reload()
+    
+    def close(self) -> None:
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
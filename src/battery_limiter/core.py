@@ -1,8 +1,24 @@
 """Core battery charge limiting functionality."""
 
+import collections
+import contextlib
+import errno
 import os
-import glob
-from typing import Optional, Tuple
+import random
+import sys
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .backends import Backend, load_backend
+from .backends.sysfs import CONTROL_FILES
+from .metrics import OperationMetrics
+from .probe import ProbeCache
+from .sysfs import AttributeCache, write_lock
+
+if TYPE_CHECKING:
+    # Only the daemon's coalescer needs futures; the CLI does not pay for them
+    import concurrent.futures
 
 
 class BatteryControlError(Exception):
@@ -10,6 +26,186 @@ class BatteryControlError(Exception):
     pass
 
 
+class LimitMismatchError(BatteryControlError):
+    """Exception raised when the firmware did not keep the written limit."""
+    
+    def __init__(self, battery: Optional[str], requested: int, actual: Optional[int],
+                 previous: Optional[int], threshold: str = 'end'):
+        self.battery = battery
+        self.requested = requested
+        self.actual = actual
+        self.previous = previous
+        self.threshold = threshold
+        if actual is None:
+            reason = "the control file could not be read back"
+        elif actual == previous:
+            reason = f"the firmware rejected it and kept {actual}%"
+        else:
+            reason = f"the firmware clamped it to {actual}%"
+        what = "Charge limit" if threshold == 'end' else "Start threshold"
+        super().__init__(f"{what} {requested}% was not applied: {reason}")
+
+
+class RetryPolicy:
+    """Bounded exponential backoff for transient firmware errors.
+    
+    Embedded controllers answer a busy or timed-out transaction with errors
+    such as ``EBUSY`` or ``EIO`` that go away on their own. Other errors
+    (permissions, unsupported values) are never retried.
+    """
+    
+    TRANSIENT_ERRNOS = frozenset({errno.EBUSY, errno.EAGAIN, errno.EIO, errno.EINTR,
+                                  errno.ETIMEDOUT})
+    
+    def __init__(self, attempts: int = 4, delay: float = 0.05, factor: float = 2.0,
+                 max_delay: float = 1.0, jitter: float = 0.25,
+                 errnos: Iterable[int] = TRANSIENT_ERRNOS,
+                 sleep: Callable[[float], None] = time.sleep):
+        """Initialize the policy.
+        
+        Args:
+            attempts: Tries in total, including the first
+            delay: Seconds before the first retry
+            factor: Growth of the delay after each retry
+            max_delay: Longest delay in seconds
+            jitter: Random spread of each delay, as a fraction of it
+            errnos: Error numbers worth retrying
+            sleep: Called to wait between tries
+        """
+        self.attempts = max(1, attempts)
+        self.delay = delay
+        self.factor = factor
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.errnos = frozenset(errnos)
+        self.sleep = sleep
+    
+    def should_retry(self, error: OSError, attempt: int) -> bool:
+        """Whether to try again after ``error`` on try number ``attempt`` (from 0)."""
+        return attempt + 1 < self.attempts and error.errno in self.errnos
+    
+    def backoff(self, attempt: int) -> float:
+        """Seconds to wait after try number ``attempt``."""
+        delay = min(self.max_delay, self.delay * self.factor ** attempt)
+        return delay * (1 + random.uniform(-self.jitter, self.jitter))
+
+
+def parse_uevent(text: str) -> Dict[str, str]:
+    """Parse the ``POWER_SUPPLY_*`` lines of a ``uevent`` file.
+    
+    Returns:
+        Properties keyed without the ``POWER_SUPPLY_`` prefix
+        (e.g. ``CAPACITY``)
+    """
+    properties = {}
+    for line in text.splitlines():
+        key, sep, value = line.partition('=')
+        if sep and key.startswith('POWER_SUPPLY_'):
+            properties[key[13:]] = value
+    return properties
+
+
+class BatterySnapshot:
+    """Point-in-time battery state parsed from its ``uevent`` properties.
+    
+    Numeric values keep the kernel's units: µWh for energy, µAh for charge,
+    µW for power, µA for current, µV for voltage and tenths of a degree
+    Celsius for temperature. Properties the driver does not report are
+    ``None``. ``limit`` is the end threshold and ``start_threshold`` the
+    start threshold, if the interface has one.
+    """
+    
+    __slots__ = (
+        'name', 'status', 'capacity',
+        'energy_now', 'energy_full', 'energy_full_design',
+        'charge_now', 'charge_full', 'charge_full_design',
+        'power_now', 'current_now', 'voltage_now', 'cycle_count', 'temp',
+        'model_name', 'manufacturer', 'limit', 'start_threshold',
+    )
+    
+    _INT_FIELDS = (
+        'capacity', 'energy_now', 'energy_full', 'energy_full_design',
+        'charge_now', 'charge_full', 'charge_full_design',
+        'power_now', 'current_now', 'voltage_now', 'cycle_count', 'temp',
+    )
+    _STR_FIELDS = ('status', 'model_name', 'manufacturer')
+    
+    name: str
+    status: Optional[str]
+    capacity: Optional[int]
+    energy_now: Optional[int]
+    energy_full: Optional[int]
+    energy_full_design: Optional[int]
+    charge_now: Optional[int]
+    charge_full: Optional[int]
+    charge_full_design: Optional[int]
+    power_now: Optional[int]
+    current_now: Optional[int]
+    voltage_now: Optional[int]
+    cycle_count: Optional[int]
+    temp: Optional[int]
+    model_name: Optional[str]
+    manufacturer: Optional[str]
+    limit: Optional[int]
+    start_threshold: Optional[int]
+    
+    def __init__(self, name: str, **values):
+        self.name = name
+        for field in self.__slots__[1:]:
+            setattr(self, field, values.get(field))
+    
+    @classmethod
+    def from_properties(cls, name: str, properties: Dict[str, str],
+                        limit: Optional[int] = None,
+                        start_threshold: Optional[int] = None) -> 'BatterySnapshot':
+        """Build a snapshot from parsed ``uevent`` properties.
+        
+        Args:
+            name: Battery directory name
+            properties: Properties keyed without the ``POWER_SUPPLY_`` prefix
+            limit: Charge limit, if not part of the properties
+            start_threshold: Start threshold, if not part of the properties
+        """
+        snapshot = cls(name)
+        for field in cls._INT_FIELDS:
+            value = properties.get(field.upper())
+            if value is not None:
+                try:
+                    setattr(snapshot, field, int(value))
+                except ValueError:
+                    pass
+        for field in cls._STR_FIELDS:
+            value = properties.get(field.upper())
+            if value:
+                setattr(snapshot, field, value.strip())
+        
+        if limit is None:
+            value = properties.get('CHARGE_CONTROL_END_THRESHOLD')
+            if value is not None and value.isdigit():
+                limit = int(value)
+        snapshot.limit = limit
+        if start_threshold is None:
+            value = properties.get('CHARGE_CONTROL_START_THRESHOLD')
+            if value is not None and value.isdigit():
+                start_threshold = int(value)
+        snapshot.start_threshold = start_threshold
+        return snapshot
+    
+    def as_dict(self) -> Dict[str, object]:
+        """Return the snapshot as a plain dictionary."""
+        return {field: getattr(self, field) for field in self.__slots__}
+    
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, BatterySnapshot):
+            return NotImplemented
+        return all(getattr(self, f) == getattr(other, f) for f in self.__slots__)
+    
+    def __repr__(self) -> str:
+        values = ", ".join(f"{f}={getattr(self, f)!r}" for f in self.__slots__
+                           if getattr(self, f) is not None)
+        return f"BatterySnapshot({values})"
+
+
 class BatteryController:
     """Main controller for battery charge limiting."""
     
@@ -18,93 +214,620 @@ class BatteryController:
     MOCK_BASE_PATH = os.path.join(os.path.dirname(__file__), '../../mock_sys/class/power_supply/')
     
     # Control file names in order of preference
-    CONTROL_FILES = ['charge_control_end_threshold', 'charge_stop_threshold']
+    CONTROL_FILES = list(CONTROL_FILES)
     
-    def __init__(self, use_mock: bool = False):
+    def __init__(self, use_mock: bool = False, battery: Optional[str] = None,
+                 base_path: Optional[str] = None, probe_cache: Optional[ProbeCache] = None,
+                 retry: Optional[RetryPolicy] = None):
         """Initialize the battery controller.
         
         Args:
             use_mock: Whether to use mock data for testing
+            battery: Battery directory name (e.g. ``BAT1``); defaults to the
+                first battery exposing a control file
+            base_path: Override for the ``power_supply`` root
+            probe_cache: Discovery results (default: the persistent per-user
+                or system cache on real hardware, an in-memory one otherwise)
+            retry: Retries of failed writes (default: :class:`RetryPolicy`)
         """
         self.use_mock = use_mock
-        self.base_path = self.MOCK_BASE_PATH if use_mock else self.REAL_BASE_PATH
-        self.control_file = self._find_control_file()
+        if base_path is None:
+            base_path = self.MOCK_BASE_PATH if use_mock else self.REAL_BASE_PATH
+        if probe_cache is None:
+            probe_cache = ProbeCache(persistent=base_path == self.REAL_BASE_PATH)
+        self.base_path = base_path
+        self.battery = battery
+        self.probe_cache = probe_cache
+        self.backend: Optional[Backend] = None
+        self._name: Optional[str] = None
+        # Latency of probe, read, write and read-back; see battery_limiter.metrics
+        self.metrics = OperationMetrics()
+        # The hottest path skips the lookup by operation name
+        self._read_latency = self.metrics.latency['read']
+        self.control_file = self._probe()
+        self.attributes = self._create_attribute_cache()
+        self.retry = retry if retry is not None else RetryPolicy()
+        self.hardware_writes = 0
+        self.writes_avoided = 0
+        self.write_retries = 0
+        # Hold off writers in other processes during a write (see sysfs.write_lock)
+        self.lock_writes = True
+        self._write_lock = threading.Lock()
+    
+    def _probe(self, refresh: bool = False) -> Optional[str]:
+        start = time.perf_counter_ns()
+        try:
+            return self._find_control_file(refresh)
+        finally:
+            self.metrics.observe('probe', time.perf_counter_ns() - start)
+    
+    def _find_control_file(self, refresh: bool = False) -> Optional[str]:
+        """Find the first available battery control file and its backend."""
+        self.backend = None
+        self._name = None
+        for name, entry in self.probe_cache.batteries(self.base_path, refresh).items():
+            if self.battery is not None and name != self.battery:
+                continue
+            backend = load_backend(entry['backend'])
+            if backend is None:
+                # Cached result names a plugin that is no longer installed
+                return None if refresh else self._find_control_file(refresh=True)
+            self.backend = backend(entry['control_file'])
+            self._name = name
+            return entry['control_file']
+        return None
     
-    def _find_control_file(self) -> Optional[str]:
-        """Find the first available battery control file."""
-        battery_dirs = glob.glob(os.path.join(self.base_path, 'BAT*'))
-        if not battery_dirs:
+    def _create_attribute_cache(self) -> Optional[AttributeCache]:
+        if not self.control_file:
             return None
+        return AttributeCache(os.path.join(self.base_path, self._name))
+    
+    def invalidate(self) -> None:
+        """Forget cached attributes and re-resolve the control file.
         
-        for bat_dir in battery_dirs:
-            for control_file in self.CONTROL_FILES:
-                path = os.path.join(bat_dir, control_file)
-                if os.path.exists(path):
-                    return path
-        return None
+        Call this when the battery is hotplugged.
+        """
+        if self.attributes is not None:
+            self.attributes.invalidate()
+        control_file = self._probe(refresh=True)
+        if control_file != self.control_file:
+            self.control_file = control_file
+            self.attributes = self._create_attribute_cache()
+    
+    def close(self) -> None:
+        """Close descriptors kept open by the attribute cache."""
+        if self.attributes is not None:
+            self.attributes.close()
+    
+    @property
+    def name(self) -> Optional[str]:
+        """Name of the battery directory being controlled."""
+        return self._name or self.battery
     
     def is_supported(self) -> bool:
         """Check if battery charge limiting is supported."""
         return self.control_file is not None
     
+    def supports_start_threshold(self) -> bool:
+        """Check if the interface has a start threshold as well."""
+        return self.control_file is not None and self.backend.start_file is not None
+    
     def get_current_limit(self) -> Optional[int]:
         """Get the current charge limit."""
         if not self.control_file:
             return None
         
+        start = time.perf_counter_ns()
         try:
-            with open(self.control_file, 'r') as f:
-                return int(f.read().strip())
+            return self.backend.decode(self.backend.read(self.attributes))
         except (IOError, ValueError):
+            self.metrics.error('read')
             return None
+        finally:
+            self._read_latency.observe(time.perf_counter_ns() - start)
+    
+    def get_start_threshold(self) -> Optional[int]:
+        """Get the start threshold, or ``None`` if there is none or it is unreadable."""
+        if not self.supports_start_threshold():
+            return None
+        
+        start = time.perf_counter_ns()
+        try:
+            return self._read_start()
+        except (IOError, ValueError):
+            self.metrics.error('read')
+            return None
+        finally:
+            self._read_latency.observe(time.perf_counter_ns() - start)
+    
+    def _read_end(self) -> int:
+        return self.backend.decode(self.backend.read(self.attributes))
+    
+    def _read_start(self) -> int:
+        return self.backend.decode_start(self.backend.read_start(self.attributes))
     
-    def set_charge_limit(self, limit: int) -> None:
+    def _write_once(self, write: Callable[[str], None], value: str) -> None:
+        start = time.perf_counter_ns()
+        try:
+            write(value)
+        except OSError:
+            self.metrics.error('write')
+            raise
+        finally:
+            self.metrics.observe('write', time.perf_counter_ns() - start)
+        self.hardware_writes += 1
+    
+    def _read_back(self, read: Callable[[], int]) -> int:
+        start = time.perf_counter_ns()
+        try:
+            return read()
+        except (OSError, ValueError):
+            self.metrics.error('readback')
+            raise
+        finally:
+            self.metrics.observe('readback', time.perf_counter_ns() - start)
+    
+    def _write_verified(self, write: Callable[[str], None], value: str,
+                        read: Callable[[], int], verify: bool) -> Optional[int]:
+        """Write ``value`` and read it back, retrying transient errors of each.
+        
+        A failed read-back only repeats the read: the value is already
+        written, and writing it again would be another firmware transaction.
+        
+        Returns:
+            The value read back, or ``None`` when not verified or unreadable
+        
+        Raises:
+            BatteryControlError: If the write fails
+        """
+        attempt = 0
+        while True:
+            try:
+                self._write_once(write, value)
+                break
+            except OSError as e:
+                if not self.retry.should_retry(e, attempt):
+                    raise BatteryControlError(f"Failed to write to control file: {e}")
+            self.write_retries += 1
+            self.retry.sleep(self.retry.backoff(attempt))
+            attempt += 1
+        if not verify:
+            return None
+        
+        attempt = 0
+        while True:
+            try:
+                return self._read_back(read)
+            except ValueError:
+                # Read back something that is not a limit
+                return None
+            except OSError as e:
+                if not self.retry.should_retry(e, attempt):
+                    # Written, but the firmware would not confirm it
+                    return None
+            self.retry.sleep(self.retry.backoff(attempt))
+            attempt += 1
+    
+    def set_charge_limit(self, limit: int, verify: bool = True) -> bool:
         """Set the battery charge limit.
         
+        The write is skipped when the control file already holds ``limit``:
+        on many laptops every write is a slow embedded controller
+        transaction, and some firmware stores it in NVRAM. A write or
+        read-back failing with a transient error is tried again following
+        :attr:`retry`. A start threshold that is not below ``limit`` is
+        cleared first, see :meth:`set_thresholds`.
+        
         Args:
             limit: Charge limit percentage (1-100)
-            
+            verify: Read the value back after writing
+        
+        Returns:
+            Whether the control file was written
+        
         Raises:
+            LimitMismatchError: If the read-back value differs from ``limit``
             BatteryControlError: If the operation fails
         """
-        if not 1 <= limit <= 100:
-            raise BatteryControlError(f"Charge limit must be between 1 and 100, got {limit}")
+        return self.set_thresholds(None, limit, verify)
+    
+    def set_thresholds(self, start: Optional[int], end: int, verify: bool = True) -> bool:
+        """Set the start and end thresholds as one transaction.
+        
+        Drivers reject a start threshold above the end threshold at every
+        write, so the two are written in the order that keeps each
+        intermediate pair valid: the start first when it fits below the
+        current end, the end first otherwise. Writers in other processes
+        wait on an advisory lock for the whole transaction (unless
+        :attr:`lock_writes` is off); readers never do. Thresholds already
+        in place are not written.
+        
+        Args:
+            start: Start threshold (0 to ``end - 1``), or ``None`` to keep
+                the current one, or to clear it to 0 if it is not below ``end``
+            end: Charge limit percentage (1-100)
+            verify: Read each value back after writing
+        
+        Returns:
+            Whether anything was written
+        
+        Raises:
+            LimitMismatchError: If a read-back value differs from the request
+            BatteryControlError: If the thresholds are invalid, the interface
+                has no start threshold, or a write fails
+        """
+        if not 1 <= end <= 100:
+            raise BatteryControlError(f"Charge limit must be between 1 and 100, got {end}")
+        if start is not None and not 0 <= start < end:
+            raise BatteryControlError(
+                f"Start threshold must be between 0 and {end - 1}, got {start}")
         
         if not self.control_file:
             raise BatteryControlError("No compatible battery control file found")
+        if start is not None and not self.supports_start_threshold():
+            raise BatteryControlError(
+                f"The {self.backend.label} interface has no start threshold")
         
-        try:
-            with open(self.control_file, 'w') as f:
-                f.write(str(limit))
-        except IOError as e:
-            raise BatteryControlError(f"Failed to write to control file: {e}")
+        with self._write_lock, (write_lock(self.control_file) if self.lock_writes
+                                else contextlib.nullcontext()):
+            previous = self.get_current_limit()
+            previous_start = self.get_start_threshold()
+            if start is None and previous_start is not None and previous_start >= end:
+                start = 0
+            if previous == end and start in (None, previous_start):
+                self.writes_avoided += 1
+                return False
+            
+            # (threshold, write, encoded value, read back, requested, previous)
+            backend = self.backend
+            steps = []
+            if backend.paired:
+                # One write sets both, so there is no intermediate pair
+                if start is None:
+                    start = previous_start or 0
+                steps.append(('end', backend.write, backend.encode_pair(start, end),
+                              self._read_end, end, previous))
+            else:
+                if previous != end:
+                    steps.append(('end', backend.write, backend.encode(end),
+                                  self._read_end, end, previous))
+                if start is not None and start != previous_start:
+                    step = ('start', backend.write_start, backend.encode_start(start),
+                            self._read_start, start, previous_start)
+                    if previous is not None and start <= previous:
+                        steps.insert(0, step)
+                    else:
+                        steps.append(step)
+            
+            for threshold, write, value, read, requested, before in steps:
+                actual = self._write_verified(write, value, read, verify)
+                if verify and actual != requested:
+                    raise LimitMismatchError(self.name, requested, actual, before, threshold)
+            if verify and backend.paired and start != previous_start:
+                actual = self.get_start_threshold()
+                if actual != start:
+                    raise LimitMismatchError(self.name, start, actual, previous_start, 'start')
+            return True
     
     def get_battery_info(self) -> Tuple[Optional[str], Optional[str]]:
         """Get battery information (model, manufacturer)."""
         if not self.control_file:
             return None, None
         
-        battery_dir = os.path.dirname(self.control_file)
+        return self.attributes.read_static('model_name'), self.attributes.read_static('manufacturer')
+    
+    def get_snapshot(self) -> Optional[BatterySnapshot]:
+        """Read the whole battery state from its ``uevent`` file.
+        
+        One read covers capacity, status, energy, power, model and
+        manufacturer; the control file is only read as well when the driver
+        does not report the threshold in ``uevent``.
+        
+        Returns:
+            The snapshot, or ``None`` if no battery is available
+        """
+        if not self.control_file:
+            return None
         
         try:
-            model_file = os.path.join(battery_dir, 'model_name')
-            manufacturer_file = os.path.join(battery_dir, 'manufacturer')
-            
-            model = None
-            manufacturer = None
-            
-            if os.path.exists(model_file):
-                with open(model_file, 'r') as f:
-                    model = f.read().strip()
-            
-            if os.path.exists(manufacturer_file):
-                with open(manufacturer_file, 'r') as f:
-                    manufacturer = f.read().strip()
-            
-            return model, manufacturer
-        except IOError:
-            return None, None
+            properties = parse_uevent(self.attributes.read_dynamic('uevent'))
+        except OSError:
+            properties = {}
+        
+        limit = start = None
+        if 'CHARGE_CONTROL_END_THRESHOLD' not in properties:
+            limit = self.get_current_limit()
+        if 'CHARGE_CONTROL_START_THRESHOLD' not in properties:
+            start = self.get_start_threshold()
+        return BatterySnapshot.from_properties(self.name, properties, limit, start)
     
     def get_control_file_path(self) -> Optional[str]:
         """Get the path to the control file being used."""
-        return self.control_file
\ No newline at end of file
+        return self.control_file
+
+
+class BatteryFleet:
+    """Controller for every battery on the system."""
+    
+    def __init__(self, use_mock: bool = False, base_path: Optional[str] = None,
+                 probe_cache: Optional[ProbeCache] = None, retry: Optional[RetryPolicy] = None):
+        """Discover all batteries and create a controller for each one.
+        
+        Args:
+            use_mock: Whether to use mock data for testing
+            base_path: Override for the ``power_supply`` root
+            probe_cache: Discovery results, see :class:`BatteryController`
+            retry: Retries of failed writes, see :class:`BatteryController`
+        """
+        self.use_mock = use_mock
+        if base_path is None:
+            base_path = (BatteryController.MOCK_BASE_PATH if use_mock
+                         else BatteryController.REAL_BASE_PATH)
+        if probe_cache is None:
+            probe_cache = ProbeCache(persistent=base_path == BatteryController.REAL_BASE_PATH)
+        self.base_path = base_path
+        self.probe_cache = probe_cache
+        self.retry = retry
+        self.controllers: Dict[str, BatteryController] = {}
+        for name in probe_cache.batteries(base_path):
+            controller = self._create(name)
+            if controller.is_supported():
+                self.controllers[name] = controller
+    
+    def _create(self, name: str) -> BatteryController:
+        return BatteryController(self.use_mock, battery=name, base_path=self.base_path,
+                                 probe_cache=self.probe_cache, retry=self.retry)
+    
+    def rediscover(self) -> Tuple[List[str], List[str]]:
+        """Probe the batteries again after one was added or removed.
+        
+        Controllers of batteries still present are kept with their caches.
+        
+        Returns:
+            Names of the batteries added and removed
+        """
+        found = self.probe_cache.batteries(self.base_path, refresh=True)
+        removed = [name for name in self.controllers if name not in found]
+        for name in removed:
+            self.controllers[name].close()
+        added = []
+        controllers = {}
+        for name in found:
+            controller = self.controllers.get(name)
+            if controller is None:
+                controller = self._create(name)
+                if not controller.is_supported():
+                    continue
+                added.append(name)
+            controllers[name] = controller
+        self.controllers = controllers
+        return added, removed
+    
+    def invalidate(self, names: Optional[Iterable[str]] = None) -> None:
+        """Forget cached attributes of the selected batteries after hotplug."""
+        for controller in self.select(names):
+            controller.invalidate()
+    
+    def close(self) -> None:
+        """Close descriptors kept open by every controller."""
+        for controller in self.controllers.values():
+            controller.close()
+    
+    def names(self) -> List[str]:
+        """Names of the batteries that support charge limiting."""
+        return list(self.controllers)
+    
+    def is_supported(self) -> bool:
+        """Check if at least one battery supports charge limiting."""
+        return bool(self.controllers)
+    
+    def select(self, names: Optional[Iterable[str]] = None) -> List[BatteryController]:
+        """Return the controllers for the given batteries (all if ``None``).
+        
+        Raises:
+            BatteryControlError: If a named battery is unknown or unsupported
+        """
+        if names is None:
+            return list(self.controllers.values())
+        
+        selected = []
+        for name in names:
+            controller = self.controllers.get(name)
+            if controller is None:
+                raise BatteryControlError(f"Battery {name} not found or not supported")
+            selected.append(controller)
+        return selected
+    
+    def write_stats(self) -> Dict[str, int]:
+        """Hardware writes performed, avoided and retried across all batteries."""
+        controllers = self.controllers.values()
+        return {
+            'hardware_writes': sum(c.hardware_writes for c in controllers),
+            'writes_avoided': sum(c.writes_avoided for c in controllers),
+            'write_retries': sum(c.write_retries for c in controllers),
+        }
+    
+    def get_limits(self, names: Optional[Iterable[str]] = None) -> Dict[str, Optional[int]]:
+        """Read the current charge limit of each selected battery."""
+        return {c.name: c.get_current_limit() for c in self.select(names)}
+    
+    def get_snapshots(self, names: Optional[Iterable[str]] = None) -> Dict[str, BatterySnapshot]:
+        """Read a snapshot of each selected battery."""
+        return {c.name: c.get_snapshot() for c in self.select(names)}
+    
+    def set_limits(self, limit: int, names: Optional[Iterable[str]] = None) -> List[str]:
+        """Set the charge limit on each selected battery.
+        
+        Every battery is attempted even if an earlier one fails.
+        
+        Args:
+            limit: Charge limit percentage (1-100)
+            names: Battery names to target; all supported batteries if ``None``
+        
+        Returns:
+            Names of the batteries that were updated
+        
+        Raises:
+            BatteryControlError: If no battery is available or any write fails
+        """
+        return self.set_thresholds(None, limit, names)
+    
+    def set_thresholds(self, start: Optional[int], end: int,
+                       names: Optional[Iterable[str]] = None) -> List[str]:
+        """Set the start and end thresholds on each selected battery.
+        
+        See :meth:`BatteryController.set_thresholds`; every battery is
+        attempted even if an earlier one fails.
+        
+        Returns:
+            Names of the batteries that were updated
+        
+        Raises:
+            BatteryControlError: If no battery is available or any write fails
+        """
+        if not 1 <= end <= 100:
+            raise BatteryControlError(f"Charge limit must be between 1 and 100, got {end}")
+        
+        controllers = self.select(names)
+        if not controllers:
+            raise BatteryControlError("No compatible battery control file found")
+        
+        updated = []
+        errors = []
+        for controller in controllers:
+            try:
+                controller.set_thresholds(start, end)
+                updated.append(controller.name)
+            except BatteryControlError as e:
+                errors.append(f"{controller.name}: {e}")
+        
+        if errors:
+            raise BatteryControlError("; ".join(errors))
+        return updated
+
+
+class LimitCoalescer:
+    """Debounce rapid limit requests into a single final write.
+    
+    Each request restarts a short timer; only the last requested limit is
+    written when it expires. Every caller gets a future that resolves with
+    the outcome of the write that covered its request.
+    
+    Requests never wait for a write: batches are queued in order and
+    written by whichever thread drains the queue, one at a time.
+    """
+    
+    def __init__(self, fleet: BatteryFleet, delay: float = 0.25,
+                 on_applied: Optional[Callable[[int, Optional[Tuple[str, ...]]], None]] = None):
+        """Initialize the coalescer.
+        
+        Args:
+            fleet: Batteries to write to
+            delay: Quiet period in seconds before the final write
+            on_applied: Called with the limit and battery names (``None`` for
+                all) after each successful final write of a request made
+                with ``save``, outside the request lock; its errors are
+                reported, not raised
+        """
+        self.fleet = fleet
+        self.delay = delay
+        self.on_applied = on_applied
+        self.requests = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        # Held while writing, so batches reach the firmware in request order
+        self._write_lock = threading.Lock()
+        self._batches: collections.deque = collections.deque()
+        self._timer: Optional[threading.Timer] = None
+        self._pending: Optional[Tuple[int, Optional[Tuple[str, ...]], Optional[int], bool]] = None
+        self._futures: List['concurrent.futures.Future'] = []
+    
+    def request(self, limit: int, names: Optional[Iterable[str]] = None,
+                start: Optional[int] = None,
+                save: bool = True) -> 'concurrent.futures.Future':
+        """Schedule ``limit`` to be written after the quiet period.
+        
+        A pending request for different batteries or another start
+        threshold is written right away, in the background, instead of
+        being replaced.
+        
+        Args:
+            limit: Charge limit percentage (1-100)
+            names: Batteries to write to (default: all)
+            start: Start threshold to write with it, see
+                :meth:`BatteryFleet.set_thresholds`
+            save: Pass the written limit to ``on_applied``; off for limits
+                the daemon applies on its own, e.g. from the schedule
+        
+        Returns:
+            Future resolving to the result of :meth:`BatteryFleet.set_thresholds`
+        
+        Raises:
+            BatteryControlError: If the limit is out of range
+        """
+        if not 1 <= limit <= 100:
+            raise BatteryControlError(f"Charge limit must be between 1 and 100, got {limit}")
+        import concurrent.futures
+        
+        key = tuple(names) if names is not None else None
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        queued = False
+        with self._lock:
+            self.requests += 1
+            if self._pending is not None and self._pending[1:] != (key, start, save):
+                queued = self._queue_locked()
+            elif self._pending is not None:
+                self.coalesced += 1
+            if self._timer is not None:
+                self._timer.cancel()
+            self._pending = (limit, key, start, save)
+            self._futures.append(future)
+            self._timer = threading.Timer(self.delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+        if queued:
+            threading.Thread(target=self._drain, daemon=True).start()
+        return future
+    
+    def flush(self) -> None:
+        """Write the pending request now, if any, and wait for queued writes."""
+        with self._lock:
+            self._queue_locked()
+        self._drain()
+    
+    def _queue_locked(self) -> bool:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._pending is None:
+            return False
+        self._batches.append((self._pending, self._futures))
+        self._pending, self._futures = None, []
+        return True
+    
+    def _drain(self) -> None:
+        with self._write_lock:
+            while True:
+                with self._lock:
+                    if not self._batches:
+                        return
+                    (limit, key, start, save), futures = self._batches.popleft()
+                self._write(limit, key, start, save, futures)
+    
+    def _write(self, limit: int, key: Optional[Tuple[str, ...]], start: Optional[int],
+               save: bool, futures: List['concurrent.futures.Future']) -> None:
+        try:
+            result = self.fleet.set_thresholds(start, limit, key)
+        except Exception as e:
+            # Backend OSError/ValueError too: a waiting client must get an answer
+            for future in futures:
+                future.set_exception(e)
+            return
+        for future in futures:
+            future.set_result(result)
+        if save and self.on_applied is not None:
+            try:
+                self.on_applied(limit, key)
+            except Exception as e:
+                # The limit is in place; later batches must still be written
+                print(f"Warning: after setting charge limit {limit}%: {e}", file=sys.stderr)
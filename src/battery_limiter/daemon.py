@@ -0,0 +1,591 @@
+"""Privileged battery limiter daemon serving a local Unix socket.
+
+The daemon owns the battery controllers, so unprivileged clients (the GUI
+and CLI) change limits with a single request instead of spawning sudo.
+
+Protocol: newline-delimited JSON. A request is
+``{"id": 1, "method": "get", "params": {...}}`` and is answered with
+``{"id": 1, "result": ...}`` or ``{"id": 1, "error": "..."}``. After a
+``subscribe`` request the connection also receives
+``{"event": "change", "battery": "BAT0", "snapshot": {...}}`` messages.
+
+Methods: ``batteries``, ``get``, ``snapshot``, ``set``, ``stats``,
+``subscribe``, ``schedule`` and ``set_schedule``. ``get``, ``snapshot``
+and ``set`` take an optional ``batteries`` list. ``set`` requests arriving
+in quick succession are coalesced into one write of the last limit.
+``set_schedule`` takes the schedule file ``text`` (see
+:mod:`battery_limiter.schedule`), which the daemon follows. It also
+follows the profiles and rules of the configuration file (see
+:mod:`battery_limiter.config`) as the time and power source change,
+reloading it whenever it is written. While the configuration has rules
+they take precedence and the schedule is suspended; neither writes its
+limits back to the file. ``stats`` includes per-battery latency
+histograms and state under ``batteries`` (see
+:func:`battery_limiter.metrics.fleet_metrics`); the same data can be
+published periodically for node_exporter with ``--textfile``.
+Anyone may read; ``set`` and ``set_schedule`` are limited to root and
+members of the allowed groups, checked with ``SO_PEERCRED``. Unknown or
+mistyped parameters are answered with an error before anything runs.
+"""
+
+import argparse
+import asyncio
+import grp
+import json
+import os
+import pwd
+import socket
+import struct
+import sys
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, Optional, Set
+
+from .apply import CONFIG_PATH
+from .client import DEFAULT_SOCKET_PATH, save_limit
+from .core import (BatteryControlError, BatteryController, BatteryFleet, BatterySnapshot,
+                   LimitCoalescer)
+from .config import ConfigFollower, ConfigWatcher, on_ac
+from .metrics import DEFAULT_TEXTFILE_PATH, fleet_metrics, format_prometheus, write_textfile
+from .schedule import (SCHEDULE_PATH, Schedule, ScheduleError, Scheduler, load_schedule,
+                       save_schedule)
+from .watch import BatteryWatcher
+
+
+DEFAULT_ALLOWED_GROUPS = ('wheel', 'sudo', 'admin', 'battery')
+
+# Quiet period before coalesced set requests are written
+COALESCE_DELAY = 0.25
+
+# Seconds between node_exporter textfile updates
+TEXTFILE_INTERVAL = 60.0
+
+# Subscribers that fall this far behind are disconnected
+MAX_PENDING_BYTES = 1 << 20
+
+_PEERCRED = struct.Struct('3i')
+
+# Parameters each method accepts; anything else is rejected
+METHOD_PARAMS = {
+    'batteries': (),
+    'get': ('batteries',),
+    'snapshot': ('batteries',),
+    'stats': (),
+    'subscribe': (),
+    'set': ('limit', 'start', 'batteries'),
+    'schedule': (),
+    'set_schedule': ('text',),
+}
+
+
+def peer_credentials(sock: socket.socket):
+    """Return ``(pid, uid, gid)`` of the process on the other end of ``sock``."""
+    data = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, _PEERCRED.size)
+    return _PEERCRED.unpack(data)
+
+
+class BatteryDaemon:
+    """Serve battery state and limit changes over a Unix socket."""
+    
+    def __init__(self, fleet: BatteryFleet, socket_path: str = DEFAULT_SOCKET_PATH,
+                 allowed_groups: Iterable[str] = DEFAULT_ALLOWED_GROUPS,
+                 allowed_uids: Iterable[int] = (), coalesce_delay: float = COALESCE_DELAY,
+                 schedule_path: Optional[str] = None, textfile_path: Optional[str] = None,
+                 textfile_interval: float = TEXTFILE_INTERVAL, config_path: Optional[str] = None):
+        """Initialize the daemon.
+        
+        Args:
+            fleet: Batteries to serve
+            socket_path: Path of the listening socket
+            allowed_groups: Groups whose members may change limits
+            allowed_uids: Additional users who may change limits
+            coalesce_delay: Seconds to wait for further set requests
+            schedule_path: Schedule file to follow (default:
+                :data:`~battery_limiter.schedule.SCHEDULE_PATH` on real
+                hardware, none otherwise)
+            textfile_path: Prometheus textfile to keep updated, if any
+            textfile_interval: Seconds between textfile updates
+            config_path: Configuration file to follow (default:
+                :data:`~battery_limiter.apply.CONFIG_PATH` on real
+                hardware, none otherwise)
+        """
+        self.fleet = fleet
+        self.socket_path = socket_path
+        self.allowed_gids = set()
+        for name in allowed_groups:
+            try:
+                self.allowed_gids.add(grp.getgrnam(name).gr_gid)
+            except KeyError:
+                pass
+        self.allowed_uids = {0, os.getuid()} | set(allowed_uids)
+        self.watcher: Optional[BatteryWatcher] = None
+        self.server: Optional[asyncio.AbstractServer] = None
+        self._subscribers: Set[asyncio.StreamWriter] = set()
+        self._clients: Dict[asyncio.Task, asyncio.StreamWriter] = {}
+        # Firmware writes can block; keep them off the loop and in order
+        self.coalescer = LimitCoalescer(
+            fleet, coalesce_delay, lambda limit, names: save_limit(fleet, limit, names))
+        self._poll_handle: Optional[asyncio.TimerHandle] = None
+        if schedule_path is None and fleet.base_path == BatteryController.REAL_BASE_PATH:
+            schedule_path = SCHEDULE_PATH
+        self.schedule_path = schedule_path
+        self.scheduler: Optional[Scheduler] = None
+        self._schedule_handle: Optional[asyncio.TimerHandle] = None
+        if config_path is None and fleet.base_path == BatteryController.REAL_BASE_PATH:
+            config_path = CONFIG_PATH
+        self.config_path = config_path
+        self.config: Optional[ConfigWatcher] = None
+        self.follower: Optional[ConfigFollower] = None
+        self._config_handle: Optional[asyncio.TimerHandle] = None
+        self.textfile_path = textfile_path
+        self.textfile_interval = textfile_interval
+        self._export_handle: Optional[asyncio.TimerHandle] = None
+    
+    def may_write(self, uid: int, gid: int) -> bool:
+        """Check whether a peer is allowed to change charge limits."""
+        if uid in self.allowed_uids or gid in self.allowed_gids:
+            return True
+        try:
+            user = pwd.getpwuid(uid).pw_name
+            return bool(self.allowed_gids.intersection(os.getgrouplist(user, gid)))
+        except (KeyError, OSError):
+            return False
+    
+    async def start(self) -> None:
+        """Listen on the socket and start watching the batteries."""
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self.server = await asyncio.start_unix_server(self._serve, path=self.socket_path,
+                                                      backlog=1024)
+        os.chmod(self.socket_path, 0o666)
+        
+        loop = asyncio.get_running_loop()
+        self.watcher = BatteryWatcher(self.fleet, self._broadcast,
+                                      supply_callback=self._on_supply_event)
+        for fd in self.watcher.filenos():
+            loop.add_reader(fd, self.watcher.handle, fd)
+        self._schedule_poll()
+        # Configuration first, so the scheduled limit is the last one written
+        self._start_config()
+        self._start_scheduler()
+        if self.textfile_path is not None:
+            self._export_metrics()
+    
+    def _export_metrics(self) -> None:
+        # Battery state comes from the watcher, so exporting reads no sysfs
+        try:
+            write_textfile(format_prometheus(fleet_metrics(self.fleet, self.watcher.state)),
+                           self.textfile_path)
+        except OSError as e:
+            print(f"Warning: cannot write metrics to {self.textfile_path}: {e}", file=sys.stderr)
+        loop = asyncio.get_running_loop()
+        self._export_handle = loop.call_later(self.textfile_interval, self._export_metrics)
+    
+    def _start_scheduler(self) -> None:
+        schedule = Schedule()
+        if self.schedule_path is not None:
+            try:
+                schedule = load_schedule(self.schedule_path)
+            except (OSError, ScheduleError) as e:
+                print(f"Warning: ignoring schedule {self.schedule_path}: {e}", file=sys.stderr)
+        self.scheduler = Scheduler(schedule, self._apply_scheduled)
+        fd = self.scheduler.fileno()
+        if fd is not None:
+            asyncio.get_running_loop().add_reader(fd, self._on_schedule_timer)
+        self.scheduler.update()
+        self._arm_schedule()
+    
+    def _schedule_suspended(self) -> bool:
+        """Whether configuration rules are in force, which take precedence."""
+        table = self.follower.table if self.follower is not None else None
+        return table is not None and table.rules > 0
+    
+    def _apply_scheduled(self, limit: int) -> None:
+        def report(future):
+            if future.exception() is not None:
+                print(f"Scheduled limit {limit}% failed: {future.exception()}", file=sys.stderr)
+        if self._schedule_suspended():
+            return
+        # Not saved: the file keeps the limit the schedule moves away from
+        self.coalescer.request(limit, save=False).add_done_callback(report)
+    
+    def _on_schedule_timer(self) -> None:
+        self.scheduler.handle()
+        self._arm_schedule()
+    
+    def _arm_schedule(self) -> None:
+        # Without a timerfd, fall back to a loop timer for the next transition
+        if self._schedule_handle is not None:
+            self._schedule_handle.cancel()
+            self._schedule_handle = None
+        timeout = self.scheduler.timeout()
+        if self.scheduler.fileno() is None and timeout is not None:
+            loop = asyncio.get_running_loop()
+            self._schedule_handle = loop.call_later(timeout, self._on_schedule_timer)
+    
+    def _start_config(self) -> None:
+        if self.config_path is None:
+            return
+        loop = asyncio.get_running_loop()
+        self.config = ConfigWatcher(self.config_path, self._on_config_change)
+        if self.config.error is not None:
+            print(f"Warning: ignoring configuration {self.config_path}: {self.config.error}",
+                  file=sys.stderr)
+        if self.config.fileno() is not None:
+            loop.add_reader(self.config.fileno(), self._on_config_file)
+        self.follower = ConfigFollower(self.fleet.controllers, self._apply_configured,
+                                       self.config.table, on_ac(self.fleet.base_path))
+        if self.follower.fileno() is not None:
+            loop.add_reader(self.follower.fileno(), self._on_config_timer)
+        self.follower.update()
+        self._arm_config()
+    
+    def _on_config_file(self) -> None:
+        if not self.config.handle() and self.config.error is not None:
+            print(f"Warning: keeping previous configuration, {self.config_path}: "
+                  f"{self.config.error}", file=sys.stderr)
+    
+    def _on_config_change(self, table) -> None:
+        suspended = self._schedule_suspended()
+        self.follower.set_table(table)
+        self._arm_config()
+        if suspended and not self._schedule_suspended() and self.scheduler is not None:
+            # The last rule is gone, so the schedule is back in force
+            self.scheduler.set_schedule(self.scheduler.schedule)
+            self._arm_schedule()
+    
+    def _apply_configured(self, start: Optional[int], end: int, names) -> None:
+        def report(future):
+            if future.exception() is not None:
+                print(f"Configured limit {end}% for {', '.join(names)} failed: "
+                      f"{future.exception()}", file=sys.stderr)
+        self.coalescer.request(end, names, start, save=False).add_done_callback(report)
+    
+    def _on_config_timer(self) -> None:
+        self.follower.handle()
+        self._arm_config()
+    
+    def _arm_config(self) -> None:
+        if self._config_handle is not None:
+            self._config_handle.cancel()
+            self._config_handle = None
+        timeout = self.follower.timeout()
+        if self.follower.fileno() is None and timeout is not None:
+            loop = asyncio.get_running_loop()
+            self._config_handle = loop.call_later(timeout, self._on_config_timer)
+    
+    def _schedule_state(self) -> Dict:
+        next_time = self.scheduler.next_time
+        return {
+            'text': self.scheduler.schedule.format(),
+            'limit': self.scheduler.current,
+            'next': next_time.isoformat(timespec='minutes') if next_time else None,
+            'suspended': self._schedule_suspended(),
+        }
+    
+    def _schedule_poll(self) -> None:
+        timeout = self.watcher.timeout()
+        if timeout is not None:
+            loop = asyncio.get_running_loop()
+            self._poll_handle = loop.call_later(timeout, self._poll)
+    
+    def _poll(self) -> None:
+        self.watcher.poll()
+        # Without uevents, plugging in or out is only seen here
+        self._on_supply_event(None)
+        self._schedule_poll()
+    
+    async def serve_forever(self) -> None:
+        await self.start()
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.stop()
+    
+    async def stop(self) -> None:
+        """Close the socket, every client and the watcher."""
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        if self._poll_handle is not None:
+            self._poll_handle.cancel()
+        if self._schedule_handle is not None:
+            self._schedule_handle.cancel()
+        if self._export_handle is not None:
+            self._export_handle.cancel()
+            self._export_handle = None
+        if self.scheduler is not None:
+            if self.scheduler.fileno() is not None:
+                asyncio.get_running_loop().remove_reader(self.scheduler.fileno())
+            self.scheduler.close()
+            self.scheduler = None
+        if self._config_handle is not None:
+            self._config_handle.cancel()
+            self._config_handle = None
+        if self.follower is not None:
+            if self.follower.fileno() is not None:
+                asyncio.get_running_loop().remove_reader(self.follower.fileno())
+            self.follower.close()
+            self.follower = None
+        if self.config is not None:
+            if self.config.fileno() is not None:
+                asyncio.get_running_loop().remove_reader(self.config.fileno())
+            self.config.close()
+            self.config = None
+        if self.watcher is not None:
+            loop = asyncio.get_running_loop()
+            for fd in self.watcher.filenos():
+                loop.remove_reader(fd)
+            self.watcher.close()
+            self.watcher = None
+        # Closing the transports ends each client's read loop
+        for writer in list(self._clients.values()):
+            writer.close()
+        await asyncio.gather(*self._clients, return_exceptions=True)
+        self._subscribers.clear()
+        self.coalescer.flush()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+    
+    def _on_supply_event(self, name: Optional[str]) -> None:
+        if self.follower is not None:
+            self.follower.set_power(on_ac(self.fleet.base_path))
+    
+    def _broadcast(self, name: str, snapshot: BatterySnapshot) -> None:
+        message = self._encode({'event': 'change', 'battery': name,
+                                'snapshot': snapshot.as_dict()})
+        for writer in list(self._subscribers):
+            if writer.transport.get_write_buffer_size() > MAX_PENDING_BYTES:
+                self._subscribers.discard(writer)
+                writer.close()
+                continue
+            writer.write(message)
+    
+    @staticmethod
+    def _encode(message: Dict) -> bytes:
+        return json.dumps(message, separators=(',', ':')).encode() + b'\n'
+    
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._clients[task] = writer
+        sock = writer.get_extra_info('socket')
+        try:
+            _pid, uid, gid = peer_credentials(sock)
+        except OSError:
+            uid = gid = -1
+        
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # Over the stream limit: the rest of the line cannot be
+                    # told apart from the next request, so answer and hang up
+                    writer.write(self._encode({'id': None, 'error': "Request too long"}))
+                    await writer.drain()
+                    break
+                if not line:
+                    break
+                response = await self._dispatch(line, uid, gid, writer)
+                writer.write(self._encode(response))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._subscribers.discard(writer)
+            self._clients.pop(task, None)
+            writer.close()
+    
+    async def _dispatch(self, line: bytes, uid: int, gid: int,
+                        writer: asyncio.StreamWriter) -> Dict:
+        try:
+            request = json.loads(line)
+            request_id = request.get('id')
+            method = request['method']
+            params = request.get('params') or {}
+        except (ValueError, KeyError, AttributeError):
+            return {'id': None, 'error': "Malformed request"}
+        
+        try:
+            self._check_params(method, params)
+            result = await self._call(method, params, uid, gid, writer)
+        except (BatteryControlError, OSError) as e:
+            return {'id': request_id, 'error': str(e)}
+        except Exception as e:
+            # Anything else is a bug, but the client still gets its reply
+            print(f"Error handling {method}: {e!r}", file=sys.stderr)
+            return {'id': request_id, 'error': f"Internal error: {e}"}
+        return {'id': request_id, 'result': result}
+    
+    @staticmethod
+    def _check_params(method: object, params: object) -> None:
+        """Reject unknown methods and parameters before anything runs.
+        
+        Raises:
+            BatteryControlError: Describing the first problem found
+        """
+        if not isinstance(method, str) or method not in METHOD_PARAMS:
+            raise BatteryControlError(f"Unknown method: {method}")
+        if not isinstance(params, dict):
+            raise BatteryControlError("'params' must be an object")
+        unknown = sorted(set(params) - set(METHOD_PARAMS[method]))
+        if unknown:
+            raise BatteryControlError(f"Unknown parameter for {method}: {', '.join(unknown)}")
+        names = params.get('batteries')
+        if names is not None and not (isinstance(names, list)
+                                      and all(isinstance(name, str) for name in names)):
+            raise BatteryControlError("'batteries' must be a list of names")
+        for key in ('limit', 'start'):
+            value = params.get(key)
+            if value is not None and (isinstance(value, bool) or not isinstance(value, int)):
+                raise BatteryControlError(f"'{key}' must be an integer")
+        if method == 'set' and params.get('limit') is None:
+            raise BatteryControlError("Missing 'limit'")
+        if method == 'set_schedule' and not isinstance(params.get('text'), str):
+            raise BatteryControlError("Missing or invalid 'text'")
+    
+    async def _call(self, method: str, params: Dict, uid: int, gid: int,
+                    writer: asyncio.StreamWriter):
+        names = params.get('batteries')
+        loop = asyncio.get_running_loop()
+        if method == 'batteries':
+            return self.fleet.names()
+        # Firmware reads can block; keep them off the loop
+        if method == 'get':
+            return await loop.run_in_executor(None, self.fleet.get_limits, names)
+        if method == 'snapshot':
+            snapshots = await loop.run_in_executor(None, self.fleet.get_snapshots, names)
+            return {name: s.as_dict() for name, s in snapshots.items()}
+        if method == 'stats':
+            stats = self.fleet.write_stats()
+            stats['set_requests'] = self.coalescer.requests
+            stats['set_coalesced'] = self.coalescer.coalesced
+            stats['batteries'] = fleet_metrics(self.fleet, self.watcher.state)
+            return stats
+        if method == 'subscribe':
+            self._subscribers.add(writer)
+            return {name: s.as_dict() for name, s in self.watcher.state.items()}
+        if method == 'set':
+            if not self.may_write(uid, gid):
+                raise BatteryControlError("Permission denied: not allowed to change charge limits")
+            return await asyncio.wrap_future(
+                self.coalescer.request(params['limit'], names, params.get('start')))
+        if method == 'schedule':
+            return self._schedule_state()
+        if method == 'set_schedule':
+            if not self.may_write(uid, gid):
+                raise BatteryControlError("Permission denied: not allowed to change the schedule")
+            try:
+                schedule = Schedule.parse(params['text'])
+            except ScheduleError as e:
+                raise BatteryControlError(f"Invalid schedule: {e}")
+            if self.schedule_path is not None:
+                try:
+                    await loop.run_in_executor(None, save_schedule, schedule,
+                                               self.schedule_path)
+                except OSError as e:
+                    raise BatteryControlError(f"Cannot save schedule: {e}")
+            self.scheduler.set_schedule(schedule)
+            self._arm_schedule()
+            return self._schedule_state()
+        raise BatteryControlError(f"Unknown method: {method}")
+
+
+@contextmanager
+def local_daemon(use_mock: bool = True, base_path: Optional[str] = None) -> Iterator[str]:
+    """Run a daemon on a private socket in a background thread.
+    
+    Intended for testing clients against ``mock_sys`` or a generated tree.
+    
+    Yields:
+        Path of the daemon socket
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        socket_path = os.path.join(tmp, 'daemon.sock')
+        daemon = BatteryDaemon(BatteryFleet(use_mock=use_mock, base_path=base_path), socket_path)
+        loop = asyncio.new_event_loop()
+        started = threading.Event()
+        
+        def run():
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(daemon.start())
+            started.set()
+            loop.run_forever()
+            loop.run_until_complete(daemon.stop())
+            loop.close()
+        
+        thread = threading.Thread(target=run, name='battery-daemon', daemon=True)
+        thread.start()
+        started.wait()
+        try:
+            yield socket_path
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+
+
+def main():
+    """Entry point for ``battery-limiter-daemon``."""
+    parser = argparse.ArgumentParser(description="Battery charge limiter daemon")
+    parser.add_argument(
+        '--socket',
+        default=DEFAULT_SOCKET_PATH,
+        help=f"Socket path (default: {DEFAULT_SOCKET_PATH})"
+    )
+    parser.add_argument(
+        '--group',
+        action='append',
+        metavar='NAME',
+        help="Group allowed to change limits; may be repeated "
+             f"(default: {', '.join(DEFAULT_ALLOWED_GROUPS)})"
+    )
+    parser.add_argument(
+        '--mock',
+        action='store_true',
+        help="Use mock environment for testing"
+    )
+    parser.add_argument(
+        '--schedule',
+        metavar='PATH',
+        help=f"Schedule file to follow (default: {SCHEDULE_PATH}, none with --mock)"
+    )
+    parser.add_argument(
+        '--config',
+        metavar='PATH',
+        help=f"Configuration file to follow (default: {CONFIG_PATH}, none with --mock)"
+    )
+    parser.add_argument(
+        '--textfile',
+        nargs='?',
+        const=DEFAULT_TEXTFILE_PATH,
+        metavar='PATH',
+        help="Keep a Prometheus textfile collector file updated "
+             f"(default path: {DEFAULT_TEXTFILE_PATH})"
+    )
+    parser.add_argument(
+        '--textfile-interval',
+        type=float,
+        default=TEXTFILE_INTERVAL,
+        metavar='SECONDS',
+        help=f"Seconds between textfile updates (default: {TEXTFILE_INTERVAL:g})"
+    )
+    args = parser.parse_args()
+    
+    fleet = BatteryFleet(use_mock=args.mock)
+    if not fleet.is_supported():
+        print("❌ Battery charge limiting is not supported on this system.")
+        sys.exit(1)
+    
+    daemon = BatteryDaemon(fleet, args.socket, args.group or DEFAULT_ALLOWED_GROUPS,
+                           schedule_path=args.schedule, textfile_path=args.textfile,
+                           textfile_interval=args.textfile_interval, config_path=args.config)
+    try:
+        asyncio.run(daemon.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+"""Time-to-limit and time-to-empty estimates from the energy trend.
+
+:class:`EnergyTrend` fits a straight line to ``energy_now`` over time by
+exponentially weighted least squares. It keeps a handful of decayed sums
+relative to the latest sample, so each sample costs a few multiplications
+however long the trend has been followed, and older samples fade out
+with a configurable half-life.
+
+The load of a laptop wanders, so energy readings drift around the line
+rather than scatter independently; the residuals of the fit alone would
+give far too narrow bounds. The trend therefore also follows the spread
+of the rates between consecutive samples. :class:`ChargeEstimator` turns
+both into a confidence interval of the time left that covers the error
+of the slope and the load wandering further until the target is reached.
+
+While charging, the time is estimated up to the charge limit (that share
+of ``energy_full``); while discharging, down to empty. The fit restarts
+when the status changes, and repeated readings are skipped, as drivers
+only refresh ``energy_now`` every so often. Drivers that report charge
+instead of energy are fitted in µAh. Until the fit has enough samples,
+the instantaneous ``power_now`` (or ``current_now``) is used instead,
+without bounds.
+"""
+
+import math
+import time
+from typing import Dict, Mapping, Optional, Tuple
+
+from .core import BatterySnapshot
+from .sampler import MISSING, STATUS_NAMES
+
+
+class EnergyTrend:
+    """Exponentially weighted linear regression of a value against time.
+    
+    Times and values are stored relative to the latest sample, which keeps
+    the sums small and the fit numerically stable over long runs. The rates
+    between consecutive samples are summed with the same weights.
+    """
+    
+    __slots__ = ('decay_rate', 'time', 'value', '_w', '_w2', '_wt', '_wv', '_wtt', '_wtv', '_wvv',
+                 '_r', '_rr', '_rn', '_rdt')
+    
+    def __init__(self, half_life: float = 600.0):
+        """Initialize an empty trend.
+        
+        Args:
+            half_life: Age in seconds at which a sample counts half
+        """
+        if half_life <= 0:
+            raise ValueError("Half-life must be positive")
+        self.decay_rate = math.log(2) / half_life
+        self.reset()
+    
+    def reset(self) -> None:
+        """Forget every sample."""
+        self.time: Optional[float] = None
+        self.value: Optional[float] = None
+        self._w = self._w2 = self._wt = self._wv = self._wtt = self._wtv = self._wvv = 0.0
+        self._r = self._rr = self._rn = self._rdt = 0.0
+    
+    def update(self, timestamp: float, value: float) -> None:
+        """Add one sample; a timestamp before the latest one restarts the fit."""
+        if self.time is not None:
+            dt = timestamp - self.time
+            if dt < 0:
+                self.reset()
+            else:
+                # Move the origin to the new sample, then age the old ones
+                dv = value - self.value
+                w, wt, wv = self._w, self._wt, self._wv
+                decay = math.exp(-self.decay_rate * dt)
+                self._wtt = (self._wtt - 2 * dt * wt + dt * dt * w) * decay
+                self._wtv = (self._wtv - dt * wv - dv * wt + dt * dv * w) * decay
+                self._wvv = (self._wvv - 2 * dv * wv + dv * dv * w) * decay
+                self._wt = (wt - dt * w) * decay
+                self._wv = (wv - dv * w) * decay
+                self._w = w * decay
+                self._w2 *= decay * decay
+                if dt > 0:
+                    rate = dv / dt
+                    self._r = self._r * decay + rate
+                    self._rr = self._rr * decay + rate * rate
+                    self._rn = self._rn * decay + 1.0
+                    self._rdt = self._rdt * decay + dt
+        self.time = timestamp
+        self.value = value
+        self._w += 1.0
+        self._w2 += 1.0
+    
+    @property
+    def effective_samples(self) -> float:
+        """Number of equally weighted samples the fit is worth."""
+        return self._w * self._w / self._w2 if self._w2 else 0.0
+    
+    @property
+    def diffusion(self) -> float:
+        """How fast the value wanders off the line: variance per second.
+        
+        The variance of the rates between samples times the mean interval;
+        over ``T`` seconds the value drifts by about ``sqrt(diffusion * T)``.
+        """
+        if self._rn < 2:
+            return 0.0
+        mean = self._r / self._rn
+        return max(self._rr / self._rn - mean * mean, 0.0) * self._rdt / self._rn
+    
+    def fit(self, min_samples: float = 3.0) -> Optional[Tuple[float, float]]:
+        """Fitted slope and its standard error, in value units per second.
+        
+        The standard error is the larger of the least-squares one and the
+        spread of the rates between samples over the effective sample count.
+        
+        Args:
+            min_samples: Effective samples needed for a fit
+        
+        Returns:
+            ``(slope, standard error)``, or ``None`` with too few samples
+            or no spread in time
+        """
+        w = self._w
+        n = self.effective_samples
+        if n < min_samples or n <= 2:
+            return None
+        sxx = self._wtt - self._wt * self._wt / w
+        if sxx <= 0:
+            return None
+        sxy = self._wtv - self._wt * self._wv / w
+        syy = self._wvv - self._wv * self._wv / w
+        slope = sxy / sxx
+        residual = max(syy - slope * sxy, 0.0)
+        variance = residual / w * n / (n - 2) / sxx
+        if self._rn >= 2:
+            mean = self._r / self._rn
+            variance = max(variance, (self._rr / self._rn - mean * mean) / n)
+        return slope, math.sqrt(variance)
+
+
+class Estimate:
+    """Time left until a battery reaches its charge limit or runs empty."""
+    
+    __slots__ = ('name', 'charging', 'target', 'seconds', 'low', 'high', 'method')
+    
+    def __init__(self, name: str, charging: bool, target: int, seconds: float,
+                 low: Optional[float] = None, high: Optional[float] = None,
+                 method: str = 'trend'):
+        """Initialize the estimate.
+        
+        Args:
+            name: Battery name
+            charging: Whether this is the time to the limit or to empty
+            target: Charge in percent at the end of that time
+            seconds: Best estimate of the time left
+            low: Lower confidence bound, or ``None`` if unknown
+            high: Upper confidence bound, or ``None`` if unknown or unbounded
+            method: ``'trend'`` for the fitted trend, ``'power'`` for the
+                instantaneous rate
+        """
+        self.name = name
+        self.charging = charging
+        self.target = target
+        self.seconds = seconds
+        self.low = low
+        self.high = high
+        self.method = method
+    
+    def as_dict(self) -> Dict[str, object]:
+        """Return the estimate as a plain dictionary."""
+        return {field: getattr(self, field) for field in self.__slots__}
+    
+    def __repr__(self) -> str:
+        values = ", ".join(f"{f}={getattr(self, f)!r}" for f in self.__slots__)
+        return f"Estimate({values})"
+
+
+def format_duration(seconds: float) -> str:
+    """Format a duration as hours and minutes, e.g. ``2 h 05 min``."""
+    minutes = int(round(seconds / 60))
+    if minutes < 1:
+        return "< 1 min"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours} h {minutes:02d} min" if hours else f"{minutes} min"
+
+
+def format_estimate(estimate: Estimate) -> str:
+    """Describe an estimate, e.g. ``1 h 05 min to 80% (55 min – 1 h 20 min)``."""
+    goal = f"to {estimate.target}%" if estimate.charging else "to empty"
+    text = f"{format_duration(estimate.seconds)} {goal}"
+    if estimate.method != 'trend':
+        return f"about {text}"
+    low = format_duration(estimate.low)
+    if estimate.high is None:
+        return f"{text} ({low} or more)"
+    high = format_duration(estimate.high)
+    if low == high:
+        return text
+    return f"{text} ({low} – {high})"
+
+
+def _levels(snapshot: BatterySnapshot) -> Tuple[Optional[int], Optional[int], Optional[int], str]:
+    """Current and full level, rate and units of a snapshot: energy if reported, else charge."""
+    if snapshot.energy_now is not None:
+        return snapshot.energy_now, snapshot.energy_full, snapshot.power_now, 'energy'
+    return snapshot.charge_now, snapshot.charge_full, snapshot.current_now, 'charge'
+
+
+class ChargeEstimator:
+    """Follow the energy trend of each battery and estimate its time left."""
+    
+    def __init__(self, half_life: float = 600.0, z: float = 1.96, min_samples: float = 3.0,
+                 clock=time.time):
+        """Initialize the estimator.
+        
+        Args:
+            half_life: Age in seconds at which a sample counts half; shorter
+                follows load changes faster, longer gives tighter bounds
+            z: Width of the confidence interval in standard errors of the
+                slope (1.96 for 95%)
+            min_samples: Effective samples needed before the trend is used
+            clock: Time source for snapshots recorded without a timestamp
+        """
+        self.half_life = half_life
+        self.z = z
+        self.min_samples = min_samples
+        self.clock = clock
+        self.trends: Dict[str, EnergyTrend] = {}
+        # Status and units each trend was fitted under
+        self._phases: Dict[str, Tuple[Optional[str], str]] = {}
+    
+    def _observe(self, name: str, timestamp: float, status: Optional[str],
+                 level: Optional[int], units: str) -> None:
+        trend = self.trends.get(name)
+        if trend is None:
+            trend = self.trends[name] = EnergyTrend(self.half_life)
+        phase = (status, units)
+        if self._phases.get(name) != phase:
+            self._phases[name] = phase
+            trend.reset()
+        if level is not None and level != trend.value:
+            trend.update(timestamp, level)
+    
+    def observe(self, snapshot: BatterySnapshot, timestamp: float) -> None:
+        """Add a snapshot to its battery's trend."""
+        level, _full, _rate, units = _levels(snapshot)
+        self._observe(snapshot.name, timestamp, snapshot.status, level, units)
+    
+    def update(self, snapshot: BatterySnapshot, timestamp: float) -> Optional[Estimate]:
+        """Add a snapshot to its battery's trend and estimate the time left."""
+        self.observe(snapshot, timestamp)
+        return self.estimate(snapshot)
+    
+    def fit_history(self, name: str, columns: Mapping) -> int:
+        """Bootstrap a battery's trend from recorded history.
+        
+        Args:
+            name: Battery the history belongs to
+            columns: Result of :meth:`~battery_limiter.history.HistoryStore.query`
+        
+        Returns:
+            Number of samples fed to the trend
+        """
+        timestamps = columns['timestamp']
+        energy = columns['energy']
+        status = columns['status']
+        for i in range(len(timestamps)):
+            value = int(energy[i])
+            self._observe(name, float(timestamps[i]), STATUS_NAMES.get(int(status[i])),
+                          None if value == MISSING else value, 'energy')
+        return len(timestamps)
+    
+    def estimate(self, snapshot: BatterySnapshot) -> Optional[Estimate]:
+        """Time until the battery reaches its limit (charging) or empty (discharging).
+        
+        Returns:
+            The estimate, or ``None`` when the battery is neither charging
+            nor discharging, is already past the limit, or reports no rate
+        """
+        level, full, rate, units = _levels(snapshot)
+        charging = snapshot.status == 'Charging'
+        if level is None or not (charging or snapshot.status == 'Discharging'):
+            return None
+        if charging:
+            if not full:
+                return None
+            target = snapshot.limit or 100
+            remaining = full * target / 100 - level
+        else:
+            target = 0
+            remaining = level
+        if remaining <= 0:
+            return None
+        
+        fit = None
+        if self._phases.get(snapshot.name) == (snapshot.status, units):
+            trend = self.trends[snapshot.name]
+            fit = trend.fit(self.min_samples)
+        if fit is not None:
+            slope, error = fit
+            speed = slope if charging else -slope
+            if speed > 0:
+                # Mean speed until the target: error of the slope plus the
+                # load wandering over the time left
+                variance = error * error + trend.diffusion * speed / remaining
+                margin = self.z * math.sqrt(variance)
+                slow = speed - margin
+                return Estimate(snapshot.name, charging, target, remaining / speed,
+                                remaining / (speed + margin),
+                                remaining / slow if slow > 0 else None)
+        if rate:
+            # µW against µWh (or µA against µAh): per hour
+            return Estimate(snapshot.name, charging, target, remaining / abs(rate) * 3600,
+                            method='power')
+        return None
+    
+    def record(self, name: str, snapshot: BatterySnapshot,
+               timestamp: Optional[float] = None) -> Optional[Estimate]:
+        """Suitable as a :class:`~battery_limiter.watch.BatteryWatcher` callback."""
+        if snapshot is None:
+            return None
+        if timestamp is None:
+            timestamp = self.clock()
+        return self.update(snapshot, timestamp)
@@ -1,33 +1,256 @@
-"""Graphical user interface for battery charge limiter."""
+"""Graphical user interface for battery charge limiter.
 
+All sysfs and daemon I/O runs on thread pools so a slow embedded
+controller or a hung write never blocks the event loop: reads go through
+one worker, writes through another, and results come back as queued
+signals. A new limit supersedes an apply that has not started yet.
+
+Widgets are only touched when the value they show changes, and tray icons
+are rendered once per quantized battery state and reused from a small
+cache.
+
+The window shows with the charge limit controls only; battery discovery,
+the schedule, info and health groups, the tray icon and its menus are set
+up after the first paint. History, analytics and watcher modules are
+imported on the read worker when first needed.
+"""
+
+import argparse
 import sys
 import os
 import math
-from typing import Optional
-from PyQt6.QtWidgets import (
-    QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, QWidget,
-    QLabel, QSlider, QPushButton, QGroupBox, QGridLayout,
-    QMessageBox, QSystemTrayIcon, QMenu, QProgressBar, QFrame
-)
-from PyQt6.QtCore import Qt, QTimer
-from PyQt6.QtGui import QIcon, QAction, QPixmap, QPainter, QPen, QBrush, QFont
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+
+try:
+    from PyQt6.QtWidgets import (
+        QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, QWidget,
+        QLabel, QSlider, QPushButton, QGroupBox, QGridLayout,
+        QMessageBox, QSystemTrayIcon, QMenu, QProgressBar, QFrame, QComboBox, QPlainTextEdit
+    )
+    from PyQt6.QtCore import (
+        Qt, QTimer, QSocketNotifier, QObject, QPoint, QRunnable, QThreadPool, pyqtSignal
+    )
+    from PyQt6.QtGui import QIcon, QAction, QPixmap, QPainter, QPen, QBrush, QFont, QColor, QPolygon
+except ImportError as e:  # pragma: no cover - optional dependency
+    raise ImportError(
+        "The GUI needs PyQt6; install it with: pip install 'battery-charge-limiter[gui]'"
+    ) from e
+
+from .core import BatteryController, BatteryControlError, BatteryFleet
+from .estimate import ChargeEstimator, format_estimate
+from .client import apply_limits, read_schedule, write_schedule
+
+
+def set_text(label: QLabel, text: str) -> None:
+    """Update a label only when its text changes, sparing a relayout and repaint."""
+    if label.text() != text:
+        label.setText(text)
+
 
-from .core import BatteryController, BatteryControlError
+def render_battery_icon(level: Optional[int], limit: Optional[int], charging: bool) -> QIcon:
+    """Paint a battery icon showing charge level, limit and charging state.
+    
+    Args:
+        level: State of charge in percent, or ``None`` if unknown
+        limit: Charge limit in percent, or ``None`` if unknown
+        charging: Whether to draw the charging bolt
+    """
+    pixmap = QPixmap(64, 64)
+    pixmap.fill(Qt.GlobalColor.transparent)
+    
+    painter = QPainter(pixmap)
+    painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+    
+    # Battery body and terminal
+    painter.setPen(QPen(Qt.GlobalColor.black, 3))
+    painter.setBrush(QBrush(Qt.GlobalColor.lightGray))
+    painter.drawRoundedRect(8, 18, 44, 28, 3, 3)
+    painter.drawRect(52, 26, 5, 12)
+    
+    # Charge level: green up to the limit, amber above it, red when low
+    if level:
+        if level <= 20:
+            color = QColor('#d32f2f')
+        elif limit is not None and level > limit:
+            color = QColor('#f9a825')
+        else:
+            color = QColor('#2e7d32')
+        painter.setPen(Qt.PenStyle.NoPen)
+        painter.setBrush(QBrush(color))
+        painter.drawRect(11, 21, round(38 * level / 100), 22)
+    
+    # Limit marker
+    if limit is not None and limit < 100:
+        painter.setPen(QPen(Qt.GlobalColor.red, 3))
+        x = 11 + round(38 * limit / 100)
+        painter.drawLine(x, 14, x, 50)
+    
+    if charging:
+        painter.setPen(QPen(Qt.GlobalColor.black, 1))
+        painter.setBrush(QBrush(QColor('#ffeb3b')))
+        painter.drawPolygon(QPolygon([
+            QPoint(33, 16), QPoint(22, 34), QPoint(30, 34),
+            QPoint(26, 48), QPoint(39, 29), QPoint(31, 29),
+        ]))
+    
+    painter.end()
+    return QIcon(pixmap)
+
+
+class BatteryIconCache:
+    """Tray icons for quantized battery states, least recently used evicted."""
+    
+    def __init__(self, size: int = 16, level_step: int = 10, limit_step: int = 5):
+        """Initialize the cache.
+        
+        Args:
+            size: Icons kept
+            level_step: Charge level bucket in percent
+            limit_step: Limit bucket in percent
+        """
+        self.size = size
+        self.level_step = level_step
+        self.limit_step = limit_step
+        self.icons: 'OrderedDict[Tuple, QIcon]' = OrderedDict()
+        self.renders = 0
+        self.hits = 0
+    
+    def key(self, capacity: Optional[int], limit: Optional[int], charging: bool) -> Tuple:
+        """Bucket a battery state; states in one bucket share an icon."""
+        level = None
+        if capacity is not None:
+            level = min(100, max(0, round(capacity / self.level_step) * self.level_step))
+        if limit is not None:
+            limit = min(100, max(0, round(limit / self.limit_step) * self.limit_step))
+        return level, limit, bool(charging)
+    
+    def icon(self, capacity: Optional[int], limit: Optional[int], charging: bool) -> QIcon:
+        """Icon for a battery state, rendered only on a cache miss."""
+        key = self.key(capacity, limit, charging)
+        icon = self.icons.get(key)
+        if icon is not None:
+            self.icons.move_to_end(key)
+            self.hits += 1
+            return icon
+        icon = render_battery_icon(*key)
+        self.renders += 1
+        self.icons[key] = icon
+        if len(self.icons) > self.size:
+            self.icons.popitem(last=False)
+        return icon
+
+
+class TaskSignals(QObject):
+    """Outcome of a :class:`Task`, delivered to the thread that connected."""
+    
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(object)
+
+
+class Task(QRunnable):
+    """Run a callable on a :class:`QThreadPool` and signal its outcome."""
+    
+    def __init__(self, func: Callable[[], object]):
+        super().__init__()
+        self.func = func
+        self.signals = TaskSignals()
+        # Kept alive by the window until delivered; see run_in_background
+        self.setAutoDelete(False)
+    
+    def run(self):
+        try:
+            result = self.func()
+        except Exception as e:
+            self.signals.failed.emit(e)
+        else:
+            self.signals.finished.emit(result)
 
 
 class BatteryLimiterGUI(QMainWindow):
     """Main application window for battery charge limiter."""
     
-    def __init__(self):
+    # Emitted from the read worker when the watcher sees a change
+    battery_changed = pyqtSignal()
+    
+    def __init__(self, fleet: Optional[BatteryFleet] = None, use_mock: bool = False):
+        """Create the window with its controls; see :meth:`finish_setup` for the rest.
+        
+        Args:
+            fleet: Batteries to control; discovered after the first paint
+                if not given
+            use_mock: Use the mock environment when discovering batteries
+        """
         super().__init__()
-        self.controller = BatteryController()
+        self.fleet = fleet
+        self.use_mock = use_mock
+        self.setup_started = False
+        self.setup_done = False
         self.current_limit = None
+        # Reads and writes each get one worker: reads never wait behind a
+        # hung write, and neither kind runs concurrently with itself
+        self.read_pool = QThreadPool(self)
+        self.read_pool.setMaxThreadCount(1)
+        self.write_pool = QThreadPool(self)
+        self.write_pool.setMaxThreadCount(1)
+        # Let running I/O finish before Qt tears the signal objects down
+        QApplication.instance().aboutToQuit.connect(self.wait_for_tasks)
+        self.tasks = set()
+        self.refreshing = False
+        self.refresh_again = False
+        self.apply_task: Optional[Task] = None
+        self.apply_generation = 0
+        self.applying_limit = None
+        self.watcher = None
+        self.sampler = None
+        # Time to the limit or to empty, fed from every displayed read
+        self.estimator = ChargeEstimator()
+        self.icons = BatteryIconCache()
+        self.icon_key = None
+        self.icon_updates = 0
+        self.battery_changed.connect(self.update_display)
+        # Rapid clicks (tray menu, presets) collapse into one write
+        self.pending_limit = None
+        self.apply_timer = QTimer(self)
+        self.apply_timer.setSingleShot(True)
+        self.apply_timer.setInterval(250)
+        self.apply_timer.timeout.connect(self.write_pending_limit)
         self.init_ui()
+    
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.setup_started:
+            self.setup_started = True
+            QTimer.singleShot(0, self.finish_setup)
+    
+    def finish_setup(self):
+        """Build the secondary widgets and tray, then discover the batteries.
+        
+        Runs once, right after the first paint. Windows that are never
+        shown (e.g. started to the tray) need to call it themselves.
+        """
+        self.setup_started = True
+        self.init_details()
         self.create_system_tray()
+        self.load_schedule()
+        if self.fleet is not None:
+            self.on_fleet_ready(self.fleet)
+        else:
+            self.run_in_background(self.read_pool, lambda: BatteryFleet(use_mock=self.use_mock),
+                                   self.on_fleet_ready)
+    
+    def on_fleet_ready(self, fleet):
+        """Fill in the battery selector and start following the batteries."""
+        self.fleet = fleet
+        for name in fleet.names():
+            self.battery_combo.addItem(name, name)
+        self.battery_combo.currentIndexChanged.connect(self.update_display)
         self.check_battery_support()
-        self.update_timer = QTimer()
-        self.update_timer.timeout.connect(self.update_display)
-        self.update_timer.start(5000)  # Update every 5 seconds
+        self.start_watcher()
+        self.setup_done = True
+        if self.pending_limit is not None:
+            self.apply_timer.start()
     
     def init_ui(self):
         """Initialize the user interface."""
@@ -71,14 +294,25 @@ class BatteryLimiterGUI(QMainWindow):
         self.control_group = QGroupBox("Charge Limit Control")
         control_layout = QGridLayout()
         
+        # Battery selector
+        control_layout.addWidget(QLabel("Battery:"), 0, 0)
+        self.battery_combo = QComboBox()
+        self.battery_combo.addItem("All batteries", None)
+        control_layout.addWidget(self.battery_combo, 0, 1)
+        
         # Current limit display
-        control_layout.addWidget(QLabel("Current Limit:"), 0, 0)
+        control_layout.addWidget(QLabel("Current Limit:"), 1, 0)
         self.current_limit_label = QLabel("Unknown")
         self.current_limit_label.setStyleSheet("font-weight: bold; color: #2e7d32;")
-        control_layout.addWidget(self.current_limit_label, 0, 1)
+        control_layout.addWidget(self.current_limit_label, 1, 1)
+        
+        # Estimated time to the limit or to empty
+        control_layout.addWidget(QLabel("Time Left:"), 2, 0)
+        self.time_left_label = QLabel("Unknown")
+        control_layout.addWidget(self.time_left_label, 2, 1)
         
         # Limit slider
-        control_layout.addWidget(QLabel("Set New Limit:"), 1, 0)
+        control_layout.addWidget(QLabel("Set New Limit:"), 3, 0)
         
         slider_layout = QHBoxLayout()
         self.limit_slider = QSlider(Qt.Orientation.Horizontal)
@@ -95,7 +329,7 @@ class BatteryLimiterGUI(QMainWindow):
         slider_layout.addWidget(self.limit_slider)
         slider_layout.addWidget(self.limit_value_label)
         
-        control_layout.addLayout(slider_layout, 1, 1)
+        control_layout.addLayout(slider_layout, 3, 1)
         
         # Preset buttons
         preset_layout = QHBoxLayout()
@@ -106,8 +340,8 @@ class BatteryLimiterGUI(QMainWindow):
             btn.clicked.connect(lambda checked, v=value: self.set_preset(v))
             preset_layout.addWidget(btn)
         
-        control_layout.addWidget(QLabel("Quick Presets:"), 2, 0)
-        control_layout.addLayout(preset_layout, 2, 1)
+        control_layout.addWidget(QLabel("Quick Presets:"), 4, 0)
+        control_layout.addLayout(preset_layout, 4, 1)
         
         # Apply button
         self.apply_button = QPushButton("Apply Limit")
@@ -128,11 +362,45 @@ class BatteryLimiterGUI(QMainWindow):
             }
         """)
         self.apply_button.clicked.connect(self.apply_limit)
-        control_layout.addWidget(self.apply_button, 3, 0, 1, 2)
+        control_layout.addWidget(self.apply_button, 5, 0, 1, 2)
         
         self.control_group.setLayout(control_layout)
+        # Enabled once the batteries are found
+        self.control_group.setEnabled(False)
         layout.addWidget(self.control_group)
         
+        layout.addStretch()
+        central_widget.setLayout(layout)
+        self.main_layout = layout
+    
+    def init_details(self):
+        """Add the schedule, info and health groups below the controls."""
+        layout = QVBoxLayout()
+        
+        # Schedule section
+        schedule_group = QGroupBox("Schedule")
+        schedule_layout = QVBoxLayout()
+        
+        self.schedule_edit = QPlainTextEdit()
+        self.schedule_edit.setPlaceholderText("mon-fri 22:00 60\nmon-fri 06:00 100")
+        self.schedule_edit.setMaximumHeight(90)
+        schedule_layout.addWidget(self.schedule_edit)
+        
+        self.schedule_status_label = QLabel("")
+        schedule_layout.addWidget(self.schedule_status_label)
+        
+        schedule_buttons = QHBoxLayout()
+        reload_schedule_button = QPushButton("Reload")
+        reload_schedule_button.clicked.connect(self.load_schedule)
+        save_schedule_button = QPushButton("Save Schedule")
+        save_schedule_button.clicked.connect(self.save_schedule)
+        schedule_buttons.addWidget(reload_schedule_button)
+        schedule_buttons.addWidget(save_schedule_button)
+        schedule_layout.addLayout(schedule_buttons)
+        
+        schedule_group.setLayout(schedule_layout)
+        layout.addWidget(schedule_group)
+        
         # Info section
         info_group = QGroupBox("Battery Information")
         info_layout = QGridLayout()
@@ -151,8 +419,32 @@ class BatteryLimiterGUI(QMainWindow):
         info_group.setLayout(info_layout)
         layout.addWidget(info_group)
         
-        layout.addStretch()
-        central_widget.setLayout(layout)
+        # Health section
+        health_group = QGroupBox("Battery Health (last 30 days)")
+        health_layout = QGridLayout()
+        
+        self.health_labels = {}
+        rows = [
+            ('capacity', "Capacity:"),
+            ('cycles', "Equivalent Cycles:"),
+            ('above_80', "Time ≥ 80%:"),
+            ('above_90', "Time ≥ 90%:"),
+            ('charge_power', "Median Charge Power:"),
+        ]
+        for row, (key, title) in enumerate(rows):
+            health_layout.addWidget(QLabel(title), row, 0)
+            self.health_labels[key] = QLabel("Unknown")
+            health_layout.addWidget(self.health_labels[key], row, 1)
+        
+        refresh_button = QPushButton("Refresh")
+        refresh_button.clicked.connect(self.update_health)
+        health_layout.addWidget(refresh_button, len(rows), 0, 1, 2)
+        
+        health_group.setLayout(health_layout)
+        layout.addWidget(health_group)
+        
+        # Above the stretch that keeps the groups at the top
+        self.main_layout.insertLayout(self.main_layout.count() - 1, layout)
     
     def create_system_tray(self):
         """Create system tray icon with menu."""
@@ -197,40 +489,26 @@ class BatteryLimiterGUI(QMainWindow):
         self.tray_icon.activated.connect(self.on_tray_activated)
         self.tray_icon.show()
     
-    def create_battery_icon(self) -> QIcon:
-        """Create a simple battery icon for the system tray."""
-        pixmap = QPixmap(64, 64)
-        pixmap.fill(Qt.GlobalColor.transparent)
-        
-        painter = QPainter(pixmap)
-        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
-        
-        # Draw battery outline
-        pen = QPen(Qt.GlobalColor.black, 3)
-        painter.setPen(pen)
-        painter.setBrush(QBrush(Qt.GlobalColor.lightGray))
-        
-        # Battery body
-        painter.drawRoundedRect(12, 20, 32, 20, 3, 3)
-        
-        # Battery terminal
-        painter.drawRect(44, 26, 4, 8)
-        
-        # Battery level indicator (green for limited)
-        pen = QPen(Qt.GlobalColor.green, 2)
-        painter.setPen(pen)
-        painter.setBrush(QBrush(Qt.GlobalColor.green))
-        
-        # Fill level (80% example)
-        painter.drawRect(16, 24, 20, 12)
-        
-        # Limit indicator (small line)
-        pen = QPen(Qt.GlobalColor.red, 3)
-        painter.setPen(pen)
-        painter.drawLine(36, 20, 36, 40)
-        
-        painter.end()
-        return QIcon(pixmap)
+    def create_battery_icon(self, capacity: Optional[int] = None, limit: Optional[int] = None,
+                            charging: bool = False) -> QIcon:
+        """Battery icon for the system tray, from the icon cache."""
+        return self.icons.icon(capacity, limit, charging)
+    
+    def update_icon(self, snapshot) -> None:
+        """Show the battery state in the window and tray icons.
+        
+        Nothing is repainted unless the state moves to another icon bucket.
+        """
+        charging = snapshot.status == 'Charging'
+        key = self.icons.key(snapshot.capacity, snapshot.limit, charging)
+        if key == self.icon_key:
+            return
+        self.icon_key = key
+        icon = self.icons.icon(snapshot.capacity, snapshot.limit, charging)
+        self.setWindowIcon(icon)
+        if hasattr(self, 'tray_icon') and self.tray_icon:
+            self.tray_icon.setIcon(icon)
+        self.icon_updates += 1
     
     def on_tray_activated(self, reason):
         """Handle system tray icon activation."""
@@ -242,9 +520,46 @@ class BatteryLimiterGUI(QMainWindow):
                 self.raise_()
                 self.activateWindow()
     
+    def selected_batteries(self) -> Optional[List[str]]:
+        """Names of the batteries targeted by the selector (``None`` for all)."""
+        name = self.battery_combo.currentData()
+        return None if name is None else [name]
+    
+    @property
+    def controller(self) -> Optional[BatteryController]:
+        """Controller shown in the display: the selected or the first battery."""
+        if self.fleet is None:
+            return None
+        controllers = self.fleet.select(self.selected_batteries())
+        return controllers[0] if controllers else None
+    
+    def run_in_background(self, pool: QThreadPool, func: Callable[[], object],
+                          on_finished: Callable[[object], None],
+                          on_failed: Optional[Callable[[Exception], None]] = None) -> Task:
+        """Run ``func`` on ``pool`` and call back on the GUI thread."""
+        task = Task(func)
+        self.tasks.add(task)
+        task.signals.finished.connect(lambda _result: self.tasks.discard(task))
+        task.signals.failed.connect(lambda _error: self.tasks.discard(task))
+        task.signals.finished.connect(on_finished)
+        task.signals.failed.connect(on_failed or self.on_background_error)
+        pool.start(task)
+        return task
+    
+    def wait_for_tasks(self):
+        """Drop queued reads and wait for running tasks and pending writes."""
+        self.read_pool.clear()
+        self.read_pool.waitForDone()
+        self.write_pool.waitForDone()
+    
+    def on_background_error(self, error):
+        """Report an unexpected failure of background I/O."""
+        self.status_label.setText(f"⚠️ {error}")
+        self.status_label.setStyleSheet("padding: 10px; font-weight: bold; color: #d32f2f;")
+    
     def check_battery_support(self):
         """Check if battery charge limiting is supported."""
-        if not self.controller.is_supported():
+        if not self.fleet.is_supported():
             self.status_label.setText("❌ Battery charge limiting not supported on this system")
             self.status_label.setStyleSheet("padding: 10px; font-weight: bold; color: #d32f2f;")
             self.control_group.setEnabled(False)
@@ -261,33 +576,221 @@ class BatteryLimiterGUI(QMainWindow):
             self.status_label.setStyleSheet("padding: 10px; font-weight: bold; color: #2e7d32;")
             self.control_group.setEnabled(True)
             self.update_display()
+            self.update_health()
     
     def update_display(self):
-        """Update the display with current battery information."""
-        if not self.controller.is_supported():
+        """Refresh the display from a background read.
+        
+        Requests made while a read is running collapse into one more read.
+        """
+        if self.fleet is None or not self.fleet.is_supported():
             return
+        if self.refreshing:
+            self.refresh_again = True
+            return
+        self.refreshing = True
+        self.run_in_background(self.read_pool, self.fleet.get_snapshots,
+                               self.show_snapshots, self.on_refresh_failed)
+    
+    def on_refresh_failed(self, error):
+        self.refreshing = False
+        self.on_background_error(error)
+    
+    def show_snapshots(self, snapshots):
+        """Update the display with current battery information."""
+        self.refreshing = False
+        if self.refresh_again:
+            self.refresh_again = False
+            self.update_display()
         
         # Update current limit
-        current_limit = self.controller.get_current_limit()
+        limits = {name: snapshots[name].limit for name in
+                  (self.selected_batteries() or snapshots)}
+        values = set(limits.values())
+        current_limit = values.pop() if len(values) == 1 else None
         if current_limit is not None:
             self.current_limit = current_limit
-            self.current_limit_label.setText(f"{current_limit}%")
+            text = f"{current_limit}%"
+        elif len(limits) > 1:
+            text = ", ".join(f"{name}: {value or 'Unknown'}%" for name, value in limits.items())
         else:
-            self.current_limit_label.setText("Unknown")
+            text = "Unknown"
+        if self.applying_limit is not None:
+            text = f"{text} (applying {self.applying_limit}%…)"
+        set_text(self.current_limit_label, text)
         
         # Update battery info
-        model, manufacturer = self.controller.get_battery_info()
-        self.battery_model_label.setText(model or "Unknown")
-        self.battery_manufacturer_label.setText(manufacturer or "Unknown")
-        
-        control_file = self.controller.get_control_file_path()
+        controller = self.controller
+        snapshot = snapshots[controller.name]
+        # Only the displayed battery is followed, from when it is shown
+        estimate = self.estimator.update(snapshot, time.time())
+        time_left = format_estimate(estimate) if estimate is not None else "Unknown"
+        set_text(self.time_left_label, time_left)
+        set_text(self.battery_model_label, snapshot.model_name or "Unknown")
+        set_text(self.battery_manufacturer_label, snapshot.manufacturer or "Unknown")
+        
+        control_file = controller.get_control_file_path()
         if control_file:
-            self.control_file_label.setText(os.path.basename(control_file))
+            set_text(self.control_file_label, os.path.basename(control_file))
         
-        # Update tray tooltip
+        # Update icons and tray tooltip
+        self.update_icon(snapshot)
         if hasattr(self, 'tray_icon') and self.tray_icon:
-            tooltip = f"Battery Charge Limiter\nCurrent limit: {current_limit or 'Unknown'}%"
-            self.tray_icon.setToolTip(tooltip)
+            lines = [f"{name}: {s.limit or 'Unknown'}%" for name, s in snapshots.items()]
+            tooltip = "Battery Charge Limiter\nCurrent limit: " + "\n".join(lines)
+            if snapshot.capacity is not None:
+                tooltip += f"\nCharge: {snapshot.capacity}% ({snapshot.status or 'Unknown'})"
+            if estimate is not None:
+                tooltip += f"\nTime left: {time_left}"
+            if self.tray_icon.toolTip() != tooltip:
+                self.tray_icon.setToolTip(tooltip)
+    
+    def start_watcher(self):
+        """Refresh the display on battery changes instead of a fixed timer.
+        
+        The watcher reads the initial state, so it is created on the read
+        worker; its callbacks run there too and only emit a signal.
+        """
+        self.update_timer = QTimer(self)
+        self.update_timer.setSingleShot(True)
+        self.update_timer.timeout.connect(self.on_poll_timeout)
+        self.notifiers = []
+        self.run_in_background(self.read_pool, self.create_watcher, self.on_watcher_ready)
+    
+    def create_watcher(self):
+        """Create the watcher, sampler and a history-seeded estimator (runs on the read worker)."""
+        from .history import HistoryStore, default_history_path
+        from .sampler import Sampler
+        from .watch import BatteryWatcher
+        
+        watcher = BatteryWatcher(self.fleet, lambda name, state: self.battery_changed.emit())
+        
+        # Battery telemetry for the history views
+        sampler = None
+        estimator = ChargeEstimator()
+        if self.fleet.is_supported():
+            name = self.fleet.names()[0]
+            try:
+                history = HistoryStore(default_history_path(name))
+            except OSError:
+                history = None
+            if history is not None:
+                # The last hour gives a trend right away instead of after a few reads
+                estimator.fit_history(name, history.query(since=time.time() - 3600))
+            sampler = Sampler(self.fleet.select()[0], history=history)
+            watcher.subscribe(sampler.record)
+            sampler.start()
+        return watcher, sampler, estimator
+    
+    def on_watcher_ready(self, result):
+        """Hook the watcher's event sources into the event loop."""
+        self.watcher, self.sampler, self.estimator = result
+        for fd in self.watcher.filenos():
+            notifier = QSocketNotifier(fd, QSocketNotifier.Type.Read, self)
+            notifier.activated.connect(
+                lambda *_args, fd=fd, notifier=notifier: self.on_watcher_readable(fd, notifier)
+            )
+            self.notifiers.append(notifier)
+        
+        # Fallback polling when kernel uevents are unavailable
+        self.schedule_poll()
+    
+    def on_watcher_readable(self, fd, notifier):
+        """Drain a watcher source on the read worker."""
+        # Level-triggered: stay quiet until the worker has read the events
+        notifier.setEnabled(False)
+        self.run_in_background(self.read_pool, lambda: self.watcher.handle(fd),
+                               lambda _changed: notifier.setEnabled(True),
+                               lambda _error: notifier.setEnabled(True))
+    
+    def schedule_poll(self):
+        """Arm the fallback poll timer for the watcher's current interval."""
+        timeout = self.watcher.timeout()
+        if timeout is not None:
+            self.update_timer.start(int(timeout * 1000))
+    
+    def on_poll_timeout(self):
+        """Poll the batteries on the read worker and re-arm the adaptive timer."""
+        self.run_in_background(self.read_pool, self.watcher.poll,
+                               lambda _changed: self.schedule_poll(),
+                               lambda _error: self.schedule_poll())
+    
+    def update_health(self):
+        """Recompute the health panel from the recorded history."""
+        controller = self.controller
+        if controller is None:
+            return
+        
+        def compute():
+            from .analytics import analyze
+            from .history import HistoryStore, default_history_path
+            
+            try:
+                history = HistoryStore(default_history_path(controller.name))
+            except OSError:
+                return None
+            columns = history.query(since=time.time() - 30 * 86400)
+            report = analyze(columns, controller.get_snapshot())
+            history.close()
+            return report
+        
+        self.run_in_background(self.read_pool, compute, self.show_health)
+    
+    def show_health(self, report):
+        """Fill the health panel from an analysis report."""
+        if report is None:
+            return
+        fade = report['capacity_fade']
+        set_text(self.health_labels['capacity'],
+                 "Unknown" if fade is None else f"{(1 - fade) * 100:.1f}% of design")
+        set_text(self.health_labels['cycles'], f"{report['equivalent_full_cycles']:.1f}")
+        for threshold in (80, 90):
+            hours = report['hours_above'][threshold]
+            fraction = report['fraction_above'][threshold]
+            set_text(self.health_labels[f'above_{threshold}'], f"{hours:.1f} h ({fraction * 100:.0f}%)")
+        power = report['median_charge_power']
+        set_text(self.health_labels['charge_power'], "Unknown" if power is None else f"{power:.1f} W")
+    
+    def load_schedule(self):
+        """Show the schedule followed by the daemon."""
+        self.run_in_background(self.read_pool, read_schedule, self.on_schedule_loaded,
+                               lambda error: self.schedule_status_label.setText(str(error)))
+    
+    def on_schedule_loaded(self, state):
+        self.schedule_edit.setPlainText(state['text'])
+        self.show_schedule_state(state)
+    
+    def save_schedule(self):
+        """Replace the schedule with the edited text."""
+        text = self.schedule_edit.toPlainText()
+        self.schedule_status_label.setText("Saving…")
+        self.run_in_background(self.write_pool, lambda: write_schedule(text),
+                               self.on_schedule_saved, self.on_schedule_failed)
+    
+    def on_schedule_saved(self, state):
+        self.show_schedule_state(state)
+        self.update_display()
+    
+    def on_schedule_failed(self, error):
+        self.schedule_status_label.setText("")
+        QMessageBox.critical(
+            self,
+            "Error",
+            f"Failed to save schedule: {error}"
+        )
+    
+    def show_schedule_state(self, state):
+        """Summarize the scheduled limit and the next change."""
+        parts = []
+        if state['limit'] is not None:
+            parts.append(f"Scheduled: {state['limit']}%")
+        if state['next']:
+            parts.append(f"next change {state['next'].replace('T', ' ')}")
+        if state.get('suspended'):
+            parts.append("suspended by configuration rules")
+        if not state['active']:
+            parts.append("daemon not running")
+        set_text(self.schedule_status_label, ", ".join(parts))
     
     def on_slider_changed(self, value):
         """Handle slider value change."""
@@ -303,44 +806,97 @@ class BatteryLimiterGUI(QMainWindow):
         self.apply_limit_direct(limit)
     
     def apply_limit_direct(self, limit):
-        """Apply charge limit directly."""
-        try:
-            self.controller.set_charge_limit(limit)
-            self.update_display()
-            
-            # Show notification
-            if hasattr(self, 'tray_icon') and self.tray_icon:
-                self.tray_icon.showMessage(
-                    "Battery Charge Limiter",
-                    f"Charge limit set to {limit}%",
-                    QSystemTrayIcon.MessageIcon.Information,
-                    3000
-                )
-            else:
-                QMessageBox.information(
-                    self,
-                    "Success",
-                    f"Battery charge limit set to {limit}%"
-                )
+        """Apply charge limit after a short quiet period."""
+        self.pending_limit = limit
+        self.apply_timer.start()
+    
+    def write_pending_limit(self):
+        """Write the last requested charge limit on the write worker.
+        
+        An earlier apply that has not started yet is cancelled; one that is
+        already running completes, but its outcome is not reported.
+        """
+        if self.fleet is None:
+            # Applied once the batteries are found
+            return
+        limit, self.pending_limit = self.pending_limit, None
+        if limit is None:
+            return
+        if self.apply_task is not None and self.write_pool.tryTake(self.apply_task):
+            self.tasks.discard(self.apply_task)
+        self.apply_generation += 1
+        generation = self.apply_generation
+        names = self.selected_batteries()
+        
+        def write():
+            current = self.fleet.get_limits(names)
+            if any(value != limit for value in current.values()):
+                apply_limits(self.fleet, limit, names)
+        
+        self.applying_limit = limit
+        self.current_limit_label.setText(f"Applying {limit}%…")
+        self.apply_task = self.run_in_background(
+            self.write_pool, write,
+            lambda _result: self.on_limit_applied(generation, limit),
+            lambda error: self.on_limit_failed(generation, error),
+        )
+    
+    def on_limit_applied(self, generation, limit):
+        """Report a finished apply unless a newer one superseded it."""
+        if generation != self.apply_generation:
+            return
+        self.apply_task = None
+        self.applying_limit = None
+        self.update_display()
         
-        except BatteryControlError as e:
+        # Show notification
+        if hasattr(self, 'tray_icon') and self.tray_icon:
+            self.tray_icon.showMessage(
+                "Battery Charge Limiter",
+                f"Charge limit set to {limit}%",
+                QSystemTrayIcon.MessageIcon.Information,
+                3000
+            )
+        else:
+            QMessageBox.information(
+                self,
+                "Success",
+                f"Battery charge limit set to {limit}%"
+            )
+    
+    def on_limit_failed(self, generation, error):
+        """Report a failed apply unless a newer one superseded it."""
+        if generation != self.apply_generation:
+            return
+        self.apply_task = None
+        self.applying_limit = None
+        self.update_display()
+        if isinstance(error, BatteryControlError):
             QMessageBox.critical(
                 self,
                 "Error",
-                f"Failed to set charge limit: {e}\n\n"
+                f"Failed to set charge limit: {error}\n\n"
                 "Make sure you have the necessary permissions."
             )
-        except Exception as e:
+        else:
             QMessageBox.critical(
                 self,
-                "Error", 
-                f"An unexpected error occurred: {e}"
+                "Error",
+                f"An unexpected error occurred: {error}"
             )
 
 
 def main():
     """Main entry point for the GUI application."""
-    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser(description="Battery charge limiter")
+    parser.add_argument(
+        '--mock',
+        action='store_true',
+        help="Use mock environment for testing"
+    )
+    args, qt_args = parser.parse_known_args()
+    
+    app = QApplication(sys.argv[:1] + qt_args)
     app.setQuitOnLastWindowClosed(False)  # Keep running in system tray
     
     # Set application metadata
@@ -348,7 +904,7 @@ def main():
     app.setApplicationDisplayName("Battery Charge Limiter")
     app.setApplicationVersion("1.0.0")
     
-    window = BatteryLimiterGUI()
+    window = BatteryLimiterGUI(use_mock=args.mock)
     window.show()
     
     sys.exit(app.exec())
@@ -0,0 +1,402 @@
+"""Persistent battery history in memory-mapped columnar segments.
+
+Each segment is a preallocated file holding a fixed number of records,
+stored column by column after a small header. Appends are plain memory
+writes into a shared mapping and are flushed to disk in batches; reads
+return ``memoryview`` slices of the mapping (or NumPy views when NumPy is
+installed) without copying. Segments rotate when full and old ones can
+be compacted into a single downsampled segment.
+"""
+
+import bisect
+import fcntl
+import mmap
+import os
+import struct
+import time
+from array import array
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .core import BatterySnapshot
+from .sampler import MAX_CAPACITY, MAX_INT, MISSING, STATUS_CODES, clamp
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - optional dependency
+    numpy = None
+
+
+MAGIC = b'BCLH'
+VERSION = 1
+HEADER = struct.Struct('<4sHHIIdd')
+HEADER_SIZE = 64
+SEGMENT_SUFFIX = '.bclh'
+
+# Column name and array typecode, ordered by item size to keep alignment
+COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ('timestamp', 'd'),
+    ('energy', 'i'),
+    ('power', 'i'),
+    ('voltage', 'i'),
+    ('capacity', 'h'),
+    ('limit', 'h'),
+    ('status', 'B'),
+)
+
+SYSTEM_HISTORY_PATH = '/var/lib/battery-limiter/history'
+
+
+def default_history_path(battery: Optional[str] = None) -> str:
+    """Shared system history if writable, otherwise the user's state dir.
+    
+    Args:
+        battery: Battery name; each battery is kept in its own subdirectory
+    """
+    if os.access(SYSTEM_HISTORY_PATH, os.W_OK):
+        path = SYSTEM_HISTORY_PATH
+    else:
+        state_home = os.environ.get('XDG_STATE_HOME') or os.path.expanduser('~/.local/state')
+        path = os.path.join(state_home, 'battery-limiter', 'history')
+    return os.path.join(path, battery) if battery else path
+
+
+def _record_size() -> int:
+    return sum(array(code).itemsize for _name, code in COLUMNS)
+
+
+class Segment:
+    """One fixed-capacity segment file mapped into memory."""
+    
+    def __init__(self, path: str, capacity: Optional[int] = None):
+        """Open an existing segment or create a new one.
+        
+        Args:
+            path: Segment file path
+            capacity: Records to preallocate; required to create the file
+        """
+        self.path = path
+        create = capacity is not None and not os.path.exists(path)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_CLOEXEC, 0o644)
+        try:
+            if create:
+                # Round up so every column stays 8-byte aligned
+                capacity = (capacity + 7) // 8 * 8
+                os.ftruncate(fd, HEADER_SIZE + capacity * _record_size())
+                os.pwrite(fd, HEADER.pack(MAGIC, VERSION, 0, capacity, 0, 0.0, 0.0), 0)
+            self.inode = os.fstat(fd).st_ino
+            self.mm = mmap.mmap(fd, 0)
+        finally:
+            os.close(fd)
+        
+        magic, version, _reserved, self.capacity, _count, _first, _last = \
+            HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self.mm.close()
+            raise ValueError(f"{path} is not a battery history segment")
+        
+        self.columns: Dict[str, memoryview] = {}
+        offset = HEADER_SIZE
+        view = memoryview(self.mm)
+        for name, code in COLUMNS:
+            size = array(code).itemsize * self.capacity
+            self.columns[name] = view[offset:offset + size].cast(code)
+            offset += size
+        view.release()
+    
+    @property
+    def count(self) -> int:
+        """Records written so far (read from the shared header)."""
+        return HEADER.unpack_from(self.mm, 0)[4]
+    
+    @property
+    def first_timestamp(self) -> float:
+        return HEADER.unpack_from(self.mm, 0)[5]
+    
+    @property
+    def last_timestamp(self) -> float:
+        return HEADER.unpack_from(self.mm, 0)[6]
+    
+    def is_full(self) -> bool:
+        return self.count >= self.capacity
+    
+    def append(self, values: Dict[str, float]) -> bool:
+        """Write one record; the caller holds the store lock.
+        
+        Returns:
+            ``False`` if the segment is full
+        """
+        count = self.count
+        if count >= self.capacity:
+            return False
+        for name, _code in COLUMNS:
+            self.columns[name][count] = values[name]
+        timestamp = values['timestamp']
+        first = timestamp if count == 0 else self.first_timestamp
+        HEADER.pack_into(self.mm, 0, MAGIC, VERSION, 0, self.capacity,
+                         count + 1, first, timestamp)
+        return True
+    
+    def bounds(self, since: Optional[float], until: Optional[float]) -> Tuple[int, int]:
+        """Record index range ``[start, stop)`` within a time range."""
+        timestamps = self.columns['timestamp'][:self.count]
+        start = 0 if since is None else bisect.bisect_left(timestamps, since)
+        stop = len(timestamps) if until is None else bisect.bisect_right(timestamps, until)
+        timestamps.release()
+        return start, max(start, stop)
+    
+    def slice(self, start: int, stop: int) -> Dict[str, memoryview]:
+        """Zero-copy views of every column for records ``[start, stop)``."""
+        return {name: column[start:stop] for name, column in self.columns.items()}
+    
+    def flush(self) -> None:
+        self.mm.flush()
+    
+    def close(self) -> None:
+        for column in self.columns.values():
+            column.release()
+        self.columns = {}
+        try:
+            self.mm.close()
+        except BufferError:
+            # A caller still holds a view; the mapping goes away with it
+            pass
+
+
+class HistoryStore:
+    """Append-only battery history shared by the CLI, GUI and boot applier.
+    
+    Writers from different processes are serialized with ``flock`` on a
+    lock file; readers never take the lock. Segment first/last timestamps
+    form a sparse index so time-range queries only touch the segments and
+    records they need.
+    """
+    
+    def __init__(self, path: Optional[str] = None, segment_records: int = 65536,
+                 sync_every: int = 64):
+        """Open (or create) a history directory.
+        
+        Args:
+            path: History directory; see :func:`default_history_path`
+            segment_records: Records per newly created segment
+            sync_every: Appends between flushes to disk
+        """
+        self.path = path or default_history_path()
+        self.segment_records = segment_records
+        self.sync_every = sync_every
+        os.makedirs(self.path, exist_ok=True)
+        self._lock_path = os.path.join(self.path, '.lock')
+        self._segments: Dict[str, Segment] = {}
+        self._unsynced = 0
+        self.refresh()
+    
+    @contextmanager
+    def _locked(self):
+        fd = os.open(self._lock_path, os.O_RDWR | os.O_CREAT | os.O_CLOEXEC, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+    
+    def refresh(self) -> None:
+        """Pick up segments created, compacted or removed by other processes."""
+        names = sorted(n for n in os.listdir(self.path) if n.endswith(SEGMENT_SUFFIX))
+        for name in set(self._segments) - set(names):
+            self._segments.pop(name).close()
+        for name in names:
+            path = os.path.join(self.path, name)
+            segment = self._segments.get(name)
+            if segment is not None:
+                try:
+                    if os.stat(path).st_ino == segment.inode:
+                        continue
+                except OSError:
+                    pass
+                # Replaced by compaction in another process
+                self._segments.pop(name).close()
+            try:
+                self._segments[name] = Segment(path)
+            except (OSError, ValueError):
+                continue
+        self._segments = dict(sorted(self._segments.items()))
+    
+    @property
+    def segments(self) -> List[Segment]:
+        return list(self._segments.values())
+    
+    def _next_name(self) -> str:
+        last = max(self._segments, default=None)
+        seq = int(last[:-len(SEGMENT_SUFFIX)]) + 1 if last else 0
+        return f"{seq:08d}{SEGMENT_SUFFIX}"
+    
+    def _active(self) -> Segment:
+        segment = self.segments[-1] if self._segments else None
+        if segment is None or segment.is_full():
+            self.refresh()
+            segment = self.segments[-1] if self._segments else None
+        if segment is None or segment.is_full():
+            if segment is not None:
+                segment.flush()
+            name = self._next_name()
+            segment = Segment(os.path.join(self.path, name), self.segment_records)
+            self._segments[name] = segment
+        return segment
+    
+    def append(self, timestamp: float, capacity: Optional[int] = None,
+               energy: Optional[int] = None, power: Optional[int] = None,
+               voltage: Optional[int] = None, limit: Optional[int] = None,
+               status: Optional[str] = None) -> None:
+        """Append one record.
+        
+        Missing values are stored as sentinels and values outside a
+        column's range are clamped to it.
+        """
+        values = {
+            'timestamp': timestamp,
+            'capacity': -1 if capacity is None else clamp(capacity, 0, MAX_CAPACITY),
+            'energy': MISSING if energy is None else clamp(energy, -MAX_INT, MAX_INT),
+            'power': MISSING if power is None else clamp(power, -MAX_INT, MAX_INT),
+            'voltage': MISSING if voltage is None else clamp(voltage, -MAX_INT, MAX_INT),
+            'limit': -1 if limit is None else clamp(limit, 0, MAX_CAPACITY),
+            'status': STATUS_CODES.get(status, 0),
+        }
+        with self._locked():
+            segment = self._active()
+            if not segment.append(values):
+                self._active().append(values)
+        
+        self._unsynced += 1
+        if self._unsynced >= self.sync_every:
+            self.flush()
+    
+    def append_snapshot(self, snapshot: BatterySnapshot,
+                        timestamp: Optional[float] = None) -> None:
+        """Append the recorded fields of a snapshot."""
+        self.append(
+            time.time() if timestamp is None else timestamp,
+            capacity=snapshot.capacity,
+            energy=snapshot.energy_now,
+            power=snapshot.power_now,
+            voltage=snapshot.voltage_now,
+            limit=snapshot.limit,
+            status=snapshot.status,
+        )
+    
+    def flush(self) -> None:
+        """Write pending records of the active segment to disk."""
+        if self._segments:
+            self.segments[-1].flush()
+        self._unsynced = 0
+    
+    def ranges(self, since: Optional[float] = None,
+               until: Optional[float] = None) -> Iterator[Dict[str, memoryview]]:
+        """Yield zero-copy column views, one dict per overlapping segment."""
+        for segment in self.segments:
+            if not segment.count:
+                continue
+            if since is not None and segment.last_timestamp < since:
+                continue
+            if until is not None and segment.first_timestamp > until:
+                continue
+            start, stop = segment.bounds(since, until)
+            if stop > start:
+                yield segment.slice(start, stop)
+    
+    def query(self, since: Optional[float] = None,
+              until: Optional[float] = None) -> Dict[str, object]:
+        """Return every column in a time range.
+        
+        Returns NumPy arrays when NumPy is installed (views into the mapping
+        if only one segment matches) and :class:`array.array` otherwise.
+        Missing values keep their sentinels: ``MISSING`` for energy, power
+        and voltage and ``-1`` for capacity and limit.
+        """
+        parts = list(self.ranges(since, until))
+        result: Dict[str, object] = {}
+        for name, code in COLUMNS:
+            if numpy is not None:
+                views = [numpy.frombuffer(part[name], dtype=code) for part in parts]
+                if len(views) == 1:
+                    result[name] = views[0]
+                else:
+                    result[name] = numpy.concatenate(views) if views else numpy.empty(0, dtype=code)
+            else:
+                column = array(code)
+                for part in parts:
+                    column.frombytes(part[name].tobytes())
+                result[name] = column
+        return result
+    
+    def __len__(self) -> int:
+        return sum(segment.count for segment in self.segments)
+    
+    def compact(self, before: float, resolution: float = 300.0) -> int:
+        """Merge segments ending before ``before`` into one downsampled segment.
+        
+        Keeps the last record of every ``resolution``-second bucket.
+        
+        Returns:
+            Number of records removed
+        """
+        with self._locked():
+            self.refresh()
+            old = [s for s in self.segments[:-1] if s.count and s.last_timestamp < before]
+            if not old:
+                return 0
+            
+            kept: List[Dict[str, float]] = []
+            last_bucket = None
+            total = 0
+            for segment in old:
+                count = segment.count
+                total += count
+                for i in range(count):
+                    record = {name: segment.columns[name][i] for name, _code in COLUMNS}
+                    bucket = int(record['timestamp'] // resolution) if resolution > 0 else i
+                    if kept and bucket == last_bucket:
+                        kept[-1] = record
+                    else:
+                        kept.append(record)
+                    last_bucket = bucket
+            
+            target = old[0].path
+            tmp_path = target + '.tmp'
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            merged = Segment(tmp_path, max(len(kept), 1))
+            for record in kept:
+                merged.append(record)
+            merged.flush()
+            merged.close()
+            
+            for segment in old:
+                self._segments.pop(os.path.basename(segment.path)).close()
+            os.replace(tmp_path, target)
+            for segment in old[1:]:
+                os.unlink(segment.path)
+            self.refresh()
+            return total - len(kept)
+    
+    def prune(self, before: float) -> int:
+        """Delete whole segments whose records all predate ``before``.
+        
+        Returns:
+            Number of segments removed
+        """
+        removed = 0
+        with self._locked():
+            self.refresh()
+            for segment in self.segments[:-1]:
+                if segment.count and segment.last_timestamp < before:
+                    os.unlink(segment.path)
+                    removed += 1
+            self.refresh()
+        return removed
+    
+    def close(self) -> None:
+        """Flush and unmap every segment."""
+        self.flush()
+        for segment in self._segments.values():
+            segment.close()
+        self._segments = {}
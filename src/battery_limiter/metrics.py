@@ -0,0 +1,239 @@
+"""Latency histograms and counters for battery control operations.
+
+Every :class:`~battery_limiter.core.BatteryController` times its probe,
+control file reads, writes and read-backs into an :class:`OperationMetrics`.
+Recording costs two clock reads, a bisect over a dozen bucket bounds and
+an integer increment; nothing is formatted or written until someone asks.
+
+:func:`format_prometheus` renders the metrics of a fleet, together with
+battery state gauges, in the Prometheus text format, and
+:func:`write_textfile` publishes it for node_exporter's textfile collector.
+"""
+
+import os
+import tempfile
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Mapping, Optional
+
+
+# Upper bucket bounds in nanoseconds: 50 µs to 10 s, roughly x2.5 apart.
+# Cached sysfs reads land in the first buckets, embedded controller
+# transactions in the millisecond range and hung firmware in the last.
+BUCKET_BOUNDS_NS = (
+    50_000, 100_000, 250_000, 500_000,
+    1_000_000, 2_500_000, 5_000_000, 10_000_000, 25_000_000, 50_000_000,
+    100_000_000, 250_000_000, 500_000_000, 1_000_000_000, 2_500_000_000, 10_000_000_000,
+)
+
+# Operations timed by the controller
+OPERATIONS = ('probe', 'read', 'write', 'readback')
+
+DEFAULT_TEXTFILE_PATH = '/var/lib/node_exporter/textfile_collector/battery_limiter.prom'
+
+PREFIX = 'battery_limiter'
+
+
+class Histogram:
+    """Fixed-bucket latency histogram in nanoseconds.
+    
+    Updates are not locked: a concurrent update may very rarely be lost,
+    which monitoring tolerates and the hot path does not pay for.
+    """
+    
+    __slots__ = ('counts', 'total_ns')
+    
+    def __init__(self):
+        # One count per bound plus the overflow bucket
+        self.counts: List[int] = [0] * (len(BUCKET_BOUNDS_NS) + 1)
+        self.total_ns = 0
+    
+    def observe(self, ns: int) -> None:
+        """Record one duration."""
+        self.counts[bisect_left(BUCKET_BOUNDS_NS, ns)] += 1
+        self.total_ns += ns
+    
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+    
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound in seconds of the bucket holding quantile ``q``.
+        
+        Returns:
+            The bound, ``inf`` for the overflow bucket, or ``None`` when empty
+        """
+        total = self.count
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for bound, count in zip(BUCKET_BOUNDS_NS, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound / 1e9
+        return float('inf')
+    
+    def to_dict(self) -> Dict[str, object]:
+        return {'counts': list(self.counts), 'sum_ns': self.total_ns}
+    
+    @classmethod
+    def from_dict(cls, data: Mapping[str, object]) -> 'Histogram':
+        histogram = cls()
+        counts = list(data['counts'])
+        if len(counts) != len(histogram.counts):
+            raise ValueError("Histogram has different buckets")
+        histogram.counts = counts
+        histogram.total_ns = int(data['sum_ns'])
+        return histogram
+
+
+class OperationMetrics:
+    """Latency histograms and error counters for each operation of one battery."""
+    
+    def __init__(self, operations: Iterable[str] = OPERATIONS):
+        self.latency: Dict[str, Histogram] = {op: Histogram() for op in operations}
+        self.errors: Dict[str, int] = {op: 0 for op in self.latency}
+    
+    def observe(self, operation: str, ns: int) -> None:
+        """Record the duration of one operation, successful or not."""
+        self.latency[operation].observe(ns)
+    
+    def error(self, operation: str) -> None:
+        """Count one failed operation."""
+        self.errors[operation] += 1
+    
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            'latency': {op: h.to_dict() for op, h in self.latency.items()},
+            'errors': dict(self.errors),
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Mapping[str, object]) -> 'OperationMetrics':
+        metrics = cls(data['latency'])
+        metrics.latency = {op: Histogram.from_dict(h) for op, h in data['latency'].items()}
+        metrics.errors.update(data['errors'])
+        return metrics
+
+
+def fleet_metrics(fleet, snapshots: Optional[Mapping[str, object]] = None) -> Dict[str, Dict]:
+    """Collect the metrics and state of every battery of a fleet.
+    
+    Args:
+        fleet: :class:`~battery_limiter.core.BatteryFleet` to collect from
+        snapshots: Current state by battery name (default: read now)
+    
+    Returns:
+        Plain data for :func:`format_prometheus`, safe to send as JSON
+    """
+    if snapshots is None:
+        snapshots = fleet.get_snapshots()
+    result = {}
+    for name, controller in fleet.controllers.items():
+        snapshot = snapshots.get(name)
+        result[name] = {
+            'operations': controller.metrics.to_dict(),
+            'hardware_writes': controller.hardware_writes,
+            'writes_avoided': controller.writes_avoided,
+            'write_retries': controller.write_retries,
+            'state': snapshot.as_dict() if snapshot is not None else {},
+        }
+    return result
+
+
+def _escape(value: object) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels: object) -> str:
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+def _seconds(ns: int) -> str:
+    return repr(ns / 1e9)
+
+
+# State gauges: (metric, help, snapshot field, scale to base units)
+GAUGES = (
+    ('charge_limit_percent', "Charge control end threshold.", 'limit', 1),
+    ('charge_start_threshold_percent', "Charge control start threshold.", 'start_threshold', 1),
+    ('capacity_percent', "State of charge.", 'capacity', 1),
+    ('energy_joules', "Energy stored now.", 'energy_now', 3.6e-3),
+    ('energy_full_joules', "Energy stored when full.", 'energy_full', 3.6e-3),
+    ('energy_full_design_joules', "Design energy when full.", 'energy_full_design', 3.6e-3),
+    ('power_watts', "Charge or discharge power.", 'power_now', 1e-6),
+    ('voltage_volts', "Voltage now.", 'voltage_now', 1e-6),
+    ('cycle_count', "Charge cycles reported by the battery.", 'cycle_count', 1),
+)
+
+
+def format_prometheus(batteries: Mapping[str, Mapping]) -> str:
+    """Render :func:`fleet_metrics` output in the Prometheus text format."""
+    lines = []
+    
+    def header(name, kind, text):
+        lines.append(f"# HELP {PREFIX}_{name} {text}")
+        lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+    
+    header('operation_duration_seconds', 'histogram',
+           "Duration of battery control file operations.")
+    for battery, data in batteries.items():
+        for op, histogram in data['operations']['latency'].items():
+            cumulative = 0
+            bounds = [_seconds(b) for b in BUCKET_BOUNDS_NS] + ['+Inf']
+            for bound, count in zip(bounds, histogram['counts']):
+                cumulative += count
+                lines.append(f"{PREFIX}_operation_duration_seconds_bucket"
+                             f"{_labels(battery=battery, operation=op, le=bound)} {cumulative}")
+            labels = _labels(battery=battery, operation=op)
+            lines.append(f"{PREFIX}_operation_duration_seconds_sum{labels} "
+                         f"{_seconds(histogram['sum_ns'])}")
+            lines.append(f"{PREFIX}_operation_duration_seconds_count{labels} {cumulative}")
+    
+    header('operation_errors_total', 'counter', "Failed battery control file operations.")
+    for battery, data in batteries.items():
+        for op, count in data['operations']['errors'].items():
+            lines.append(f"{PREFIX}_operation_errors_total"
+                         f"{_labels(battery=battery, operation=op)} {count}")
+    
+    for key, text in (('hardware_writes', "Charge limit writes sent to the firmware."),
+                      ('writes_avoided', "Charge limit writes skipped as already in place."),
+                      ('write_retries', "Charge limit writes tried again after a transient error.")):
+        header(f'{key}_total', 'counter', text)
+        for battery, data in batteries.items():
+            lines.append(f"{PREFIX}_{key}_total{_labels(battery=battery)} {data.get(key, 0)}")
+    
+    header('charging', 'gauge', "Whether the battery is charging.")
+    for battery, data in batteries.items():
+        status = data['state'].get('status')
+        if status is not None:
+            lines.append(f"{PREFIX}_charging{_labels(battery=battery)} "
+                         f"{int(status == 'Charging')}")
+    for name, text, field, scale in GAUGES:
+        header(name, 'gauge', text)
+        for battery, data in batteries.items():
+            value = data['state'].get(field)
+            if value is not None:
+                lines.append(f"{PREFIX}_{name}{_labels(battery=battery)} {value * scale:g}")
+    return '\n'.join(lines) + '\n'
+
+
+def write_textfile(text: str, path: str = DEFAULT_TEXTFILE_PATH) -> None:
+    """Publish metrics for the node_exporter textfile collector.
+    
+    The file is written next to ``path`` under a name the collector
+    ignores and renamed into place, so a scrape never sees half of it.
+    
+    Raises:
+        OSError: If the file cannot be written
+    """
+    directory = os.path.dirname(path) or '.'
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.battery_limiter-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except OSError:
+        os.unlink(tmp)
+        raise
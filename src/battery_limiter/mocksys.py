@@ -0,0 +1,329 @@
+"""Synthetic ``power_supply`` trees for testing and benchmarks.
+
+Trees hold any number of batteries, mains and USB-C adapters and HID
+peripheral batteries, with the attribute files and ``uevent`` properties
+the kernel drivers expose, and optionally a vendor platform driver layout.
+With a ``seed``, batteries differ as they do across real machines: energy
+or charge units, wear, state of charge, status and model.
+
+Run ``python -m battery_limiter.mocksys ROOT`` to create one on disk.
+"""
+
+import argparse
+import os
+import random
+from typing import Optional
+
+
+def _write(path: str, value) -> None:
+    with open(path, 'w') as f:
+        f.write(f"{value}\n")
+
+
+def _write_uevent(directory: str, properties: dict) -> None:
+    with open(os.path.join(directory, 'uevent'), 'w') as f:
+        for key, value in properties.items():
+            f.write(f"POWER_SUPPLY_{key}={value}\n")
+
+
+# (manufacturer, model name, design energy in µWh, design voltage in µV)
+BATTERY_MODELS = (
+    ('SMP', '5B10W13930', 57000000, 11550000),
+    ('LGC', '5B10W51867', 80000000, 15440000),
+    ('SANYO', '45N1011', 62160000, 10800000),
+    ('BYD', 'DELL M59JH2A', 54000000, 11400000),
+    ('Hewlett-Packard', 'PRIMARY', 45000000, 11550000),
+    ('ASUSTeK', 'ASUS Battery', 75000000, 15400000),
+)
+
+STATUSES = ('Charging', 'Discharging', 'Not charging', 'Full')
+
+
+def _capacity_level(capacity: int, status: str) -> str:
+    if status == 'Full':
+        return 'Full'
+    if capacity <= 5:
+        return 'Critical'
+    if capacity <= 15:
+        return 'Low'
+    return 'Normal'
+
+
+def create_battery(base_path: str, name: str, limit: int = 80, capacity: int = 75,
+                   control_file: Optional[str] = 'charge_control_end_threshold',
+                   status: str = 'Not charging', units: str = 'energy',
+                   model: tuple = BATTERY_MODELS[0], wear: float = 0.9,
+                   cycle_count: int = 214, serial_number: int = 1234,
+                   temp: Optional[int] = None, start_threshold: Optional[int] = None) -> str:
+    """Create a battery directory with a realistic set of attributes.
+    
+    Args:
+        base_path: ``power_supply`` root to create the battery in
+        name: Directory name (e.g. ``BAT0``)
+        limit: Initial charge limit
+        capacity: State of charge in percent
+        control_file: Control file to create, or ``None`` for an
+            unsupported battery
+        status: ``STATUS`` property (e.g. ``Charging``)
+        units: ``energy`` (µWh, as most ACPI batteries) or ``charge``
+            (µAh with ``CURRENT_NOW``, as some Dell and HP firmware)
+        model: Entry of :data:`BATTERY_MODELS`
+        wear: Full capacity as a fraction of the design capacity
+        cycle_count: ``CYCLE_COUNT`` property
+        serial_number: ``SERIAL_NUMBER`` property
+        temp: Temperature in tenths of a degree Celsius, or ``None`` when
+            the driver does not report it
+        start_threshold: Initial start threshold, or ``None`` for a
+            battery with an end threshold only
+    
+    Returns:
+        Path of the battery directory
+    """
+    directory = os.path.join(base_path, name)
+    os.makedirs(directory, exist_ok=True)
+    
+    manufacturer, model_name, energy_full_design, voltage_min_design = model
+    voltage_now = voltage_min_design * (100 + capacity // 10) // 100
+    # Drawing or charging at around 10 W, nothing while idle
+    power_now = {'Charging': 25000000, 'Discharging': 9500000}.get(status, 0)
+    attributes = {
+        'NAME': name,
+        'TYPE': 'Battery',
+        'STATUS': status,
+        'PRESENT': 1,
+        'TECHNOLOGY': 'Li-ion',
+        'CYCLE_COUNT': cycle_count,
+        'VOLTAGE_MIN_DESIGN': voltage_min_design,
+        'VOLTAGE_NOW': voltage_now,
+    }
+    if units == 'energy':
+        energy_full = int(energy_full_design * wear)
+        attributes.update({
+            'POWER_NOW': power_now,
+            'ENERGY_FULL_DESIGN': energy_full_design,
+            'ENERGY_FULL': energy_full,
+            'ENERGY_NOW': energy_full * capacity // 100,
+        })
+    else:
+        charge_full_design = energy_full_design * 1000 // (voltage_min_design // 1000)
+        charge_full = int(charge_full_design * wear)
+        attributes.update({
+            'CURRENT_NOW': power_now * 1000 // (voltage_now // 1000),
+            'CHARGE_FULL_DESIGN': charge_full_design,
+            'CHARGE_FULL': charge_full,
+            'CHARGE_NOW': charge_full * capacity // 100,
+        })
+    if temp is not None:
+        attributes['TEMP'] = temp
+    attributes.update({
+        'CAPACITY': capacity,
+        'CAPACITY_LEVEL': _capacity_level(capacity, status),
+        'MODEL_NAME': model_name,
+        'MANUFACTURER': manufacturer,
+        'SERIAL_NUMBER': serial_number,
+    })
+    _write_uevent(directory, attributes)
+    for key, value in attributes.items():
+        _write(os.path.join(directory, key.lower()), value)
+    if control_file:
+        _write(os.path.join(directory, control_file), limit)
+        if start_threshold is not None:
+            _write(os.path.join(directory, 'charge_control_start_threshold'), start_threshold)
+    return directory
+
+
+def update_battery(directory: str, **properties) -> None:
+    """Change a battery's state, as its driver does on every update.
+    
+    Args:
+        directory: Battery directory from :func:`create_battery`
+        properties: ``uevent`` properties to change (e.g.
+            ``STATUS='Charging'``, ``CAPACITY=81``); their attribute files
+            are rewritten as well
+    """
+    current = {}
+    with open(os.path.join(directory, 'uevent'), 'r') as f:
+        for line in f:
+            key, _, value = line.rstrip('\n').partition('=')
+            current[key[len('POWER_SUPPLY_'):]] = value
+    current.update(properties)
+    _write_uevent(directory, current)
+    for key, value in properties.items():
+        _write(os.path.join(directory, key.lower()), value)
+
+
+def create_adapter(base_path: str, name: str = 'AC', online: bool = True,
+                   usb: bool = False) -> str:
+    """Create a mains or USB Power Delivery adapter directory."""
+    directory = os.path.join(base_path, name)
+    os.makedirs(directory, exist_ok=True)
+    kind = 'USB' if usb else 'Mains'
+    attributes = {'NAME': name, 'TYPE': kind, 'ONLINE': int(online)}
+    if usb:
+        # As ucsi_acpi reports a USB-C charger
+        attributes.update({
+            'USB_TYPE': 'C [PD] PD_PPS',
+            'SCOPE': 'System',
+            'VOLTAGE_MIN': 5000000,
+            'VOLTAGE_MAX': 20000000,
+            'VOLTAGE_NOW': 20000000 if online else 0,
+            'CURRENT_MAX': 3250000 if online else 0,
+            'CURRENT_NOW': 3250000 if online else 0,
+        })
+    _write_uevent(directory, attributes)
+    for key, value in attributes.items():
+        if key != 'NAME':
+            _write(os.path.join(directory, key.lower()), value)
+    return directory
+
+
+def create_peripheral(base_path: str, name: str, capacity: int = 60,
+                      model_name: str = 'MX Master 3', serial_number: str = '4082-a1-7c') -> str:
+    """Create a peripheral (HID device) battery directory."""
+    directory = os.path.join(base_path, name)
+    os.makedirs(directory, exist_ok=True)
+    attributes = {'NAME': name, 'TYPE': 'Battery', 'SCOPE': 'Device',
+                  'STATUS': 'Discharging', 'ONLINE': 1, 'CAPACITY': capacity,
+                  'MODEL_NAME': model_name, 'MANUFACTURER': 'Logitech',
+                  'SERIAL_NUMBER': serial_number}
+    _write_uevent(directory, attributes)
+    for key, value in attributes.items():
+        _write(os.path.join(directory, key.lower()), value)
+    return directory
+
+
+def _create_batteries(base_path: str, batteries: int, limit: int,
+                      control_file: Optional[str], seed: Optional[int],
+                      start_threshold: Optional[int] = None) -> None:
+    if seed is None:
+        for i in range(batteries):
+            create_battery(base_path, f"BAT{i}", limit=limit, control_file=control_file,
+                           start_threshold=start_threshold)
+        return
+    rng = random.Random(seed)
+    for i in range(batteries):
+        status = rng.choice(STATUSES)
+        create_battery(
+            base_path, f"BAT{i}", limit=limit, control_file=control_file,
+            # Held at the limit when not charging on mains
+            capacity=limit if status in ('Not charging', 'Full') else rng.randint(3, limit - 1),
+            status=status,
+            units=rng.choice(('energy', 'energy', 'charge')),
+            model=rng.choice(BATTERY_MODELS),
+            wear=rng.uniform(0.6, 1.0),
+            cycle_count=rng.randint(0, 1200),
+            serial_number=rng.randint(1, 65535),
+            temp=rng.choice((None, rng.randint(200, 450))),
+            start_threshold=start_threshold,
+        )
+
+
+def _create_accessories(base_path: str, adapters: int, usb_adapters: int,
+                        peripherals: int) -> None:
+    for i in range(adapters):
+        create_adapter(base_path, 'AC' if i == 0 else f"ADP{i}")
+    for i in range(usb_adapters):
+        create_adapter(base_path, f"ucsi-source-psy-USBC000:00{i + 1}", online=i == 0, usb=True)
+    for i in range(peripherals):
+        create_peripheral(base_path, f"hidpp_battery_{i}", capacity=(60 + 7 * i) % 100)
+
+
+def create_power_supply_tree(base_path: str, batteries: int = 1, adapters: int = 1,
+                             peripherals: int = 0, limit: int = 80, usb_adapters: int = 0,
+                             seed: Optional[int] = None,
+                             start_threshold: Optional[int] = None) -> str:
+    """Create a ``power_supply`` tree.
+    
+    Args:
+        base_path: Directory to populate (created if missing)
+        batteries: Number of ``BATn`` batteries with a control file
+        adapters: Number of mains adapters
+        peripherals: Number of HID peripheral batteries
+        limit: Initial charge limit of every battery
+        usb_adapters: Number of USB-C Power Delivery ports, the first online
+        seed: Vary the batteries' units, wear, charge, status and model
+            with this seed; identical batteries when ``None``
+        start_threshold: Initial start threshold of every battery, or
+            ``None`` for batteries with an end threshold only
+    
+    Returns:
+        ``base_path``
+    """
+    os.makedirs(base_path, exist_ok=True)
+    _create_batteries(base_path, batteries, limit, 'charge_control_end_threshold', seed,
+                      start_threshold)
+    _create_accessories(base_path, adapters, usb_adapters, peripherals)
+    return base_path
+
+
+# Vendor control file (relative to the sysfs root) and its raw value for
+# the requested limit, by backend name
+VENDOR_CONTROL_FILES = {
+    'huawei': ('devices/platform/huawei-wmi/charge_control_thresholds',
+               lambda limit: f"0 {limit}"),
+    'lg': ('devices/platform/lg-laptop/battery_care_limit', str),
+    'samsung': ('devices/platform/samsung/battery_life_extender',
+                lambda limit: '1' if limit < 100 else '0'),
+    'smapi': ('devices/platform/smapi/BAT0/stop_charge_thresh', str),
+    'sony': ('devices/platform/sony-laptop/battery_care_limiter',
+             lambda limit: '0' if limit == 100 else str(limit)),
+}
+
+
+def create_sysfs_tree(root: str, backend: str = 'sysfs', batteries: int = 1,
+                      limit: int = 80, adapters: int = 1, usb_adapters: int = 0,
+                      peripherals: int = 0, seed: Optional[int] = None) -> str:
+    """Create a sysfs tree exposing the charge limit through ``backend``.
+    
+    Args:
+        root: Directory standing in for ``/sys`` (created if missing)
+        backend: ``sysfs`` or a key of :data:`VENDOR_CONTROL_FILES`
+        batteries: Number of ``BATn`` batteries
+        limit: Initial charge limit
+        adapters: Number of mains adapters
+        usb_adapters: Number of USB-C Power Delivery ports
+        peripherals: Number of HID peripheral batteries
+        seed: Vary the batteries, see :func:`create_power_supply_tree`
+    
+    Returns:
+        Path of the ``class/power_supply`` directory
+    """
+    base_path = os.path.join(root, 'class', 'power_supply')
+    os.makedirs(base_path, exist_ok=True)
+    control_file = 'charge_control_end_threshold' if backend == 'sysfs' else None
+    _create_batteries(base_path, batteries, limit, control_file, seed)
+    _create_accessories(base_path, adapters, usb_adapters, peripherals)
+    if backend != 'sysfs':
+        path, encode = VENDOR_CONTROL_FILES[backend]
+        path = os.path.join(root, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _write(path, encode(limit))
+    return base_path
+
+
+def main():
+    """Create a synthetic sysfs tree on disk."""
+    parser = argparse.ArgumentParser(
+        description="Create a synthetic sysfs tree with a power_supply class"
+    )
+    parser.add_argument('root', help="Directory standing in for /sys")
+    parser.add_argument('--backend', default='sysfs',
+                        choices=['sysfs'] + sorted(VENDOR_CONTROL_FILES),
+                        help="Where the charge limit is exposed (default: sysfs)")
+    parser.add_argument('--batteries', type=int, default=1, help="Batteries (default: 1)")
+    parser.add_argument('--adapters', type=int, default=1, help="Mains adapters (default: 1)")
+    parser.add_argument('--usb-adapters', type=int, default=0,
+                        help="USB-C Power Delivery ports (default: 0)")
+    parser.add_argument('--peripherals', type=int, default=0,
+                        help="HID peripheral batteries (default: 0)")
+    parser.add_argument('--limit', type=int, default=80, help="Charge limit (default: 80)")
+    parser.add_argument('--seed', type=int,
+                        help="Vary the batteries with this seed (default: identical batteries)")
+    args = parser.parse_args()
+    
+    print(create_sysfs_tree(args.root, args.backend, args.batteries, args.limit, args.adapters,
+                            args.usb_adapters, args.peripherals, args.seed))
+
+
+if __name__ == "__main__":
+    main()
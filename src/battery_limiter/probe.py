@@ -0,0 +1,194 @@
+"""Persistent cache of the battery capability probe.
+
+Discovering which batteries expose a charge threshold means running the
+pre-checks of every backend and asking the matching ones which batteries
+they control. The result only changes with the hardware or the kernel, so
+it is stored keyed by DMI product name/version and kernel release and
+validated on load with one ``stat`` per cached control file and a listing
+of the ``BAT*`` entries present at probe time. Any mismatch triggers a
+fresh probe. Empty results are never stored, since they usually mean the
+driver has not loaded yet.
+"""
+
+import json
+import os
+import tempfile
+from typing import Dict, List, Optional, Tuple
+
+from .backends import backend_specs, sysfs_root
+from .sysfs import read_sysfs
+
+
+# Bumped whenever the cached layout changes
+CACHE_VERSION = 3
+SYSTEM_CACHE_PATH = '/var/cache/battery-limiter/probe.json'
+DMI_PATH = '/sys/class/dmi/id'
+
+
+def default_cache_path() -> str:
+    """Cache file location: system-wide for root, per-user otherwise."""
+    if os.geteuid() == 0:
+        return SYSTEM_CACHE_PATH
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'battery-limiter', 'probe.json')
+
+
+def _read_text(path: str) -> str:
+    try:
+        return read_sysfs(path).strip()
+    except OSError:
+        return ''
+
+
+def hardware_key(base_path: str) -> Dict[str, str]:
+    """Identify the machine, kernel and ``power_supply`` root."""
+    return {
+        'product_name': _read_text(os.path.join(DMI_PATH, 'product_name')),
+        'product_version': _read_text(os.path.join(DMI_PATH, 'product_version')),
+        'kernel': os.uname().release,
+        'base_path': os.path.abspath(base_path),
+    }
+
+
+def _attributes(directory: str) -> List[str]:
+    try:
+        with os.scandir(directory) as entries:
+            return sorted(entry.name for entry in entries if entry.is_file())
+    except OSError:
+        return []
+
+
+def present_batteries(base_path: str) -> List[str]:
+    """Names of the ``BAT*`` entries under ``base_path``, sorted."""
+    try:
+        return sorted(name for name in os.listdir(base_path) if name.startswith('BAT'))
+    except OSError:
+        return []
+
+
+def probe(base_path: str) -> Dict[str, Dict[str, object]]:
+    """Probe every battery under ``base_path``.
+    
+    Backends are tried in order of preference and only imported when their
+    pre-check matches; the first backend claiming a battery controls it.
+    
+    Returns:
+        ``{'backend', 'control_file', 'attributes'}`` for each supported
+        battery, in name order
+    """
+    root = sysfs_root(base_path)
+    batteries = {}
+    for spec in backend_specs():
+        if not spec.matches(root):
+            continue
+        for name, control_file in spec.load().discover(root, base_path).items():
+            if name not in batteries:
+                batteries[name] = {
+                    'backend': spec.name,
+                    'control_file': os.path.abspath(control_file),
+                    'attributes': _attributes(os.path.join(base_path, name)),
+                }
+    return dict(sorted(batteries.items()))
+
+
+class ProbeCache:
+    """Probe results persisted across runs.
+    
+    Results are also kept in memory, so the controllers of one process
+    share a single load of the cache file.
+    """
+    
+    def __init__(self, path: Optional[str] = None, persistent: bool = True):
+        """Initialize the cache.
+        
+        Args:
+            path: Cache file (default: :func:`default_cache_path`)
+            persistent: Whether to use the cache file at all; otherwise
+                results are only shared within the process
+        """
+        self.path = path or default_cache_path()
+        self.persistent = persistent
+        self._results: Dict[str, Dict[str, Dict[str, object]]] = {}
+        self.hits = 0
+        self.misses = 0
+    
+    def _load(self) -> Optional[Dict]:
+        if not self.persistent:
+            return None
+        try:
+            with open(self.path, 'rb') as f:
+                data = json.loads(f.read())
+        except (OSError, ValueError):
+            return None
+        if not isinstance(data, dict) or data.get('version') != CACHE_VERSION:
+            return None
+        return data
+    
+    @staticmethod
+    def _valid(data: Dict, base_path: str, key: Dict[str, str]) -> bool:
+        if data.get('key') != key or not data.get('batteries'):
+            return False
+        # A battery added or removed since the probe changes the answer
+        if data.get('present') != present_batteries(base_path):
+            return False
+        for name, entry in data['batteries'].items():
+            try:
+                os.stat(entry['control_file'])
+            except (OSError, KeyError, TypeError):
+                return False
+        return True
+    
+    def _store(self, key: Dict[str, str], batteries: Dict[str, Dict[str, object]],
+               present: List[str]) -> None:
+        if not self.persistent or not batteries:
+            return
+        directory = os.path.dirname(self.path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=directory, prefix='.probe-')
+        except OSError:
+            # A read-only cache only costs the next startup a probe
+            return
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'version': CACHE_VERSION, 'key': key, 'present': present,
+                           'batteries': batteries}, f)
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, self.path)
+        except OSError:
+            os.unlink(tmp)
+    
+    def batteries(self, base_path: str, refresh: bool = False) -> Dict[str, Dict[str, object]]:
+        """Return the probe result for ``base_path``, probing only when needed.
+        
+        Args:
+            base_path: Path to the ``power_supply`` class directory
+            refresh: Ignore the stored result, e.g. after hotplug
+        """
+        if not refresh and base_path in self._results:
+            return self._results[base_path]
+        key = hardware_key(base_path)
+        data = None if refresh else self._load()
+        if data is not None and self._valid(data, base_path, key):
+            self.hits += 1
+            batteries = data['batteries']
+        else:
+            self.misses += 1
+            present = present_batteries(base_path)
+            batteries = probe(base_path)
+            self._store(key, batteries, present)
+        self._results[base_path] = batteries
+        return batteries
+    
+    def control_files(self, base_path: str, refresh: bool = False) -> List[Tuple[str, str]]:
+        """Return ``(battery, control file path)`` pairs in name order."""
+        return [(name, entry['control_file'])
+                for name, entry in self.batteries(base_path, refresh).items()]
+    
+    def clear(self) -> None:
+        """Delete the stored result."""
+        self._results.clear()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,275 @@
+"""Low-wakeup battery telemetry sampling."""
+
+import threading
+import time
+from array import array
+from typing import Callable, Dict, List, Optional
+
+from .core import BatteryController, BatterySnapshot
+
+
+# Compact status codes shared by the in-memory buffer and on-disk history
+STATUS_CODES = {
+    'Unknown': 0,
+    'Charging': 1,
+    'Discharging': 2,
+    'Not charging': 3,
+    'Full': 4,
+}
+STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+
+# Stored in integer columns when the driver does not report a value
+MISSING = -(2 ** 31)
+# Largest values the capacity and 32-bit columns hold; bigger readings
+# from a misbehaving driver are clamped rather than dropped
+MAX_CAPACITY = 2 ** 15 - 1
+MAX_INT = 2 ** 31 - 1
+
+
+def clamp(value: int, low: int, high: int) -> int:
+    """Limit ``value`` to ``[low, high]``."""
+    return low if value < low else high if value > high else value
+
+
+class RingBuffer:
+    """Fixed-size columnar buffer of battery samples.
+    
+    Every column is a preallocated :class:`array.array`, so recording a
+    sample only overwrites machine integers in place.
+    """
+    
+    COLUMNS = ('timestamp', 'capacity', 'status', 'power_now', 'voltage_now', 'temp')
+    
+    def __init__(self, size: int = 4096):
+        """Initialize the buffer.
+        
+        Args:
+            size: Maximum number of samples kept
+        """
+        if size < 1:
+            raise ValueError("Ring buffer size must be positive")
+        self.size = size
+        self.timestamp = array('d', bytes(8 * size))
+        self.capacity = array('h', bytes(2 * size))
+        self.status = array('B', bytes(size))
+        self.power_now = array('i', bytes(4 * size))
+        self.voltage_now = array('i', bytes(4 * size))
+        self.temp = array('i', bytes(4 * size))
+        self._next = 0
+        self._count = 0
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return self._count
+    
+    def append(self, timestamp: float, capacity: Optional[int], status: Optional[str],
+               power_now: Optional[int], voltage_now: Optional[int],
+               temp: Optional[int]) -> None:
+        """Record one sample, overwriting the oldest when full.
+        
+        Values outside a column's range are clamped to it.
+        """
+        with self._lock:
+            i = self._next
+            self.timestamp[i] = timestamp
+            self.capacity[i] = -1 if capacity is None else clamp(capacity, 0, MAX_CAPACITY)
+            self.status[i] = STATUS_CODES.get(status, 0)
+            self.power_now[i] = (MISSING if power_now is None
+                                 else clamp(power_now, -MAX_INT, MAX_INT))
+            self.voltage_now[i] = (MISSING if voltage_now is None
+                                   else clamp(voltage_now, -MAX_INT, MAX_INT))
+            self.temp[i] = MISSING if temp is None else clamp(temp, -MAX_INT, MAX_INT)
+            self._next = (i + 1) % self.size
+            if self._count < self.size:
+                self._count += 1
+    
+    def append_snapshot(self, timestamp: float, snapshot: BatterySnapshot) -> None:
+        """Record the sampled fields of a snapshot."""
+        self.append(timestamp, snapshot.capacity, snapshot.status,
+                    snapshot.power_now, snapshot.voltage_now, snapshot.temp)
+    
+    def _indices(self) -> range:
+        start = (self._next - self._count) % self.size
+        return range(start, start + self._count)
+    
+    def query(self, since: Optional[float] = None, until: Optional[float] = None,
+              limit: Optional[int] = None) -> Dict[str, List]:
+        """Return samples in chronological order, one list per column.
+        
+        Args:
+            since: Only samples at or after this timestamp
+            until: Only samples at or before this timestamp
+            limit: Only the most recent ``limit`` matching samples
+        
+        Returns:
+            Mapping of column name to values; missing values are ``None``
+            and status codes are decoded to names
+        """
+        with self._lock:
+            positions = [i % self.size for i in self._indices()]
+            if since is not None or until is not None:
+                lo = float('-inf') if since is None else since
+                hi = float('inf') if until is None else until
+                positions = [i for i in positions if lo <= self.timestamp[i] <= hi]
+            if limit is not None:
+                positions = positions[-limit:] if limit > 0 else []
+            
+            result: Dict[str, List] = {name: [] for name in self.COLUMNS}
+            for i in positions:
+                result['timestamp'].append(self.timestamp[i])
+                capacity = self.capacity[i]
+                result['capacity'].append(None if capacity < 0 else capacity)
+                result['status'].append(STATUS_NAMES.get(self.status[i], 'Unknown'))
+                for name in ('power_now', 'voltage_now', 'temp'):
+                    value = getattr(self, name)[i]
+                    result[name].append(None if value == MISSING else value)
+        return result
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._next = 0
+            self._count = 0
+
+
+class SamplingPolicy:
+    """Choose the next sampling interval from the battery state.
+    
+    Sampling is fast only while charging close to the limit, where the
+    firmware is about to stop charging, and very slow once the battery
+    sits at the limit on AC. A wakeup budget caps the rate overall.
+    """
+    
+    def __init__(self, fast: float = 30.0, normal: float = 120.0,
+                 discharging: float = 300.0, idle: float = 1800.0,
+                 near_limit: int = 5, wakeups_per_hour: float = 60.0):
+        """Initialize the policy.
+        
+        Args:
+            fast: Interval while charging within ``near_limit`` of the limit
+            normal: Interval while charging further below the limit
+            discharging: Interval while running on battery
+            idle: Interval on AC at the limit, full or in an unknown state
+            near_limit: Percentage points below the limit counted as "near"
+            wakeups_per_hour: Upper bound on sampler wakeups
+        """
+        if wakeups_per_hour <= 0:
+            raise ValueError("Wakeup budget must be positive")
+        self.fast = fast
+        self.normal = normal
+        self.discharging = discharging
+        self.idle = idle
+        self.near_limit = near_limit
+        self.wakeups_per_hour = wakeups_per_hour
+    
+    @property
+    def min_interval(self) -> float:
+        """Shortest interval the wakeup budget allows."""
+        return 3600.0 / self.wakeups_per_hour
+    
+    def interval(self, snapshot: Optional[BatterySnapshot]) -> float:
+        """Seconds to wait before the next sample."""
+        if snapshot is None:
+            interval = self.idle
+        elif snapshot.status == 'Charging':
+            limit = snapshot.limit or 100
+            if snapshot.capacity is not None and snapshot.capacity >= limit - self.near_limit:
+                interval = self.fast
+            else:
+                interval = self.normal
+        elif snapshot.status == 'Discharging':
+            interval = self.discharging
+        else:
+            interval = self.idle
+        return max(interval, self.min_interval)
+
+
+class Sampler:
+    """Record battery telemetry into a :class:`RingBuffer` on a background thread."""
+    
+    def __init__(self, controller: BatteryController, buffer: Optional[RingBuffer] = None,
+                 policy: Optional[SamplingPolicy] = None,
+                 clock: Callable[[], float] = time.time, history=None):
+        """Initialize the sampler.
+        
+        Args:
+            controller: Battery to sample
+            buffer: Destination buffer; a 4096-sample buffer by default
+            policy: Interval policy; defaults to :class:`SamplingPolicy`
+            clock: Time source for sample timestamps
+            history: Optional :class:`~battery_limiter.history.HistoryStore`
+                that also receives every sample
+        """
+        self.controller = controller
+        self.buffer = buffer if buffer is not None else RingBuffer()
+        self.policy = policy if policy is not None else SamplingPolicy()
+        self.clock = clock
+        self.history = history
+        self.wakeups = 0
+        self._last_stored: Optional[float] = None
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def sample(self) -> float:
+        """Take one sample now.
+        
+        Returns:
+            Seconds until the next sample is due
+        """
+        snapshot = self.controller.get_snapshot()
+        if snapshot is not None:
+            self._store(self.clock(), snapshot)
+        return self.policy.interval(snapshot)
+    
+    def _store(self, timestamp: float, snapshot: BatterySnapshot) -> None:
+        self._last_stored = timestamp
+        self.buffer.append_snapshot(timestamp, snapshot)
+        if self.history is not None:
+            try:
+                self.history.append_snapshot(snapshot, timestamp)
+            except OSError:
+                pass
+    
+    def record(self, name: str, snapshot: BatterySnapshot) -> None:
+        """Record a snapshot delivered by a :class:`~battery_limiter.watch.BatteryWatcher`.
+        
+        Suitable as a watcher callback; it costs no extra wakeup. Drivers
+        can send several uevents a second, so snapshots arriving sooner
+        than the policy's :attr:`~SamplingPolicy.min_interval` after the
+        last stored sample are left out.
+        """
+        if name != self.controller.name or snapshot is None:
+            return
+        timestamp = self.clock()
+        if (self._last_stored is not None
+                and timestamp - self._last_stored < self.policy.min_interval):
+            return
+        self._store(timestamp, snapshot)
+    
+    def query(self, since: Optional[float] = None, until: Optional[float] = None,
+              limit: Optional[int] = None) -> Dict[str, List]:
+        """Return recorded samples; see :meth:`RingBuffer.query`."""
+        return self.buffer.query(since, until, limit)
+    
+    def run(self) -> None:
+        """Sample until :meth:`stop` is called."""
+        while not self._stopped.is_set():
+            interval = self.sample()
+            self.wakeups += 1
+            self._stopped.wait(interval)
+    
+    def start(self) -> None:
+        """Run the sampler on a daemon thread."""
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self.run, name='battery-sampler', daemon=True)
+        self._thread.start()
+    
+    def stop(self) -> None:
+        """Stop the sampling thread."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.history is not None:
+            self.history.flush()
@@ -0,0 +1,494 @@
+"""Time-of-day charge limit schedule.
+
+A schedule is a list of weekly rules (``mon-fri 22:00 60``: from 22:00 on
+weekdays the limit is 60%) and one-off overrides (``override
+2026-10-20T06:00 2026-10-20T09:00 100``). The limit in force is the one of
+the newest active override, otherwise of the most recent rule transition.
+
+:class:`Scheduler` sleeps on a ``CLOCK_REALTIME`` timerfd armed for the
+exact next transition, so there are no wakeups in between. The timer is
+absolute and cancelled when the clock is set, which makes it fire on time
+after suspend and get recomputed after clock or timezone changes.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, List, Optional, Tuple
+
+
+SCHEDULE_PATH = '/etc/battery-limiter/schedule'
+
+DAY_NAMES = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+
+CLOCK_REALTIME = 0
+TFD_TIMER_ABSTIME = 1
+TFD_TIMER_CANCEL_ON_SET = 2
+
+
+class ScheduleError(ValueError):
+    """Exception raised for malformed schedule entries."""
+    pass
+
+
+def parse_limit(text: str) -> int:
+    """Parse a charge limit such as ``80`` or ``80%``.
+    
+    Raises:
+        ScheduleError: If it is not a number between 1 and 100
+    """
+    try:
+        limit = int(text.rstrip('%'))
+    except ValueError:
+        raise ScheduleError(f"Invalid charge limit: {text}")
+    if not 1 <= limit <= 100:
+        raise ScheduleError(f"Charge limit must be between 1 and 100, got {limit}")
+    return limit
+
+
+def parse_days(text: str) -> Tuple[int, ...]:
+    """Parse weekdays such as ``mon-fri``, ``sat,sun`` or ``daily`` (0 = Monday).
+    
+    Raises:
+        ScheduleError: If a day name is unknown
+    """
+    if text in ('*', 'daily'):
+        return tuple(range(7))
+    days = set()
+    for part in text.lower().split(','):
+        first, _, last = part.partition('-')
+        try:
+            start = DAY_NAMES.index(first[:3])
+            end = DAY_NAMES.index(last[:3]) if last else start
+        except ValueError:
+            raise ScheduleError(f"Invalid days: {text}")
+        day = start
+        days.add(day)
+        while day != end:
+            day = (day + 1) % 7
+            days.add(day)
+    return tuple(sorted(days))
+
+
+def format_days(days: Tuple[int, ...]) -> str:
+    """Inverse of :func:`parse_days`, with runs of days as ranges."""
+    if len(days) == 7:
+        return 'daily'
+    # Collapse runs of consecutive days into ranges
+    parts = []
+    start = prev = days[0]
+    for day in days[1:] + (None,):
+        if day is not None and day == prev + 1:
+            prev = day
+            continue
+        parts.append(DAY_NAMES[start] if start == prev else f"{DAY_NAMES[start]}-{DAY_NAMES[prev]}")
+        if day is not None:
+            start = prev = day
+    return ','.join(parts)
+
+
+def _parse_datetime(text: str) -> datetime:
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        raise ScheduleError(f"Invalid date and time: {text}")
+
+
+class Rule:
+    """Weekly transition to a charge limit."""
+    
+    __slots__ = ('days', 'hour', 'minute', 'limit')
+    
+    def __init__(self, days: Iterable[int], hour: int, minute: int, limit: int):
+        self.days = tuple(sorted(set(days)))
+        self.hour = hour
+        self.minute = minute
+        self.limit = limit
+    
+    @classmethod
+    def parse(cls, text: str) -> 'Rule':
+        """Parse ``DAYS HH:MM LIMIT``, e.g. ``mon-fri 07:00 100``.
+        
+        ``DAYS`` is ``daily``, ``*`` or a comma-separated list of day names
+        and ranges.
+        
+        Raises:
+            ScheduleError: If the rule is malformed
+        """
+        fields = text.split()
+        if len(fields) != 3:
+            raise ScheduleError(f"Expected 'DAYS HH:MM LIMIT', got: {text}")
+        days, clock, limit = fields
+        try:
+            hour, minute = (int(part) for part in clock.split(':'))
+        except ValueError:
+            raise ScheduleError(f"Invalid time: {clock}")
+        if not (0 <= hour < 24 and 0 <= minute < 60):
+            raise ScheduleError(f"Invalid time: {clock}")
+        return cls(parse_days(days), hour, minute, parse_limit(limit))
+    
+    def __str__(self) -> str:
+        return f"{format_days(self.days)} {self.hour:02d}:{self.minute:02d} {self.limit}"
+    
+    def next_after(self, moment: datetime) -> datetime:
+        """First occurrence strictly after ``moment``."""
+        day = moment.replace(hour=self.hour, minute=self.minute, second=0, microsecond=0)
+        for offset in range(8):
+            candidate = day + timedelta(days=offset)
+            if candidate > moment and candidate.weekday() in self.days:
+                return candidate
+        raise AssertionError("a rule occurs at least once a week")
+    
+    def last_at_or_before(self, moment: datetime) -> datetime:
+        """Latest occurrence at or before ``moment``."""
+        day = moment.replace(hour=self.hour, minute=self.minute, second=0, microsecond=0)
+        for offset in range(8):
+            candidate = day - timedelta(days=offset)
+            if candidate <= moment and candidate.weekday() in self.days:
+                return candidate
+        raise AssertionError("a rule occurs at least once a week")
+
+
+class Override:
+    """One-off charge limit for a period of time."""
+    
+    __slots__ = ('start', 'end', 'limit')
+    
+    def __init__(self, start: datetime, end: Optional[datetime], limit: int):
+        """Initialize the override.
+        
+        Args:
+            start: When the override takes effect
+            end: When it stops; ``None`` lasts until the next rule transition
+            limit: Charge limit while active
+        """
+        self.start = start
+        self.end = end
+        self.limit = limit
+    
+    @classmethod
+    def parse(cls, text: str) -> 'Override':
+        """Parse ``START [END] LIMIT`` with ISO 8601 local times.
+        
+        Raises:
+            ScheduleError: If the override is malformed
+        """
+        fields = text.split()
+        if len(fields) not in (2, 3):
+            raise ScheduleError(f"Expected 'START [END] LIMIT', got: {text}")
+        start = _parse_datetime(fields[0])
+        end = _parse_datetime(fields[1]) if len(fields) == 3 else None
+        if end is not None and end <= start:
+            raise ScheduleError(f"Override ends before it starts: {text}")
+        return cls(start, end, parse_limit(fields[-1]))
+    
+    def __str__(self) -> str:
+        times = [self.start.isoformat(timespec='minutes')]
+        if self.end is not None:
+            times.append(self.end.isoformat(timespec='minutes'))
+        return f"{' '.join(times)} {self.limit}"
+
+
+class Schedule:
+    """Weekly rules plus one-off overrides."""
+    
+    def __init__(self, rules: Iterable[Rule] = (), overrides: Iterable[Override] = ()):
+        self.rules: List[Rule] = list(rules)
+        self.overrides: List[Override] = list(overrides)
+    
+    @classmethod
+    def parse(cls, text: str) -> 'Schedule':
+        """Parse a schedule file: one rule or ``override ...`` per line.
+        
+        Blank lines and ``#`` comments are ignored.
+        
+        Raises:
+            ScheduleError: If a line is malformed
+        """
+        schedule = cls()
+        for number, line in enumerate(text.splitlines(), 1):
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            try:
+                if line.startswith('override '):
+                    schedule.overrides.append(Override.parse(line[len('override '):]))
+                else:
+                    schedule.rules.append(Rule.parse(line))
+            except ScheduleError as e:
+                raise ScheduleError(f"line {number}: {e}")
+        return schedule
+    
+    def format(self) -> str:
+        lines = ["# DAYS HH:MM LIMIT, or: override START [END] LIMIT"]
+        lines.extend(str(rule) for rule in self.rules)
+        lines.extend(f"override {override}" for override in self.overrides)
+        return "\n".join(lines) + "\n"
+    
+    def __bool__(self) -> bool:
+        return bool(self.rules or self.overrides)
+    
+    def _last_rule(self, moment: datetime) -> Optional[Rule]:
+        latest = None
+        latest_at = None
+        for rule in self.rules:
+            at = rule.last_at_or_before(moment)
+            # Later rules win ties
+            if latest_at is None or at >= latest_at:
+                latest, latest_at = rule, at
+        return latest
+    
+    def _next_rule_time(self, moment: datetime) -> Optional[datetime]:
+        times = [rule.next_after(moment) for rule in self.rules]
+        return min(times) if times else None
+    
+    def _override_end(self, override: Override) -> Optional[datetime]:
+        if override.end is not None:
+            return override.end
+        return self._next_rule_time(override.start)
+    
+    def limit_at(self, moment: datetime) -> Optional[int]:
+        """Charge limit in force at ``moment``, or ``None`` if unscheduled."""
+        active = None
+        for override in self.overrides:
+            end = self._override_end(override)
+            if override.start <= moment and (end is None or moment < end):
+                if active is None or override.start >= active.start:
+                    active = override
+        if active is not None:
+            return active.limit
+        rule = self._last_rule(moment)
+        return rule.limit if rule is not None else None
+    
+    def next_transition(self, moment: datetime) -> Optional[datetime]:
+        """First time after ``moment`` at which the limit may change."""
+        times = []
+        rule_time = self._next_rule_time(moment)
+        if rule_time is not None:
+            times.append(rule_time)
+        for override in self.overrides:
+            if override.start > moment:
+                times.append(override.start)
+            end = self._override_end(override)
+            if end is not None and end > moment:
+                times.append(end)
+        return min(times) if times else None
+    
+    def prune(self, moment: datetime) -> None:
+        """Drop overrides that ended before ``moment``."""
+        kept = []
+        for override in self.overrides:
+            end = self._override_end(override)
+            if end is None or end > moment:
+                kept.append(override)
+        self.overrides = kept
+
+
+def load_schedule(path: str = SCHEDULE_PATH, now: Optional[datetime] = None) -> Schedule:
+    """Read a schedule file; a missing file is an empty schedule.
+    
+    Overrides that ended before ``now`` (default: the current time) are
+    left out.
+    
+    Raises:
+        ScheduleError: If the file is malformed
+    """
+    try:
+        with open(path, 'r') as f:
+            schedule = Schedule.parse(f.read())
+    except FileNotFoundError:
+        return Schedule()
+    schedule.prune(now or datetime.now())
+    return schedule
+
+
+def save_schedule(schedule: Schedule, path: str = SCHEDULE_PATH,
+                  now: Optional[datetime] = None) -> None:
+    """Write a schedule file atomically, dropping overrides that have ended.
+    
+    Raises:
+        OSError: If the file cannot be written
+    """
+    schedule.prune(now or datetime.now())
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    # A private name per writer, removed again if anything fails
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.schedule-')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(schedule.format())
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except OSError:
+        os.unlink(tmp)
+        raise
+
+
+class _Timespec(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+
+class _Itimerspec(ctypes.Structure):
+    _fields_ = [('it_interval', _Timespec), ('it_value', _Timespec)]
+
+
+class RealtimeTimer:
+    """Absolute ``CLOCK_REALTIME`` timerfd that also fires on clock changes."""
+    
+    def __init__(self):
+        """Create the timer.
+        
+        Raises:
+            OSError: If timerfd is unavailable
+        """
+        libc_name = ctypes.util.find_library('c')
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self._libc.timerfd_create(CLOCK_REALTIME, os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+    
+    def fileno(self) -> int:
+        return self.fd
+    
+    def arm(self, when: Optional[float]) -> None:
+        """Fire at wall-clock time ``when`` (``None`` disarms)."""
+        spec = _Itimerspec()
+        if when is not None:
+            # A zero it_value would disarm; fire overdue times immediately
+            when = max(when, 1e-9)
+            spec.it_value.tv_sec = int(when)
+            spec.it_value.tv_nsec = int((when - int(when)) * 1e9)
+        if self._libc.timerfd_settime(self.fd, TFD_TIMER_ABSTIME | TFD_TIMER_CANCEL_ON_SET,
+                                      ctypes.byref(spec), None) < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+    
+    def read(self) -> None:
+        """Acknowledge an expiry or clock change."""
+        try:
+            os.read(self.fd, 8)
+        except OSError as e:
+            # ECANCELED reports a clock change; EAGAIN a spurious wakeup
+            if e.errno not in (errno.ECANCELED, errno.EAGAIN):
+                raise
+    
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class Scheduler:
+    """Apply a :class:`Schedule` at each transition.
+    
+    The scheduled limit is only written when it differs from the one
+    applied at the previous transition, so a limit changed by hand stays
+    in place until the schedule next moves (or until resume or a battery
+    swap re-applies the limit stored in ``/etc/bcl.conf``).
+    """
+    
+    def __init__(self, schedule: Schedule, apply: Callable[[int], object],
+                 clock: Callable[[], float] = time.time, use_timerfd: bool = True):
+        """Initialize the scheduler.
+        
+        Args:
+            schedule: Rules and overrides to follow
+            apply: Called with each new scheduled limit, e.g.
+                ``fleet.set_limits``
+            clock: Wall-clock time source (seconds since the epoch)
+            use_timerfd: Sleep on a timerfd; otherwise the caller drives
+                :meth:`update` using :meth:`timeout`
+        """
+        self.schedule = schedule
+        self.apply = apply
+        self.clock = clock
+        self.current: Optional[int] = None
+        self.next_time: Optional[datetime] = None
+        self.timer: Optional[RealtimeTimer] = None
+        if use_timerfd:
+            try:
+                self.timer = RealtimeTimer()
+            except (OSError, AttributeError):
+                self.timer = None
+        self._stop = threading.Event()
+        self._wakeup_r, self._wakeup_w = os.pipe2(os.O_NONBLOCK | os.O_CLOEXEC)
+    
+    def now(self) -> datetime:
+        return datetime.fromtimestamp(self.clock())
+    
+    def set_schedule(self, schedule: Schedule) -> None:
+        """Replace the schedule and re-evaluate it immediately."""
+        self.schedule = schedule
+        self.current = None
+        self.update()
+    
+    def update(self) -> Optional[datetime]:
+        """Apply the limit in force now and arm the timer for the next change.
+        
+        Returns:
+            Time of the next transition, or ``None`` if there is none
+        """
+        now = self.now()
+        limit = self.schedule.limit_at(now)
+        if limit is not None and limit != self.current:
+            self.apply(limit)
+        self.current = limit
+        self.next_time = self.schedule.next_transition(now)
+        if self.timer is not None:
+            self.timer.arm(self.next_time.timestamp() if self.next_time else None)
+        return self.next_time
+    
+    def timeout(self) -> Optional[float]:
+        """Seconds until the next transition (for callers without a timerfd)."""
+        if self.next_time is None:
+            return None
+        return max(0.0, self.next_time.timestamp() - self.clock())
+    
+    def fileno(self) -> Optional[int]:
+        return self.timer.fileno() if self.timer is not None else None
+    
+    def handle(self) -> None:
+        """Process a timer expiry or clock change."""
+        if self.timer is not None:
+            self.timer.read()
+        self.update()
+    
+    def run(self) -> None:
+        """Follow the schedule until :meth:`stop` is called."""
+        self._stop.clear()
+        poller = select.poll()
+        poller.register(self._wakeup_r, select.POLLIN)
+        if self.timer is not None:
+            poller.register(self.timer.fileno(), select.POLLIN)
+        self.update()
+        while not self._stop.is_set():
+            if self.timer is not None:
+                timeout = None
+            else:
+                timeout = self.timeout()
+            events = poller.poll(None if timeout is None else timeout * 1000)
+            if self._stop.is_set():
+                break
+            if any(fd == self._wakeup_r for fd, _ in events):
+                os.read(self._wakeup_r, 64)
+            if any(fd != self._wakeup_r for fd, _ in events) or not events:
+                self.handle()
+    
+    def stop(self) -> None:
+        self._stop.set()
+        try:
+            os.write(self._wakeup_w, b'x')
+        except BlockingIOError:
+            pass
+    
+    def close(self) -> None:
+        if self.timer is not None:
+            self.timer.close()
+            self.timer = None
+        os.close(self._wakeup_r)
+        os.close(self._wakeup_w)
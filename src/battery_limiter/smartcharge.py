@@ -0,0 +1,531 @@
+"""Predictive charge limit that learns when the machine is unplugged.
+
+:class:`UnplugModel` keeps an exponentially weighted weekly profile of
+unplug times (15-minute slots per weekday) and the observed charge rate.
+It is updated incrementally from every sample, so it costs a few
+arithmetic operations per sample and one pass over a weekday's slots per
+day. :class:`SmartChargePolicy` holds the battery at a low limit and
+raises it to the target just early enough to reach it by the predicted
+unplug time. :class:`SmartCharger` feeds a :class:`BatteryController`'s
+samples through both and writes the resulting limit.
+
+Plugged in means any status other than ``Discharging``, which is also
+what the recorded history stores.
+
+Nothing in the CLI or daemon uses it yet; it is a library for callers
+that run their own watcher. Run ``python -m battery_limiter.smartcharge``
+to replay synthetic weeks through a mock ``power_supply`` tree and
+compare the policy with fixed limits.
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from .core import BatteryControlError, BatteryController, BatterySnapshot
+from .mocksys import create_sysfs_tree, update_battery
+from .probe import ProbeCache
+from .sampler import STATUS_NAMES
+
+
+SLOT_SECONDS = 900
+SLOTS_PER_DAY = 86400 // SLOT_SECONDS
+
+MODEL_VERSION = 1
+
+
+def _slot(moment: datetime) -> int:
+    return (moment.hour * 3600 + moment.minute * 60 + moment.second) // SLOT_SECONDS
+
+
+class UnplugModel:
+    """Weekly unplug profile and charge rate, fitted one sample at a time."""
+    
+    def __init__(self, half_life_days: float = 28.0, rate_weight: float = 0.1):
+        """Initialize an empty model.
+        
+        Args:
+            half_life_days: Age at which an observed day counts half; each
+                weekday decays once a week, so the default forgets a
+                routine in about a month
+            rate_weight: Weight of each new charge rate sample
+        """
+        self.decay = 0.5 ** (7.0 / half_life_days)
+        self.rate_weight = rate_weight
+        # Weighted unplug count per weekday and slot, and weighted days observed
+        self.events: List[List[float]] = [[0.0] * SLOTS_PER_DAY for _ in range(7)]
+        self.days: List[float] = [0.0] * 7
+        # Percent per hour while charging
+        self.charge_rate: Optional[float] = None
+        self._day: Optional[int] = None
+        self._weekday = 0
+        # Unplug slots of the current day, folded in when the day is over
+        self._today: List[int] = []
+        self._plugged: Optional[bool] = None
+        self._last_charging: Optional[tuple] = None
+        # Bumped whenever the profile changes, to reuse predictions
+        self.version = 0
+        self._prediction_key: Optional[tuple] = None
+        self._prediction: Optional[float] = None
+    
+    @property
+    def plugged(self) -> Optional[bool]:
+        """Whether the last sample was on AC, ``None`` before any sample."""
+        return self._plugged
+    
+    def observe(self, timestamp: float, status: Optional[str], capacity: Optional[int] = None,
+                power: Optional[int] = None, energy_full: Optional[int] = None) -> None:
+        """Update the model with one sample.
+        
+        Args:
+            timestamp: Sample time (seconds since the epoch)
+            status: Battery status as reported by the kernel
+            capacity: State of charge in percent
+            power: ``power_now`` in µW
+            energy_full: ``energy_full`` in µWh, to turn power into percent
+                per hour
+        """
+        moment = datetime.fromtimestamp(timestamp)
+        weekday = moment.weekday()
+        day = moment.toordinal()
+        if day != self._day:
+            self._close_day(day)
+            self._day = day
+            self._weekday = weekday
+        
+        if status is None or status == 'Unknown':
+            return
+        plugged = status != 'Discharging'
+        if self._plugged and not plugged:
+            self._today.append(_slot(moment))
+        self._plugged = plugged
+        
+        if status != 'Charging':
+            self._last_charging = None
+            return
+        rate = None
+        if power and energy_full:
+            rate = power / energy_full * 100
+        elif capacity is not None:
+            if self._last_charging is not None:
+                last_time, last_capacity = self._last_charging
+                if timestamp > last_time and capacity > last_capacity:
+                    rate = (capacity - last_capacity) / (timestamp - last_time) * 3600
+            self._last_charging = (timestamp, capacity)
+        if rate is not None and rate > 0:
+            if self.charge_rate is None:
+                self.charge_rate = rate
+            else:
+                self.charge_rate += self.rate_weight * (rate - self.charge_rate)
+    
+    def _close_day(self, day: int) -> None:
+        # Only complete days count, so a day's unplugs are not predicted
+        # as missed before they happen
+        if self._day is None:
+            return
+        self._fade(self._weekday, self.decay)
+        for slot in self._today:
+            self.events[self._weekday][slot] += 1.0
+        self.days[self._weekday] += 1.0
+        self._today = []
+        
+        # Days without samples in between (machine off or away) are not
+        # observed, but their weekdays still age
+        skipped = day - self._day - 1
+        for offset in range(min(skipped, 7)):
+            weeks = (skipped - offset + 6) // 7
+            self._fade((self._weekday + 1 + offset) % 7, self.decay ** weeks)
+        self.version += 1
+    
+    def _fade(self, weekday: int, factor: float) -> None:
+        row = self.events[weekday]
+        for i in range(SLOTS_PER_DAY):
+            row[i] *= factor
+        self.days[weekday] *= factor
+    
+    @property
+    def observed_days(self) -> float:
+        return sum(self.days)
+    
+    def next_unplug(self, timestamp: float, confidence: float = 0.5,
+                    min_days: float = 3.0) -> Optional[float]:
+        """Predict the next unplug time.
+        
+        Walks the weekly profile forward from ``timestamp`` until the
+        expected number of unplugs reaches ``confidence``; lower values
+        predict earlier, more conservatively.
+        
+        Returns:
+            Start of the predicted 15-minute slot (possibly the current
+            one), or ``None`` without enough history or unplug events
+        """
+        if self.observed_days < min_days:
+            return None
+        moment = datetime.fromtimestamp(timestamp)
+        slot = _slot(moment)
+        key = (self.version, moment.toordinal(), slot, confidence)
+        if key == self._prediction_key:
+            return self._prediction
+        
+        midnight = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+        weekday = moment.weekday()
+        prediction = None
+        expected = 0.0
+        for offset in range(7 * SLOTS_PER_DAY):
+            day, index = divmod(slot + offset, SLOTS_PER_DAY)
+            wd = (weekday + day) % 7
+            if self.days[wd]:
+                expected += self.events[wd][index] / self.days[wd]
+            if expected >= confidence:
+                start = midnight + timedelta(days=day, seconds=index * SLOT_SECONDS)
+                prediction = start.timestamp()
+                break
+        self._prediction_key = key
+        self._prediction = prediction
+        return prediction
+    
+    def to_dict(self) -> Dict:
+        return {
+            'version': MODEL_VERSION,
+            'decay': self.decay,
+            'rate_weight': self.rate_weight,
+            'events': self.events,
+            'days': self.days,
+            'charge_rate': self.charge_rate,
+            'day': self._day,
+            'weekday': self._weekday,
+            'today': self._today,
+            'plugged': self._plugged,
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'UnplugModel':
+        """Restore a model saved with :meth:`to_dict`.
+        
+        Raises:
+            ValueError: If the data is from another version or malformed
+        """
+        if data.get('version') != MODEL_VERSION:
+            raise ValueError(f"Unsupported model version: {data.get('version')}")
+        model = cls(rate_weight=data['rate_weight'])
+        model.decay = data['decay']
+        events = [[float(value) for value in row] for row in data['events']]
+        if len(events) != 7 or any(len(row) != SLOTS_PER_DAY for row in events):
+            raise ValueError("Malformed unplug profile")
+        model.events = events
+        model.days = [float(value) for value in data['days']]
+        model.charge_rate = data['charge_rate']
+        model._day = data['day']
+        model._weekday = data['weekday']
+        model._today = [int(slot) for slot in data['today']]
+        model._plugged = data['plugged']
+        return model
+    
+    @classmethod
+    def load(cls, path: str) -> 'UnplugModel':
+        """Read a saved model; a missing or unreadable file gives an empty one."""
+        try:
+            with open(path, 'r') as f:
+                return cls.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError):
+            return cls()
+    
+    def save(self, path: str) -> None:
+        """Write the model atomically.
+        
+        Raises:
+            OSError: If the file cannot be written
+        """
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        # A private name per writer, removed again if anything fails
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.smartcharge-')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.to_dict(), f)
+            os.replace(tmp, path)
+        except OSError:
+            os.unlink(tmp)
+            raise
+
+
+class SmartChargePolicy:
+    """Hold a low limit and raise it ahead of the predicted unplug."""
+    
+    def __init__(self, model: UnplugModel, low: int = 60, target: int = 100,
+                 margin: float = 1800.0, default_rate: float = 30.0,
+                 confidence: float = 0.5, grace: float = 3600.0):
+        """Initialize the policy.
+        
+        Args:
+            model: Unplug profile and charge rate
+            low: Limit held while no unplug is near
+            target: Limit to reach by the predicted unplug
+            margin: Seconds of slack before the predicted unplug
+            default_rate: Charge rate in percent per hour until one is observed
+            confidence: See :meth:`UnplugModel.next_unplug`
+            grace: Seconds to keep the target after a predicted unplug that
+                did not happen
+        """
+        self.model = model
+        self.low = low
+        self.target = target
+        self.margin = margin
+        self.default_rate = default_rate
+        self.confidence = confidence
+        self.grace = grace
+        # Predicted unplug the target was raised for; kept until the
+        # machine is unplugged so the limit does not flap while charging
+        self._raised_for: Optional[float] = None
+    
+    def charge_time(self, capacity: Optional[int]) -> float:
+        """Seconds needed to charge from ``capacity`` (or ``low``) to the target."""
+        start = self.low if capacity is None else min(capacity, self.low)
+        rate = self.model.charge_rate or self.default_rate
+        return max(0, self.target - start) / rate * 3600
+    
+    def limit_at(self, timestamp: float, capacity: Optional[int] = None) -> int:
+        """Limit to apply at ``timestamp``."""
+        if self._raised_for is not None:
+            if self.model.plugged is False or timestamp > self._raised_for + self.grace:
+                self._raised_for = None
+            else:
+                return self.target
+        
+        unplug = self.model.next_unplug(timestamp, self.confidence)
+        if unplug is None:
+            return self.low
+        if timestamp >= unplug - self.charge_time(capacity) - self.margin:
+            self._raised_for = unplug
+            return self.target
+        return self.low
+
+
+class SmartCharger:
+    """Drive a :class:`BatteryController`'s limit with a :class:`SmartChargePolicy`."""
+    
+    def __init__(self, controller: BatteryController, policy: SmartChargePolicy,
+                 clock=time.time):
+        """Initialize the charger.
+        
+        Args:
+            controller: Battery to control
+            policy: Policy whose model is fed with every sample
+            clock: Time source for samples without a timestamp
+        """
+        self.controller = controller
+        self.policy = policy
+        self.clock = clock
+        self.last_error: Optional[BatteryControlError] = None
+    
+    @property
+    def model(self) -> UnplugModel:
+        return self.policy.model
+    
+    def record(self, name: str, snapshot: BatterySnapshot,
+               timestamp: Optional[float] = None) -> Optional[int]:
+        """Learn from a snapshot and apply the resulting limit.
+        
+        Suitable as a :class:`~battery_limiter.watch.BatteryWatcher`
+        callback. Write failures are kept in :attr:`last_error` rather
+        than raised, so a watcher keeps running.
+        
+        Returns:
+            The limit in force, or ``None`` for another battery
+        """
+        if name != self.controller.name or snapshot is None:
+            return None
+        if timestamp is None:
+            timestamp = self.clock()
+        self.model.observe(timestamp, snapshot.status, snapshot.capacity,
+                           snapshot.power_now, snapshot.energy_full)
+        limit = self.policy.limit_at(timestamp, snapshot.capacity)
+        if limit != snapshot.limit:
+            try:
+                self.controller.set_charge_limit(limit)
+                self.last_error = None
+            except BatteryControlError as e:
+                self.last_error = e
+        return limit
+    
+    def fit_history(self, columns: Dict) -> int:
+        """Bootstrap the model from recorded history.
+        
+        Args:
+            columns: Result of :meth:`~battery_limiter.history.HistoryStore.query`
+        
+        Returns:
+            Number of samples fed to the model
+        """
+        snapshot = self.controller.get_snapshot()
+        energy_full = snapshot.energy_full if snapshot is not None else None
+        timestamps = columns['timestamp']
+        for i in range(len(timestamps)):
+            capacity = columns['capacity'][i]
+            power = columns['power'][i]
+            self.model.observe(
+                float(timestamps[i]),
+                STATUS_NAMES.get(int(columns['status'][i])),
+                None if capacity < 0 else int(capacity),
+                int(power) if power > 0 else None,
+                energy_full,
+            )
+        return len(timestamps)
+
+
+def _plugged_at(moment: datetime, routine: Dict[int, tuple]) -> bool:
+    """Synthetic routine: away from ``routine[date]`` start to end, else on AC."""
+    away = routine.get(moment.toordinal())
+    if away is None:
+        return True
+    start, end = away
+    return not start <= moment < end
+
+
+def _synthetic_routine(first_day: datetime, weeks: int, rng: random.Random) -> Dict[int, tuple]:
+    """Weekdays out 08:00-18:00 with jitter, weekends out some afternoons."""
+    routine = {}
+    for day in range(weeks * 7):
+        date = first_day + timedelta(days=day)
+        if date.weekday() < 5:
+            start = date + timedelta(hours=8, minutes=rng.gauss(0, 10))
+            end = date + timedelta(hours=18, minutes=rng.gauss(0, 30))
+        elif rng.random() < 0.5:
+            start = date + timedelta(hours=rng.uniform(10, 14))
+            end = start + timedelta(hours=rng.uniform(2, 5))
+        else:
+            continue
+        routine[date.toordinal()] = (start, end)
+    return routine
+
+
+def simulate(policy: str = 'smart', weeks: int = 4, low: int = 60, target: int = 100,
+             step: float = 300.0, seed: int = 0, warmup_weeks: int = 1) -> Dict[str, float]:
+    """Replay synthetic weeks through a mock battery.
+    
+    Every step updates the mock ``power_supply`` files from a simple
+    charge/discharge model that honours the limit in the control file,
+    then feeds the controller's snapshot to the policy.
+    
+    Args:
+        policy: ``smart``, or ``fixed`` to always use ``target``, or
+            ``low`` to always use ``low``
+        weeks: Weeks to replay, starting on a Monday
+        low: Low limit (smart and low policies)
+        target: Limit wanted at unplug
+        step: Seconds between samples
+        seed: Seed of the synthetic routine
+        warmup_weeks: Leading weeks left out of the results while the
+            model learns
+    
+    Returns:
+        ``unplugs``, ``short_unplugs`` (unplugged more than 5% below the
+        target), ``mean_unplug_capacity``, ``hours_above_80`` per week,
+        ``mean_plugged_capacity`` and ``us_per_sample`` (policy cost)
+    """
+    rng = random.Random(seed)
+    first_day = datetime(2026, 1, 5)
+    routine = _synthetic_routine(first_day, weeks, rng)
+    charge_rate = 40.0
+    drain_rate = 8.0
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        base_path = create_sysfs_tree(os.path.join(tmp, 'sys'), limit=low if policy != 'fixed' else target)
+        controller = BatteryController(base_path=base_path, probe_cache=ProbeCache(persistent=False))
+        directory = os.path.join(base_path, controller.name)
+        with open(os.path.join(directory, 'energy_full')) as f:
+            energy_full = int(f.read())
+        charger = SmartCharger(controller, SmartChargePolicy(UnplugModel(), low, target))
+        
+        capacity = float(low)
+        was_plugged = True
+        measured_from = (first_day + timedelta(weeks=warmup_weeks)).timestamp()
+        unplug_capacities = []
+        seconds_above_80 = 0.0
+        plugged_capacity = []
+        policy_time = 0.0
+        samples = 0
+        
+        end = (first_day + timedelta(weeks=weeks)).timestamp()
+        timestamp = first_day.timestamp()
+        while timestamp < end:
+            moment = datetime.fromtimestamp(timestamp)
+            plugged = _plugged_at(moment, routine)
+            limit = controller.get_current_limit() or 100
+            power = 0
+            if plugged:
+                if capacity < limit:
+                    # Constant current up to 80%, then tapering
+                    rate = charge_rate if capacity < 80 else charge_rate / 2
+                    capacity = min(limit, capacity + rate * step / 3600)
+                    status = 'Charging'
+                    power = int(rate * energy_full / 100)
+                else:
+                    status = 'Not charging'
+            else:
+                capacity = max(0.0, capacity - drain_rate * step / 3600)
+                status = 'Discharging'
+                power = int(drain_rate * energy_full / 100)
+            
+            if timestamp >= measured_from:
+                if was_plugged and not plugged:
+                    unplug_capacities.append(capacity)
+                if capacity > 80:
+                    seconds_above_80 += step
+                if plugged:
+                    plugged_capacity.append(capacity)
+            was_plugged = plugged
+            
+            level = int(capacity)
+            update_battery(directory, STATUS=status, POWER_NOW=power,
+                           ENERGY_NOW=energy_full * level // 100, CAPACITY=level)
+            
+            if policy == 'smart':
+                snapshot = controller.get_snapshot()
+                start = time.perf_counter()
+                charger.record(controller.name, snapshot, timestamp)
+                policy_time += time.perf_counter() - start
+                samples += 1
+            timestamp += step
+    
+    measured_weeks = max(weeks - warmup_weeks, 1)
+    return {
+        'unplugs': float(len(unplug_capacities)),
+        'short_unplugs': float(sum(1 for c in unplug_capacities if c < target - 5)),
+        'mean_unplug_capacity': (sum(unplug_capacities) / len(unplug_capacities)
+                                 if unplug_capacities else float('nan')),
+        'hours_above_80': seconds_above_80 / 3600 / measured_weeks,
+        'mean_plugged_capacity': (sum(plugged_capacity) / len(plugged_capacity)
+                                  if plugged_capacity else float('nan')),
+        'us_per_sample': policy_time / samples * 1e6 if samples else 0.0,
+    }
+
+
+def main():
+    """Compare the smart policy with fixed limits on synthetic weeks."""
+    parser = argparse.ArgumentParser(
+        description="Replay synthetic weeks through a mock battery and compare charge policies"
+    )
+    parser.add_argument('--weeks', type=int, default=4, help="Weeks to replay (default: 4)")
+    parser.add_argument('--low', type=int, default=60, help="Low limit (default: 60)")
+    parser.add_argument('--target', type=int, default=100, help="Limit wanted at unplug (default: 100)")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the synthetic routine")
+    parser.add_argument('--policy', action='append', choices=['smart', 'fixed', 'low'],
+                        help="Policy to run; may be repeated (default: all)")
+    args = parser.parse_args()
+    if args.weeks < 2:
+        parser.error("--weeks must be at least 2 (the first week is for learning)")
+    
+    for name in args.policy or ['smart', 'fixed', 'low']:
+        result = simulate(name, args.weeks, args.low, args.target, seed=args.seed)
+        for metric, value in result.items():
+            print(f"{name}.{metric}: {value:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""Stress harness for the battery control path.
+
+:func:`stress` drives thousands of concurrent threshold reads and writes
+through :class:`~battery_limiter.core.BatteryController` instances backed by
+:mod:`battery_limiter.backends.simulated`, and reports throughput, tail
+latency and how retries, clamping and resets played out.
+
+:func:`stress_pairs` runs start/end threshold transactions from many
+processes at once against a mock tree whose files enforce the driver
+rule that the start never exceeds the end, while other processes keep
+reading, to check the write ordering and the cross-process write lock.
+
+Run with ``python -m battery_limiter.stress [--processes N]``.
+"""
+
+import argparse
+import concurrent.futures
+import errno
+import json
+import os
+import random
+import tempfile
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .backends.simulated import FaultSchedule, Latency, SimulatedFirmware, attach
+from .backends.sysfs import SysfsBackend
+from .core import BatteryControlError, BatteryFleet, LimitMismatchError, RetryPolicy
+from .mocksys import create_power_supply_tree
+from .probe import ProbeCache
+from .sysfs import read_sysfs
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return float('nan')
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def stress(operations: int = 5000, threads: int = 16, batteries: int = 4,
+           write_ratio: float = 0.2, latency_ms: float = 1.0, p99_ms: float = 10.0,
+           fault_rate: float = 0.05, supported: Optional[Sequence[int]] = None,
+           reset_after: Optional[float] = None, attempts: int = 4,
+           seed: int = 0) -> Dict[str, float]:
+    """Run a mix of reads and writes against simulated batteries.
+    
+    Args:
+        operations: Reads and writes in total
+        threads: Concurrent callers
+        batteries: Simulated batteries, shared by all callers
+        write_ratio: Fraction of operations that set a random limit
+        latency_ms: Median firmware write latency; reads take a tenth
+        p99_ms: 99th percentile firmware write latency
+        fault_rate: Probability that a firmware read or write fails with
+            ``EBUSY`` or ``EIO``
+        supported: Thresholds the firmware stores, clamping the rest
+        reset_after: Seconds after which the firmware forgets a threshold
+        attempts: Tries per write, see :class:`~battery_limiter.core.RetryPolicy`
+        seed: Seed of the operation mix, latencies and faults
+    
+    Returns:
+        ``ops_per_second``, latency percentiles of reads and writes in
+        milliseconds, and counts of failed writes, mismatches (clamped or
+        unconfirmed), retries, firmware faults and resets
+    """
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        base_path = create_power_supply_tree(os.path.join(tmp, 'sys'), batteries=batteries)
+        # Short backoff: the point is the tail it adds, not wall-clock waits
+        retry = RetryPolicy(attempts=attempts, delay=latency_ms / 1e3, max_delay=p99_ms / 1e3)
+        fleet = BatteryFleet(base_path=base_path, probe_cache=ProbeCache(persistent=False),
+                             retry=retry)
+        firmwares = []
+        for i, controller in enumerate(fleet.select()):
+            firmwares.append(attach(controller, SimulatedFirmware(
+                read_latency=Latency.lognormal(latency_ms / 10e3, p99_ms / 10e3, seed + 4 * i),
+                write_latency=Latency.lognormal(latency_ms / 1e3, p99_ms / 1e3, seed + 4 * i + 1),
+                read_faults=FaultSchedule(fault_rate, seed=seed + 4 * i + 2),
+                write_faults=FaultSchedule(fault_rate, seed=seed + 4 * i + 3),
+                supported=supported,
+                reset_after=reset_after,
+            )))
+        controllers = fleet.select()
+        plan = [(rng.choice(controllers), rng.randint(50, 100) if rng.random() < write_ratio else None)
+                for _ in range(operations)]
+        
+        def run(controller, limit):
+            start = time.perf_counter()
+            outcome = 'ok'
+            if limit is None:
+                if controller.get_current_limit() is None:
+                    outcome = 'failed'
+            else:
+                try:
+                    controller.set_charge_limit(limit)
+                except LimitMismatchError:
+                    outcome = 'mismatch'
+                except BatteryControlError:
+                    outcome = 'failed'
+            return limit is not None, outcome, time.perf_counter() - start
+        
+        start = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(threads) as executor:
+            results = list(executor.map(lambda step: run(*step), plan))
+        elapsed = time.perf_counter() - start
+        stats = fleet.write_stats()
+        fleet.close()
+    
+    reads = sorted(duration for is_write, _outcome, duration in results if not is_write)
+    writes = sorted(duration for is_write, _outcome, duration in results if is_write)
+    outcomes = [(is_write, outcome) for is_write, outcome, _duration in results]
+    return {
+        'ops_per_second': operations / elapsed,
+        'read_p50_ms': _percentile(reads, 0.5) * 1e3,
+        'read_p99_ms': _percentile(reads, 0.99) * 1e3,
+        'write_p50_ms': _percentile(writes, 0.5) * 1e3,
+        'write_p99_ms': _percentile(writes, 0.99) * 1e3,
+        'write_max_ms': (writes[-1] if writes else float('nan')) * 1e3,
+        'writes': float(len(writes)),
+        'failed_reads': float(outcomes.count((False, 'failed'))),
+        'failed_writes': float(outcomes.count((True, 'failed'))),
+        'mismatched_writes': float(outcomes.count((True, 'mismatch'))),
+        'hardware_writes': float(stats['hardware_writes']),
+        'write_retries': float(stats['write_retries']),
+        'firmware_faults': float(sum(f.faults for f in firmwares)),
+        'firmware_resets': float(sum(f.resets for f in firmwares)),
+    }
+
+
+class OrderedThresholdBackend(SysfsBackend):
+    """Mock tree thresholds that follow the driver rules.
+    
+    Plain files accept anything, so writes in the wrong order would go
+    unnoticed. Like ``thinkpad_acpi``, this rejects a start above the
+    stored end and an end below the stored start with ``EINVAL``, and
+    stores each value with a single fixed-width write, which concurrent
+    readers see whole, as they do a sysfs store.
+    """
+    
+    label = 'ordered mock'
+    
+    @staticmethod
+    def _store(path: str, value: int) -> None:
+        fd = os.open(path, os.O_WRONLY | os.O_CLOEXEC)
+        try:
+            os.pwrite(fd, f"{value:3d}\n".encode(), 0)
+        finally:
+            os.close(fd)
+    
+    @staticmethod
+    def _reject() -> OSError:
+        return OSError(errno.EINVAL, os.strerror(errno.EINVAL))
+    
+    def write(self, raw: str) -> None:
+        end = int(raw)
+        if end < int(read_sysfs(self.start_file)):
+            raise self._reject()
+        self._store(self.control_file, end)
+    
+    def write_start(self, raw: str) -> None:
+        start = int(raw)
+        if start > int(read_sysfs(self.control_file)):
+            raise self._reject()
+        self._store(self.start_file, start)
+
+
+def _open_ordered_fleet(base_path: str, lock: bool) -> BatteryFleet:
+    # EINVAL is never retried, so every out-of-order write shows up
+    fleet = BatteryFleet(base_path=base_path, probe_cache=ProbeCache(persistent=False))
+    for controller in fleet.select():
+        controller.backend = OrderedThresholdBackend(controller.control_file)
+        controller.lock_writes = lock
+    return fleet
+
+
+def _pair_writer(base_path: str, transactions: int, lock: bool,
+                 seed: int) -> Tuple[Dict[str, int], List[float], List[Tuple[int, int]]]:
+    """Apply random (start, end) pairs; runs in a worker process."""
+    rng = random.Random(seed)
+    fleet = _open_ordered_fleet(base_path, lock)
+    controllers = fleet.select()
+    outcomes = {'ok': 0, 'failed': 0, 'mismatch': 0}
+    durations = []
+    pairs = []
+    for _ in range(transactions):
+        controller = rng.choice(controllers)
+        end = rng.randint(2, 100)
+        start = rng.randint(0, end - 1)
+        pairs.append((start, end))
+        begin = time.perf_counter()
+        try:
+            controller.set_thresholds(start, end)
+            outcomes['ok'] += 1
+        except LimitMismatchError:
+            outcomes['mismatch'] += 1
+        except BatteryControlError:
+            outcomes['failed'] += 1
+        durations.append(time.perf_counter() - begin)
+    fleet.close()
+    return outcomes, durations, pairs
+
+
+def _pair_reader(base_path: str, reads: int) -> Tuple[int, List[float]]:
+    """Read both thresholds without the lock; runs in a worker process."""
+    fleet = _open_ordered_fleet(base_path, lock=True)
+    controllers = fleet.select()
+    failed = 0
+    durations = []
+    for i in range(reads):
+        controller = controllers[i % len(controllers)]
+        begin = time.perf_counter()
+        if controller.get_current_limit() is None or controller.get_start_threshold() is None:
+            failed += 1
+        durations.append(time.perf_counter() - begin)
+    fleet.close()
+    return failed, durations
+
+
+def stress_pairs(processes: int = 8, transactions: int = 300, batteries: int = 2,
+                 readers: int = 2, reads: int = 20000, lock: bool = True,
+                 seed: int = 0) -> Dict[str, float]:
+    """Apply threshold pairs from many processes at once.
+    
+    Args:
+        processes: Writer processes
+        transactions: Pairs applied by each writer
+        batteries: Batteries in the mock tree, shared by all writers
+        readers: Processes reading both thresholds meanwhile
+        reads: Reads by each reader
+        lock: Serialize writers with the advisory lock; turn off to see
+            what it prevents
+        seed: Seed of the pairs and battery choices
+    
+    Returns:
+        ``transactions_per_second``, transaction and read latency
+        percentiles in milliseconds, counts of failed (rejected) and
+        mismatched (overwritten before read back) transactions, failed
+        reads, and ``torn_pairs``: batteries ending with a pair no writer
+        applied
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        base_path = create_power_supply_tree(os.path.join(tmp, 'sys'), batteries=batteries,
+                                             limit=80, start_threshold=0)
+        start = time.perf_counter()
+        with concurrent.futures.ProcessPoolExecutor(processes + readers) as executor:
+            writers = [executor.submit(_pair_writer, base_path, transactions, lock, seed + i)
+                       for i in range(processes)]
+            reading = [executor.submit(_pair_reader, base_path, reads) for _ in range(readers)]
+            written = [future.result() for future in writers]
+            elapsed = time.perf_counter() - start
+            read = [future.result() for future in reading]
+        
+        requested = {pair for _outcomes, _durations, pairs in written for pair in pairs}
+        fleet = _open_ordered_fleet(base_path, lock)
+        torn = sum((c.get_start_threshold(), c.get_current_limit()) not in requested
+                   for c in fleet.select())
+        fleet.close()
+    
+    durations = sorted(d for _outcomes, writer, _pairs in written for d in writer)
+    read_durations = sorted(d for _failed, reader in read for d in reader)
+    return {
+        'transactions_per_second': processes * transactions / elapsed,
+        'transaction_p50_ms': _percentile(durations, 0.5) * 1e3,
+        'transaction_p99_ms': _percentile(durations, 0.99) * 1e3,
+        'read_p99_ms': _percentile(read_durations, 0.99) * 1e3,
+        'failed_transactions': float(sum(o['failed'] for o, _d, _p in written)),
+        'mismatched_transactions': float(sum(o['mismatch'] for o, _d, _p in written)),
+        'failed_reads': float(sum(failed for failed, _durations in read)),
+        'torn_pairs': float(torn),
+    }
+
+
+def main():
+    """Stress the control path and print the results."""
+    parser = argparse.ArgumentParser(
+        description="Drive concurrent threshold reads and writes through simulated firmware"
+    )
+    parser.add_argument('--operations', type=int, default=5000, help="Operations (default: 5000)")
+    parser.add_argument('--threads', type=int, default=16, help="Concurrent callers (default: 16)")
+    parser.add_argument('--batteries', type=int, default=4, help="Batteries (default: 4)")
+    parser.add_argument('--write-ratio', type=float, default=0.2,
+                        help="Fraction of writes (default: 0.2)")
+    parser.add_argument('--latency-ms', type=float, default=1.0,
+                        help="Median write latency (default: 1)")
+    parser.add_argument('--p99-ms', type=float, default=10.0,
+                        help="99th percentile write latency (default: 10)")
+    parser.add_argument('--fault-rate', type=float, default=0.05,
+                        help="Probability of EBUSY/EIO per firmware operation (default: 0.05)")
+    parser.add_argument('--supported', metavar='LIMITS',
+                        help="Comma-separated thresholds the firmware clamps to, e.g. 60,80,100")
+    parser.add_argument('--reset-after', type=float, metavar='SECONDS',
+                        help="Seconds after which the firmware forgets the threshold")
+    parser.add_argument('--attempts', type=int, default=4,
+                        help="Tries per write (default: 4; 1 disables retries)")
+    parser.add_argument('--seed', type=int, default=0, help="Seed (default: 0)")
+    parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+    pairs = parser.add_argument_group(
+        "threshold pairs", "Apply start/end pairs from several processes to a mock tree instead")
+    pairs.add_argument('--processes', type=int, metavar='N',
+                       help="Writer processes; selects this mode")
+    pairs.add_argument('--transactions', type=int, default=300,
+                       help="Pairs applied by each writer (default: 300)")
+    pairs.add_argument('--readers', type=int, default=2,
+                       help="Processes reading meanwhile (default: 2)")
+    pairs.add_argument('--no-lock', action='store_true',
+                       help="Do not serialize writers, to see what the lock prevents")
+    args = parser.parse_args()
+    
+    if args.processes is not None:
+        result = stress_pairs(args.processes, args.transactions, args.batteries, args.readers,
+                              lock=not args.no_lock, seed=args.seed)
+        _print_result(result, args.json)
+        return
+    
+    supported = None
+    if args.supported:
+        try:
+            supported = [int(value) for value in args.supported.split(',')]
+        except ValueError:
+            parser.error("--supported takes comma-separated integers")
+    result = stress(args.operations, args.threads, args.batteries, args.write_ratio,
+                    args.latency_ms, args.p99_ms, args.fault_rate, supported,
+                    args.reset_after, args.attempts, args.seed)
+    _print_result(result, args.json)
+
+
+def _print_result(result: Dict[str, float], as_json: bool) -> None:
+    if as_json:
+        print(json.dumps(result))
+        return
+    for metric, value in result.items():
+        print(f"{metric}: {value:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,434 @@
+"""Event-driven battery monitoring.
+
+Changes are picked up from kernel ``power_supply`` uevents (netlink) and
+inotify watches on the control files, so an idle machine causes no wakeups.
+When neither is available the watcher falls back to polling with an
+interval that backs off while nothing changes. Batteries added or removed
+while watching are picked up from their uevents, or from the directory
+listing when polling.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import socket
+import struct
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from .core import BatteryController, BatteryFleet, BatterySnapshot
+from .sysfs import find_batteries
+
+
+NETLINK_KOBJECT_UEVENT = 15
+UEVENT_GROUP_KERNEL = 1
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_IGNORED = 0x00008000
+_INOTIFY_EVENT = struct.Struct('iIII')
+
+# Callback signature: (battery name, new snapshot)
+ChangeCallback = Callable[[str, BatterySnapshot], None]
+
+
+def parse_uevent(data: bytes) -> Optional[Dict[str, str]]:
+    """Parse a kernel uevent datagram.
+    
+    Args:
+        data: Raw netlink payload (``action@devpath`` followed by
+            NUL-separated ``KEY=value`` pairs)
+    
+    Returns:
+        The properties of a ``power_supply`` event, or ``None`` for any
+        other subsystem
+    """
+    properties = {}
+    for field in data.split(b'\0')[1:]:
+        key, sep, value = field.partition(b'=')
+        if sep:
+            properties[key.decode('ascii', 'replace')] = value.decode('utf-8', 'replace')
+    
+    if properties.get('SUBSYSTEM') != 'power_supply':
+        return None
+    if 'POWER_SUPPLY_NAME' not in properties:
+        properties['POWER_SUPPLY_NAME'] = os.path.basename(properties.get('DEVPATH', ''))
+    return properties
+
+
+class UeventSource:
+    """Kernel ``power_supply`` uevents received on a netlink socket."""
+    
+    def __init__(self):
+        """Open and bind the netlink socket.
+        
+        Raises:
+            OSError: If netlink is unavailable (containers, non-Linux)
+        """
+        self.sock = socket.socket(
+            socket.AF_NETLINK,
+            socket.SOCK_DGRAM | socket.SOCK_NONBLOCK | socket.SOCK_CLOEXEC,
+            NETLINK_KOBJECT_UEVENT
+        )
+        try:
+            self.sock.bind((0, UEVENT_GROUP_KERNEL))
+        except OSError:
+            self.sock.close()
+            raise
+    
+    def fileno(self) -> int:
+        return self.sock.fileno()
+    
+    def read(self) -> List[Dict[str, str]]:
+        """Drain all pending uevents."""
+        events = []
+        while True:
+            try:
+                data = self.sock.recv(16384)
+            except (BlockingIOError, InterruptedError):
+                break
+            properties = parse_uevent(data)
+            if properties is not None:
+                events.append(properties)
+        return events
+    
+    def close(self) -> None:
+        self.sock.close()
+
+
+class InotifySource:
+    """Inotify watches on individual sysfs attribute files, or on directories."""
+    
+    def __init__(self):
+        """Create the inotify instance.
+        
+        Raises:
+            OSError: If inotify is unavailable
+        """
+        libc_name = ctypes.util.find_library('c')
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._watches: Dict[int, str] = {}
+        # Watches on a directory that only report one entry of it
+        self._filenames: Dict[int, bytes] = {}
+    
+    def add(self, path: str, name: str, mask: int = IN_MODIFY | IN_ATTRIB,
+            filename: Optional[str] = None) -> None:
+        """Watch ``path`` and report changes to it as ``name``.
+        
+        Args:
+            path: File or directory to watch
+            name: Reported by :meth:`read` for its events
+            mask: Inotify events to watch for
+            filename: For a directory, only report events on this entry
+        """
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        self._watches[wd] = name
+        if filename is not None:
+            self._filenames[wd] = os.fsencode(filename)
+    
+    def fileno(self) -> int:
+        return self.fd
+    
+    def read(self) -> Set[str]:
+        """Drain pending inotify events and return the affected batteries."""
+        names = set()
+        while True:
+            try:
+                data = os.read(self.fd, 4096)
+            except (BlockingIOError, InterruptedError):
+                break
+            offset = 0
+            while offset + _INOTIFY_EVENT.size <= len(data):
+                wd, mask, _cookie, length = _INOTIFY_EVENT.unpack_from(data, offset)
+                start = offset + _INOTIFY_EVENT.size
+                offset = start + length
+                if mask & IN_IGNORED:
+                    self._watches.pop(wd, None)
+                elif wd in self._watches:
+                    filename = self._filenames.get(wd)
+                    if filename is not None and data[start:offset].rstrip(b'\0') != filename:
+                        continue
+                    names.add(self._watches[wd])
+        return names
+    
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class AdaptiveInterval:
+    """Polling interval that doubles while idle and resets on change."""
+    
+    def __init__(self, minimum: float = 5.0, maximum: float = 300.0, factor: float = 2.0):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.factor = factor
+        self.current = minimum
+    
+    def reset(self) -> float:
+        self.current = self.minimum
+        return self.current
+    
+    def backoff(self) -> float:
+        self.current = min(self.current * self.factor, self.maximum)
+        return self.current
+
+
+class BatteryWatcher:
+    """Watch every battery in a fleet and report real changes only.
+    
+    The watcher can be driven by any event loop: register :meth:`filenos`
+    for reading, call :meth:`handle` when one becomes readable and call
+    :meth:`poll` after :meth:`timeout` seconds (``None`` means no timer is
+    needed). :meth:`run` provides a blocking loop for the CLI and daemons.
+    """
+    
+    def __init__(self, fleet: BatteryFleet, callback: Optional[ChangeCallback] = None,
+                 use_events: bool = True, min_interval: float = 5.0,
+                 max_interval: float = 300.0,
+                 supply_callback: Optional[Callable[[str], None]] = None):
+        """Initialize the watcher.
+        
+        Args:
+            fleet: Batteries to watch
+            callback: Called as ``callback(name, state)`` on every change
+            use_events: Whether to use netlink/inotify; if ``False`` or
+                unavailable, adaptive polling is used
+            min_interval: Fastest polling interval in seconds
+            max_interval: Slowest polling interval in seconds
+            supply_callback: Called with the supply name on every
+                ``power_supply`` uevent, adapters included, e.g. to follow
+                the power source
+        """
+        self.fleet = fleet
+        self.supply_callback = supply_callback
+        self.interval = AdaptiveInterval(min_interval, max_interval)
+        self._callbacks: List[ChangeCallback] = []
+        if callback is not None:
+            self._callbacks.append(callback)
+        self._pending: Dict[str, BatterySnapshot] = {}
+        self.state: Dict[str, BatterySnapshot] = fleet.get_snapshots()
+        self._listing = find_batteries(fleet.base_path)
+        
+        self.uevents: Optional[UeventSource] = None
+        self.inotify: Optional[InotifySource] = None
+        if use_events:
+            self._open_sources()
+        
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        self._stopped = threading.Event()
+    
+    def _open_sources(self) -> None:
+        if self.fleet.base_path == BatteryController.REAL_BASE_PATH:
+            try:
+                self.uevents = UeventSource()
+            except OSError:
+                self.uevents = None
+        
+        try:
+            inotify = InotifySource()
+        except (OSError, AttributeError):
+            return
+        try:
+            for controller in self.fleet.select():
+                inotify.add(controller.get_control_file_path(), controller.name)
+        except OSError:
+            inotify.close()
+            return
+        self.inotify = inotify
+    
+    @property
+    def events_available(self) -> bool:
+        """Whether kernel uevents replace periodic polling."""
+        return self.uevents is not None
+    
+    def subscribe(self, callback: ChangeCallback) -> None:
+        """Register another change callback."""
+        self._callbacks.append(callback)
+    
+    def unsubscribe(self, callback: ChangeCallback) -> None:
+        """Remove a previously registered change callback."""
+        self._callbacks.remove(callback)
+    
+    def filenos(self) -> List[int]:
+        """File descriptors to wait on for readability."""
+        fds = []
+        if self.uevents is not None:
+            fds.append(self.uevents.fileno())
+        if self.inotify is not None:
+            fds.append(self.inotify.fileno())
+        return fds
+    
+    def timeout(self) -> Optional[float]:
+        """Seconds until :meth:`poll` is due, or ``None`` if event driven."""
+        return None if self.events_available else self.interval.current
+    
+    def _read_state(self, name: str) -> BatterySnapshot:
+        snapshot = self._pending.pop(name, None)
+        if snapshot is None:
+            snapshot = self.fleet.controllers[name].get_snapshot()
+        return snapshot
+    
+    def _refresh(self, names: Iterable[str]) -> bool:
+        changed = False
+        for name in names:
+            if name not in self.fleet.controllers:
+                continue
+            new = self._read_state(name)
+            if new != self.state.get(name):
+                self.state[name] = new
+                changed = True
+                for callback in list(self._callbacks):
+                    callback(name, new)
+        return changed
+    
+    def _rediscover(self) -> Set[str]:
+        """Follow a battery hotplug; returns the batteries added."""
+        self._listing = find_batteries(self.fleet.base_path)
+        added, removed = self.fleet.rediscover()
+        for name in removed:
+            self.state.pop(name, None)
+            self._pending.pop(name, None)
+        if self.inotify is not None:
+            for name in added:
+                try:
+                    self.inotify.add(self.fleet.controllers[name].get_control_file_path(), name)
+                except OSError:
+                    pass
+        return set(added)
+    
+    def _apply_uevent(self, properties: Dict[str, str]) -> Set[str]:
+        name = properties['POWER_SUPPLY_NAME']
+        if self.supply_callback is not None:
+            self.supply_callback(name)
+        action = properties.get('ACTION')
+        known = name in self.fleet.controllers
+        if name.startswith('BAT') and ((action == 'add' and not known)
+                                       or (action == 'remove' and known)):
+            added = self._rediscover()
+            if name not in added:
+                # Removed, or a battery without charge limiting
+                return added
+        controller = self.fleet.controllers.get(name)
+        if controller is None:
+            # AC adapter and other supplies: batteries usually follow suit
+            return set(self.fleet.names())
+        if properties.get('ACTION') in ('add', 'remove', 'bind', 'unbind'):
+            controller.invalidate()
+        
+        # The uevent carries every property, so no sysfs read is needed
+        # unless the driver leaves the thresholds out of it
+        properties = {
+            key[len('POWER_SUPPLY_'):]: value
+            for key, value in properties.items()
+            if key.startswith('POWER_SUPPLY_')
+        }
+        limit = start = None
+        if 'CHARGE_CONTROL_END_THRESHOLD' not in properties:
+            limit = controller.get_current_limit()
+        if ('CHARGE_CONTROL_START_THRESHOLD' not in properties
+                and controller.supports_start_threshold()):
+            start = controller.get_start_threshold()
+        self._pending[name] = BatterySnapshot.from_properties(name, properties, limit, start)
+        return {name}
+    
+    def handle(self, fd: int) -> bool:
+        """Process a readable file descriptor.
+        
+        Returns:
+            Whether any battery state changed
+        """
+        names: Set[str] = set()
+        if self.uevents is not None and fd == self.uevents.fileno():
+            for properties in self.uevents.read():
+                names |= self._apply_uevent(properties)
+        elif self.inotify is not None and fd == self.inotify.fileno():
+            names = self.inotify.read()
+        return self._refresh(names)
+    
+    def poll(self) -> bool:
+        """Re-read every battery and adapt the polling interval.
+        
+        Returns:
+            Whether any battery state changed
+        """
+        if find_batteries(self.fleet.base_path) != self._listing:
+            self._rediscover()
+        changed = self._refresh(self.fleet.names())
+        if changed:
+            self.interval.reset()
+        else:
+            self.interval.backoff()
+        return changed
+    
+    def inject(self, name: Optional[str] = None,
+               properties: Optional[Dict[str, str]] = None) -> bool:
+        """Feed a synthetic uevent, as the kernel would send it.
+        
+        Intended for exercising the watcher against ``mock_sys``.
+        
+        Args:
+            name: Supply name, e.g. ``BAT0`` or ``AC``; all batteries if ``None``
+            properties: Extra ``POWER_SUPPLY_*`` properties
+        
+        Returns:
+            Whether any battery state changed
+        """
+        if name is None:
+            return self._refresh(self.fleet.names())
+        event = {'SUBSYSTEM': 'power_supply', 'POWER_SUPPLY_NAME': name}
+        event.update(properties or {})
+        return self._refresh(self._apply_uevent(event))
+    
+    def run(self) -> None:
+        """Block and dispatch changes until :meth:`stop` is called."""
+        poller = select.poll()
+        for fd in self.filenos() + [self._wakeup_r]:
+            poller.register(fd, select.POLLIN)
+        
+        while not self._stopped.is_set():
+            timeout = self.timeout()
+            try:
+                ready = poller.poll(None if timeout is None else timeout * 1000)
+            except InterruptedError:
+                continue
+            if not ready:
+                self.poll()
+                continue
+            for fd, _events in ready:
+                if fd == self._wakeup_r:
+                    os.read(self._wakeup_r, 64)
+                else:
+                    self.handle(fd)
+    
+    def stop(self) -> None:
+        """Make :meth:`run` return; safe to call from another thread."""
+        self._stopped.set()
+        try:
+            os.write(self._wakeup_w, b'\0')
+        except OSError as e:
+            if e.errno != errno.EBADF:
+                raise
+    
+    def close(self) -> None:
+        """Release sockets, inotify and wakeup descriptors."""
+        self.stop()
+        if self.uevents is not None:
+            self.uevents.close()
+            self.uevents = None
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+        os.close(self._wakeup_r)
+        os.close(self._wakeup_w)
@@ -0,0 +1,102 @@
+"""Tests for battery health analytics."""
+
+import pytest
+
+from battery_limiter.analytics import analyze, capacity_fade, format_report
+from battery_limiter.core import BatteryController
+from battery_limiter.history import HistoryStore
+from battery_limiter.mocksys import create_battery, create_power_supply_tree
+from battery_limiter.probe import ProbeCache
+from battery_limiter.sampler import MISSING, STATUS_CODES
+
+CHARGING = STATUS_CODES['Charging']
+DISCHARGING = STATUS_CODES['Discharging']
+
+
+@pytest.fixture
+def base_path(tmp_path):
+    return create_power_supply_tree(str(tmp_path / 'power_supply'), batteries=1)
+
+
+def snapshot_of(base_path, name='BAT0'):
+    controller = BatteryController(battery=name, base_path=base_path,
+                                   probe_cache=ProbeCache(persistent=False))
+    try:
+        return controller.get_snapshot()
+    finally:
+        controller.close()
+
+
+def hourly(capacity, power=None, status=None):
+    count = len(capacity)
+    return {
+        'timestamp': [3600.0 * i for i in range(count)],
+        'capacity': capacity,
+        'power': power or [MISSING] * count,
+        'status': status or [DISCHARGING] * count,
+    }
+
+
+def test_capacity_fade_in_energy_and_charge_units(base_path):
+    assert capacity_fade(snapshot_of(base_path)) == pytest.approx(0.1)
+    create_battery(base_path, 'BAT1', units='charge', wear=0.8)
+    assert capacity_fade(snapshot_of(base_path, 'BAT1')) == pytest.approx(0.2, abs=1e-6)
+    assert capacity_fade(None) is None
+
+
+@pytest.mark.parametrize('use_numpy', [False, True])
+def test_time_above_thresholds_and_cycles(use_numpy):
+    if use_numpy:
+        pytest.importorskip('numpy')
+    columns = hourly([60, 80, 90, 80, -1])
+    report = analyze(columns, use_numpy=use_numpy)
+    # The unknown last reading is left out entirely
+    assert report['samples'] == 4
+    assert report['span_hours'] == pytest.approx(3.0)
+    assert report['equivalent_full_cycles'] == pytest.approx(0.2)
+    assert report['mean_soc'] == pytest.approx((60 + 80 + 90) / 3)
+    assert report['hours_above'] == {80: pytest.approx(2.0), 90: pytest.approx(1.0)}
+    assert report['fraction_above'][80] == pytest.approx(2 / 3)
+
+
+def test_gaps_are_capped():
+    columns = hourly([85, 85, 85])
+    columns['timestamp'][2] = 100 * 3600.0
+    report = analyze(columns, max_gap=3600.0, use_numpy=False)
+    assert report['span_hours'] == pytest.approx(2.0)
+    assert report['hours_above'][80] == pytest.approx(2.0)
+
+
+def test_charging_power_histogram():
+    watts = [3, 12, 12, 50, 150]
+    columns = hourly([50] * 6,
+                     power=[w * 1000000 for w in watts] + [20000000],
+                     status=[CHARGING] * 5 + [DISCHARGING])
+    report = analyze(columns, use_numpy=False)
+    # Bins 0-5, 5-10, 10-20, 20-30, 30-45, 45-65, 65-100 and above
+    assert report['charge_power_histogram'] == [1, 0, 2, 0, 0, 1, 1]
+    assert report['median_charge_power'] == pytest.approx(12.0)
+
+
+def test_empty_history():
+    report = analyze(hourly([]), use_numpy=False)
+    assert report['samples'] == 0
+    assert report['mean_soc'] is None
+    assert report['median_charge_power'] is None
+
+
+def test_report_from_recorded_history(base_path, tmp_path):
+    store = HistoryStore(str(tmp_path / 'history'))
+    try:
+        for i, capacity in enumerate((50, 60, 70, 80, 80)):
+            store.append(1000.0 + i * 1800, capacity=capacity, power=25000000,
+                         limit=80, status='Charging')
+        report = analyze(store.query(), snapshot_of(base_path))
+    finally:
+        store.close()
+    assert report['samples'] == 5
+    assert report['cycle_count'] == 214
+    text = format_report(report)
+    assert "Capacity health: 90.0% of design (10.0% fade)" in text
+    assert "Time at or above 80%: 0.5 h (25%)" in text
+    assert "Median charging power: 25.0 W" in text
@@ -0,0 +1,91 @@
+"""Vendor backends against the fixture trees in ``mock_sys/vendors``."""
+
+import os
+import shutil
+
+import pytest
+
+from battery_limiter.core import BatteryControlError, BatteryFleet
+from battery_limiter.probe import ProbeCache
+
+VENDORS = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                       'mock_sys', 'vendors')
+
+
+@pytest.fixture
+def vendor(tmp_path):
+    """Open a copy of a vendor's fixture tree; returns the controller and its control file."""
+    fleets = []
+    
+    def open_vendor(name):
+        root = str(tmp_path / name)
+        shutil.copytree(os.path.join(VENDORS, name), root)
+        fleet = BatteryFleet(base_path=os.path.join(root, 'class', 'power_supply'),
+                             probe_cache=ProbeCache(persistent=False))
+        fleets.append(fleet)
+        controller = fleet.controllers['BAT0']
+        return controller, controller.control_file
+    yield open_vendor
+    for fleet in fleets:
+        fleet.close()
+
+
+def _read(path):
+    with open(path) as f:
+        return f.read().strip()
+
+
+@pytest.mark.parametrize('name, label, control', [
+    ('huawei', 'huawei-wmi', 'devices/platform/huawei-wmi/charge_control_thresholds'),
+    ('lg', 'lg-laptop', 'devices/platform/lg-laptop/battery_care_limit'),
+    ('samsung', 'samsung-laptop', 'devices/platform/samsung/battery_life_extender'),
+    ('smapi', 'tp_smapi', 'devices/platform/smapi/BAT0/stop_charge_thresh'),
+    ('sony', 'sony-laptop', 'devices/platform/sony-laptop/battery_care_limiter'),
+])
+def test_probe_finds_the_vendor_interface(vendor, tmp_path, name, label, control):
+    controller, control_file = vendor(name)
+    assert controller.backend.label == label
+    assert control_file == str(tmp_path / name / control)
+    assert controller.get_current_limit() == 80
+
+
+def test_huawei_writes_both_thresholds_at_once(vendor):
+    controller, control_file = vendor('huawei')
+    assert controller.supports_start_threshold()
+    assert controller.set_thresholds(40, 90)
+    assert _read(control_file) == "40 90"
+    assert (controller.get_start_threshold(), controller.get_current_limit()) == (40, 90)
+    
+    # A new limit keeps the start threshold below it, or clears it
+    controller.set_charge_limit(60)
+    assert _read(control_file) == "40 60"
+    controller.set_charge_limit(30)
+    assert _read(control_file) == "0 30"
+    with pytest.raises(BatteryControlError, match="at least 2%"):
+        controller.set_charge_limit(1)
+
+
+@pytest.mark.parametrize('name, writes, unsupported', [
+    ('lg', {100: '100', 80: '80'}, 60),
+    ('samsung', {100: '0', 80: '1'}, 90),
+    ('sony', {100: '0', 50: '50', 80: '80'}, 60),
+])
+def test_discrete_limits_are_encoded(vendor, name, writes, unsupported):
+    controller, control_file = vendor(name)
+    for limit, raw in writes.items():
+        controller.set_charge_limit(limit)
+        assert _read(control_file) == raw
+        assert controller.get_current_limit() == limit
+    with pytest.raises(BatteryControlError, match="only supports limits of"):
+        controller.set_charge_limit(unsupported)
+    assert controller.get_current_limit() == limit
+
+
+def test_smapi_zero_means_full_charge(vendor):
+    controller, control_file = vendor('smapi')
+    assert not controller.supports_start_threshold()
+    controller.set_charge_limit(60)
+    assert _read(control_file) == "60"
+    with open(control_file, 'w') as f:
+        f.write("0\n")
+    assert controller.get_current_limit() == 100
@@ -0,0 +1,85 @@
+"""Tests for the benchmark baselines in ``benchmarks/bench.py``."""
+
+import importlib.util
+import json
+import math
+import os
+import subprocess
+import sys
+
+import pytest
+
+BENCH = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                     'benchmarks', 'bench.py')
+
+spec = importlib.util.spec_from_file_location('bench', BENCH)
+bench = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(bench)
+
+
+def run(tmp_path, *args):
+    env = dict(os.environ, XDG_CACHE_HOME=str(tmp_path / 'cache'))
+    return subprocess.run([sys.executable, BENCH, 'writes', *args], env=env,
+                          capture_output=True, text=True, timeout=60)
+
+
+def test_baseline_round_trip(tmp_path):
+    path = str(tmp_path / 'baseline.json')
+    bench.save_baseline(path, {'fleet.controller_us': 12.5, 'writes.requests': 200})
+    assert bench.load_baseline(path) == {'fleet.controller_us': 12.5, 'writes.requests': 200.0}
+    with open(path) as f:
+        data = json.load(f)
+    assert data['version'] == bench.BASELINE_VERSION
+    assert data['python'] and data['machine']
+
+
+@pytest.mark.parametrize('content', ['[]', '{"results": {}}', '{"version": 0, "results": {}}'])
+def test_other_files_are_not_baselines(tmp_path, content):
+    path = tmp_path / 'baseline.json'
+    path.write_text(content)
+    with pytest.raises(ValueError):
+        bench.load_baseline(str(path))
+
+
+def test_compare_direction_and_tolerance():
+    # Lower is better for times, higher for throughput
+    assert bench.compare('stress.write_p99_ms', 20.0, 10.0, 0.25) == (1.0, True)
+    assert bench.compare('stress.write_p99_ms', 5.0, 10.0, 0.25) == (-0.5, False)
+    assert bench.compare('stress.ops_per_second', 500.0, 1000.0, 0.25) == (-0.5, True)
+    assert bench.compare('stress.ops_per_second', 800.0, 1000.0, 0.25) == (-0.2, False)
+
+
+def test_compare_noise_floor():
+    # Doubling a 0.5 µs time is below the 1 µs floor, 2 ms to 5 ms is not
+    assert bench.compare('metrics.read_overhead_us', 1.0, 0.5, 0.25) == (1.0, False)
+    assert bench.compare('apply.overhead_ms', 4.0, 2.0, 0.25) == (1.0, False)
+    assert bench.compare('apply.overhead_ms', 5.0, 2.0, 0.25) == (1.5, True)
+
+
+def test_compare_zero_and_missing_baselines():
+    assert bench.compare('stress.failed_writes', 0.0, 0.0, 0.25) == (0.0, False)
+    assert bench.compare('stress.failed_writes', 2.0, 0.0, 0.25) == (math.inf, True)
+    relative, regressed = bench.compare('gui.max_latency_ms', float('nan'), 10.0, 0.25)
+    assert math.isnan(relative) and not regressed
+
+
+def test_save_and_compare_from_the_command_line(tmp_path):
+    path = str(tmp_path / 'baseline.json')
+    result = run(tmp_path, '--save', path)
+    assert result.returncode == 0, result.stderr
+    assert "writes.writes_avoided: 200.00" in result.stdout
+    assert bench.load_baseline(path)['writes.writes_avoided'] == 200
+    
+    assert run(tmp_path, '--compare', path).returncode == 0
+    
+    # A baseline that avoided more writes makes this run a regression
+    bench.save_baseline(path, {'writes.writes_avoided': 400.0})
+    result = run(tmp_path, '--compare', path)
+    assert result.returncode == 1
+    assert "writes.writes_avoided: 200.00 (baseline 400.00, -50.0%, regressed)" in result.stdout
+
+
+def test_unreadable_baseline_is_a_usage_error(tmp_path):
+    result = run(tmp_path, '--compare', str(tmp_path / 'missing.json'))
+    assert result.returncode == 2
+    assert "cannot read baseline" in result.stderr
@@ -0,0 +1,121 @@
+"""Tests for the get, set, info and watch subcommands on a mock tree."""
+
+import json
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from battery_limiter import cli, history
+from battery_limiter.core import BatteryController
+from battery_limiter.mocksys import create_power_supply_tree
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src')
+
+
+@pytest.fixture
+def base_path(tmp_path, monkeypatch):
+    """Point ``--mock`` at a fresh two-battery tree and history at tmp_path."""
+    base_path = create_power_supply_tree(str(tmp_path / 'power_supply'), batteries=2,
+                                         start_threshold=40)
+    monkeypatch.setattr(BatteryController, 'MOCK_BASE_PATH', base_path)
+    monkeypatch.setenv('XDG_STATE_HOME', str(tmp_path / 'state'))
+    monkeypatch.setattr(history, 'SYSTEM_HISTORY_PATH', str(tmp_path / 'system'))
+    return base_path
+
+
+def run(capsys, *argv):
+    cli.main(list(argv))
+    return capsys.readouterr()
+
+
+def test_get_json(base_path, capsys):
+    out = run(capsys, 'get', '--mock', '--json')
+    assert json.loads(out.out) == {'BAT0': 80, 'BAT1': 80}
+    out = run(capsys, 'get', '--mock', '--json', '--battery', 'BAT1')
+    assert json.loads(out.out) == {'BAT1': 80}
+
+
+def test_get_text(base_path, capsys):
+    out = run(capsys, 'get', '--mock', '--battery', 'BAT0')
+    assert out.out == "🔋 BAT0: 80% (charging from 40%)\n"
+
+
+def test_unknown_battery_errors_go_to_stderr_in_json_mode(base_path, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        cli.main(['get', '--mock', '--json', '--battery', 'BAT9'])
+    assert exit_info.value.code == 1
+    out = capsys.readouterr()
+    assert out.out == ''
+    assert "BAT9" in out.err
+
+
+def test_set_json_writes_only_when_needed(base_path, capsys):
+    out = run(capsys, 'set', '60', '--start', '50', '--mock', '--json')
+    assert json.loads(out.out) == {'limit': 60, 'start': 50, 'changed': True,
+                                   'batteries': {'BAT0': 60, 'BAT1': 60}}
+    with open(os.path.join(base_path, 'BAT1', 'charge_control_start_threshold')) as f:
+        assert f.read().strip() == '50'
+    
+    out = run(capsys, 'set', '60', '--start', '50', '--mock', '--json')
+    assert json.loads(out.out)['changed'] is False
+
+
+def test_set_text(base_path, capsys):
+    out = run(capsys, 'set', '70', '--mock', '--battery', 'BAT0')
+    assert out.out.startswith("✅ Battery charge limit set to 70%\n")
+    assert json.loads(run(capsys, 'get', '--mock', '--json').out) == {'BAT0': 70, 'BAT1': 80}
+
+
+def test_info_json(base_path, capsys):
+    details = json.loads(run(capsys, 'info', '--mock', '--json').out)
+    assert list(details) == ['BAT0', 'BAT1']
+    bat0 = details['BAT0']
+    assert (bat0['limit'], bat0['start_threshold'], bat0['capacity']) == (80, 40, 75)
+    assert bat0['control_file'] == os.path.join(base_path, 'BAT0', 'charge_control_end_threshold')
+    assert 'estimate' in bat0
+
+
+def test_watch_interval_streams_ndjson(base_path, capsys):
+    out = run(capsys, 'watch', '--mock', '--json', '--interval', '0.01', '--count', '5')
+    records = [json.loads(line) for line in out.out.splitlines()]
+    # Both batteries per tick, cut off after five records
+    assert [record['name'] for record in records] == ['BAT0', 'BAT1', 'BAT0', 'BAT1', 'BAT0']
+    assert all(record['time'] > 0 and record['limit'] == 80 for record in records)
+
+
+def test_watch_prints_changes(base_path, capsys, monkeypatch):
+    started = threading.Event()
+    write = cli.SnapshotWriter.write
+    
+    def write_and_signal(self, snapshots):
+        write(self, snapshots)
+        started.set()
+    monkeypatch.setattr(cli.SnapshotWriter, 'write', write_and_signal)
+    
+    thread = threading.Thread(target=cli.main,
+                              args=(['watch', '--mock', '--json', '--count', '3'],))
+    thread.start()
+    # The initial state of both batteries comes first, then the change
+    assert started.wait(5)
+    with open(os.path.join(base_path, 'BAT1', 'charge_control_end_threshold'), 'w') as f:
+        f.write('65\n')
+    thread.join(15)
+    assert not thread.is_alive()
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [(record['name'], record['limit']) for record in records] == [
+        ('BAT0', 80), ('BAT1', 80), ('BAT1', 65)]
+
+
+def test_closed_pipe_exits_quietly():
+    env = dict(os.environ, PYTHONPATH=SRC)
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'battery_limiter.cli', 'watch', '--mock', '--interval', '0.01'],
+        env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    process.stdout.readline()
+    process.stdout.close()
+    _out, err = process.communicate(timeout=10)
+    assert process.returncode == 141
+    assert err == b''
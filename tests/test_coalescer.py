@@ -0,0 +1,87 @@
+"""Tests for coalescing limit requests."""
+
+import threading
+import time
+
+import pytest
+
+from battery_limiter.core import BatteryFleet, LimitCoalescer
+from battery_limiter.mocksys import create_power_supply_tree
+from battery_limiter.probe import ProbeCache
+
+
+@pytest.fixture
+def fleet(tmp_path):
+    base_path = create_power_supply_tree(str(tmp_path / 'power_supply'), batteries=2)
+    fleet = BatteryFleet(base_path=base_path, probe_cache=ProbeCache(persistent=False))
+    yield fleet
+    fleet.close()
+
+
+def test_rapid_requests_write_last_limit_once(fleet):
+    applied = []
+    coalescer = LimitCoalescer(fleet, delay=0.05,
+                               on_applied=lambda limit, names: applied.append(limit))
+    futures = [coalescer.request(limit) for limit in (60, 70, 75)]
+    results = [future.result(timeout=5) for future in futures]
+    assert results[0] == results[-1]
+    assert applied == [75]
+    assert coalescer.coalesced == 2
+    assert [fleet.controllers[name].get_current_limit() for name in fleet.names()] == [75, 75]
+
+
+def test_write_errors_resolve_every_future(fleet):
+    def fail(start, limit, names):
+        raise OSError(5, "Input/output error")
+    fleet.set_thresholds = fail
+    coalescer = LimitCoalescer(fleet, delay=0.01)
+    futures = [coalescer.request(60), coalescer.request(65)]
+    for future in futures:
+        with pytest.raises(OSError):
+            future.result(timeout=5)
+
+
+def test_failing_callback_does_not_block_later_batches(fleet, capsys):
+    def fail(limit, names):
+        raise RuntimeError("disk full")
+    coalescer = LimitCoalescer(fleet, delay=0.01, on_applied=fail)
+    coalescer.request(60).result(timeout=5)
+    coalescer.request(65, ['BAT0']).result(timeout=5)
+    assert fleet.controllers['BAT0'].get_current_limit() == 65
+    assert "disk full" in capsys.readouterr().err
+
+
+def test_request_does_not_wait_for_slow_writes(fleet):
+    release = threading.Event()
+    order = []
+    set_thresholds = fleet.set_thresholds
+    
+    def slow(start, limit, names):
+        order.append((limit, names))
+        release.wait(5)
+        return set_thresholds(start, limit, names)
+    fleet.set_thresholds = slow
+    coalescer = LimitCoalescer(fleet, delay=0.01)
+    first = coalescer.request(60, ['BAT0'])
+    time.sleep(0.1)
+    
+    # The first write is stuck in the firmware; queueing more must not be
+    started = time.perf_counter()
+    second = coalescer.request(70, ['BAT1'])
+    third = coalescer.request(80)
+    assert time.perf_counter() - started < 0.05
+    release.set()
+    for future in (first, second, third):
+        future.result(timeout=5)
+    assert order == [(60, ('BAT0',)), (70, ('BAT1',)), (80, None)]
+    assert [fleet.controllers[name].get_current_limit() for name in fleet.names()] == [80, 80]
+
+
+def test_unsaved_requests_skip_the_callback(fleet):
+    applied = []
+    coalescer = LimitCoalescer(fleet, delay=0.01,
+                               on_applied=lambda limit, names: applied.append(limit))
+    coalescer.request(65, save=False).result(timeout=5)
+    coalescer.request(70).result(timeout=5)
+    assert applied == [70]
+    assert fleet.controllers['BAT0'].get_current_limit() == 70
@@ -0,0 +1,121 @@
+"""Tests for the configuration rule table and follower."""
+
+from datetime import datetime
+
+import pytest
+
+from battery_limiter.config import Config, ConfigError, ConfigFollower, update_limit
+
+CONFIG = """\
+limit 80
+start 75
+battery BAT1 limit 90
+
+[profile desk]
+limit 60
+battery BAT1 limit 70 start 65
+
+[profile travel]
+limit 100
+
+[profile night]
+limit 50
+
+[rules]
+mon-fri 09:00-18:00 on ac use desk
+on battery use travel
+sun 22:00-06:00 use night
+"""
+
+# 2026-10-19 is a Monday
+MONDAY = datetime(2026, 10, 19)
+
+
+def at(day: int, hour: int, minute: int = 0) -> datetime:
+    return MONDAY.replace(day=MONDAY.day + day, hour=hour, minute=minute)
+
+
+@pytest.fixture
+def table():
+    return Config.parse(CONFIG).compile()
+
+
+def test_limits_follow_the_rules(table):
+    assert table.rules == 3
+    assert table.profile_at(at(0, 10), ac=True) == 'desk'
+    assert table.limits(['BAT0', 'BAT1'], at(0, 10), ac=True) == {
+        'BAT0': (None, 60), 'BAT1': (65, 70)}
+    assert table.profile_at(at(0, 20), ac=True) == 'default'
+    assert table.limits(['BAT0', 'BAT1'], at(0, 20), ac=True) == {
+        'BAT0': (75, 80), 'BAT1': (None, 90)}
+    assert table.profile_at(at(5, 10), ac=True) == 'default'
+
+
+def test_first_matching_rule_wins(table):
+    # Desk hours on battery: the desk rule needs AC, so travel applies
+    assert table.profile_at(at(0, 10), ac=False) == 'travel'
+    # Sunday night on battery: travel comes before night
+    assert table.profile_at(at(6, 23), ac=False) == 'travel'
+
+
+def test_window_wraps_past_midnight_and_the_week(table):
+    assert table.profile_at(at(6, 21, 59), ac=True) == 'default'
+    assert table.profile_at(at(6, 22), ac=True) == 'night'
+    # Sunday's window carries into Monday
+    assert table.profile_at(at(0, 5, 59), ac=True) == 'night'
+    assert table.profile_at(at(0, 6), ac=True) == 'default'
+
+
+def test_next_change(table):
+    assert table.next_change(at(0, 8, 30), ac=True) == at(0, 9)
+    assert table.next_change(at(0, 9, 0), ac=True) == at(0, 18)
+    assert table.next_change(at(6, 23, 15), ac=True) == at(7, 6)
+    assert table.next_change(at(0, 8), ac=False) is None
+
+
+def test_legacy_file_is_a_single_limit():
+    config = Config.parse("85\n")
+    assert config.legacy
+    table = config.compile()
+    assert table.rules == 0
+    assert not table.dynamic
+    assert table.limits(['BAT0'], MONDAY) == {'BAT0': (None, 85)}
+
+
+@pytest.mark.parametrize('text, error', [
+    ("limit 80\n[rules]\nuse missing\n", "line 3: Unknown profile: missing"),
+    ("limit 80\n[rules]\nmon 09:00 use default\n", "line 3"),
+    ("limit 80\nvolume 3\n", "line 2: Unknown setting: volume"),
+    ("limit 80\nstart 85\n", "start threshold 85% is not below the limit 80%"),
+])
+def test_errors_name_the_line(text, error):
+    with pytest.raises(ConfigError, match=error):
+        Config.parse(text).compile()
+
+
+def test_update_limit_keeps_the_rest():
+    text = update_limit(CONFIG, 70)
+    assert text.splitlines()[:2] == ['limit 70', 'battery BAT1 limit 90']
+    assert text.endswith("sun 22:00-06:00 use night\n")
+    assert update_limit("# mine\n", 60).splitlines() == ['limit 60', '# mine']
+
+
+def test_follower_applies_only_changes(table):
+    now = [at(0, 8, 59).timestamp()]
+    applied = []
+    follower = ConfigFollower(['BAT0', 'BAT1'], lambda *args: applied.append(args),
+                              table, ac=True, clock=lambda: now[0], use_timerfd=False)
+    assert follower.update() == at(0, 9)
+    assert sorted(applied, key=str) == [(75, 80, ['BAT0']), (None, 90, ['BAT1'])]
+    assert follower.timeout() == 60
+    
+    applied.clear()
+    now[0] = at(0, 9).timestamp()
+    follower.update()
+    assert sorted(applied, key=str) == [(65, 70, ['BAT1']), (None, 60, ['BAT0'])]
+    
+    applied.clear()
+    follower.update()
+    assert applied == []
+    follower.set_power(False)
+    assert applied == [(None, 100, ['BAT0', 'BAT1'])]
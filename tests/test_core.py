@@ -0,0 +1,103 @@
+"""Tests for the battery controller and fleet."""
+
+import errno
+import os
+
+import pytest
+
+from battery_limiter.core import BatteryFleet, BatterySnapshot, RetryPolicy
+from battery_limiter.mocksys import create_power_supply_tree, update_battery
+from battery_limiter.probe import ProbeCache
+
+
+@pytest.fixture
+def fleet(tmp_path):
+    base_path = create_power_supply_tree(str(tmp_path / 'power_supply'), batteries=2)
+    fleet = BatteryFleet(base_path=base_path, probe_cache=ProbeCache(persistent=False))
+    yield fleet
+    fleet.close()
+
+
+def _failing(func, errors):
+    """Wrap ``func`` to raise each of ``errors`` once before working."""
+    calls = []
+    
+    def wrapper(*args):
+        calls.append(args)
+        if errors:
+            raise errors.pop(0)
+        return func(*args)
+    return wrapper, calls
+
+
+def test_failed_read_back_is_retried_without_writing_again(fleet):
+    controller = fleet.controllers['BAT0']
+    controller.retry = RetryPolicy(sleep=lambda delay: None)
+    controller.backend.write, writes = _failing(controller.backend.write, [])
+    controller._read_end, reads = _failing(controller._read_end,
+                                           [OSError(errno.EBUSY, "Device or resource busy")])
+    assert controller.set_charge_limit(60)
+    assert len(writes) == 1
+    assert len(reads) == 2
+    assert controller.write_retries == 0
+
+
+def test_transient_write_errors_are_retried(fleet):
+    controller = fleet.controllers['BAT0']
+    controller.retry = RetryPolicy(sleep=lambda delay: None)
+    controller.backend.write, writes = _failing(controller.backend.write,
+                                                [OSError(errno.EIO, "Input/output error")])
+    assert controller.set_charge_limit(60)
+    assert len(writes) == 2
+    assert controller.write_retries == 1
+    assert controller.get_current_limit() == 60
+
+
+def test_snapshot_reads_the_uevent(fleet):
+    snapshot = fleet.controllers['BAT0'].get_snapshot()
+    assert snapshot.name == 'BAT0'
+    assert (snapshot.status, snapshot.capacity) == ('Not charging', 75)
+    assert (snapshot.energy_full, snapshot.energy_now) == (51300000, 38475000)
+    assert (snapshot.model_name, snapshot.manufacturer) == ('5B10W13930', 'SMP')
+    assert snapshot.charge_now is None
+    # Not in the uevent, so read from the control file
+    assert snapshot.limit == 80
+    assert snapshot.as_dict()['capacity'] == 75
+
+
+def test_snapshot_follows_the_driver(fleet):
+    controller = fleet.controllers['BAT0']
+    before = controller.get_snapshot()
+    update_battery(os.path.join(fleet.base_path, 'BAT0'), STATUS='Charging', CAPACITY=76)
+    after = controller.get_snapshot()
+    assert (after.status, after.capacity) == ('Charging', 76)
+    assert after != before
+    assert controller.get_snapshot() == after
+
+
+def test_snapshot_uses_thresholds_reported_in_uevent(fleet):
+    controller = fleet.controllers['BAT0']
+    update_battery(os.path.join(fleet.base_path, 'BAT0'),
+                   CHARGE_CONTROL_END_THRESHOLD=90, CHARGE_CONTROL_START_THRESHOLD=85)
+    snapshot = controller.get_snapshot()
+    assert (snapshot.limit, snapshot.start_threshold) == (90, 85)
+
+
+def test_snapshot_from_properties_skips_malformed_values():
+    snapshot = BatterySnapshot.from_properties('BAT0', {
+        'STATUS': 'Discharging', 'CAPACITY': 'n/a', 'VOLTAGE_NOW': '11800000',
+        'CHARGE_CONTROL_END_THRESHOLD': '-1', 'MODEL_NAME': '',
+    }, start_threshold=40)
+    assert snapshot.status == 'Discharging'
+    assert snapshot.capacity is None
+    assert snapshot.voltage_now == 11800000
+    assert snapshot.limit is None
+    assert snapshot.model_name is None
+    assert snapshot.start_threshold == 40
+
+
+def test_snapshot_without_uevent_keeps_the_limit(fleet):
+    os.unlink(os.path.join(fleet.base_path, 'BAT1', 'uevent'))
+    snapshot = fleet.controllers['BAT1'].get_snapshot()
+    assert snapshot.limit == 80
+    assert snapshot.capacity is None
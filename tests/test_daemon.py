@@ -0,0 +1,69 @@
+"""Tests for the daemon request handling."""
+
+import json
+import socket
+
+import pytest
+
+from battery_limiter.client import DaemonClient
+from battery_limiter.core import BatteryControlError, BatteryFleet
+from battery_limiter.daemon import local_daemon
+from battery_limiter.mocksys import create_power_supply_tree
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    base_path = create_power_supply_tree(str(tmp_path / 'power_supply'), batteries=2)
+    with local_daemon(use_mock=False, base_path=base_path) as socket_path:
+        yield socket_path
+
+
+@pytest.fixture
+def client(socket_path):
+    client = DaemonClient(socket_path)
+    yield client
+    client.close()
+
+
+def test_get_and_set(client):
+    assert client.call('get') == {'BAT0': 80, 'BAT1': 80}
+    client.call('set', limit=60, batteries=['BAT1'])
+    assert client.call('get', batteries=['BAT1']) == {'BAT1': 60}
+
+
+@pytest.mark.parametrize('method, params, error', [
+    ('set', {'limit': '80'}, "'limit' must be an integer"),
+    ('set', {'limit': True}, "'limit' must be an integer"),
+    ('set', {}, "Missing 'limit'"),
+    ('set', {'limit': 80, 'start': 70.5}, "'start' must be an integer"),
+    ('set', {'limit': 80, 'force': True}, "Unknown parameter for set: force"),
+    ('get', {'batteries': 'BAT0'}, "'batteries' must be a list of names"),
+    ('set_schedule', {'text': 5}, "Missing or invalid 'text'"),
+    ('reboot', {}, "Unknown method: reboot"),
+])
+def test_malformed_params_get_an_error_reply(client, method, params, error):
+    with pytest.raises(BatteryControlError, match=error):
+        client.call(method, **params)
+    # The connection stays usable
+    assert client.call('batteries') == ['BAT0', 'BAT1']
+
+
+def test_unexpected_errors_get_an_error_reply(client, monkeypatch):
+    def fail(self, start, limit, names=None):
+        raise ValueError("unexpected")
+    monkeypatch.setattr(BatteryFleet, 'set_thresholds', fail)
+    with pytest.raises(BatteryControlError, match="Internal error: unexpected"):
+        client.call('set', limit=60)
+    assert client.call('batteries') == ['BAT0', 'BAT1']
+
+
+def test_oversized_request_gets_an_error_reply(socket_path, client):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(10)
+        sock.connect(socket_path)
+        request = json.dumps({'id': 1, 'method': 'get', 'params': {'pad': 'x' * 100000}})
+        sock.sendall(request.encode() + b'\n')
+        reply = sock.makefile('rb').readline()
+    assert json.loads(reply) == {'id': None, 'error': "Request too long"}
+    # Other connections are not affected
+    assert client.call('batteries') == ['BAT0', 'BAT1']
@@ -0,0 +1,180 @@
+"""Tests for the time-to-limit and time-to-empty estimator."""
+
+import random
+
+import pytest
+
+from battery_limiter.core import BatterySnapshot
+from battery_limiter.estimate import (ChargeEstimator, EnergyTrend, Estimate, format_duration,
+                                      format_estimate)
+from battery_limiter.sampler import MISSING, STATUS_CODES
+
+FULL = 50000000
+# 30 W in µWh per second
+CHARGE_RATE = 30000000 / 3600
+
+
+def charging(energy_now, power_now=30000000, limit=80):
+    return BatterySnapshot('BAT0', status='Charging', energy_now=int(energy_now),
+                           energy_full=FULL, power_now=power_now, limit=limit)
+
+
+def discharging(energy_now, power_now=10000000):
+    return BatterySnapshot('BAT0', status='Discharging', energy_now=int(energy_now),
+                           energy_full=FULL, power_now=power_now, limit=80)
+
+
+def test_trend_follows_a_line():
+    trend = EnergyTrend(half_life=600.0)
+    assert trend.fit() is None
+    for i in range(10000):
+        trend.update(1e9 + 30.0 * i, 20000000 + 250.0 * i)
+    slope, error = trend.fit()
+    # A long run stays exact, as the sums are relative to the latest sample
+    assert slope == pytest.approx(250.0 / 30)
+    assert error == pytest.approx(0.0, abs=1e-6)
+    assert trend.diffusion == pytest.approx(0.0, abs=1e-6)
+
+
+def test_old_samples_fade_out():
+    trend = EnergyTrend(half_life=60.0)
+    for i in range(200):
+        trend.update(10.0 * i, 1000.0 * i)
+    # Six samples per half-life, decaying by d = 2 ** (-1 / 6) each, are
+    # worth (1 + d) / (1 - d) equal ones
+    assert trend.effective_samples == pytest.approx(17.3, abs=0.1)
+    for i in range(200, 400):
+        trend.update(10.0 * i, 200000.0 - 500.0 * (i - 200))
+    assert trend.fit()[0] == pytest.approx(-50.0, rel=1e-3)
+
+
+def test_trend_restarts_when_time_goes_back():
+    trend = EnergyTrend()
+    for i in range(5):
+        trend.update(100.0 + i, i)
+    trend.update(50.0, 0)
+    assert trend.effective_samples == 1
+    with pytest.raises(ValueError):
+        EnergyTrend(half_life=0)
+
+
+def test_time_to_limit_while_charging():
+    estimator = ChargeEstimator()
+    start = 20000000
+    for i in range(20):
+        estimate = estimator.update(charging(start + CHARGE_RATE * 30 * i), 30.0 * i)
+    remaining = FULL * 0.8 - (start + CHARGE_RATE * 30 * 19)
+    assert (estimate.charging, estimate.target, estimate.method) == (True, 80, 'trend')
+    assert estimate.seconds == pytest.approx(remaining / CHARGE_RATE, rel=1e-3)
+    assert estimate.low <= estimate.seconds <= estimate.high
+
+
+def test_time_to_empty_while_discharging():
+    estimator = ChargeEstimator()
+    rate = 10000000 / 3600
+    for i in range(20):
+        estimate = estimator.update(discharging(30000000 - rate * 30 * i), 30.0 * i)
+    assert (estimate.charging, estimate.target) == (False, 0)
+    assert estimate.seconds == pytest.approx((30000000 - rate * 30 * 19) / rate, rel=1e-3)
+
+
+def test_bounds_cover_a_noisy_charge():
+    rng = random.Random(0)
+    estimator = ChargeEstimator()
+    level = 10000000.0
+    levels = []
+    for i in range(120):
+        level += CHARGE_RATE * 30 * rng.gauss(1.0, 0.1)
+        levels.append(level)
+        estimate = estimator.update(charging(level), 30.0 * i)
+    # Charging carries on at the same speed until the limit
+    actual = (FULL * 0.8 - level) / CHARGE_RATE
+    assert estimate.method == 'trend'
+    assert estimate.low < actual < estimate.high
+    assert estimate.high - estimate.low < actual
+
+
+def test_power_is_used_until_the_trend_is_known():
+    estimator = ChargeEstimator()
+    estimate = estimator.update(charging(20000000), 0.0)
+    assert estimate.method == 'power'
+    assert estimate.seconds == pytest.approx(20000000 / 30000000 * 3600)
+    assert (estimate.low, estimate.high) == (None, None)
+    # Without a power reading either, there is no estimate
+    assert ChargeEstimator().update(charging(20000000, power_now=None), 0.0) is None
+
+
+def test_repeated_readings_are_skipped():
+    estimator = ChargeEstimator()
+    for i in range(10):
+        estimator.update(charging(20000000 + 250000 * (i // 5)), 30.0 * i)
+    assert estimator.trends['BAT0'].effective_samples == pytest.approx(2, abs=0.1)
+
+
+def test_status_change_restarts_the_fit():
+    estimator = ChargeEstimator()
+    for i in range(20):
+        estimator.update(charging(20000000 + CHARGE_RATE * 30 * i), 30.0 * i)
+    estimate = estimator.update(discharging(24750000), 600.0)
+    assert estimate.method == 'power'
+    assert estimate.seconds == pytest.approx(24750000 / 10000000 * 3600)
+
+
+@pytest.mark.parametrize('snapshot', [
+    BatterySnapshot('BAT0', status='Not charging', energy_now=40000000, energy_full=FULL,
+                    power_now=0, limit=80),
+    # Already past the limit
+    charging(41000000),
+    # No full level to find the limit from
+    BatterySnapshot('BAT0', status='Charging', energy_now=1, power_now=30000000),
+])
+def test_no_estimate(snapshot):
+    assert ChargeEstimator().update(snapshot, 0.0) is None
+
+
+def test_charge_units():
+    estimator = ChargeEstimator()
+    for i in range(10):
+        snapshot = BatterySnapshot('BAT0', status='Discharging', charge_now=4000000 - 1000 * i,
+                                   charge_full=4500000, current_now=1200000, limit=80)
+        estimate = estimator.update(snapshot, 30.0 * i)
+    assert estimate.method == 'trend'
+    assert estimate.seconds == pytest.approx(3991000 / (1000 / 30), rel=1e-3)
+
+
+def test_fit_history():
+    count = 20
+    columns = {
+        'timestamp': [30.0 * i for i in range(count)],
+        'energy': [MISSING if i == 5 else int(20000000 + CHARGE_RATE * 30 * i)
+                   for i in range(count)],
+        'status': [STATUS_CODES['Charging']] * count,
+    }
+    estimator = ChargeEstimator()
+    assert estimator.fit_history('BAT0', columns) == count
+    assert estimator.trends['BAT0'].effective_samples > 3
+    # The fitted history is used for the very next snapshot
+    estimate = estimator.update(charging(20000000 + CHARGE_RATE * 600), 600.0)
+    assert estimate.method == 'trend'
+    assert estimate.seconds == pytest.approx((20000000 - CHARGE_RATE * 600) / CHARGE_RATE,
+                                             rel=1e-3)
+
+
+def test_record_uses_the_clock():
+    estimator = ChargeEstimator(clock=lambda: 1000.0)
+    assert estimator.record('BAT0', None) is None
+    estimator.record('BAT0', charging(20000000))
+    assert estimator.trends['BAT0'].time == 1000.0
+
+
+def test_formatting():
+    assert format_duration(20) == "< 1 min"
+    assert format_duration(45 * 60) == "45 min"
+    assert format_duration(2 * 3600 + 5 * 60) == "2 h 05 min"
+    trend = Estimate('BAT0', True, 80, 3900, 3300, 4800)
+    assert format_estimate(trend) == "1 h 05 min to 80% (55 min – 1 h 20 min)"
+    assert format_estimate(Estimate('BAT0', False, 0, 3900, 3300)) == \
+        "1 h 05 min to empty (55 min or more)"
+    assert format_estimate(Estimate('BAT0', False, 0, 600, method='power')) == \
+        "about 10 min to empty"
+    assert trend.as_dict()['seconds'] == 3900
@@ -0,0 +1,146 @@
+"""Tests for the GUI event loop, run on Qt's offscreen platform."""
+
+import os
+import time
+
+import pytest
+
+pytest.importorskip('PyQt6.QtWidgets')
+
+from battery_limiter import history
+from battery_limiter.core import BatteryFleet
+from battery_limiter.mocksys import create_power_supply_tree, update_battery
+from battery_limiter.probe import ProbeCache
+
+# Longest event-loop stall allowed while every sysfs access takes 200 ms
+MAX_STALL_MS = 50.0
+
+
+def _slowed(func, delay):
+    def slow(*args, **kwargs):
+        time.sleep(delay)
+        return func(*args, **kwargs)
+    return slow
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv('QT_QPA_PLATFORM', 'offscreen')
+    # Keep the GUI's sampler away from the real history
+    monkeypatch.setenv('XDG_STATE_HOME', str(tmp_path / 'state'))
+    monkeypatch.setattr(history, 'SYSTEM_HISTORY_PATH', str(tmp_path / 'system'))
+    from PyQt6.QtWidgets import QApplication
+    return QApplication.instance() or QApplication([])
+
+
+def test_slow_sysfs_does_not_stall_the_event_loop(app, tmp_path):
+    from PyQt6.QtCore import QTimer
+    from battery_limiter.gui import BatteryLimiterGUI
+    
+    fleet = BatteryFleet(use_mock=True,
+                         base_path=create_power_supply_tree(str(tmp_path / 'power_supply')))
+    for controller in fleet.select():
+        for method in ('get_snapshot', 'get_current_limit', 'set_charge_limit'):
+            setattr(controller, method, _slowed(getattr(controller, method), 0.2))
+    window = BatteryLimiterGUI(fleet)
+    window.finish_setup()
+    
+    interval = 10
+    stalls = []
+    last = [time.perf_counter()]
+    
+    def tick():
+        now = time.perf_counter()
+        stalls.append((now - last[0]) * 1e3 - interval)
+        last[0] = now
+    
+    requests = [0]
+    
+    def poke():
+        # Refresh and apply requests, as the timer, the watcher and the tray do
+        requests[0] += 1
+        window.update_display()
+        window.apply_limit_direct(60 if requests[0] % 2 else 80)
+    
+    ticker = QTimer()
+    ticker.setInterval(interval)
+    ticker.timeout.connect(tick)
+    poker = QTimer()
+    poker.setInterval(100)
+    poker.timeout.connect(poke)
+    
+    def finish():
+        ticker.stop()
+        poker.stop()
+        app.quit()
+    
+    try:
+        ticker.start()
+        poker.start()
+        QTimer.singleShot(1500, finish)
+        app.exec()
+    finally:
+        window.read_pool.waitForDone()
+        window.write_pool.waitForDone()
+        if window.sampler is not None:
+            window.sampler.stop()
+        if window.watcher is not None:
+            window.watcher.close()
+        fleet.close()
+    
+    assert requests[0] >= 10
+    assert max(stalls) < MAX_STALL_MS
+    # The writes did reach the batteries, off the event loop
+    assert fleet.select()[0].get_current_limit() in (60, 80)
+
+
+def test_icon_cache_shares_buckets_and_evicts(app):
+    from battery_limiter.gui import BatteryIconCache
+    
+    cache = BatteryIconCache(size=2)
+    icon = cache.icon(71, 79, False)
+    # 74% and an 81% limit fall into the same 10% and 5% buckets
+    assert cache.icon(74, 81, False) is icon
+    assert (cache.renders, cache.hits) == (1, 1)
+    
+    cache.icon(50, 80, True)
+    cache.icon(30, 80, False)
+    assert len(cache.icons) == 2
+    assert cache.key(71, 79, False) not in cache.icons
+    cache.icon(71, 79, False)
+    assert cache.renders == 4
+
+
+def test_unchanged_state_updates_no_widgets(app, tmp_path):
+    from battery_limiter.gui import BatteryLimiterGUI
+    
+    fleet = BatteryFleet(base_path=create_power_supply_tree(str(tmp_path / 'power_supply')),
+                         probe_cache=ProbeCache(persistent=False))
+    window = BatteryLimiterGUI(fleet)
+    try:
+        window.init_details()
+        window.show_snapshots(fleet.get_snapshots())
+        assert window.icon_updates == 1
+        
+        texts = []
+        for label in (window.current_limit_label, window.battery_model_label):
+            label.setText = lambda text, set_text=label.setText: (texts.append(text),
+                                                                  set_text(text))
+        window.show_snapshots(fleet.get_snapshots())
+        assert texts == []
+        assert window.icon_updates == 1
+        
+        # One percent more stays in the icon's bucket, charging does not
+        directory = os.path.join(fleet.base_path, 'BAT0')
+        update_battery(directory, CAPACITY=76)
+        window.show_snapshots(fleet.get_snapshots())
+        assert window.icon_updates == 1
+        update_battery(directory, STATUS='Charging')
+        window.show_snapshots(fleet.get_snapshots())
+        assert window.icon_updates == 2
+        assert window.icon_key == (80, 80, True)
+        assert texts == []
+    finally:
+        window.wait_for_tasks()
+        window.close()
+        fleet.close()
@@ -0,0 +1,91 @@
+"""Tests for the memory-mapped history store."""
+
+import os
+
+import pytest
+
+from battery_limiter.core import BatterySnapshot
+from battery_limiter.history import HistoryStore
+from battery_limiter.sampler import MAX_INT, MISSING, STATUS_CODES
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(str(tmp_path / 'history'), segment_records=8, sync_every=4)
+    yield store
+    store.close()
+
+
+def fill(store, count, start=1000.0, step=60.0):
+    for i in range(count):
+        store.append(start + i * step, capacity=50 + i % 50, energy=40000000 + i,
+                     power=9000000, voltage=None, limit=80, status='Discharging')
+
+
+def test_append_and_query_across_segments(store):
+    fill(store, 20)
+    # Segments hold 8 records, so 20 need three of them
+    assert len(store.segments) == 3
+    assert len(store) == 20
+    result = store.query()
+    assert list(result['timestamp']) == [1000.0 + i * 60 for i in range(20)]
+    assert list(result['energy'])[-1] == 40000019
+    assert set(result['voltage']) == {MISSING}
+    assert set(result['status']) == {STATUS_CODES['Discharging']}
+
+
+def test_query_time_range(store):
+    fill(store, 20)
+    result = store.query(since=1000.0 + 7 * 60, until=1000.0 + 9 * 60)
+    assert list(result['timestamp']) == [1420.0, 1480.0, 1540.0]
+    assert list(store.query(since=5000.0)['timestamp']) == []
+
+
+def test_snapshot_missing_values_are_sentinels(store):
+    store.append_snapshot(BatterySnapshot('BAT0', status='Charging', capacity=42), 10.0)
+    result = store.query()
+    assert list(result['capacity']) == [42]
+    assert list(result['limit']) == [-1]
+    assert list(result['power']) == [MISSING]
+
+
+def test_out_of_range_values_are_clamped(store):
+    store.append(10.0, capacity=70000, energy=2 ** 40, power=-(2 ** 40), limit=-3)
+    result = store.query()
+    assert list(result['capacity']) == [2 ** 15 - 1]
+    assert list(result['energy']) == [MAX_INT]
+    assert list(result['power']) == [-MAX_INT]
+    assert list(result['limit']) == [0]
+
+
+def test_records_are_shared_between_processes(store):
+    fill(store, 10)
+    store.flush()
+    other = HistoryStore(store.path, segment_records=8)
+    try:
+        assert len(other) == 10
+        # Appends from one store show up in the other after a refresh
+        other.append(5000.0, capacity=99)
+        store.refresh()
+        assert list(store.query(since=5000.0)['capacity']) == [99]
+    finally:
+        other.close()
+
+
+def test_compact_downsamples_old_segments(store):
+    # 24 records a minute apart, then a newer active segment
+    fill(store, 24)
+    fill(store, 2, start=100000.0)
+    removed = store.compact(before=50000.0, resolution=300.0)
+    # The last record of every 5-minute bucket is kept
+    timestamps = list(store.query(until=50000.0)['timestamp'])
+    assert removed == 24 - len(timestamps)
+    assert timestamps == [1180.0, 1480.0, 1780.0, 2080.0, 2380.0]
+    assert list(store.query(since=50000.0)['timestamp']) == [100000.0, 100060.0]
+    assert not [n for n in os.listdir(store.path) if n.endswith('.tmp')]
+
+
+def test_prune_removes_old_segments(store):
+    fill(store, 20)
+    assert store.prune(before=1000.0 + 16 * 60) == 2
+    assert list(store.query()['timestamp']) == [1000.0 + i * 60 for i in range(16, 20)]
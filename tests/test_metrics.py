@@ -0,0 +1,111 @@
+"""Tests for operation latency histograms and the Prometheus export."""
+
+import errno
+import os
+
+import pytest
+
+from battery_limiter.core import BatteryControlError, BatteryFleet, RetryPolicy
+from battery_limiter.metrics import (BUCKET_BOUNDS_NS, Histogram, OperationMetrics,
+                                     fleet_metrics, format_prometheus, write_textfile)
+from battery_limiter.mocksys import create_power_supply_tree
+from battery_limiter.probe import ProbeCache
+
+
+@pytest.fixture
+def fleet(tmp_path):
+    base_path = create_power_supply_tree(str(tmp_path / 'power_supply'), batteries=1)
+    fleet = BatteryFleet(base_path=base_path, probe_cache=ProbeCache(persistent=False))
+    yield fleet
+    fleet.close()
+
+
+def samples(text):
+    """Sample lines of the text format as {name{labels}: value}."""
+    result = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            name, _, value = line.rpartition(' ')
+            result[name] = float(value)
+    return result
+
+
+def test_histogram_buckets_and_quantiles():
+    histogram = Histogram()
+    assert histogram.quantile(0.5) is None
+    for ns in (10_000, 60_000, 60_000, 3_000_000, 20_000_000_000):
+        histogram.observe(ns)
+    assert histogram.count == 5
+    assert histogram.counts[0] == 1
+    assert histogram.counts[1] == 2
+    assert histogram.counts[-1] == 1
+    assert histogram.quantile(0.5) == 100e-6
+    assert histogram.quantile(0.8) == 5e-3
+    assert histogram.quantile(1.0) == float('inf')
+
+
+def test_metrics_round_trip_through_plain_data():
+    metrics = OperationMetrics()
+    metrics.observe('write', 2_000_000)
+    metrics.error('write')
+    restored = OperationMetrics.from_dict(metrics.to_dict())
+    assert restored.to_dict() == metrics.to_dict()
+    with pytest.raises(ValueError):
+        Histogram.from_dict({'counts': [0, 1], 'sum_ns': 5})
+
+
+def test_controller_times_its_operations(fleet):
+    controller = fleet.controllers['BAT0']
+    controller.retry = RetryPolicy(sleep=lambda delay: None)
+    controller.set_charge_limit(60)
+    latency = controller.metrics.latency
+    assert latency['write'].count == 1
+    assert latency['readback'].count == 1
+    
+    def broken(value):
+        raise OSError(errno.EACCES, "Permission denied")
+    controller.backend.write = broken
+    with pytest.raises(BatteryControlError):
+        controller.set_charge_limit(70)
+    assert controller.metrics.errors['write'] == 1
+    assert latency['write'].count == 2
+
+
+def test_prometheus_export(fleet):
+    fleet.set_limits(60)
+    text = format_prometheus(fleet_metrics(fleet))
+    values = samples(text)
+    bucket = 'battery_limiter_operation_duration_seconds_bucket{battery="BAT0",operation="write",'
+    # Buckets are cumulative and end with the total count
+    counts = [values[f'{bucket}le="{bound / 1e9!r}"}}'] for bound in BUCKET_BOUNDS_NS]
+    assert counts == sorted(counts)
+    assert values[bucket + 'le="+Inf"}'] == 1
+    assert values['battery_limiter_operation_duration_seconds_count'
+                  '{battery="BAT0",operation="write"}'] == 1
+    assert values['battery_limiter_hardware_writes_total{battery="BAT0"}'] == 1
+    assert values['battery_limiter_charge_limit_percent{battery="BAT0"}'] == 60
+    assert values['battery_limiter_charging{battery="BAT0"}'] == 0
+    # 38475000 µWh
+    assert values['battery_limiter_energy_joules{battery="BAT0"}'] == pytest.approx(138510)
+    assert "# TYPE battery_limiter_operation_duration_seconds histogram" in text
+
+
+def test_labels_are_escaped():
+    metrics = {'BAT"0\\': {'operations': OperationMetrics().to_dict(), 'state': {}}}
+    assert 'battery="BAT\\"0\\\\"' in format_prometheus(metrics)
+
+
+def test_write_textfile(tmp_path):
+    path = str(tmp_path / 'battery_limiter.prom')
+    write_textfile("battery_limiter_up 1\n", path)
+    write_textfile("battery_limiter_up 2\n", path)
+    with open(path) as f:
+        assert f.read() == "battery_limiter_up 2\n"
+    assert os.listdir(tmp_path) == ['battery_limiter.prom']
+    
+    # A directory in the way makes the rename fail; nothing is left behind
+    blocked = tmp_path / 'blocked'
+    (blocked / 'battery_limiter.prom').mkdir(parents=True)
+    with pytest.raises(OSError):
+        write_textfile("battery_limiter_up 3\n", str(blocked / 'battery_limiter.prom'))
+    assert os.listdir(blocked) == ['battery_limiter.prom']
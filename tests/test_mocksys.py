@@ -0,0 +1,113 @@
+"""Tests for the synthetic ``power_supply`` tree generator."""
+
+import os
+
+import pytest
+
+from battery_limiter.core import BatteryFleet
+from battery_limiter.mocksys import (BATTERY_MODELS, VENDOR_CONTROL_FILES,
+                                     create_power_supply_tree, create_sysfs_tree)
+from battery_limiter.probe import ProbeCache
+from battery_limiter.sysfs import find_batteries
+
+
+def uevent(directory):
+    with open(os.path.join(directory, 'uevent')) as f:
+        return dict(line.rstrip('\n').split('=', 1) for line in f)
+
+
+def read(path):
+    with open(path) as f:
+        return f.read().strip()
+
+
+def snapshots(base_path):
+    fleet = BatteryFleet(base_path=base_path, probe_cache=ProbeCache(persistent=False))
+    try:
+        return fleet.get_snapshots()
+    finally:
+        fleet.close()
+
+
+def test_tree_layout(tmp_path):
+    base_path = create_power_supply_tree(str(tmp_path / 'power_supply'), batteries=3,
+                                         adapters=2, usb_adapters=2, peripherals=2)
+    assert sorted(os.listdir(base_path)) == [
+        'AC', 'ADP1', 'BAT0', 'BAT1', 'BAT2', 'hidpp_battery_0', 'hidpp_battery_1',
+        'ucsi-source-psy-USBC000:001', 'ucsi-source-psy-USBC000:002']
+    assert find_batteries(base_path) == ['BAT0', 'BAT1', 'BAT2']
+    assert uevent(os.path.join(base_path, 'AC'))['POWER_SUPPLY_TYPE'] == 'Mains'
+    usb = os.path.join(base_path, 'ucsi-source-psy-USBC000:00')
+    assert (read(usb + '1/online'), read(usb + '2/online')) == ('1', '0')
+    assert uevent(os.path.join(base_path, 'hidpp_battery_0'))['POWER_SUPPLY_SCOPE'] == 'Device'
+
+
+def test_attribute_files_match_uevent(tmp_path):
+    base_path = create_power_supply_tree(str(tmp_path / 'power_supply'), seed=3,
+                                         batteries=4, start_threshold=40)
+    for name in find_batteries(base_path):
+        directory = os.path.join(base_path, name)
+        for key, value in uevent(directory).items():
+            assert read(os.path.join(directory, key[len('POWER_SUPPLY_'):].lower())) == value
+        assert read(os.path.join(directory, 'charge_control_end_threshold')) == '80'
+        assert read(os.path.join(directory, 'charge_control_start_threshold')) == '40'
+
+
+def test_identical_batteries_without_a_seed(tmp_path):
+    base_path = create_power_supply_tree(str(tmp_path / 'power_supply'), batteries=2)
+    bat0, bat1 = (uevent(os.path.join(base_path, name)) for name in ('BAT0', 'BAT1'))
+    assert bat0.pop('POWER_SUPPLY_NAME') != bat1.pop('POWER_SUPPLY_NAME')
+    assert bat0 == bat1
+
+
+def test_seed_varies_batteries_reproducibly(tmp_path):
+    def tree(name, seed):
+        base_path = create_power_supply_tree(str(tmp_path / name), batteries=16, seed=seed)
+        return [uevent(os.path.join(base_path, battery)) for battery in find_batteries(base_path)]
+    
+    first = tree('first', 7)
+    assert tree('again', 7) == first
+    assert tree('other', 8) != first
+    models = {battery['POWER_SUPPLY_MODEL_NAME'] for battery in first}
+    assert models <= {model for _, model, _, _ in BATTERY_MODELS}
+    assert len(models) > 1
+    # Some report charge in µAh instead of energy in µWh
+    units = {'POWER_SUPPLY_ENERGY_NOW' in battery for battery in first}
+    assert units == {True, False}
+
+
+def test_seeded_batteries_are_consistent(tmp_path):
+    base_path = create_power_supply_tree(str(tmp_path / 'power_supply'), batteries=16, seed=1)
+    for snapshot in snapshots(base_path).values():
+        assert snapshot.limit == 80
+        if snapshot.status in ('Not charging', 'Full'):
+            assert snapshot.capacity == 80
+        else:
+            assert 3 <= snapshot.capacity < 80
+        if snapshot.energy_full is not None:
+            now, full, design = (snapshot.energy_now, snapshot.energy_full,
+                                 snapshot.energy_full_design)
+        else:
+            now, full, design = (snapshot.charge_now, snapshot.charge_full,
+                                 snapshot.charge_full_design)
+        assert now == full * snapshot.capacity // 100
+        assert 0.6 * design <= full <= design
+
+
+@pytest.mark.parametrize('backend', sorted(VENDOR_CONTROL_FILES))
+def test_vendor_layouts_are_detected(tmp_path, backend):
+    root = tmp_path / 'sys'
+    base_path = create_sysfs_tree(str(root), backend, peripherals=1, seed=0)
+    assert base_path == str(root / 'class' / 'power_supply')
+    assert not os.path.exists(os.path.join(base_path, 'BAT0', 'charge_control_end_threshold'))
+    path, encode = VENDOR_CONTROL_FILES[backend]
+    assert read(str(root / path)) == encode(80)
+    
+    fleet = BatteryFleet(base_path=base_path, probe_cache=ProbeCache(persistent=False))
+    try:
+        assert list(fleet.controllers) == ['BAT0']
+        controller = fleet.controllers['BAT0']
+        assert controller.control_file == str(root / path)
+        assert controller.get_current_limit() == 80
+    finally:
+        fleet.close()
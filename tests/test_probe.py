@@ -0,0 +1,51 @@
+"""Tests for the persistent probe cache."""
+
+import os
+
+from battery_limiter.mocksys import create_power_supply_tree
+from battery_limiter.probe import ProbeCache
+
+
+def test_valid_cache_is_reused(tmp_path):
+    base_path = create_power_supply_tree(str(tmp_path / 'power_supply'), batteries=2)
+    cache_path = str(tmp_path / 'probe.json')
+    assert list(ProbeCache(cache_path).batteries(base_path)) == ['BAT0', 'BAT1']
+    
+    cache = ProbeCache(cache_path)
+    assert list(cache.batteries(base_path)) == ['BAT0', 'BAT1']
+    assert (cache.hits, cache.misses) == (1, 0)
+
+
+def test_empty_result_is_not_stored(tmp_path):
+    base_path = create_power_supply_tree(str(tmp_path / 'power_supply'), batteries=0)
+    cache_path = str(tmp_path / 'probe.json')
+    assert ProbeCache(cache_path).batteries(base_path) == {}
+    assert not os.path.exists(cache_path)
+    
+    # The driver loads later
+    create_power_supply_tree(base_path, batteries=1, adapters=0)
+    cache = ProbeCache(cache_path)
+    assert list(cache.batteries(base_path)) == ['BAT0']
+    assert cache.misses == 1
+
+
+def test_new_battery_invalidates_cache(tmp_path):
+    base_path = create_power_supply_tree(str(tmp_path / 'power_supply'), batteries=1)
+    cache_path = str(tmp_path / 'probe.json')
+    ProbeCache(cache_path).batteries(base_path)
+    
+    create_power_supply_tree(base_path, batteries=2, adapters=0)
+    cache = ProbeCache(cache_path)
+    assert list(cache.batteries(base_path)) == ['BAT0', 'BAT1']
+    assert (cache.hits, cache.misses) == (0, 1)
+
+
+def test_removed_control_file_invalidates_cache(tmp_path):
+    base_path = create_power_supply_tree(str(tmp_path / 'power_supply'), batteries=2)
+    cache_path = str(tmp_path / 'probe.json')
+    ProbeCache(cache_path).batteries(base_path)
+    
+    os.unlink(os.path.join(base_path, 'BAT1', 'charge_control_end_threshold'))
+    cache = ProbeCache(cache_path)
+    assert list(cache.batteries(base_path)) == ['BAT0']
+    assert cache.misses == 1
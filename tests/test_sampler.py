@@ -0,0 +1,88 @@
+"""Tests for the ring buffer, the sampling policy and the sampler."""
+
+import pytest
+
+from battery_limiter.core import BatteryController, BatterySnapshot
+from battery_limiter.mocksys import create_power_supply_tree
+from battery_limiter.probe import ProbeCache
+from battery_limiter.sampler import MAX_CAPACITY, MAX_INT, RingBuffer, Sampler, SamplingPolicy
+
+
+class Clock:
+    """Time source that only moves when told to."""
+    
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+    
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def controller(tmp_path):
+    base_path = create_power_supply_tree(str(tmp_path / 'power_supply'), batteries=1)
+    return BatteryController(base_path=base_path, probe_cache=ProbeCache(persistent=False))
+
+
+def test_buffer_keeps_newest_in_order():
+    buffer = RingBuffer(size=3)
+    for i in range(5):
+        buffer.append(float(i), 50 + i, 'Charging', 1000 * i, None, None)
+    assert len(buffer) == 3
+    result = buffer.query()
+    assert result['timestamp'] == [2.0, 3.0, 4.0]
+    assert result['capacity'] == [52, 53, 54]
+    assert result['voltage_now'] == [None, None, None]
+    assert buffer.query(since=3.0)['timestamp'] == [3.0, 4.0]
+    assert buffer.query(limit=1)['timestamp'] == [4.0]
+
+
+def test_buffer_clamps_out_of_range_values():
+    buffer = RingBuffer(size=2)
+    buffer.append(1.0, 70000, 'Full', 2 ** 40, -(2 ** 40), 2 ** 31)
+    buffer.append(2.0, -5, 'Bogus', None, None, None)
+    result = buffer.query()
+    assert result['capacity'] == [MAX_CAPACITY, 0]
+    assert result['power_now'] == [MAX_INT, None]
+    # Clamping never produces the missing-value sentinel
+    assert result['voltage_now'] == [-MAX_INT, None]
+    assert result['temp'] == [MAX_INT, None]
+    assert result['status'] == ['Full', 'Unknown']
+
+
+def test_policy_intervals():
+    policy = SamplingPolicy(wakeups_per_hour=60)
+    assert policy.interval(None) == policy.idle
+    charging = BatterySnapshot('BAT0', status='Charging', capacity=50, limit=80)
+    assert policy.interval(charging) == policy.normal
+    # Near the limit is fast, but never faster than the wakeup budget
+    near = BatterySnapshot('BAT0', status='Charging', capacity=78, limit=80)
+    assert policy.interval(near) == 60.0
+    discharging = BatterySnapshot('BAT0', status='Discharging', capacity=78, limit=80)
+    assert policy.interval(discharging) == policy.discharging
+
+
+def test_sample_reads_the_battery(controller):
+    clock = Clock()
+    sampler = Sampler(controller, RingBuffer(size=8), clock=clock)
+    assert sampler.sample() == sampler.policy.idle
+    result = sampler.query()
+    assert result['timestamp'] == [1000.0]
+    assert result['capacity'] == [75]
+    assert result['status'] == ['Not charging']
+
+
+def test_record_keeps_to_the_wakeup_budget(controller):
+    clock = Clock()
+    sampler = Sampler(controller, RingBuffer(size=8),
+                      SamplingPolicy(wakeups_per_hour=120), clock=clock)
+    snapshot = controller.get_snapshot()
+    for offset in (0.0, 1.0, 29.0, 30.0, 31.0, 60.0):
+        clock.now = 1000.0 + offset
+        sampler.record('BAT0', snapshot)
+    assert sampler.query()['timestamp'] == [1000.0, 1030.0, 1060.0]
+    
+    # Other batteries are not recorded
+    clock.now = 2000.0
+    sampler.record('BAT1', snapshot)
+    assert len(sampler.buffer) == 3
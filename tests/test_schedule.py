@@ -0,0 +1,165 @@
+"""Tests for charge limit schedules and following them with an injected clock."""
+
+import os
+import time
+from datetime import datetime
+
+import pytest
+
+from battery_limiter.schedule import Schedule, Scheduler, load_schedule, save_schedule
+
+
+class Clock:
+    """Wall clock that only moves when told to."""
+    
+    def __init__(self, moment: datetime):
+        self.now = moment.timestamp()
+    
+    def __call__(self) -> float:
+        return self.now
+    
+    def set(self, moment: datetime) -> None:
+        self.now = moment.timestamp()
+
+
+@pytest.fixture
+def timezone(monkeypatch):
+    """Switch the local time zone for the duration of a test."""
+    def switch(name: str) -> None:
+        monkeypatch.setenv('TZ', name)
+        time.tzset()
+    switch('UTC')
+    yield switch
+    monkeypatch.undo()
+    time.tzset()
+
+
+def follow(text: str, moment: datetime):
+    clock = Clock(moment)
+    applied = []
+    scheduler = Scheduler(Schedule.parse(text), applied.append, clock=clock,
+                          use_timerfd=False)
+    scheduler.update()
+    return scheduler, clock, applied
+
+
+def test_limit_changes_exactly_at_the_rule(timezone):
+    # 2026-10-19 is a Monday
+    scheduler, clock, applied = follow("mon-fri 07:00 100\nmon-fri 22:00 60\n",
+                                       datetime(2026, 10, 19, 21, 59, 59))
+    assert applied == [100]
+    assert scheduler.next_time == datetime(2026, 10, 19, 22, 0)
+    assert scheduler.timeout() == 1
+    
+    clock.set(datetime(2026, 10, 19, 22, 0))
+    scheduler.handle()
+    assert applied == [100, 60]
+    assert scheduler.next_time == datetime(2026, 10, 20, 7, 0)
+    
+    # Nothing is written again until the limit changes
+    clock.set(datetime(2026, 10, 19, 23, 0))
+    scheduler.handle()
+    assert applied == [100, 60]
+
+
+def test_rules_carry_over_the_end_of_the_week(timezone):
+    scheduler, clock, applied = follow("sat 08:00 90\nsun 22:00 50\n",
+                                       datetime(2026, 10, 19, 10, 0))
+    # Sunday evening's rule is still in force on Monday
+    assert applied == [50]
+    assert scheduler.next_time == datetime(2026, 10, 24, 8, 0)
+    
+    for moment in (datetime(2026, 10, 24, 8, 0), datetime(2026, 10, 25, 22, 0)):
+        clock.set(moment)
+        scheduler.handle()
+    assert applied == [50, 90, 50]
+    assert scheduler.next_time == datetime(2026, 10, 31, 8, 0)
+
+
+def test_override_expires(timezone):
+    scheduler, clock, applied = follow("daily 07:00 80\n"
+                                       "override 2026-10-19T09:00 2026-10-19T10:00 100\n"
+                                       "override 2026-10-19T20:00 95\n",
+                                       datetime(2026, 10, 19, 8, 0))
+    assert applied == [80]
+    assert scheduler.next_time == datetime(2026, 10, 19, 9, 0)
+    
+    for moment in (datetime(2026, 10, 19, 9, 0), datetime(2026, 10, 19, 10, 0)):
+        clock.set(moment)
+        scheduler.handle()
+    assert applied == [80, 100, 80]
+    
+    # Without an end, an override lasts until the next rule transition
+    clock.set(datetime(2026, 10, 19, 20, 0))
+    scheduler.handle()
+    assert applied[-1] == 95
+    assert scheduler.next_time == datetime(2026, 10, 20, 7, 0)
+    clock.set(scheduler.next_time)
+    scheduler.handle()
+    assert applied == [80, 100, 80, 95, 80]
+
+
+def test_repeated_hour_applies_once(timezone):
+    # Clocks in Berlin go back from 03:00 to 02:00 on 2026-10-25
+    timezone('Europe/Berlin')
+    scheduler, clock, applied = follow("daily 02:30 60\ndaily 05:00 80\n",
+                                       datetime(2026, 10, 25, 1, 0))
+    assert applied == [80]
+    assert scheduler.next_time == datetime(2026, 10, 25, 2, 30)
+    
+    clock.now += scheduler.timeout()
+    scheduler.handle()
+    assert applied == [80, 60]
+    
+    # 02:30 comes round a second time an hour later
+    clock.now += 3600
+    repeated = datetime.fromtimestamp(clock.now)
+    assert (repeated, repeated.fold) == (datetime(2026, 10, 25, 2, 30), 1)
+    scheduler.handle()
+    assert applied == [80, 60]
+    assert scheduler.next_time == datetime(2026, 10, 25, 5, 0)
+    
+    clock.set(scheduler.next_time)
+    scheduler.handle()
+    assert applied == [80, 60, 80]
+
+
+def test_skipped_hour_still_applies_the_rule(timezone):
+    # Clocks in Berlin go forward from 02:00 to 03:00 on 2026-03-29
+    timezone('Europe/Berlin')
+    scheduler, clock, applied = follow("daily 02:30 60\ndaily 05:00 80\n",
+                                       datetime(2026, 3, 29, 1, 59))
+    assert applied == [80]
+    timeout = scheduler.timeout()
+    assert 0 < timeout <= 2 * 3600
+    
+    # 02:30 never shows on the clock, but the timer still fires
+    clock.now += timeout
+    scheduler.handle()
+    assert applied == [80, 60]
+    assert scheduler.next_time == datetime(2026, 3, 29, 5, 0)
+
+
+def test_ended_overrides_are_dropped(tmp_path):
+    path = str(tmp_path / 'schedule')
+    schedule = Schedule.parse("daily 07:00 80\n"
+                              "override 2026-10-19T09:00 2026-10-19T10:00 100\n"
+                              "override 2026-10-20T09:00 2026-10-20T10:00 90\n")
+    save_schedule(schedule, path, now=datetime(2026, 10, 19, 12, 0))
+    assert [override.limit for override in
+            load_schedule(path, now=datetime(2026, 10, 19, 12, 0)).overrides] == [90]
+    assert load_schedule(path, now=datetime(2026, 10, 20, 10, 0)).overrides == []
+    assert len(load_schedule(path, now=datetime(2026, 10, 20, 9, 30)).rules) == 1
+
+
+def test_failed_save_leaves_no_temporary_file(tmp_path, monkeypatch):
+    path = tmp_path / 'schedule'
+    path.write_text("daily 07:00 80\n")
+    
+    def fail(src, dst):
+        raise OSError(28, "No space left on device")
+    monkeypatch.setattr(os, 'replace', fail)
+    with pytest.raises(OSError):
+        save_schedule(Schedule.parse("daily 07:00 60\n"), str(path))
+    assert os.listdir(tmp_path) == ['schedule']
+    assert path.read_text() == "daily 07:00 80\n"
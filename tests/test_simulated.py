@@ -0,0 +1,117 @@
+"""Tests for the simulated firmware backend and write retries."""
+
+import errno
+
+import pytest
+
+from battery_limiter.backends.simulated import FaultSchedule, SimulatedFirmware, attach
+from battery_limiter.core import (BatteryControlError, BatteryFleet, LimitMismatchError,
+                                  RetryPolicy)
+from battery_limiter.mocksys import create_power_supply_tree
+from battery_limiter.probe import ProbeCache
+from battery_limiter.stress import stress
+
+
+class Clock:
+    """Monotonic clock that only moves when told to."""
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def controller(tmp_path):
+    base_path = create_power_supply_tree(str(tmp_path / 'power_supply'), batteries=1)
+    fleet = BatteryFleet(base_path=base_path, probe_cache=ProbeCache(persistent=False))
+    controller = fleet.controllers['BAT0']
+    yield controller
+    fleet.close()
+
+
+def retrying(controller, sleeps, attempts=4):
+    controller.retry = RetryPolicy(attempts=attempts, delay=0.05, jitter=0.0,
+                                   sleep=sleeps.append)
+
+
+def test_fault_schedule_plays_sequence_then_rate():
+    schedule = FaultSchedule(rate=1.0, errnos=(errno.EIO,),
+                             sequence=[errno.EBUSY, None])
+    assert [schedule.next() for _ in range(4)] == [errno.EBUSY, None, errno.EIO, errno.EIO]
+    assert FaultSchedule().next() is None
+
+
+def test_transient_write_errors_are_retried_with_backoff(controller):
+    sleeps = []
+    retrying(controller, sleeps)
+    firmware = attach(controller, SimulatedFirmware(
+        write_faults=FaultSchedule(sequence=[errno.EBUSY, errno.EIO])))
+    assert controller.set_charge_limit(60)
+    assert firmware.limit == 60
+    assert (firmware.writes, firmware.faults) == (3, 2)
+    assert controller.write_retries == 2
+    assert sleeps == [0.05, 0.1]
+
+
+def test_retries_give_up_after_the_last_attempt(controller):
+    sleeps = []
+    retrying(controller, sleeps, attempts=3)
+    firmware = attach(controller, SimulatedFirmware(
+        write_faults=FaultSchedule(sequence=[errno.EBUSY] * 5)))
+    with pytest.raises(BatteryControlError):
+        controller.set_charge_limit(60)
+    assert firmware.writes == 3
+    assert firmware.limit == 80
+
+
+def test_permanent_errors_are_not_retried(controller):
+    sleeps = []
+    retrying(controller, sleeps)
+    firmware = attach(controller, SimulatedFirmware(
+        write_faults=FaultSchedule(sequence=[errno.EACCES])))
+    with pytest.raises(BatteryControlError):
+        controller.set_charge_limit(60)
+    assert firmware.writes == 1
+    assert sleeps == []
+
+
+def test_clamped_limit_is_reported_not_retried(controller):
+    sleeps = []
+    retrying(controller, sleeps)
+    firmware = attach(controller, SimulatedFirmware(supported=(50, 80, 100)))
+    with pytest.raises(LimitMismatchError):
+        controller.set_charge_limit(65)
+    # Rounded to the nearest supported value, upwards on a tie
+    assert firmware.limit == 80
+    assert (firmware.writes, firmware.clamped) == (1, 1)
+    assert sleeps == []
+
+
+def test_firmware_forgets_the_limit(controller):
+    clock = Clock()
+    firmware = attach(controller, SimulatedFirmware(reset_after=60.0, clock=clock))
+    controller.set_charge_limit(60)
+    clock.now = 59.0
+    assert controller.get_current_limit() == 60
+    clock.now = 60.0
+    assert controller.get_current_limit() == 100
+    assert firmware.resets == 1
+
+
+def test_firmware_rejects_out_of_range_values():
+    firmware = SimulatedFirmware()
+    for raw in ('0', '101', 'eighty'):
+        with pytest.raises(OSError) as error:
+            firmware.write(raw)
+        assert error.value.errno == errno.EINVAL
+    assert firmware.limit == 80
+
+
+def test_no_write_is_lost_under_faults():
+    result = stress(operations=1000, fault_rate=0.05)
+    assert result['firmware_faults'] > 0
+    assert result['write_retries'] > 0
+    assert result['failed_writes'] == 0
+    assert result['mismatched_writes'] == 0
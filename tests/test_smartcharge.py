@@ -0,0 +1,158 @@
+"""Tests for the unplug model, its persistence and the smart charger."""
+
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from battery_limiter.core import BatteryController
+from battery_limiter.mocksys import create_power_supply_tree, update_battery
+from battery_limiter.probe import ProbeCache
+from battery_limiter.smartcharge import SmartChargePolicy, SmartCharger, UnplugModel
+
+MONDAY = datetime(2026, 1, 5)
+# 08:00 in 15-minute slots
+EIGHT = 32
+
+
+@pytest.fixture(autouse=True)
+def utc(monkeypatch):
+    monkeypatch.setenv('TZ', 'UTC')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def at(moment: datetime) -> float:
+    return moment.timestamp()
+
+
+def learn(model: UnplugModel, days: int) -> None:
+    """Feed a routine: on AC overnight, out 08:00-18:00 on weekdays."""
+    for day in range(days):
+        date = MONDAY + timedelta(days=day)
+        model.observe(at(date + timedelta(hours=6)), 'Charging')
+        if date.weekday() < 5:
+            model.observe(at(date + timedelta(hours=8)), 'Discharging')
+            model.observe(at(date + timedelta(hours=18)), 'Charging')
+
+
+def test_unplugs_count_once_the_day_is_over():
+    model = UnplugModel()
+    model.observe(at(MONDAY + timedelta(hours=7)), 'Charging')
+    model.observe(at(MONDAY + timedelta(hours=8)), 'Discharging')
+    # The day is still open, so its unplug is not part of the profile yet
+    assert model.events[0][EIGHT] == 0.0
+    assert model.days[0] == 0.0
+    
+    model.observe(at(MONDAY + timedelta(days=1, hours=7)), 'Discharging')
+    assert model.events[0][EIGHT] == 1.0
+    assert model.days[0] == 1.0
+    assert sum(model.events[0]) == 1.0
+
+
+def test_charge_rate_follows_power():
+    model = UnplugModel(rate_weight=0.5)
+    model.observe(at(MONDAY), 'Charging', 50, power=20000000, energy_full=50000000)
+    assert model.charge_rate == pytest.approx(40.0)
+    model.observe(at(MONDAY + timedelta(minutes=5)), 'Charging', 51,
+                  power=10000000, energy_full=50000000)
+    assert model.charge_rate == pytest.approx(30.0)
+
+
+def test_predicts_the_routine():
+    model = UnplugModel()
+    learn(model, 21)
+    monday = MONDAY + timedelta(weeks=3)
+    assert model.next_unplug(at(monday + timedelta(hours=6))) == at(monday + timedelta(hours=8))
+    # Weekends have no unplugs, so Saturday predicts Monday
+    saturday = MONDAY + timedelta(days=19, hours=12)
+    assert model.next_unplug(at(saturday)) == at(monday + timedelta(hours=8))
+
+
+def test_no_prediction_without_enough_days():
+    model = UnplugModel()
+    learn(model, 2)
+    assert model.next_unplug(at(MONDAY + timedelta(days=2, hours=6))) is None
+
+
+def test_skipped_days_fade():
+    model = UnplugModel()
+    learn(model, 2)
+    # Nothing from Wednesday 7 to Monday 19: two Mondays and one Tuesday
+    # go by unobserved
+    model.observe(at(MONDAY + timedelta(days=15, hours=6)), 'Charging')
+    decay = model.decay
+    assert model.days[0] == pytest.approx(decay ** 2)
+    assert model.events[0][EIGHT] == pytest.approx(decay ** 2)
+    assert model.days[1] == pytest.approx(decay)
+    assert model.events[1][EIGHT] == pytest.approx(decay)
+    assert model.days[2] == 0.0
+    
+    # The same as a model that saw those days without unplugs, apart
+    # from the days counted as observed
+    seen = UnplugModel()
+    learn(seen, 2)
+    for day in range(2, 15):
+        seen.observe(at(MONDAY + timedelta(days=day, hours=6)), 'Charging')
+    seen.observe(at(MONDAY + timedelta(days=15, hours=6)), 'Charging')
+    assert model.events[0][EIGHT] == pytest.approx(seen.events[0][EIGHT])
+    assert seen.days[0] == pytest.approx(decay ** 2 + decay + 1.0)
+
+
+def test_save_and_load(tmp_path):
+    model = UnplugModel()
+    learn(model, 21)
+    model.observe(at(MONDAY + timedelta(weeks=3, hours=6)), 'Charging', 50,
+                  power=20000000, energy_full=50000000)
+    path = str(tmp_path / 'state' / 'smartcharge.json')
+    model.save(path)
+    assert os.listdir(tmp_path / 'state') == ['smartcharge.json']
+    
+    loaded = UnplugModel.load(path)
+    assert loaded.to_dict() == model.to_dict()
+    moment = at(MONDAY + timedelta(weeks=3, hours=7))
+    assert loaded.next_unplug(moment) == model.next_unplug(moment)
+    assert loaded.plugged is True
+
+
+def test_load_unreadable_gives_empty_model(tmp_path):
+    path = tmp_path / 'smartcharge.json'
+    path.write_text('{"version": 1, "events": []}')
+    model = UnplugModel.load(str(path))
+    assert model.observed_days == 0
+    assert model.charge_rate is None
+    assert UnplugModel.load(str(tmp_path / 'missing.json')).observed_days == 0
+
+
+def test_failed_save_leaves_no_temp_file(tmp_path):
+    # A directory where the file should be makes the final rename fail
+    (tmp_path / 'smartcharge.json').mkdir()
+    with pytest.raises(OSError):
+        UnplugModel().save(str(tmp_path / 'smartcharge.json'))
+    assert os.listdir(tmp_path) == ['smartcharge.json']
+
+
+def test_charger_raises_limit_ahead_of_unplug(tmp_path):
+    base_path = create_power_supply_tree(str(tmp_path / 'power_supply'), batteries=1)
+    controller = BatteryController(base_path=base_path, probe_cache=ProbeCache(persistent=False))
+    model = UnplugModel()
+    learn(model, 21)
+    charger = SmartCharger(controller, SmartChargePolicy(model, low=60, target=100))
+    monday = MONDAY + timedelta(weeks=3)
+    
+    # 40% at 30% per hour plus half an hour of margin: raised at 06:10
+    assert charger.record('BAT0', controller.get_snapshot(),
+                          at(monday + timedelta(hours=5))) == 60
+    assert controller.get_current_limit() == 60
+    
+    update_battery(os.path.join(base_path, 'BAT0'), STATUS='Charging', CAPACITY=62)
+    assert charger.record('BAT0', controller.get_snapshot(),
+                          at(monday + timedelta(hours=6, minutes=30))) == 100
+    assert controller.get_current_limit() == 100
+    assert charger.last_error is None
+    
+    # Other batteries are left alone
+    assert charger.record('BAT1', controller.get_snapshot()) is None
@@ -0,0 +1,51 @@
+"""Startup cost of the command-line and GUI entry points, from ``-X importtime``."""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src')
+
+# Milliseconds to import each entry point, best of a few runs
+CLI_IMPORT_BUDGET_MS = 100.0
+GUI_IMPORT_BUDGET_MS = 250.0
+
+
+def import_times(module):
+    """Cumulative import time in milliseconds of every module ``module`` pulls in."""
+    env = dict(os.environ, PYTHONPATH=SRC)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+                            env=env, check=True, stderr=subprocess.PIPE, text=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        fields = [field.strip() for field in line.split('|')]
+        if len(fields) == 3 and fields[1].isdigit():
+            times[fields[2]] = int(fields[1]) / 1e3
+    return times
+
+
+def best_of(module, runs=3):
+    samples = [import_times(module) for _ in range(runs)]
+    return samples[0], min(times[module] for times in samples)
+
+
+def top_level(modules):
+    return {name.split('.')[0] for name in modules}
+
+
+def test_cli_imports_neither_qt_nor_asyncio():
+    modules, import_ms = best_of('battery_limiter.cli')
+    assert not top_level(modules) & {'PyQt6', 'asyncio'}
+    assert import_ms < CLI_IMPORT_BUDGET_MS
+
+
+def test_gui_defers_optional_modules():
+    pytest.importorskip('PyQt6.QtWidgets')
+    modules, import_ms = best_of('battery_limiter.gui')
+    assert 'asyncio' not in top_level(modules)
+    # Loaded on the read worker once the window is up
+    for deferred in ('history', 'analytics', 'watch'):
+        assert f'battery_limiter.{deferred}' not in modules
+    assert import_ms < GUI_IMPORT_BUDGET_MS
@@ -0,0 +1,14 @@
+"""Concurrent threshold writers in separate processes against a mock tree."""
+
+from battery_limiter.stress import stress_pairs
+
+
+def test_concurrent_pair_transactions_stay_whole():
+    # Every writer process applies random (start, end) pairs to the same two
+    # batteries whose files reject an out-of-order write, while another
+    # process reads both thresholds without the lock
+    result = stress_pairs(processes=4, transactions=150, batteries=2, readers=1, reads=3000)
+    assert result['failed_transactions'] == 0
+    assert result['mismatched_transactions'] == 0
+    assert result['failed_reads'] == 0
+    assert result['torn_pairs'] == 0
@@ -0,0 +1,76 @@
+"""Tests for tiered sysfs attribute access."""
+
+import os
+
+import pytest
+
+from battery_limiter.mocksys import create_power_supply_tree, update_battery
+from battery_limiter.sysfs import AttributeCache, find_batteries
+
+
+@pytest.fixture
+def base_path(tmp_path):
+    return create_power_supply_tree(str(tmp_path / 'power_supply'), batteries=2, adapters=1)
+
+
+@pytest.fixture
+def cache(base_path):
+    cache = AttributeCache(os.path.join(base_path, 'BAT0'))
+    yield cache
+    cache.close()
+
+
+def test_find_batteries_lists_only_batteries(base_path):
+    assert find_batteries(base_path) == ['BAT0', 'BAT1']
+    assert find_batteries(os.path.join(base_path, 'missing')) == []
+
+
+def test_static_attributes_are_read_once(cache):
+    assert cache.read('model_name') == '5B10W13930'
+    # A battery swap changes it, but only invalidate() reads it again
+    update_battery(cache.directory, MODEL_NAME='45N1011')
+    assert cache.read('model_name') == '5B10W13930'
+    assert (cache.static_misses, cache.static_hits) == (1, 1)
+    
+    cache.invalidate()
+    assert cache.read('model_name') == '45N1011'
+    assert cache.static_misses == 2
+
+
+def test_missing_static_attribute_is_remembered(cache):
+    assert cache.read('scope') is None
+    assert cache.read('scope') is None
+    assert (cache.static_misses, cache.static_hits) == (1, 1)
+
+
+def test_dynamic_attributes_reuse_one_descriptor(cache):
+    assert cache.read('capacity') == '75'
+    update_battery(cache.directory, CAPACITY=74)
+    assert cache.read('capacity') == '74'
+    assert cache.read('status') == 'Not charging'
+    stats = cache.stats()
+    assert (stats['fd_opens'], stats['fd_hits'], stats['open_fds']) == (2, 1, 2)
+    assert stats['syscalls_saved'] == 2
+
+
+def test_stale_descriptor_is_reopened(cache):
+    assert cache.read('capacity') == '75'
+    # The device went away under the descriptor
+    os.close(cache._fds['capacity'])
+    update_battery(cache.directory, CAPACITY=60)
+    assert cache.read('capacity') == '60'
+    assert cache.fd_opens == 2
+
+
+def test_missing_dynamic_attribute(cache):
+    assert cache.read('temp') is None
+    with pytest.raises(OSError):
+        cache.read_dynamic('temp')
+
+
+def test_invalidate_closes_descriptors(cache):
+    cache.read('capacity')
+    cache.read('voltage_now')
+    cache.invalidate()
+    assert cache.stats()['open_fds'] == 0
+    assert cache.read('capacity') == '75'
@@ -0,0 +1,116 @@
+"""Tests for the battery watcher."""
+
+import os
+import shutil
+
+import pytest
+
+from battery_limiter.core import BatteryFleet
+from battery_limiter.mocksys import create_battery, create_power_supply_tree
+from battery_limiter.probe import ProbeCache
+from battery_limiter.watch import BatteryWatcher
+
+
+@pytest.fixture
+def fleet(tmp_path):
+    base_path = create_power_supply_tree(str(tmp_path / 'power_supply'), batteries=1,
+                                         start_threshold=70)
+    fleet = BatteryFleet(base_path=base_path, probe_cache=ProbeCache(persistent=False))
+    yield fleet
+    fleet.close()
+
+
+def test_uevent_without_thresholds_keeps_both(fleet):
+    changes = []
+    watcher = BatteryWatcher(fleet, lambda name, state: changes.append(state),
+                             use_events=False)
+    try:
+        assert watcher.state['BAT0'].start_threshold == 70
+        # Drivers usually leave the thresholds out of their uevents
+        watcher.inject('BAT0', {'POWER_SUPPLY_STATUS': 'Discharging',
+                                'POWER_SUPPLY_CAPACITY': '55'})
+        state = watcher.state['BAT0']
+        assert (state.status, state.limit, state.start_threshold) == ('Discharging', 80, 70)
+        
+        # A poll reading the same values reports no change
+        changes.clear()
+        watcher.inject('BAT0', {'POWER_SUPPLY_STATUS': 'Discharging',
+                                'POWER_SUPPLY_CAPACITY': '55'})
+        assert changes == []
+    finally:
+        watcher.close()
+
+
+def test_uevent_thresholds_are_used_as_reported(fleet):
+    watcher = BatteryWatcher(fleet, use_events=False)
+    try:
+        watcher.inject('BAT0', {'POWER_SUPPLY_CHARGE_CONTROL_END_THRESHOLD': '90',
+                                'POWER_SUPPLY_CHARGE_CONTROL_START_THRESHOLD': '85'})
+        state = watcher.state['BAT0']
+        assert (state.limit, state.start_threshold) == (90, 85)
+    finally:
+        watcher.close()
+
+
+def test_adapter_uevents_reach_the_supply_callback(fleet):
+    supplies = []
+    watcher = BatteryWatcher(fleet, use_events=False, supply_callback=supplies.append)
+    try:
+        watcher.inject('AC', {'POWER_SUPPLY_ONLINE': '0'})
+        watcher.inject('BAT0', {'POWER_SUPPLY_STATUS': 'Discharging'})
+        assert supplies == ['AC', 'BAT0']
+    finally:
+        watcher.close()
+
+
+def test_hotplug_uevents_rediscover_the_fleet(fleet):
+    changes = []
+    watcher = BatteryWatcher(fleet, lambda name, state: changes.append(name), use_events=False)
+    try:
+        directory = create_battery(fleet.base_path, 'BAT1', limit=75)
+        assert watcher.inject('BAT1', {'ACTION': 'add'})
+        assert fleet.names() == ['BAT0', 'BAT1']
+        assert changes == ['BAT1']
+        assert watcher.state['BAT1'].limit == 75
+        
+        shutil.rmtree(directory)
+        watcher.inject('BAT1', {'ACTION': 'remove'})
+        assert fleet.names() == ['BAT0']
+        assert 'BAT1' not in watcher.state
+        assert fleet.set_limits(60) == ['BAT0']
+    finally:
+        watcher.close()
+
+
+def test_polling_notices_added_and_removed_batteries(fleet):
+    changes = []
+    watcher = BatteryWatcher(fleet, lambda name, state: changes.append(name), use_events=False)
+    try:
+        directory = create_battery(fleet.base_path, 'BAT1', limit=75)
+        assert watcher.poll()
+        assert changes == ['BAT1']
+        
+        shutil.rmtree(directory)
+        watcher.poll()
+        assert fleet.names() == ['BAT0']
+        assert list(watcher.state) == ['BAT0']
+    finally:
+        watcher.close()
+
+
+def test_added_battery_control_file_is_watched(fleet):
+    changes = []
+    watcher = BatteryWatcher(fleet, lambda name, state: changes.append((name, state.limit)))
+    if watcher.inotify is None:
+        watcher.close()
+        pytest.skip("inotify is not available")
+    try:
+        directory = create_battery(fleet.base_path, 'BAT1', limit=75)
+        watcher.inject('BAT1', {'ACTION': 'add'})
+        changes.clear()
+        with open(os.path.join(directory, 'charge_control_end_threshold'), 'w') as f:
+            f.write('65\n')
+        assert watcher.handle(watcher.inotify.fileno())
+        assert changes == [('BAT1', 65)]
+    finally:
+        watcher.close()
@@ -54,6 +54,18 @@ if systemctl --user is-enabled --quiet battery-charge-limiter.service 2>/dev/nul
     print_success "Disabled user service"
 fi
 
+# Boot apply service
+if systemctl is-enabled --quiet battery-limiter-apply.service 2>/dev/null; then
+    sudo systemctl disable battery-limiter-apply.service
+    print_success "Disabled boot apply service"
+fi
+
+# Daemon service
+if systemctl is-enabled --quiet battery-limiter-daemon.service 2>/dev/null; then
+    sudo systemctl disable --now battery-limiter-daemon.service
+    print_success "Disabled daemon service"
+fi
+
 # Legacy system service (old)
 if systemctl is-active --quiet bcl.service 2>/dev/null; then
     sudo systemctl stop bcl.service
@@ -90,7 +102,7 @@ else
 fi
 
 # Remove wrapper scripts
-for script in battery-limiter battery-limiter-gui; do
+for script in battery-limiter battery-limiter-gui battery-limiter-daemon battery-limiter-apply; do
     if [ -f "$HOME/.local/bin/$script" ]; then
         rm -f "$HOME/.local/bin/$script"
         print_success "Removed $HOME/.local/bin/$script"
@@ -112,6 +124,13 @@ if [ -f "$USER_SERVICE" ]; then
     print_success "Removed user systemd service"
 fi
 
+# Remove cached hardware probe results
+rm -rf "${XDG_CACHE_HOME:-$HOME/.cache}/battery-limiter"
+if [ -d "/var/cache/battery-limiter" ]; then
+    sudo rm -rf "/var/cache/battery-limiter"
+    print_success "Removed probe cache"
+fi
+
 # Remove legacy files (with sudo)
 print_status "Removing legacy system files..."
 
@@ -119,6 +138,12 @@ LEGACY_FILES=(
     "/usr/local/bin/bcl"
     "/usr/local/bin/bcl-apply"
     "/etc/systemd/system/bcl.service"
+    "/etc/systemd/system/battery-limiter-daemon.service"
+    "/usr/local/bin/battery-limiter-daemon"
+    "/usr/local/bin/battery-limiter-apply"
+    "/etc/systemd/system/battery-limiter-apply.service"
+    "/etc/udev/rules.d/99-battery-limiter.rules"
+    "/usr/lib/systemd/system-sleep/battery-limiter"
 )
 
 for file in "${LEGACY_FILES[@]}"; do
@@ -128,6 +153,12 @@ for file in "${LEGACY_FILES[@]}"; do
     fi
 done
 
+# Remove the root-owned copy used by the system services
+if [ -d "/opt/battery-limiter" ]; then
+    sudo rm -rf "/opt/battery-limiter"
+    print_success "Removed /opt/battery-limiter"
+fi
+
 # Ask about configuration file
 if [ -f "/etc/bcl.conf" ]; then
     echo ""